@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Punto de entrada ASGI del servidor, para desplegarlo con un servidor ASGI como uvicorn:
+
+    SEARCH_PROCESSES=4 uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+Es solo una capa de compatibilidad: WSGIMiddleware ejecuta los mismos manejadores síncronos de la aplicación
+Flask de server.py en un pool de ASGI_THREADS hilos, así que no atiende más peticiones a la vez que un servidor
+WSGI con hilos (gunicorn --threads, waitress) y no aporta concurrencia propia. Lo que reparte la puntuación
+difusa entre núcleos es SEARCH_PROCESSES (server.ScoringPool), que funciona igual con cualquier servidor. Conviene
+arrancar un solo worker de uvicorn (sin --workers), porque cada uno tendría su propio pool de procesos; si se
+arrancan varios, SHARED_NAME_CORPUS=1 hace que también ellos compartan el índice en lugar de cargar uno cada uno.
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from server import app as flask_app
+
+# Hilos que ejecutan los manejadores de Flask; las demás peticiones esperan en el bucle de eventos.
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', '32'))
+
+app = WSGIMiddleware(flask_app, workers=ASGI_THREADS)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Compara los filtros por fecha de nacimiento y nacionalidad por texto (LIKE sobre CaracteristicasAdicionales o
+sus tablas FTS5) con los de FechasNacimiento y Nacionalidades.
+
+Toma valores al azar de la propia base de datos (fechas en el formato de cada lista y países tal como aparecen),
+los busca con server.rank_search_results por los dos caminos y muestra el tiempo medio por consulta, el número
+medio de entidades encontradas y las que solo encuentra el filtro por texto.
+
+    python benchmarks/bench_attribute_filters.py sanctions_lists.db
+    python benchmarks/bench_attribute_filters.py sanctions_lists.db --queries 500 --dob-tolerance 1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+from structured_attributes import is_birth_date_type, is_nationality_type
+
+def search(cursor, key, value, dob_tolerance, structured):
+    params = {'name': '', 'dob': '', 'nationality': '', 'gov_id': '', 'threshold': 80, 'is_exact_search': False,
+              'exclude_aliases': False, 'dob_tolerance': dob_tolerance, key: value}
+    original = server.structured_filters
+    if not structured:
+        server.structured_filters = lambda *args, **kwargs: {}
+    try:
+        start = time.perf_counter()
+        uids, _ = server.rank_search_results(cursor, params)
+        return set(uids), time.perf_counter() - start
+    finally:
+        server.structured_filters = original
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="Ruta a sanctions_lists.db")
+    parser.add_argument("--queries", type=int, default=200, help="Valores por filtro.")
+    parser.add_argument("--dob-tolerance", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    server.DB_FILE = args.db
+    conn = server.conectar_db()
+    cursor = conn.cursor()
+    if not {'FechasNacimiento', 'Nacionalidades'} <= server._search_tables(cursor):
+        raise SystemExit("La base de datos no tiene FechasNacimiento ni Nacionalidades: vuelve a ejecutar ofac_parser.py.")
+    values = {'dob': [], 'nationality': []}
+    for tipo, valor in cursor.execute("SELECT DISTINCT tipo_caracteristica, valor_caracteristica FROM CaracteristicasAdicionales"):
+        if is_birth_date_type(tipo): values['dob'].append(valor)
+        elif is_nationality_type(tipo): values['nationality'].append(valor)
+    rnd = random.Random(args.seed)
+    print(f"{len(values['dob'])} fechas y {len(values['nationality'])} nacionalidades distintas")
+    print(f"{'filtro':>12} {'consultas':>10} {'texto (ms)':>11} {'entidades':>10} {'tablas (ms)':>12} {'entidades':>10} {'solo texto':>11}")
+
+    for key, pool in values.items():
+        sample = rnd.sample(pool, min(args.queries, len(pool)))
+        if not sample: continue
+        totals = {'text': 0.0, 'structured': 0.0}
+        found = {'text': 0, 'structured': 0}
+        only_text = 0
+        for value in sample:
+            text_uids, text_time = search(cursor, key, value, args.dob_tolerance, False)
+            structured_uids, structured_time = search(cursor, key, value, args.dob_tolerance, True)
+            totals['text'] += text_time; totals['structured'] += structured_time
+            found['text'] += len(text_uids); found['structured'] += len(structured_uids)
+            only_text += len(text_uids - structured_uids)
+        n = len(sample)
+        print(f"{key:>12} {n:>10} {totals['text'] / n * 1000:>11.2f} {found['text'] / n:>10.1f} "
+              f"{totals['structured'] / n * 1000:>12.2f} {found['structured'] / n:>10.1f} {only_text:>11}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Mide cuántas búsquedas difusas por segundo atiende el servidor con varias peticiones a la vez, puntuando en
+el hilo de cada petición (SEARCH_PROCESSES=0) y en los procesos de server.ScoringPool.
+
+Toma nombres principales al azar de la base de datos y los busca con server.perform_database_search desde
+--concurrency hilos, como lo haría el servidor ASGI (asgi.py), con la caché de búsquedas desactivada. Muestra
+búsquedas por segundo, latencias p50 y p95 y las búsquedas rechazadas por tener la cola llena.
+
+    python benchmarks/bench_concurrency.py sanctions_lists.db
+    python benchmarks/bench_concurrency.py sanctions_lists.db --processes 0,2,4,8 --concurrency 16 --queries 400
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def run(names, concurrency, threshold):
+    """Lanza todas las búsquedas desde ``concurrency`` hilos; devuelve (segundos, latencias, rechazadas)."""
+    def search(name):
+        params = {'name': name, 'dob': '', 'dob_tolerance': 0, 'nationality': '', 'gov_id': '', 'threshold': threshold,
+                  'is_exact_search': False, 'exclude_aliases': False}
+        start = time.perf_counter()
+        try:
+            server.perform_database_search(params, limit=10)
+        except server.SearchOverloaded:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(search, names))
+    latencies = [result for result in results if result is not None]
+    return time.perf_counter() - start, latencies, len(results) - len(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="Ruta a sanctions_lists.db")
+    parser.add_argument("--processes", default=f"0,{os.cpu_count() or 1}", help="Valores de SEARCH_PROCESSES, separados por comas.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Búsquedas simultáneas.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threshold", type=int, default=80)
+    parser.add_argument("--queue-size", type=int, default=server.SEARCH_QUEUE_SIZE)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    server.DB_FILE = args.db
+    server.SEARCH_CACHE_SIZE = 0
+    server._search_cache = server.SearchCache(0, server.SEARCH_CACHE_TTL, server.SEARCH_CACHE_MAX_RESULTS)
+    conn = server.conectar_db()
+    names = [row[0] for row in conn.execute("SELECT nombre_principal FROM Entidades WHERE nombre_principal IS NOT NULL")]
+    conn.close()
+    names = random.Random(args.seed).choices(names, k=args.queries)
+
+    print(f"{args.queries} búsquedas difusas (umbral {args.threshold}) desde {args.concurrency} hilos")
+    print(f"{'procesos':>9} {'búsq./s':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'rechazadas':>11}")
+    for processes in (int(value) for value in args.processes.split(",")):
+        server._scoring_pool = server.ScoringPool(processes, args.queue_size, server.SEARCH_QUEUE_TIMEOUT) if processes > 0 else None
+        # Carga el índice de nombres (en el proceso o en los del pool) antes de medir.
+        generation = server.get_active_generation()
+        if server._scoring_pool is not None: server._scoring_pool.warm(generation)
+        else: generation.get_name_index()
+        elapsed, latencies, rejected = run(names, args.concurrency, args.threshold)
+        print(f"{processes:>9} {len(latencies) / elapsed:>9.1f} {percentile(latencies, 0.5) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>9.1f} {rejected:>11}")
+        if server._scoring_pool is not None: server._scoring_pool.shutdown()
+
+if __name__ == "__main__":
+    main()
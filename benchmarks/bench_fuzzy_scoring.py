@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Compara el bucle fuzz.token_sort_ratio nombre a nombre con name_matching.score_corpus.
+
+Genera corpus sintéticos de alias (por defecto 50k, 500k y 5M filas), verifica que ambos
+caminos devuelven exactamente las mismas puntuaciones y muestra el tiempo medio por consulta.
+
+    python benchmarks/bench_fuzzy_scoring.py
+    python benchmarks/bench_fuzzy_scoring.py --sizes 50000,500000 --threshold 85 --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thefuzz import fuzz
+import name_matching
+from name_matching import normalize_string, prepare_for_scoring, score_corpus
+
+FIRST = ["Muhammad", "Ali", "Ivan", "Nicolas", "Sergei", "Ahmed", "Omar", "Dmitry", "Hassan", "Yusuf", "Kim", "Jose", "Vladimir", "Abdul", "Olga", "Fatima"]
+LAST = ["Maduro", "Petrov", "Ivanov", "Al-Rashid", "Khan", "Hussain", "Smirnov", "Kuznetsov", "Abdullah", "Haddad", "Moros", "Popov", "Nasser", "Karimov"]
+ORG = ["Trading", "Shipping", "Holdings", "Group", "Bank", "Industries", "Logistics", "Petroleum"]
+
+def synthetic_names(n, rnd):
+    names = []
+    for i in range(n):
+        if rnd.random() < 0.7:
+            names.append(f"{rnd.choice(LAST)}, {rnd.choice(FIRST)} {rnd.choice(FIRST)}")
+        else:
+            names.append(f"{rnd.choice(LAST)} {rnd.choice(ORG)} {i}")
+    return names
+
+def legacy_scores(query, normalized_names, threshold):
+    normalized_query = normalize_string(query)
+    hits = []
+    for pos, name in enumerate(normalized_names):
+        score = fuzz.token_sort_ratio(normalized_query, name)
+        if score >= threshold:
+            hits.append((pos, score))
+    return hits
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="50000,500000,5000000", help="Tamaños de corpus separados por comas.")
+    parser.add_argument("--queries", type=int, default=5, help="Consultas por tamaño.")
+    parser.add_argument("--threshold", type=int, default=80)
+    parser.add_argument("--workers", type=int, default=name_matching.FUZZY_WORKERS, help="Hilos para score_corpus (-1 = todos).")
+    parser.add_argument("--legacy-limit", type=int, default=500000,
+                        help="Máximo de nombres puntuados con el bucle original; por encima se extrapola linealmente.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    queries = [f"{rnd.choice(FIRST)} {rnd.choice(LAST)}" for _ in range(args.queries)]
+    print(f"numpy: {'sí' if name_matching.np is not None else 'no'} | workers: {args.workers} | umbral: {args.threshold} | núcleos: {os.cpu_count()}")
+    print(f"{'filas':>10} {'original (ms)':>15} {'lote (ms)':>12} {'aceleración':>12} {'coincidencias':>14}")
+
+    for size in [int(s) for s in args.sizes.split(",")]:
+        names = synthetic_names(size, rnd)
+        normalized = [normalize_string(n) for n in names]
+        processed = [prepare_for_scoring(n) for n in normalized]
+        legacy_n = min(size, args.legacy_limit)
+
+        legacy_total = batch_total = 0.0
+        hits_total = 0
+        for query in queries:
+            start = time.perf_counter()
+            expected = legacy_scores(query, normalized[:legacy_n], args.threshold)
+            legacy_total += (time.perf_counter() - start) * size / legacy_n
+
+            start = time.perf_counter()
+            hits = score_corpus(prepare_for_scoring(normalize_string(query)), processed, args.threshold, workers=args.workers)
+            batch_total += time.perf_counter() - start
+            hits_total += len(hits)
+
+            if [h for h in hits if h[0] < legacy_n] != expected:
+                raise SystemExit(f"Las puntuaciones difieren para '{query}' con {size} filas.")
+
+        legacy_ms = legacy_total / len(queries) * 1000
+        batch_ms = batch_total / len(queries) * 1000
+        estimated = "*" if legacy_n < size else " "
+        print(f"{size:>10} {legacy_ms:>14.1f}{estimated} {batch_ms:>12.1f} {legacy_ms / batch_ms:>11.1f}x {hits_total // len(queries):>14}")
+
+    print("* tiempo original extrapolado a partir de --legacy-limit nombres.")
+
+if __name__ == "__main__":
+    main()
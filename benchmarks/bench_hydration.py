@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Compara el coste de hidratar una página de resultados con seis consultas por UID y con server.get_entities_details.
+
+Toma páginas de UIDs al azar de la base de datos, verifica que ambos caminos devuelven los
+mismos documentos y muestra el tiempo medio por página y el número de consultas.
+
+    python benchmarks/bench_hydration.py sanctions_lists.db
+    python benchmarks/bench_hydration.py sanctions_lists.db --page-sizes 50,500 --pages 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+def legacy_details(cursor, uid):
+    """Hidratación original: una consulta por tabla y por UID."""
+    cursor.execute("SELECT * FROM Entidades WHERE uid = ?", (uid,))
+    entidad_data = cursor.fetchone()
+    if not entidad_data: return None
+    entidad_completa = dict(entidad_data)
+    cursor.execute("SELECT * FROM Alias WHERE entidad_uid = ?", (uid,))
+    entidad_completa['aliases'] = [dict(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT * FROM Direcciones WHERE entidad_uid = ?", (uid,))
+    entidad_completa['direcciones'] = [dict(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT * FROM Programas WHERE entidad_uid = ?", (uid,))
+    entidad_completa['programas'] = [row['programa'] for row in cursor.fetchall()]
+    cursor.execute("SELECT * FROM Identificadores WHERE entidad_uid = ?", (uid,))
+    entidad_completa['identificadores'] = [dict(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT * FROM CaracteristicasAdicionales WHERE entidad_uid = ?", (uid,))
+    entidad_completa['caracteristicas'] = [dict(row) for row in cursor.fetchall()]
+    return entidad_completa
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="Ruta a sanctions_lists.db")
+    parser.add_argument("--page-sizes", default="10,50,500")
+    parser.add_argument("--pages", type=int, default=20, help="Páginas por tamaño.")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    server.DB_FILE = args.db
+    conn = server.conectar_db()
+    cursor = conn.cursor()
+    all_uids = [row['uid'] for row in cursor.execute("SELECT uid FROM Entidades")]
+    rnd = random.Random(args.seed)
+    print(f"{len(all_uids)} entidades")
+    print(f"{'página':>7} {'original (ms)':>14} {'consultas':>10} {'en bloque (ms)':>15} {'consultas':>10} {'aceleración':>12}")
+
+    for page_size in [int(s) for s in args.page_sizes.split(",")]:
+        pages = [rnd.sample(all_uids, min(page_size, len(all_uids))) for _ in range(args.pages)]
+        legacy_total = bulk_total = 0.0
+        for page in pages:
+            start = time.perf_counter()
+            expected = [d for d in (legacy_details(cursor, uid) for uid in page) if d]
+            legacy_total += time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = list(server.iter_entity_details(cursor, page, {}))
+            bulk_total += time.perf_counter() - start
+
+            if json.dumps(expected, sort_keys=True, default=str) != json.dumps(found, sort_keys=True, default=str):
+                raise SystemExit(f"Los documentos difieren en una página de {page_size} UIDs.")
+
+        legacy_ms = legacy_total / len(pages) * 1000
+        bulk_ms = bulk_total / len(pages) * 1000
+        bulk_queries = -(-page_size // server.HYDRATION_CHUNK_SIZE) * (1 + len(server.ENTITY_CHILD_TABLES))
+        print(f"{page_size:>7} {legacy_ms:>14.2f} {page_size * 6:>10} {bulk_ms:>15.2f} {bulk_queries:>10} {legacy_ms / bulk_ms:>11.1f}x")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""Mide el recall del bloqueo por trigramas frente a la puntuación exhaustiva, umbral a umbral.
+
+Toma nombres reales de la base de datos, les aplica errores típicos (erratas, tokens
+intercambiados u omitidos) y compara, para cada umbral, las entidades que encuentra
+score_corpus sobre todo el corpus con las que encuentra tras NGramIndex.candidates.
+El resultado sirve para fijar NGRAM_BLOCKING_MIN_THRESHOLD.
+
+    python benchmarks/bench_ngram_recall.py sanctions_lists.db --queries 300
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import name_matching
+import server
+from name_matching import normalize_string, prepare_for_scoring, score_corpus
+
+def perturb(name, rnd):
+    tokens = name.split()
+    op = rnd.choice(["typo", "typo", "swap", "drop", "none"])
+    if op == "swap" and len(tokens) > 1:
+        rnd.shuffle(tokens)
+    elif op == "drop" and len(tokens) > 2:
+        tokens.pop(rnd.randrange(len(tokens)))
+    elif op == "typo":
+        chars = list(" ".join(tokens))
+        for _ in range(rnd.randint(1, 2)):
+            if len(chars) < 3: break
+            i = rnd.randrange(len(chars) - 1)
+            kind = rnd.choice(["sub", "del", "ins", "transpose"])
+            if kind == "sub": chars[i] = rnd.choice("abcdefghijklmnopqrstuvwxyz")
+            elif kind == "del": del chars[i]
+            elif kind == "ins": chars.insert(i, rnd.choice("abcdefghijklmnopqrstuvwxyz"))
+            else: chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        return "".join(chars)
+    return " ".join(tokens)
+
+def entities(corpus, hits):
+    return {corpus.owners[pos] for pos, _ in hits}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db", help="Ruta a sanctions_lists.db")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--thresholds", default="50,60,70,75,80,85,90,95,100")
+    parser.add_argument("--exclude-aliases", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    server.DB_FILE = args.db
+    name_matching.NGRAM_BLOCKING_MIN_THRESHOLD = 0
+    index = server.get_name_index()
+    corpus = index.primary if args.exclude_aliases else index.full
+    rnd = random.Random(args.seed)
+    queries = [prepare_for_scoring(normalize_string(perturb(rnd.choice(corpus.names), rnd))) for _ in range(args.queries)]
+    print(f"{len(corpus)} nombres, {len(corpus.uids)} entidades, {len(queries)} consultas")
+    print(f"{'umbral':>7} {'recall':>8} {'perdidas':>9} {'candidatos':>11} {'exhaustivo (ms)':>16} {'bloqueado (ms)':>15}")
+
+    for threshold in [int(t) for t in args.thresholds.split(",")]:
+        expected_total = found_total = candidates_total = 0
+        exhaustive_time = blocked_time = 0.0
+        for query in queries:
+            start = time.perf_counter()
+            expected = entities(corpus, score_corpus(query, corpus.token_sorted, threshold))
+            exhaustive_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            candidates = corpus.ngram_index.candidates(query, threshold)
+            if candidates is None:
+                candidates = list(range(len(corpus)))
+            hits = score_corpus(query, [corpus.token_sorted[pos] for pos in candidates], threshold)
+            found = entities(corpus, [(candidates[pos], score) for pos, score in hits])
+            blocked_time += time.perf_counter() - start
+
+            expected_total += len(expected)
+            found_total += len(expected & found)
+            candidates_total += len(candidates)
+
+        recall = found_total / expected_total if expected_total else 1.0
+        print(f"{threshold:>7} {recall:>8.4f} {expected_total - found_total:>9} {candidates_total / len(queries) / len(corpus):>10.1%} "
+              f"{exhaustive_time / len(queries) * 1000:>16.2f} {blocked_time / len(queries) * 1000:>15.2f}")
+
+if __name__ == "__main__":
+    main()
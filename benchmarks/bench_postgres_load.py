@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Mide la carga en PostgreSQL de ofac_parser.py (COPY a tablas de carga y una fusión por tabla)
+contra una instancia local.
+
+Analiza una vez las cuatro listas de un directorio de descargas y las carga, tal cual (x1) y
+multiplicadas (x10: cada entidad se repite con otro UID), en un esquema temporal que se borra
+al terminar: primero en tablas vacías y después otra vez con las mismas listas, que no deben
+producir cambios. Muestra las filas por segundo de cada tabla. La conexión se toma de las
+variables DB_HOST, DB_PORT, DB_NAME, DB_USER y DB_PASSWORD, como en el parser.
+
+    DB_HOST=localhost DB_USER=postgres python benchmarks/bench_postgres_load.py downloaded_lists
+    python benchmarks/bench_postgres_load.py downloaded_lists --factors 1,10 --schema bench_carga
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ofac_parser
+from ofac_parser import SOURCES_CONFIG
+
+from bench_sqlite_load import multiplied
+
+def load(conn, corpus, factor):
+    """Guarda todas las fuentes y suma, por tabla, las filas y los segundos de COPY y de fusión."""
+    start = time.perf_counter()
+    tables, reports = {}, {}
+    for source, entities in corpus.items():
+        report = ofac_parser.guardar_datos_en_db_postgres(conn, multiplied(entities, source, factor), source)
+        if report is None:
+            raise SystemExit(f"No se pudo guardar {source}.")
+        reports[source] = report
+        for table, stats in report["rendimiento"]["tablas"].items():
+            total = tables.setdefault(table, {"filas": 0, "copia": 0.0, "fusion": 0.0})
+            for key in total:
+                total[key] += stats[key]
+    return time.perf_counter() - start, tables, reports
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("lists_dir", help="Directorio con los XML descargados (downloaded_lists)")
+    parser.add_argument("--factors", default="1,10")
+    parser.add_argument("--schema", default="bench_carga_postgres", help="Esquema temporal; se borra al empezar y al terminar.")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    corpus = {}
+    start = time.perf_counter()
+    for source, config in SOURCES_CONFIG.items():
+        path = os.path.join(args.lists_dir, os.path.basename(config["local_filename"]))
+        if not os.path.exists(path):
+            print(f"{source}: no se encuentra {path}; se omite.")
+            continue
+        corpus[source] = list(ofac_parser.con_huellas(config["parser_function"](path)))
+    if not corpus:
+        raise SystemExit("No hay ninguna lista que cargar.")
+    print(f"{sum(len(e) for e in corpus.values())} entidades en {', '.join(corpus)} (análisis: {time.perf_counter() - start:.1f} s)")
+
+    conn = ofac_parser.conectar_db_postgres()
+    if conn is None:
+        raise SystemExit("No se pudo conectar a PostgreSQL; revisa las variables DB_*.")
+    cursor = conn.cursor()
+    try:
+        for factor in [int(f) for f in args.factors.split(",")]:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {args.schema}")
+            cursor.execute(f"SET search_path TO {args.schema}")
+            conn.commit()
+            ofac_parser.crear_tablas_postgres(conn)
+
+            for label in ("vacía", "recarga"):
+                elapsed, tables, reports = load(conn, corpus, factor)
+                rows = sum(stats["filas"] for stats in tables.values())
+                changed = sum(len(r["añadidas"]) + len(r["modificadas"]) + len(r["eliminadas"]) for r in reports.values())
+                if label == "recarga" and changed:
+                    raise SystemExit(f"La recarga sin cambios ha modificado {changed} entidades con factor {factor}.")
+                print(f"\nfactor {factor}, carga {label}: {rows} filas en {elapsed:.2f} s ({rows / elapsed:.0f} filas/s), {changed} entidades con cambios")
+                print(f"{'tabla':>27} {'filas':>9} {'COPY (s)':>9} {'fusión (s)':>11} {'filas/s':>10}")
+                for table, stats in tables.items():
+                    seconds = stats["copia"] + stats["fusion"]
+                    rate = f"{stats['filas'] / seconds:.0f}" if seconds and stats["filas"] else "-"
+                    print(f"{table:>27} {stats['filas']:>9} {stats['copia']:>9.2f} {stats['fusion']:>11.2f} {rate:>10}")
+    finally:
+        conn.rollback()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        conn.commit()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Mide el recall y la latencia de la búsqueda difusa con SEARCH_BACKEND=postgres, umbral a umbral.
+
+Toma nombres de la base de datos PostgreSQL (variables DB_*), les aplica los mismos errores que
+bench_ngram_recall.py y compara las entidades que encuentra rank_search_results puntuando todos los
+nombres con las que encuentra con los candidatos de pg_trgm y de ClavesFoneticas. El resultado sirve
+para fijar POSTGRES_TRGM_SIMILARITY_FACTOR.
+
+    DB_HOST=localhost DB_USER=postgres python benchmarks/bench_postgres_search.py --queries 200
+    python benchmarks/bench_postgres_search.py --factors 0.003,0.004 --thresholds 70,80,90
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+os.environ['SEARCH_BACKEND'] = 'postgres'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import server
+
+from bench_ngram_recall import perturb
+
+def search(cursor, query, threshold, exclude_aliases):
+    params = {'name': query, 'dob': '', 'nationality': '', 'gov_id': '', 'threshold': threshold,
+              'is_exact_search': False, 'exclude_aliases': exclude_aliases}
+    start = time.perf_counter()
+    uids, _ = server.rank_search_results(cursor, params)
+    elapsed = time.perf_counter() - start
+    cursor.connection.rollback()
+    return set(uids), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--thresholds", default="70,75,80,85,90,95")
+    parser.add_argument("--factors", default=str(server.POSTGRES_TRGM_SIMILARITY_FACTOR))
+    parser.add_argument("--exclude-aliases", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    conn = server._db_pool.acquire()
+    if conn is None:
+        raise SystemExit("No se pudo conectar a PostgreSQL; revisa las variables DB_*.")
+    cursor = conn.cursor()
+    cursor.execute("SELECT nombre_principal FROM Entidades WHERE nombre_principal IS NOT NULL UNION ALL SELECT nombre_alias FROM Alias WHERE nombre_alias IS NOT NULL")
+    names = [row['nombre_principal'] for row in cursor.fetchall()]
+    conn.rollback()
+    if not names:
+        raise SystemExit("La base de datos no tiene nombres.")
+    rnd = random.Random(args.seed)
+    queries = [perturb(rnd.choice(names), rnd) for _ in range(args.queries)]
+    print(f"{len(names)} nombres, {len(queries)} consultas, pg_trgm y claves fonéticas: {server._postgres_search_features(cursor)[1:]}")
+    print(f"{'umbral':>7} {'factor':>7} {'similitud':>10} {'recall':>8} {'perdidas':>9} {'exhaustivo (ms)':>16} {'candidatos (ms)':>16}")
+
+    blocking_threshold = server.NGRAM_BLOCKING_MIN_THRESHOLD
+    try:
+        for threshold in [int(t) for t in args.thresholds.split(",")]:
+            server.NGRAM_BLOCKING_MIN_THRESHOLD = 101
+            exhaustive = [search(cursor, query, threshold, args.exclude_aliases) for query in queries]
+            server.NGRAM_BLOCKING_MIN_THRESHOLD = 0
+            for factor in [float(f) for f in args.factors.split(",")]:
+                server.POSTGRES_TRGM_SIMILARITY_FACTOR = factor
+                blocked = [search(cursor, query, threshold, args.exclude_aliases) for query in queries]
+                expected_total = sum(len(expected) for expected, _ in exhaustive)
+                found_total = sum(len(expected & found) for (expected, _), (found, _) in zip(exhaustive, blocked))
+                recall = found_total / expected_total if expected_total else 1.0
+                exhaustive_ms = sum(elapsed for _, elapsed in exhaustive) / len(queries) * 1000
+                blocked_ms = sum(elapsed for _, elapsed in blocked) / len(queries) * 1000
+                print(f"{threshold:>7} {factor:>7.4f} {min(threshold * factor, 1.0):>10.2f} {recall:>8.4f} {expected_total - found_total:>9} {exhaustive_ms:>16.2f} {blocked_ms:>16.2f}")
+    finally:
+        server.NGRAM_BLOCKING_MIN_THRESHOLD = blocking_threshold
+        server._db_pool.release(conn)
+
+if __name__ == "__main__":
+    main()
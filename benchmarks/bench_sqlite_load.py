@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Compara el tiempo de construir una base de datos SQLite vacía con la carga ordinaria
+(guardar_delta_sqlite por fuente, lo que hacía el parser) y con la carga rápida de ofac_parser.py.
+
+Analiza una vez las cuatro listas de un directorio de descargas y las carga en archivos
+temporales, tal cual (x1) y multiplicadas (x10: cada entidad se repite con otro UID), y
+comprueba que los dos caminos dejan las mismas filas. Solo se mide el guardado de las
+entidades; el índice de nombres y las tablas FTS5 se construyen igual en ambos casos.
+
+    python benchmarks/bench_sqlite_load.py downloaded_lists
+    python benchmarks/bench_sqlite_load.py downloaded_lists --factors 1,10 --repeats 3
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ofac_parser
+from ofac_parser import SOURCES_CONFIG
+
+TABLES = ["Entidades", "Alias", "Direcciones", "Programas", "Identificadores", "CaracteristicasAdicionales", "HuellasEntidades"]
+
+def multiplied(entities, source, factor):
+    """Genera las entidades de la fuente ``factor`` veces; las copias llevan un sufijo en el UID."""
+    for copy in range(factor):
+        for entity in entities:
+            if copy == 0:
+                yield entity
+                continue
+            entity = dict(entity)
+            entity['uid'] = f"{ofac_parser.uid_entidad(entity, source)}-x{copy}"
+            entity['huella'] = hashlib.sha256(f"{entity['huella']}-x{copy}".encode()).hexdigest()
+            yield entity
+
+def load_ordinary(path, corpus, factor):
+    conn = ofac_parser.conectar_db_sqlite(path)
+    ofac_parser.crear_tablas_sqlite(conn)
+    for source, entities in corpus.items():
+        ofac_parser.guardar_delta_sqlite(conn, multiplied(entities, source, factor), source)
+    return conn
+
+def load_fast(path, corpus, factor):
+    conn = ofac_parser.conectar_db_sqlite(path)
+    ofac_parser.crear_tablas_sqlite(conn, con_indices=False)
+    carga = ofac_parser.iniciar_carga_rapida_sqlite(conn)
+    for source, entities in corpus.items():
+        ofac_parser.guardar_carga_rapida_sqlite(conn, multiplied(entities, source, factor), source, carga)
+    if not ofac_parser.terminar_carga_rapida_sqlite(conn, carga):
+        raise SystemExit("La carga rápida no se pudo confirmar.")
+    return conn
+
+def timed_load(loader, corpus, factor, workdir):
+    fd, path = tempfile.mkstemp(suffix=".db", dir=workdir)
+    os.close(fd); os.remove(path)
+    start = time.perf_counter()
+    conn = loader(path, corpus, factor)
+    conn.close()
+    elapsed = time.perf_counter() - start
+    conn = ofac_parser.sqlite3.connect(path)
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+    conn.close()
+    ofac_parser.borrar_archivo_sqlite(path)
+    return elapsed, counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("lists_dir", help="Directorio con los XML descargados (downloaded_lists)")
+    parser.add_argument("--factors", default="1,10")
+    parser.add_argument("--repeats", type=int, default=1, help="Cargas por camino y factor; se toma la más rápida.")
+    parser.add_argument("--workdir", default=None, help="Directorio de los archivos temporales (por defecto, el del sistema).")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    corpus = {}
+    start = time.perf_counter()
+    for source, config in SOURCES_CONFIG.items():
+        path = os.path.join(args.lists_dir, os.path.basename(config["local_filename"]))
+        if not os.path.exists(path):
+            print(f"{source}: no se encuentra {path}; se omite.")
+            continue
+        corpus[source] = list(ofac_parser.con_huellas(config["parser_function"](path)))
+    if not corpus:
+        raise SystemExit("No hay ninguna lista que cargar.")
+    print(f"{sum(len(e) for e in corpus.values())} entidades en {', '.join(corpus)} (análisis: {time.perf_counter() - start:.1f} s)")
+    print(f"{'factor':>6} {'entidades':>10} {'filas':>10} {'ordinaria (s)':>14} {'rápida (s)':>11} {'entidades/s':>12} {'aceleración':>12}")
+
+    for factor in [int(f) for f in args.factors.split(",")]:
+        ordinary = min(timed_load(load_ordinary, corpus, factor, args.workdir) for _ in range(args.repeats))
+        fast = min(timed_load(load_fast, corpus, factor, args.workdir) for _ in range(args.repeats))
+        if ordinary[1] != fast[1]:
+            raise SystemExit(f"Las cargas difieren con factor {factor}: {ordinary[1]} frente a {fast[1]}")
+        entities = fast[1]["Entidades"]
+        print(f"{factor:>6} {entities:>10} {sum(fast[1].values()):>10} {ordinary[0]:>14.2f} {fast[0]:>11.2f} {entities / fast[0]:>12.0f} {ordinary[0] / fast[0]:>11.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""Banco de pruebas de los parsers y del buscador con listas sintéticas (ver benchmarks/synthetic_lists.py).
+
+Para cada tamaño (entidades en total, repartidas a partes iguales entre OFAC, ONU, UE y UK):
+
+  1. genera el XML de cada fuente en su esquema;
+  2. lo analiza con su analizar_* de ofac_parser.py y mide entidades/s, MiB/s y memoria pico;
+  3. construye la base de datos SQLite como en una primera carga del parser (carga rápida, índice de nombres,
+     tablas FTS5 y tablas de atributos) y mide cada paso;
+  4. lanza sobre server.perform_database_search cuatro cargas de consultas tomadas de la propia base de datos:
+     exacta, difusa (nombres con erratas, palabras cambiadas de orden o de menos), difusa con la fecha de
+     nacimiento y la nacionalidad de la entidad buscada, y difusa con exclude_aliases. De cada una mide las
+     latencias p50/p95/p99, las consultas/s y en qué proporción aparece la entidad buscada en la primera página.
+
+Cada fase se ejecuta en un proceso nuevo, así que la memoria pico de una no arrastra la de las anteriores, y
+la caché de búsquedas está desactivada para medir siempre la búsqueda completa. El resultado es un JSON (en
+--output o en la salida estándar; el resumen legible va a la salida de errores). Con --baseline se compara
+con un resultado anterior y el programa termina con código 1 si alguna medida empeora más de --tolerance.
+
+    python benchmarks/bench_suite.py --output bench.json
+    python benchmarks/bench_suite.py --sizes 10000,100000,1000000 --workdir /data/bench --output bench.json
+    python benchmarks/bench_suite.py --baseline bench.json --tolerance 0.25
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ofac_parser
+from ofac_parser import SOURCES_CONFIG
+from structured_attributes import is_nationality_type
+import synthetic_lists
+
+WORKLOADS = ["exact", "fuzzy", "fuzzy_filters", "exclude_aliases"]
+# Consultas de cada carga que se lanzan antes de medir (páginas de SQLite en caché, hilos de puntuación creados).
+WARMUP_QUERIES = 5
+# Medidas que se comparan con --baseline: (ruta dentro de cada tamaño, True si más es mejor).
+REGRESSION_METRICS = [("parse.{source}.records_per_second", True), ("parse.{source}.peak_rss_mib", False),
+                      ("load.total_seconds", False), ("search.index_load_seconds", False), ("search.peak_rss_mib", False),
+                      ("search.workloads.{workload}.p95_ms", False), ("search.workloads.{workload}.throughput_qps", True)]
+
+def in_fresh_process(function, *args):
+    """Ejecuta ``function(*args)`` en un proceso nuevo (spawn) para que su memoria pico sea solo la suya."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(function, *args).result()
+
+def parse_source(source, path):
+    """Analiza el XML de una fuente sin guardar las entidades."""
+    logging.disable(logging.WARNING)
+    ofac_parser.reiniciar_memoria_pico()
+    start = time.perf_counter()
+    records = aliases = 0
+    for entity in SOURCES_CONFIG[source]["parser_function"](path):
+        records += 1
+        aliases += len(entity.get('aliases') or [])
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    return {"records": records, "aliases": aliases, "seconds": round(elapsed, 3),
+            "records_per_second": round(records / elapsed, 1), "mib_per_second": round(size / 2**20 / elapsed, 2),
+            "peak_rss_mib": round(ofac_parser.memoria_pico_mib() or 0, 1)}
+
+def build_database(lists_dir, db_path):
+    """Construye la base de datos como una primera carga de ofac_parser.py (ver bench_sqlite_load.py)."""
+    logging.disable(logging.WARNING)
+    stages = {}
+    start = time.perf_counter()
+    conn = ofac_parser.conectar_db_sqlite(db_path)
+    ofac_parser.crear_tablas_sqlite(conn, con_indices=False)
+    carga = ofac_parser.iniciar_carga_rapida_sqlite(conn)
+    for source, config in SOURCES_CONFIG.items():
+        entities = ofac_parser.con_huellas(config["parser_function"](os.path.join(lists_dir, config["local_filename"])))
+        ofac_parser.guardar_carga_rapida_sqlite(conn, entities, source, carga)
+    if not ofac_parser.terminar_carga_rapida_sqlite(conn, carga):
+        raise RuntimeError("La carga rápida no se pudo confirmar.")
+    stages["parse_and_load_seconds"] = time.perf_counter() - start
+    for name, step in [("fts_seconds", ofac_parser.construir_indices_busqueda_sqlite),
+                       ("name_index_seconds", ofac_parser.construir_indice_nombres_sqlite),
+                       ("attributes_seconds", ofac_parser.construir_atributos_sqlite)]:
+        step_start = time.perf_counter()
+        step(conn)
+        stages[name] = time.perf_counter() - step_start
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ["Entidades", "Alias", "NombresIndexados", "FechasNacimiento", "Nacionalidades"]}
+    conn.close()
+    result = {name: round(seconds, 3) for name, seconds in stages.items()}
+    result.update({"total_seconds": round(time.perf_counter() - start, 3), "db_mib": round(os.path.getsize(db_path) / 2**20, 1),
+                   "rows": counts, "peak_rss_mib": round(ofac_parser.memoria_pico_mib() or 0, 1)})
+    return result
+
+def search_params(name, exact=False, exclude_aliases=False, dob='', nationality=''):
+    return {'name': name, 'dob': dob, 'dob_tolerance': 0, 'nationality': nationality, 'gov_id': '', 'threshold': 80,
+            'is_exact_search': exact, 'exclude_aliases': exclude_aliases}
+
+def build_workloads(db_path, count, seed):
+    """Devuelve {carga: [(uid buscado, search_params)]} con ``count`` consultas por carga tomadas de la base de datos."""
+    # bench_ngram_recall importa server; aquí y no arriba para que los procesos de cada fase no lo carguen sin necesidad.
+    from bench_ngram_recall import perturb
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    names = conn.execute("SELECT entidad_uid, nombre, es_alias FROM NombresIndexados").fetchall()
+    primary = [(uid, name) for uid, name, es_alias in names if not es_alias]
+    nationalities = {}
+    for uid, tipo, valor in conn.execute("SELECT entidad_uid, tipo_caracteristica, valor_caracteristica FROM CaracteristicasAdicionales"):
+        if is_nationality_type(tipo): nationalities.setdefault(uid, valor)
+    # Entidades con fecha de nacimiento y nacionalidad: una fila por entidad con su primer año de nacimiento.
+    with_attributes = [(uid, name, year, nationalities[uid]) for uid, name, year in conn.execute(
+        "SELECT e.uid, e.nombre_principal, MIN(f.anio) FROM Entidades e JOIN FechasNacimiento f ON f.entidad_uid = e.uid GROUP BY e.uid")
+        if uid in nationalities]
+    conn.close()
+    sample = lambda rows: [rnd.choice(rows) for _ in range(count)] if rows else []
+    return {
+        "exact": [(uid, search_params(name, exact=True)) for uid, name, _ in sample(names)],
+        "fuzzy": [(uid, search_params(perturb(name, rnd))) for uid, name, _ in sample(names)],
+        "fuzzy_filters": [(uid, search_params(perturb(name, rnd), dob=str(year), nationality=nationality))
+                          for uid, name, year, nationality in sample(with_attributes)],
+        "exclude_aliases": [(uid, search_params(perturb(name, rnd), exclude_aliases=True)) for uid, name in sample(primary)],
+    }
+
+def percentile(ordered, fraction):
+    """Percentil por interpolación lineal de una lista ya ordenada."""
+    position = (len(ordered) - 1) * fraction
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def run_searches(db_path, workloads, concurrency):
+    """Carga el índice de nombres de ``db_path`` y lanza cada carga de consultas con ``concurrency`` hilos."""
+    logging.disable(logging.WARNING)
+    import name_matching
+    import server
+    server.DB_FILE = db_path
+    # Sin caché de búsquedas: cada consulta recorre la búsqueda completa.
+    server.SEARCH_CACHE_SIZE = 0
+    server._search_cache = server.SearchCache(0, server.SEARCH_CACHE_TTL, server.SEARCH_CACHE_MAX_RESULTS)
+    start = time.perf_counter()
+    server.get_name_index()
+    result = {"index_load_seconds": round(time.perf_counter() - start, 3), "index_rss_mib": round(ofac_parser.memoria_pico_mib() or 0, 1),
+              "concurrency": concurrency, "workloads": {},
+              "settings": {name: getattr(module, name) for module, name in [
+                  (server, 'PHONETIC_SEARCH'), (server, 'SEARCH_DEFAULT_LIMIT'), (server, 'SQLITE_POOL_SIZE'),
+                  (name_matching, 'FUZZY_WORKERS'), (name_matching, 'NGRAM_BLOCKING_MIN_THRESHOLD')]}}
+
+    def timed(query):
+        uid, params = query
+        query_start = time.perf_counter()
+        page = server.perform_database_search(params)
+        return time.perf_counter() - query_start, len(page), any(entity['uid'] == uid for entity in page)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for workload, queries in workloads.items():
+            if not queries: continue
+            list(pool.map(timed, queries[:WARMUP_QUERIES]))
+            wall_start = time.perf_counter()
+            timings = list(pool.map(timed, queries))
+            wall = time.perf_counter() - wall_start
+            latencies = sorted(seconds * 1000 for seconds, _, _ in timings)
+            result["workloads"][workload] = {
+                "queries": len(timings), "mean_ms": round(statistics.fmean(latencies), 3),
+                "p50_ms": round(percentile(latencies, 0.50), 3), "p95_ms": round(percentile(latencies, 0.95), 3),
+                "p99_ms": round(percentile(latencies, 0.99), 3), "max_ms": round(latencies[-1], 3),
+                "throughput_qps": round(len(timings) / wall, 2),
+                "mean_results": round(statistics.fmean(found for _, found, _ in timings), 2),
+                "target_found_rate": round(sum(hit for _, _, hit in timings) / len(timings), 4)}
+    result["peak_rss_mib"] = round(ofac_parser.memoria_pico_mib() or 0, 1)
+    return result
+
+def run_size(size, workdir, args, log):
+    per_source = max(1, size // len(SOURCES_CONFIG))
+    lists_dir = os.path.join(workdir, f"n{size}", "lists")
+    db_path = os.path.join(workdir, f"n{size}", "sanctions_lists.db")
+    ofac_parser.borrar_archivo_sqlite(db_path)
+    result = {"entities_per_source": per_source}
+
+    log(f"[{size}] Generando listas sintéticas en {lists_dir}...")
+    result["generate"] = {source: {key: value for key, value in info.items() if key != "path"}
+                          for source, info in synthetic_lists.generate(lists_dir, per_source, args.seed).items()}
+
+    result["parse"] = {}
+    for source, config in SOURCES_CONFIG.items():
+        parsed = in_fresh_process(parse_source, source, os.path.join(lists_dir, config["local_filename"]))
+        result["parse"][source] = parsed
+        log(f"[{size}] {source:>5}: {parsed['records']} entidades, {parsed['aliases']} alias, {parsed['records_per_second']:.0f} entidades/s, "
+            f"{parsed['mib_per_second']:.1f} MiB/s, pico {parsed['peak_rss_mib']:.0f} MiB")
+
+    result["load"] = load = in_fresh_process(build_database, lists_dir, db_path)
+    log(f"[{size}] Base de datos: {load['total_seconds']:.1f} s ({load['parse_and_load_seconds']:.1f} s carga, {load['fts_seconds']:.1f} s FTS5, "
+        f"{load['name_index_seconds']:.1f} s índice de nombres, {load['attributes_seconds']:.1f} s atributos), {load['db_mib']:.0f} MiB, "
+        f"pico {load['peak_rss_mib']:.0f} MiB, {load['rows']['NombresIndexados']} nombres")
+
+    workloads = build_workloads(db_path, args.queries, args.seed)
+    result["search"] = search = in_fresh_process(run_searches, db_path, workloads, args.concurrency)
+    log(f"[{size}] Índice de nombres cargado en {search['index_load_seconds']:.1f} s ({search['index_rss_mib']:.0f} MiB); "
+        f"pico durante las búsquedas {search['peak_rss_mib']:.0f} MiB")
+    for workload, stats in search["workloads"].items():
+        log(f"[{size}] {workload:>16}: p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  "
+            f"{stats['throughput_qps']:8.1f} consultas/s  encontrada {stats['target_found_rate']:.0%}")
+    return result
+
+def metric(result, path):
+    for key in path.split("."):
+        if not isinstance(result, dict) or key not in result: return None
+        result = result[key]
+    return result
+
+def compare(current, baseline, tolerance):
+    """Devuelve las medidas de ``current`` que empeoran más de ``tolerance`` (proporción) respecto a ``baseline``."""
+    regressions = []
+    for size, result in current["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if not previous: continue
+        for template, higher_is_better in REGRESSION_METRICS:
+            for path in {template.format(source=source, workload=workload) for source in SOURCES_CONFIG for workload in WORKLOADS}:
+                new, old = metric(result, path), metric(previous, path)
+                if not new or not old: continue
+                change = (old - new) / old if higher_is_better else (new - old) / old
+                if change > tolerance:
+                    regressions.append({"size": size, "metric": path, "baseline": old, "current": new, "worse_by": round(change, 3)})
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="Entidades en total de cada base de datos, separadas por comas.")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas por carga y tamaño.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Hilos que lanzan las consultas a la vez.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Directorio de las listas y bases de datos generadas, que se conservan "
+                                                        "(por defecto, uno temporal que se borra al terminar).")
+    parser.add_argument("--output", default="-", help="Archivo JSON del resultado ('-' para la salida estándar).")
+    parser.add_argument("--baseline", default=None, help="JSON de una ejecución anterior con el que comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Empeoramiento relativo admitido frente a --baseline.")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_suite_")
+    report = {"meta": {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "commit": git_commit(),
+                       "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+                       "sqlite": sqlite3.sqlite_version, "sizes": sizes, "queries": args.queries,
+                       "concurrency": args.concurrency, "seed": args.seed},
+              "sizes": {}}
+    try:
+        for size in sizes:
+            report["sizes"][str(size)] = run_size(size, workdir, args, log)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+        for regression in report["regressions"]:
+            log(f"Empeora [{regression['size']}] {regression['metric']}: {regression['baseline']} -> {regression['current']} "
+                f"({regression['worse_by']:+.0%})")
+        log(f"{len(report['regressions'])} medidas empeoran más de un {args.tolerance:.0%} frente a {args.baseline}.")
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    sys.exit(1 if report.get("regressions") else 0)
+
+if __name__ == "__main__":
+    main()
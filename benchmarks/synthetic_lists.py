@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+"""Genera listas de sanciones sintéticas en los cuatro esquemas XML que lee ofac_parser.py (SDN Enhanced de
+OFAC, lista consolidada de la ONU, export de la UE y ConList de OFSI), para medir el parser y el buscador con
+corpus del tamaño que se quiera sin descargar nada.
+
+Los nombres se construyen según su origen (árabe, persa, eslavo, hispano, coreano o chino): los apellidos se
+forman con sílabas, así que apenas se repiten aunque se generen millones. El número de alias de cada entidad
+sigue una distribución de cola larga como la de las listas reales (la mayoría con ninguno o uno, algunas con
+más de diez): variantes de transliteración, el nombre sin el segundo nombre o en otro orden, en cirílico o en
+árabe, kunyas ("Abu ...") y otros nombres; las empresas, su forma jurídica desarrollada o traducida, siglas
+y nombres anteriores. Las fechas de nacimiento y las nacionalidades se escriben como las escribe cada lista.
+La misma semilla y el mismo tamaño generan siempre los mismos archivos.
+
+    python benchmarks/synthetic_lists.py 10000 /tmp/listas
+    python benchmarks/synthetic_lists.py 250000 /tmp/listas --seed 7
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ofac_parser import SOURCES_CONFIG
+
+# Nombre del país en cada lista: OFAC, ONU, UE y la nacionalidad tal como la escribe UK.
+COUNTRIES = {
+    "RU": ("Russia", "Russian Federation", "RUSSIAN FEDERATION", "Russian"),
+    "BY": ("Belarus", "Belarus", "BELARUS", "Belarusian"),
+    "UA": ("Ukraine", "Ukraine", "UKRAINE", "Ukrainian"),
+    "IR": ("Iran", "Iran (Islamic Republic of)", "IRAN (ISLAMIC REPUBLIC OF)", "Iranian"),
+    "AF": ("Afghanistan", "Afghanistan", "AFGHANISTAN", "Afghan"),
+    "SY": ("Syria", "Syrian Arab Republic", "SYRIAN ARAB REPUBLIC", "Syrian"),
+    "IQ": ("Iraq", "Iraq", "IRAQ", "Iraqi"),
+    "LY": ("Libya", "Libya", "LIBYA", "Libyan"),
+    "YE": ("Yemen", "Yemen", "YEMEN", "Yemeni"),
+    "LB": ("Lebanon", "Lebanon", "LEBANON", "Lebanese"),
+    "SO": ("Somalia", "Somalia", "SOMALIA", "Somali"),
+    "SD": ("Sudan", "Sudan", "SUDAN", "Sudanese"),
+    "SA": ("Saudi Arabia", "Saudi Arabia", "SAUDI ARABIA", "Saudi Arabian"),
+    "VE": ("Venezuela", "Venezuela (Bolivarian Republic of)", "VENEZUELA (BOLIVARIAN REPUBLIC OF)", "Venezuelan"),
+    "CU": ("Cuba", "Cuba", "CUBA", "Cuban"),
+    "NI": ("Nicaragua", "Nicaragua", "NICARAGUA", "Nicaraguan"),
+    "KP": ("Korea, North", "Democratic People's Republic of Korea", "KOREA (DEMOCRATIC PEOPLE'S REPUBLIC OF)", "North Korean"),
+    "CN": ("China", "China", "CHINA", "Chinese"),
+}
+OFAC, ONU, UE, UK = range(4)
+
+# Por origen: nombres de pila, sílabas y terminaciones de los apellidos, países, cambios de transliteración
+# que dan las variantes ortográficas y escritura original (None si no se genera).
+ORIGINS = {
+    "arabic": {
+        "given": ["Muhammad", "Ahmed", "Ali", "Omar", "Hassan", "Hussein", "Yusuf", "Khalid", "Ibrahim", "Abdullah",
+                  "Mustafa", "Tariq", "Faisal", "Karim", "Samir", "Nabil", "Walid", "Jamal", "Salim", "Mahmoud",
+                  "Abd al-Rahman", "Abd al-Aziz", "Said", "Hamza", "Bilal", "Fatima", "Aisha", "Layla", "Mariam", "Zainab"],
+        "syllables": ["ha", "ra", "sa", "qa", "ja", "ma", "na", "ka", "za", "ba", "da", "fa", "ta", "sha", "kha"],
+        "endings": ["shid", "ddad", "sim", "mal", "jid", "sser", "rouk", "bib", "kim", "lil", "wad", "hir", "mid", "tar", "rif"],
+        "countries": ["SY", "IQ", "LY", "YE", "LB", "SO", "SD", "SA"],
+        "spelling": [("Muhammad", "Mohammed"), ("Muhammad", "Mohamed"), ("Ahmed", "Ahmad"), ("Hussein", "Husayn"),
+                     ("Hussein", "Hussain"), ("Yusuf", "Youssef"), ("Omar", "Umar"), ("Said", "Saeed"), ("Al-", "El "),
+                     ("Al-", "al-"), ("ou", "u"), ("q", "k"), ("Kh", "H"), ("ee", "i"), ("ss", "s"), ("dd", "d")],
+        "script": "arabic",
+    },
+    "persian": {
+        "given": ["Mohammad", "Ali", "Reza", "Hossein", "Mahmoud", "Mehdi", "Javad", "Majid", "Hamid", "Mohsen",
+                  "Saeed", "Ahmad", "Hassan", "Gholam", "Abbas", "Esmail", "Morteza", "Qasem", "Zahra", "Maryam"],
+        "syllables": ["ah", "ra", "mo", "ka", "ja", "gha", "sa", "ha", "ba", "na", "za", "fa", "ta", "kho"],
+        "endings": ["madi", "himi", "radi", "semi", "fari", "deqi", "shemi", "zadeh", "pour", "nejad", "vand", "ani"],
+        "countries": ["IR", "AF"],
+        "spelling": [("Mohammad", "Muhammad"), ("Hossein", "Hosein"), ("Hossein", "Husayn"), ("zadeh", "zade"),
+                     ("Qasem", "Ghasem"), ("Gh", "Q"), ("ou", "u"), ("Esmail", "Ismail"), ("ee", "i"), ("Saeed", "Said")],
+        "script": "arabic",
+    },
+    "slavic": {
+        "given": ["Ivan", "Sergei", "Dmitry", "Vladimir", "Alexei", "Nikolai", "Andrei", "Mikhail", "Yuri", "Oleg",
+                  "Igor", "Pavel", "Viktor", "Boris", "Gennady", "Arkady", "Olga", "Natalia", "Elena", "Irina",
+                  "Tatiana", "Svetlana", "Yekaterina", "Lyudmila"],
+        "syllables": ["ka", "lo", "mi", "ro", "sa", "ve", "do", "ni", "tu", "ba", "ze", "go", "pa", "le", "ru", "sho", "kha", "zhu"],
+        "endings": ["ov", "ev", "in", "enko", "sky", "ovich", "uk", "yan", "ikov"],
+        "countries": ["RU", "RU", "RU", "BY", "UA"],
+        "spelling": [("y", "i"), ("ei", "ey"), ("ii", "iy"), ("kh", "h"), ("ov", "off"), ("ev", "eff"), ("ya", "ia"),
+                     ("yu", "iu"), ("sky", "ski"), ("zh", "j"), ("Yu", "Iu"), ("Ye", "E"), ("sh", "ch")],
+        "script": "cyrillic",
+    },
+    "hispanic": {
+        "given": ["Jose", "Carlos", "Luis", "Juan", "Jorge", "Miguel", "Pedro", "Rafael", "Nicolas", "Diego",
+                  "Ramon", "Alejandro", "Maria", "Carmen", "Rosa", "Ana", "Delcy", "Tareck", "Diosdado", "Vladimir"],
+        "surnames": ["Garcia", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Perez", "Sanchez",
+                     "Ramirez", "Torres", "Flores", "Rivera", "Gomez", "Diaz", "Reyes", "Morales", "Cruz", "Ortiz",
+                     "Gutierrez", "Chavez", "Ramos", "Ruiz", "Alvarez", "Mendoza", "Castillo", "Jimenez", "Moreno",
+                     "Romero", "Herrera", "Medina", "Aguilar", "Vargas", "Castro", "Guzman", "Munoz", "Rojas",
+                     "Salazar", "Cabello", "Maduro", "Moros", "Padrino", "Carvajal", "Saab", "Ortega", "Murillo"],
+        "syllables": ["ca", "ri", "ve", "na", "co", "lo", "mar", "sol", "ter", "pe", "tro", "gua", "mon", "al", "ba", "sur"],
+        "countries": ["VE", "VE", "CU", "NI"],
+        "spelling": [("Jose", "José"), ("Ramirez", "Ramírez"), ("Gonzalez", "González"), ("Rodriguez", "Rodríguez"),
+                     ("Lopez", "López"), ("Perez", "Pérez"), ("Munoz", "Muñoz"), ("Nicolas", "Nicolás"), ("z", "s")],
+        "script": None,
+    },
+    "korean": {
+        "surnames": ["Kim", "Ri", "Pak", "Choe", "Jang", "Jong", "O", "Han", "Kang", "Yun", "Jo", "Hwang"],
+        "given_syllables": ["Jong", "Song", "Chol", "Il", "Su", "Nam", "Yong", "Hyok", "Myong", "Chun", "Kwang",
+                            "Ho", "Sok", "Hui", "Gil", "Mun", "Ryong", "Sung", "Chang", "Thae", "Un", "Hak"],
+        "countries": ["KP"],
+        "spelling": [("Ri ", "Lee "), ("Pak ", "Park "), ("Choe ", "Choi "), ("Jong", "Chong"), ("Ryong", "Ryung"),
+                     ("Thae", "Tae"), ("Kwang", "Gwang")],
+        "script": None,
+    },
+    "chinese": {
+        "surnames": ["Wang", "Li", "Zhang", "Liu", "Chen", "Yang", "Huang", "Zhao", "Wu", "Zhou", "Xu", "Sun", "Ma",
+                     "Zhu", "Hu", "Guo", "He", "Lin", "Gao", "Luo"],
+        "given_syllables": ["Wei", "Jun", "Hua", "Ming", "Jian", "Lei", "Yong", "Qiang", "Ping", "Hui", "Xin", "Bo",
+                            "Tao", "Gang", "Hong", "Feng", "Lin", "Yan", "Jie", "Peng", "Dong", "Hai"],
+        "countries": ["CN"],
+        "spelling": [("Zh", "Ch"), ("Xu", "Hsu"), ("Q", "Ch"), ("X", "Hs"), ("ong", "ung")],
+        "script": None,
+    },
+}
+ORIGIN_WEIGHTS = {"arabic": 30, "persian": 12, "slavic": 30, "hispanic": 10, "korean": 10, "chinese": 8}
+
+ORG_PREFIXES = ["Golden", "Eastern", "Global", "United", "Northern", "Pacific", "Caspian", "Gulf", "Red Star", "New",
+                "International", "National", "Trans", "Euro", "Asia", "Sea", "Grand", "Royal", "First", "Black Sea"]
+ORG_SECTORS = ["Trading", "Shipping", "Petroleum", "Industrial", "Investment", "Engineering", "Logistics", "Mining",
+               "Defence", "Electronics", "Exchange", "Construction", "Aviation", "Chemical", "Marine", "Energy",
+               "Metals", "Technology", "General Trading", "Import Export"]
+ORG_FORMS = [("LLC", "Limited Liability Company", "OOO"), ("Ltd", "Limited", None), ("JSC", "Joint Stock Company", "AO"),
+             ("PJSC", "Public Joint Stock Company", "PAO"), ("Co., Ltd.", "Company Limited", None), ("FZE", "Free Zone Establishment", None),
+             ("Group", "Group", None), ("Holding", "Holding Company", None), ("S.A.", "Sociedad Anonima", None)]
+
+# Número de alias (0, 1, 2, ...) con su peso: la mayoría de las entradas tiene uno o ninguno y unas pocas más de diez.
+ALIAS_FANOUT_WEIGHTS = [38, 21, 12, 8, 6, 4, 3, 2, 1.5, 1.2, 1, 0.8, 0.6, 0.5, 0.4, 0.3, 0.25, 0.2, 0.15, 0.1, 0.1, 0.05, 0.05, 0.05, 0.05]
+INDIVIDUAL_SHARE = 0.7
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+_CYRILLIC = [("shch", "щ"), ("zh", "ж"), ("kh", "х"), ("ts", "ц"), ("ch", "ч"), ("sh", "ш"), ("yu", "ю"), ("ya", "я"),
+             ("ye", "е"), ("yo", "ё"), ("iy", "ий"), ("y", "ы"), ("a", "а"), ("b", "б"), ("v", "в"), ("g", "г"), ("d", "д"),
+             ("e", "е"), ("z", "з"), ("i", "и"), ("k", "к"), ("l", "л"), ("m", "м"), ("n", "н"), ("o", "о"), ("p", "п"),
+             ("r", "р"), ("s", "с"), ("t", "т"), ("u", "у"), ("f", "ф"), ("h", "х"), ("c", "к"), ("j", "дж"), ("x", "кс"), ("w", "в")]
+_ARABIC = [("al-", "ال"), ("sh", "ش"), ("kh", "خ"), ("th", "ث"), ("dh", "ذ"), ("gh", "غ"), ("ou", "و"), ("ee", "ي"),
+           ("b", "ب"), ("t", "ت"), ("j", "ج"), ("h", "ح"), ("d", "د"), ("r", "ر"), ("z", "ز"), ("s", "س"), ("f", "ف"),
+           ("q", "ق"), ("k", "ك"), ("l", "ل"), ("m", "م"), ("n", "ن"), ("w", "و"), ("y", "ي"), ("i", "ي"), ("e", "ي"),
+           ("u", "و"), ("o", "و"), ("p", "ب"), ("v", "ف"), ("g", "ج"), ("c", "ك"), ("x", "كس")]
+
+def _transcribe(text, table, initial_vowel=""):
+    """Escribe ``text`` en otra escritura con una tabla de equivalencias (la más larga primero en cada posición).
+    Con ``initial_vowel``, la 'a' solo se escribe (con esa letra) al principio de palabra, como en árabe."""
+    out = []
+    for word in text.lower().split():
+        chars, i = [], 0
+        while i < len(word):
+            if word[i] == "a" and initial_vowel:
+                if i == 0: chars.append(initial_vowel)
+                i += 1
+                continue
+            if i and word[i] == word[i - 1] and word[i].isalpha():
+                i += 1
+                continue
+            for latin, native in table:
+                if word.startswith(latin, i):
+                    chars.append(native); i += len(latin)
+                    break
+            else:
+                i += 1
+        out.append("".join(chars))
+    return " ".join(word for word in out if word)
+
+def native_script(name, script):
+    if script == "cyrillic": return _transcribe(name, _CYRILLIC).title()
+    if script == "arabic": return _transcribe(name, _ARABIC, initial_vowel="ا")
+    return None
+
+def _word(rnd, syllables, endings=None, count=(1, 2)):
+    word = "".join(rnd.choice(syllables) for _ in range(rnd.randint(*count)))
+    return (word + (rnd.choice(endings) if endings else "")).capitalize()
+
+def respell(name, rnd, rules, times=1):
+    """Variante ortográfica de ``name``: aplica ``times`` cambios de transliteración al azar entre los que le afectan."""
+    for _ in range(times):
+        applicable = [(old, new) for old, new in rules if old in name]
+        if not applicable: break
+        old, new = rnd.choice(applicable)
+        name = name.replace(old, new, 1)
+    return name
+
+def alias_count(rnd, scale=1.0):
+    return int(rnd.choices(range(len(ALIAS_FANOUT_WEIGHTS)), weights=ALIAS_FANOUT_WEIGHTS)[0] * scale)
+
+def person_name(rnd, origin):
+    """Devuelve (nombre, segundo nombre, apellido) de una persona del origen dado."""
+    spec = ORIGINS[origin]
+    if origin in ("korean", "chinese"):
+        given = "".join(rnd.sample(spec["given_syllables"], 2)).capitalize() if origin == "chinese" and rnd.random() < 0.7 else \
+            " ".join(rnd.sample(spec["given_syllables"], 2 if origin == "korean" else 1))
+        return given, "", rnd.choice(spec["surnames"])
+    if origin == "hispanic":
+        middle = rnd.choice(spec["given"]) if rnd.random() < 0.5 else ""
+        return rnd.choice(spec["given"]), middle, f"{rnd.choice(spec['surnames'])} {rnd.choice(spec['surnames'])}"
+    last = _word(rnd, spec["syllables"], spec["endings"])
+    if origin == "arabic":
+        # Nombre, nombre del padre (y a veces del abuelo) y apellido familiar, a menudo con el artículo.
+        middle = " ".join(rnd.choice(spec["given"]) for _ in range(rnd.choice([1, 1, 2])))
+        return rnd.choice(spec["given"]), middle, ("Al-" + last if rnd.random() < 0.6 else last)
+    if origin == "slavic":
+        # Patronímico a partir de otro nombre de pila.
+        father = rnd.choice(spec["given"][:16])
+        middle = father.rstrip("iy") + ("ovich" if father[-1] not in "iy" else "evich") if rnd.random() < 0.7 else ""
+        return rnd.choice(spec["given"]), middle, last
+    return rnd.choice(spec["given"]), (rnd.choice(spec["given"]) if rnd.random() < 0.3 else ""), last
+
+def person_aliases(rnd, origin, given, middle, last, count):
+    """Hasta ``count`` alias distintos de una persona, de los tipos que aparecen en las listas reales."""
+    spec = ORIGINS[origin]
+    full = " ".join(filter(None, [given, middle, last]))
+    kinds = [
+        lambda: respell(full, rnd, spec["spelling"], rnd.randint(1, 2)),
+        lambda: f"{given} {last}",
+        lambda: f"{last} {given}",
+        lambda: respell(f"{given} {last}", rnd, spec["spelling"]),
+        lambda: native_script(full, spec["script"]) if spec["script"] else None,
+        lambda: native_script(f"{given} {last}", spec["script"]) if spec["script"] else None,
+        lambda: f"Abu {rnd.choice(spec['given'])}" + (f" al-{last.replace('Al-', '')}" if rnd.random() < 0.5 else "") if origin == "arabic" else None,
+        lambda: " ".join(person_name(rnd, origin)[::2]),
+        lambda: f"{given[0]}. {last}",
+    ]
+    aliases, attempts = [], 0
+    while len(aliases) < count and attempts < count * 4:
+        attempts += 1
+        alias = rnd.choice(kinds)()
+        if alias and alias != full and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+def organization_name(rnd, origin):
+    spec = ORIGINS[origin]
+    syllables = spec.get("syllables") or [s.lower() for s in spec["given_syllables"]]
+    brand = _word(rnd, syllables, count=(2, 3))
+    parts = [rnd.choice(ORG_PREFIXES) if rnd.random() < 0.4 else "", brand, rnd.choice(ORG_SECTORS) if rnd.random() < 0.7 else ""]
+    return " ".join(filter(None, parts)), rnd.choice(ORG_FORMS)
+
+def organization_aliases(rnd, origin, base, form, count):
+    spec = ORIGINS[origin]
+    short, long_form, local = form
+    kinds = [
+        lambda: f"{base} {long_form}",
+        lambda: base,
+        lambda: "".join(word[0] for word in base.split()).upper() + f" {short}",
+        lambda: f"{local} {native_script(base, spec['script'])}" if local and spec["script"] == "cyrillic" else None,
+        lambda: native_script(base, spec["script"]) if spec["script"] == "arabic" else None,
+        lambda: respell(f"{base} {short}", rnd, spec["spelling"]),
+        lambda: " ".join(organization_name(rnd, origin)[0].split()[:2]) + f" {short}",
+    ]
+    aliases, attempts = [], 0
+    while len(aliases) < count and attempts < count * 4:
+        attempts += 1
+        alias = rnd.choice(kinds)()
+        if alias and alias != f"{base} {short}" and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+def make_record(rnd, number):
+    """Una entrada de la lista: persona (70 %) u organización, con sus alias, país y, si es persona, fecha de nacimiento."""
+    origin = rnd.choices(list(ORIGIN_WEIGHTS), weights=list(ORIGIN_WEIGHTS.values()))[0]
+    country = rnd.choice(ORIGINS[origin]["countries"])
+    if rnd.random() < INDIVIDUAL_SHARE:
+        given, middle, last = person_name(rnd, origin)
+        year = rnd.randint(1940, 2000)
+        # Precisión de la fecha: completa, solo el año o un intervalo de años.
+        precision = rnd.choices(["day", "year", "range"], weights=[60, 30, 10])[0]
+        return {"individual": True, "number": number, "given": given, "middle": middle, "last": last, "country": country,
+                "second_country": rnd.choice(list(COUNTRIES)) if rnd.random() < 0.08 else None,
+                "name": " ".join(filter(None, [given, middle, last])),
+                "aliases": person_aliases(rnd, origin, given, middle, last, alias_count(rnd)),
+                "dob": (year, rnd.randint(1, 12), rnd.randint(1, 28), precision, rnd.randint(1, 4)),
+                "passport": f"{rnd.choice('ABCDEFGHKLMNPRSTUX')}{rnd.randint(1000000, 9999999)}" if rnd.random() < 0.45 else None}
+    base, form = organization_name(rnd, origin)
+    return {"individual": False, "number": number, "name": f"{base} {form[0]}", "country": country, "second_country": None,
+            "aliases": organization_aliases(rnd, origin, base, form, alias_count(rnd, 0.7)), "dob": None,
+            "passport": f"{rnd.randint(100000000, 999999999)}" if rnd.random() < 0.3 else None}
+
+def script_of(name):
+    if any("Ѐ" <= ch <= "ӿ" for ch in name): return "cyrillic"
+    if any("؀" <= ch <= "ۿ" for ch in name): return "arabic"
+    return "latin"
+
+def ofac_xml(records):
+    ns = "https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/ENHANCED_XML"
+    refs = {"1": "Individual", "2": "Entity", "10": "SDGT", "11": "IRAN", "12": "RUSSIA-EO14024", "13": "SYRIA", "14": "DPRK3",
+            "15": "VENEZUELA-EO13850", "20": "A.K.A.", "21": "F.K.A.", "22": "N.K.A.", "30": "Latin", "31": "Cyrillic", "32": "Arabic",
+            "40": "Passport", "41": "Registration Number", "50": "Address1", "51": "City", "8": "Birthdate", "9": "Nationality Country"}
+    codes = list(COUNTRIES)
+    refs.update({str(100 + i): COUNTRIES[code][OFAC] for i, code in enumerate(codes)})
+    scripts = {"latin": "30", "cyrillic": "31", "arabic": "32"}
+    yield f'<?xml version="1.0" encoding="utf-8"?>\n<sanctionsData xmlns="{ns}">\n<referenceValues>\n'
+    for ref_id, value in refs.items():
+        yield f'<referenceValue refId="{ref_id}"><type>x</type><value>{escape(value)}</value></referenceValue>\n'
+    yield '<publicationDate>2024-01-01</publicationDate></referenceValues>\n<entities>\n'
+    for record in records:
+        rnd = record["rnd"]; number = record["number"]; individual = record["individual"]
+        yield (f'<entity id="{number}"><generalInfo><identityId>{10000 + number}</identityId>'
+               f'<entityType refId="{1 if individual else 2}">{"Individual" if individual else "Entity"}</entityType></generalInfo><sanctionsPrograms>')
+        for program in rnd.sample(["10", "11", "12", "13", "14", "15"], rnd.randint(1, 2)):
+            yield f'<sanctionsProgram refId="{program}">x</sanctionsProgram>'
+        primary = f'{record["last"]}, {" ".join(filter(None, [record["given"], record["middle"]]))}' if individual else record["name"]
+        yield (f'</sanctionsPrograms><names><name><isPrimary>true</isPrimary><translations><translation><isPrimary>true</isPrimary>'
+               f'<script refId="30">Latin</script><formattedFullName>{escape(primary)}</formattedFullName></translation></translations></name>')
+        for alias in record["aliases"]:
+            yield (f'<name><isPrimary>false</isPrimary><aliasType refId="{rnd.choice(["20", "20", "20", "21", "22"])}">x</aliasType>'
+                   f'<translations><translation><isPrimary>true</isPrimary><script refId="{scripts[script_of(alias)]}">x</script>'
+                   f'<formattedFullName>{escape(alias)}</formattedFullName></translation></translations></name>')
+        yield '</names><addresses>'
+        if rnd.random() < 0.6:
+            country = codes.index(record["country"])
+            yield (f'<address><country refId="{100 + country}">x</country><translations><translation><addressParts>'
+                   f'<addressPart><type refId="50">Address1</type><value>{rnd.randint(1, 99)} Main St</value></addressPart>'
+                   f'<addressPart><type refId="51">City</type><value>City{rnd.randint(1, 50)}</value></addressPart></addressParts></translation></translations></address>')
+        yield '</addresses><identityDocuments>'
+        if record["passport"]:
+            country = codes.index(record["country"])
+            yield (f'<identityDocument><type refId="{40 if individual else 41}">x</type><documentNumber>{record["passport"]}</documentNumber>'
+                   f'<issuingCountry refId="{100 + country}">x</issuingCountry></identityDocument>')
+        yield '</identityDocuments><features>'
+        if individual:
+            year, month, day, precision, span = record["dob"]
+            value = {"day": f"{day:02d} {MONTHS[month - 1]} {year}", "year": f"{year}", "range": f"{year} to {year + span}"}[precision]
+            yield f'<feature><type featureTypeId="8">Birthdate</type><value>{value}</value></feature>'
+            for country in filter(None, [record["country"], record["second_country"]]):
+                yield f'<feature><type featureTypeId="9">Nationality Country</type><value>{escape(COUNTRIES[country][OFAC])}</value></feature>'
+        yield '</features></entity>\n'
+    yield '</entities>\n</sanctionsData>\n'
+
+def onu_xml(records):
+    individuals, entities = [], []
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<CONSOLIDATED_LIST dateGenerated="2024-01-01T00:00:00">\n<INDIVIDUALS>\n'
+    for record in records:
+        if not record["individual"]:
+            entities.append(record)
+            continue
+        rnd = record["rnd"]; number = record["number"]
+        # La ONU reparte el nombre en FIRST_NAME, SECOND_NAME y THIRD_NAME.
+        parts = [record["given"]] + ([record["middle"]] if record["middle"] else []) + [record["last"]]
+        tags = "".join(f'<{tag}>{escape(part)}</{tag}>' for tag, part in zip(["FIRST_NAME", "SECOND_NAME", "THIRD_NAME"], parts))
+        yield (f'<INDIVIDUAL><DATAID>{600000 + number}</DATAID>{tags}<UN_LIST_TYPE>{rnd.choice(["Al-Qaida", "DPRK", "Libya", "Yemen"])}</UN_LIST_TYPE>'
+               f'<REFERENCE_NUMBER>QDi.{number:03d}</REFERENCE_NUMBER><LISTED_ON>2010-01-01</LISTED_ON>')
+        native = [alias for alias in record["aliases"] if script_of(alias) != "latin"]
+        if native:
+            yield f'<NAME_ORIGINAL_SCRIPT>{escape(native[0])}</NAME_ORIGINAL_SCRIPT>'
+        yield f'<COMMENTS1>Synthetic entry {number}.</COMMENTS1><NATIONALITY><VALUE>{escape(COUNTRIES[record["country"]][ONU])}</VALUE></NATIONALITY>'
+        for alias in record["aliases"]:
+            if alias not in native[:1]:
+                yield f'<INDIVIDUAL_ALIAS><QUALITY>{rnd.choice(["Good", "Good", "Low"])}</QUALITY><ALIAS_NAME>{escape(alias)}</ALIAS_NAME></INDIVIDUAL_ALIAS>'
+        yield f'<INDIVIDUAL_ADDRESS><COUNTRY>{escape(COUNTRIES[record["country"]][ONU])}</COUNTRY><CITY>City{rnd.randint(1, 50)}</CITY></INDIVIDUAL_ADDRESS>'
+        year, month, day, precision, _ = record["dob"]
+        if precision == "day":
+            yield (f'<INDIVIDUAL_DATE_OF_BIRTH><TYPE_OF_DATE>EXACT</TYPE_OF_DATE><DATE>{year}-{month:02d}-{day:02d}</DATE>'
+                   f'<YEAR>{year}</YEAR><MONTH>{month:02d}</MONTH><DAY>{day:02d}</DAY></INDIVIDUAL_DATE_OF_BIRTH>')
+        else:
+            yield f'<INDIVIDUAL_DATE_OF_BIRTH><TYPE_OF_DATE>APPROXIMATELY</TYPE_OF_DATE><YEAR>{year}</YEAR></INDIVIDUAL_DATE_OF_BIRTH>'
+        if record["passport"]:
+            yield f'<INDIVIDUAL_DOCUMENT><TYPE_OF_DOCUMENT>Passport</TYPE_OF_DOCUMENT><NUMBER>{record["passport"]}</NUMBER></INDIVIDUAL_DOCUMENT>'
+        yield f'<INDIVIDUAL_PLACE_OF_BIRTH><CITY>City{rnd.randint(1, 50)}</CITY><COUNTRY>{escape(COUNTRIES[record["country"]][ONU])}</COUNTRY></INDIVIDUAL_PLACE_OF_BIRTH></INDIVIDUAL>\n'
+    yield '</INDIVIDUALS>\n<ENTITIES>\n'
+    for record in entities:
+        rnd = record["rnd"]; number = record["number"]
+        yield (f'<ENTITY><DATAID>{600000 + number}</DATAID><FIRST_NAME>{escape(record["name"])}</FIRST_NAME><UN_LIST_TYPE>DPRK</UN_LIST_TYPE>'
+               f'<REFERENCE_NUMBER>KPe.{number:03d}</REFERENCE_NUMBER><LISTED_ON>2012-05-05</LISTED_ON>')
+        for alias in record["aliases"]:
+            yield f'<ENTITY_ALIAS><QUALITY>a.k.a.</QUALITY><ALIAS_NAME>{escape(alias)}</ALIAS_NAME></ENTITY_ALIAS>'
+        yield f'<ENTITY_ADDRESS><COUNTRY>{escape(COUNTRIES[record["country"]][ONU])}</COUNTRY><CITY>City{rnd.randint(1, 50)}</CITY></ENTITY_ADDRESS></ENTITY>\n'
+    yield '</ENTITIES>\n</CONSOLIDATED_LIST>\n'
+
+def ue_xml(records):
+    ns = "http://eu.europa.ec/fpi/fsd/export"
+    languages = {"latin": "EN", "cyrillic": "RU", "arabic": "AR"}
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<export xmlns="{ns}" generationDate="2024-01-01T00:00:00">\n'
+    for record in records:
+        rnd = record["rnd"]; number = record["number"]; individual = record["individual"]
+        yield (f'<sanctionEntity designationDate="2014-03-17" logicalId="{13000 + number}" euReferenceNumber="EU.{number}.{rnd.randint(10, 99)}">'
+               f'<regulation programme="{rnd.choice(["UKR", "SYR", "IRN", "LBY", "PRK", "VEN"])}"/><subjectType code="{"person" if individual else "enterprise"}"/>')
+        if individual:
+            yield (f'<nameAlias firstName={quoteattr(record["given"])} middleName={quoteattr(record["middle"])} lastName={quoteattr(record["last"])} '
+                   f'wholeName={quoteattr(record["name"])} nameLanguage="" strong="true" gender="{rnd.choice("MMMF")}"/>')
+        else:
+            yield f'<nameAlias wholeName={quoteattr(record["name"])} nameLanguage="" strong="true"/>'
+        for alias in record["aliases"]:
+            yield f'<nameAlias wholeName={quoteattr(alias)} nameLanguage="{languages[script_of(alias)]}" strong="{rnd.choice(["true", "false"])}"/>'
+        if individual:
+            for country in filter(None, [record["country"], record["second_country"]]):
+                yield f'<citizenship countryDescription={quoteattr(COUNTRIES[country][UE])}/>'
+            year, month, day, precision, span = record["dob"]
+            country = quoteattr(COUNTRIES[record["country"]][UE])
+            if precision == "day":
+                yield (f'<birthdate birthdate="{year}-{month:02d}-{day:02d}" dayOfMonth="{day}" monthOfYear="{month}" year="{year}" '
+                       f'city="City{rnd.randint(1, 50)}" countryDescription={country}/>')
+            else:
+                for birth_year in range(year, year + (span + 1 if precision == "range" else 1)):
+                    yield f'<birthdate year="{birth_year}" countryDescription={country}/>'
+        if rnd.random() < 0.5:
+            yield f'<address city="City{rnd.randint(1, 50)}" street="{rnd.randint(1, 99)} Main St" countryDescription={quoteattr(COUNTRIES[record["country"]][UE])}/>'
+        if record["passport"]:
+            yield (f'<identification identificationTypeCode="{"passport" if individual else "regnumber"}" identificationTypeDescription="Passport" '
+                   f'number="{record["passport"]}" countryDescription={quoteattr(COUNTRIES[record["country"]][UE])}/>')
+        yield f'<remark>Synthetic entry {number}.</remark></sanctionEntity>\n'
+    yield '</export>\n'
+
+def uk_xml(records):
+    yield '<?xml version="1.0" encoding="utf-8"?>\n<ArrayOfFinancialSanctionsTarget xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+    for record in records:
+        rnd = record["rnd"]; number = record["number"]; individual = record["individual"]
+        # Una fila por nombre con el mismo GroupID: Name1 y Name2 son los nombres de pila, Name6 el apellido.
+        if individual:
+            rows = [("Primary Name", [record["given"], record["middle"], "", "", "", record["last"]])]
+        else:
+            rows = [("Primary Name", ["", "", "", "", "", record["name"]])]
+        rows += [("Alias", ["", "", "", "", "", alias]) for alias in record["aliases"]]
+        regime = rnd.choice(["Russia", "Iran", "Syria", "Libya", "Democratic People's Republic of Korea", "Venezuela"])
+        if individual:
+            year, month, day, precision, _ = record["dob"]
+            dob = f"{day:02d}/{month:02d}/{year}" if precision == "day" else f"00/00/{year}"
+        for alias_type, parts in rows:
+            yield '<FinancialSanctionsTarget>'
+            for i, part in enumerate(parts, 1):
+                yield f'<Name{i}>{escape(part)}</Name{i}>' if part else f'<Name{i} />'
+            yield (f'<AliasType>{alias_type}</AliasType><GroupTypeDescription>{"Individual" if individual else "Entity"}</GroupTypeDescription>'
+                   f'<RegimeName>{escape(regime)}</RegimeName><GroupID>{20000 + number}</GroupID><UKSanctionsListRef>SYN{number:05d}</UKSanctionsListRef>')
+            if individual:
+                nationalities = "".join(f'<Nationality>{escape(COUNTRIES[country][UK])}</Nationality>' for country in filter(None, [record["country"], record["second_country"]]))
+                yield f'<Individual_DateOfBirth><Date>{dob}</Date></Individual_DateOfBirth><Individual_Nationality>{nationalities}</Individual_Nationality>'
+                if record["passport"]:
+                    yield f'<Individual_PassportNumber>{record["passport"]}</Individual_PassportNumber>'
+            yield (f'<Address1>{rnd.randint(1, 99)} High St</Address1><Country>{escape(COUNTRIES[record["country"]][ONU])}</Country>'
+                   '<DateListed>2022-03-15T00:00:00</DateListed><LastUpdated>2023-01-01T00:00:00</LastUpdated></FinancialSanctionsTarget>\n')
+    yield '</ArrayOfFinancialSanctionsTarget>\n'
+
+WRITERS = {"OFAC": ofac_xml, "ONU": onu_xml, "UE": ue_xml, "UK": uk_xml}
+
+def records(source, count, seed):
+    """Genera las ``count`` entradas de una fuente; cada una lleva su propio generador aleatorio para los
+    detalles que decide el esquema, así que las entradas no dependen de cómo se escriban."""
+    rnd = random.Random(f"{seed}-{source}-{count}")
+    for number in range(count):
+        record = make_record(rnd, number)
+        record["rnd"] = random.Random(rnd.random())
+        yield record
+
+def generate(directory, entities_per_source, seed=0, sources=None):
+    """Escribe en ``directory`` el XML de cada fuente con el nombre que espera SOURCES_CONFIG.
+    Devuelve {fuente: {"path", "entities", "bytes", "seconds"}}."""
+    os.makedirs(directory, exist_ok=True)
+    summary = {}
+    for source in sources or WRITERS:
+        path = os.path.join(directory, SOURCES_CONFIG[source]["local_filename"])
+        start = time.perf_counter()
+        with open(path, "w", encoding="utf-8") as f:
+            for chunk in WRITERS[source](records(source, entities_per_source, seed)):
+                f.write(chunk)
+        summary[source] = {"path": path, "entities": entities_per_source, "bytes": os.path.getsize(path),
+                           "seconds": round(time.perf_counter() - start, 3)}
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entities", type=int, help="Entidades en total, repartidas a partes iguales entre las cuatro fuentes.")
+    parser.add_argument("directory", help="Directorio de salida (se usa como downloaded_lists).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for source, info in generate(args.directory, max(1, args.entities // len(WRITERS)), args.seed).items():
+        print(f"{source:>5} {info['entities']:>9} entidades {info['bytes'] / 2**20:>9.1f} MiB {info['seconds']:>8.1f} s  {info['path']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""Índice de nombres del servidor en un archivo binario que se abre con mmap, para compartirlo entre procesos.
+
+Un proceso escribe el índice (write_name_index) y los demás lo abren en modo de solo lectura
+(MappedNameIndex.open): las páginas del archivo están una sola vez en la caché del sistema operativo,
+sea cual sea el número de procesos que lo usan. Lo escriben ofac_parser.py al construir cada generación
+(junto a la base de datos) y, si no lo encuentra, el propio servidor (ver server.DatabaseGeneration).
+MappedCorpus ofrece los mismos atributos que name_matching.NameCorpus, así que score_name_query y best_matches funcionan igual sobre los dos; las cadenas se
+decodifican al leerlas, solo las de los candidatos de cada búsqueda.
+
+Formato: cabecera (MAGIC, FORMAT_VERSION, número de secciones, orden de bytes y CRC-32 de todo lo que la
+sigue), directorio de secciones (nombre, desplazamiento, longitud) y las secciones, alineadas a 8 bytes. La
+sección ``meta`` (JSON) identifica la base de datos de la que sale el índice. Cada lista de cadenas ocupa dos
+secciones: ``<nombre>.data``, las cadenas en UTF-8 terminadas en NUL, y ``<nombre>.offsets`` (uint32, una
+más que cadenas), donde empieza cada una.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+from name_matching import NGramIndex, PhoneticIndex, np
+
+MAGIC = b"SNCORPUS"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sII2s2xI")
+_SECTION = struct.Struct("<32sQQ")
+_ALIGNMENT = 8
+_BYTEORDER = sys.byteorder[0].encode() * 2
+_NUMPY_TYPES = {'i': 'int32', 'I': 'uint32', 'q': 'int64', 'B': 'uint8'}
+CORPORA = ("full", "primary")
+STRING_FIELDS = ("uids", "names", "normalized", "token_sorted", "transliterated", "skeletons")
+
+def _string_sections(name, strings):
+    """Secciones ``.offsets`` y ``.data`` de una lista de cadenas."""
+    data, offsets, size = [], array('I', [0]), 0
+    for value in strings:
+        encoded = (value or "").encode('utf-8') + b"\0"
+        data.append(encoded)
+        size += len(encoded)
+        offsets.append(size)
+    return {f"{name}.offsets": offsets.tobytes(), f"{name}.data": b"".join(data)}
+
+def _postings_sections(name, postings):
+    """Secciones de un índice invertido {clave: posiciones}: claves ordenadas, límites (int64) y posiciones (int32)."""
+    keys = sorted(postings)
+    bounds, positions = array('q', [0]), array('i')
+    for key in keys:
+        # Las posiciones son int32 tanto en array('i') como en los arrays numpy de NGramIndex y PhoneticIndex.
+        positions.frombytes(bytes(postings[key]))
+        bounds.append(len(positions))
+    sections = _string_sections(f"{name}.keys", keys)
+    sections[f"{name}.bounds"] = bounds.tobytes()
+    sections[f"{name}.positions"] = positions.tobytes()
+    return sections
+
+def corpus_sections(prefix, corpus):
+    """Secciones de un name_matching.NameCorpus (construido con sus índices de trigramas y fonético)."""
+    sections = {}
+    for field in STRING_FIELDS:
+        sections.update(_string_sections(f"{prefix}.{field}", getattr(corpus, field)))
+    sections[f"{prefix}.offsets"] = array('i', corpus.offsets).tobytes()
+    sections[f"{prefix}.owners"] = array('i', corpus.owners).tobytes()
+    sections[f"{prefix}.abjad"] = bytes(bytearray(1 if value else 0 for value in corpus.abjad))
+    sections[f"{prefix}.lengths"] = array('i', (int(value) for value in corpus.ngram_index.lengths)).tobytes()
+    sections.update(_postings_sections(f"{prefix}.ngrams", corpus.ngram_index.postings))
+    sections.update(_postings_sections(f"{prefix}.phonetic", corpus.phonetic_index.postings))
+    return sections
+
+def write_sections(path, sections):
+    """Escribe las secciones ({nombre: bytes}) en ``path`` de forma atómica: un archivo temporal en el mismo
+    directorio que sustituye a ``path`` solo cuando está completo. El archivo queda con permisos 0644, como
+    una base de datos recién creada, para que un servidor con otro usuario pueda abrirlo."""
+    directory_size = _HEADER.size + _SECTION.size * len(sections)
+    offset = -(-directory_size // _ALIGNMENT) * _ALIGNMENT
+    entries = []
+    for name, data in sections.items():
+        entries.append((name, offset, len(data)))
+        offset += -(-len(data) // _ALIGNMENT) * _ALIGNMENT
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".corpus.", suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            chunks = [_SECTION.pack(name.encode('ascii'), section_offset, length) for name, section_offset, length in entries]
+            position = directory_size
+            for (name, section_offset, length), data in zip(entries, sections.values()):
+                chunks += [b"\0" * (section_offset - position), data]
+                position = section_offset + length
+            checksum = 0
+            for chunk in chunks:
+                checksum = zlib.crc32(chunk, checksum)
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(entries), _BYTEORDER, checksum))
+            f.writelines(chunks)
+        os.chmod(temporary, 0o644) # mkstemp lo crea con 0600.
+        os.replace(temporary, path)
+    except BaseException:
+        try: os.remove(temporary)
+        except OSError: pass
+        raise
+
+def write_name_index(path, name_index, meta=None):
+    """Escribe los corpus ``full`` y ``primary`` de un name_matching.NameIndex en ``path``; ``meta`` (un dict)
+    se guarda en la sección ``meta``."""
+    sections = {"meta": json.dumps(meta or {}, sort_keys=True).encode('utf-8')}
+    for prefix in CORPORA:
+        sections.update(corpus_sections(prefix, getattr(name_index, prefix)))
+    write_sections(path, sections)
+
+class MappedFile:
+    """Archivo escrito por write_sections, abierto con mmap en modo de solo lectura.
+
+    ValueError si no es un archivo de este formato o de esta versión, o si la suma de comprobación no coincide
+    (archivo truncado o modificado); comprobarla lee el archivo entero, que así queda en la caché del sistema.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{path} no es un índice de nombres")
+        magic, version, count, byteorder, checksum = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} no es un índice de nombres")
+        if version != FORMAT_VERSION or byteorder != _BYTEORDER:
+            raise ValueError(f"{path} tiene la versión {version} del formato ({byteorder!r}); se esperaba la {FORMAT_VERSION} ({_BYTEORDER!r})")
+        if zlib.crc32(self._view[_HEADER.size:]) != checksum:
+            raise ValueError(f"{path} está dañado: la suma de comprobación no coincide")
+        self.sections = {}
+        for i in range(count):
+            name, offset, length = _SECTION.unpack_from(self._mmap, _HEADER.size + i * _SECTION.size)
+            if offset + length > len(self._mmap):
+                raise ValueError(f"{path} está truncado")
+            self.sections[name.rstrip(b"\0").decode('ascii')] = (offset, length)
+        self.meta = json.loads(str(self.bytes("meta"), 'utf-8')) if "meta" in self.sections else {}
+
+    def bytes(self, name):
+        offset, length = self.sections[name]
+        return self._view[offset:offset + length]
+
+    def array(self, name, typecode):
+        """Vista (sin copia) de una sección como array numpy o, sin numpy, como memoryview de ``typecode``."""
+        view = self.bytes(name)
+        if np is not None:
+            return np.frombuffer(view, dtype=_NUMPY_TYPES[typecode])
+        return view.cast(typecode)
+
+    def strings(self, name):
+        return StringTable(self.array(f"{name}.offsets", 'I'), self.bytes(f"{name}.data"))
+
+    def postings(self, name):
+        return PostingsTable(self.strings(f"{name}.keys"), self.array(f"{name}.bounds", 'q'), self.array(f"{name}.positions", 'i'))
+
+class StringTable(Sequence):
+    """Lista de cadenas de un MappedFile; cada elemento se decodifica al pedirlo.
+
+    Un tramo (``table[a:b]``, p. ej. los bloques de score_corpus) se decodifica de una vez y se parte por los NUL.
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+        self.size = len(offsets) - 1
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.size)
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            if stop <= start:
+                return []
+            return str(self.data[self.offsets[start]:self.offsets[stop] - 1], 'utf-8').split("\0")
+        if i < 0: i += self.size
+        if not 0 <= i < self.size: raise IndexError(i)
+        return str(self.data[self.offsets[i]:self.offsets[i + 1] - 1], 'utf-8')
+
+    def take(self, positions):
+        """[table[p] for p in positions] para una lista de posiciones válidas."""
+        if np is not None:
+            positions = np.asarray(positions, dtype=np.int64)
+            starts, ends = self.offsets[positions].tolist(), self.offsets[positions + 1].tolist()
+        else:
+            starts, ends = [self.offsets[p] for p in positions], [self.offsets[p + 1] for p in positions]
+        data = self.data
+        return [str(data[a:b - 1], 'utf-8') for a, b in zip(starts, ends)]
+
+def take(strings, positions):
+    """[strings[p] for p in positions], de una vez si ``strings`` es un StringTable."""
+    if isinstance(strings, StringTable):
+        return strings.take(positions)
+    return [strings[p] for p in positions]
+
+class PostingsTable(Mapping):
+    """Índice invertido {clave: posiciones} de un MappedFile: las claves se buscan por bisección y las
+    posiciones se devuelven como vista del archivo, sin copiarlas."""
+
+    def __init__(self, keys, bounds, positions):
+        self.keys = keys
+        self.bounds = bounds
+        self.positions = positions
+
+    def _find(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def __contains__(self, key):
+        return self._find(key) is not None
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i is None: raise KeyError(key)
+        return self.positions[self.bounds[i]:self.bounds[i + 1]]
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+class MappedCorpus:
+    """Un corpus (``full`` o ``primary``) de un MappedFile con la interfaz de name_matching.NameCorpus."""
+
+    def __init__(self, mapped, prefix):
+        for field in STRING_FIELDS:
+            setattr(self, field, mapped.strings(f"{prefix}.{field}"))
+        self.offsets = mapped.array(f"{prefix}.offsets", 'i')
+        self.owners = mapped.array(f"{prefix}.owners", 'i')
+        self.abjad = mapped.array(f"{prefix}.abjad", 'B')
+        self.ngram_index = NGramIndex.from_mapping(mapped.postings(f"{prefix}.ngrams"), mapped.array(f"{prefix}.lengths", 'i'))
+        self.phonetic_index = PhoneticIndex.from_mapping(mapped.postings(f"{prefix}.phonetic"), len(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+class MappedNameIndex:
+    """Índice de nombres (``full`` y ``primary``, como name_matching.NameIndex) abierto desde un archivo de
+    write_name_index; ``meta`` es lo que se guardó con él."""
+
+    def __init__(self, signature, mapped):
+        self.signature = signature
+        self.path = mapped.path
+        self.meta = mapped.meta
+        self.full = MappedCorpus(mapped, "full")
+        self.primary = MappedCorpus(mapped, "primary")
+
+    @classmethod
+    def open(cls, path, signature=None):
+        return cls(signature, MappedFile(path))
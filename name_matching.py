@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""Normalización de nombres, motor de puntuación difusa e índice de nombres compartidos por server.py y ofac_parser.py."""
+import logging
+import math
+import os
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from rapidfuzz import fuzz as rf_fuzz, process as rf_process
+from thefuzz import utils as fuzz_utils
+
+# numpy es opcional: con él se usa process.cdist (varios núcleos); sin él, process.extract en un solo hilo.
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+# Número de hilos para puntuar (-1 = todos los núcleos) y tamaño mínimo del corpus para repartirlo entre ellos.
+FUZZY_WORKERS = int(os.environ.get('FUZZY_WORKERS', '-1'))
+FUZZY_PARALLEL_MIN_CHOICES = 20000
+# Los resultados de cdist se piden por bloques para que la memoria no crezca con el tamaño del corpus.
+FUZZY_CHUNK_SIZE = 250000
+# Por debajo de este umbral no se bloquea por n-gramas y se puntúa el corpus completo
+# (ver benchmarks/bench_ngram_recall.py para medir el recall de cada umbral).
+NGRAM_BLOCKING_MIN_THRESHOLD = int(os.environ.get('NGRAM_BLOCKING_MIN_THRESHOLD', '70'))
+NGRAM_SIZE = 3
+
+# Transliteración al alfabeto latino (aprox. BGN/PCGN) de las escrituras que aparecen en los alias de
+# OFAC, ONU, UE y UK. Los caracteres sin entrada se dejan tal cual; las marcas diacríticas se eliminan.
+_TRANSLITERATION = {
+    # Cirílico (ruso, ucraniano, bielorruso, serbio, macedonio, kazajo)
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't',
+    'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '',
+    'э': 'e', 'ю': 'yu', 'я': 'ya', 'є': 'ye', 'і': 'i', 'ї': 'yi', 'ґ': 'g', 'ў': 'u', 'ђ': 'dj', 'ј': 'j',
+    'љ': 'lj', 'њ': 'nj', 'ћ': 'c', 'џ': 'dz', 'ѓ': 'g', 'ќ': 'k', 'ѕ': 'dz', 'қ': 'q', 'ғ': 'gh', 'ү': 'u',
+    'ұ': 'u', 'һ': 'h', 'ә': 'a', 'ө': 'o', 'ң': 'ng',
+    # Griego
+    'α': 'a', 'β': 'v', 'γ': 'g', 'δ': 'd', 'ε': 'e', 'ζ': 'z', 'η': 'i', 'θ': 'th', 'ι': 'i', 'κ': 'k',
+    'λ': 'l', 'μ': 'm', 'ν': 'n', 'ξ': 'x', 'ο': 'o', 'π': 'p', 'ρ': 'r', 'σ': 's', 'ς': 's', 'τ': 't',
+    'υ': 'y', 'φ': 'f', 'χ': 'ch', 'ψ': 'ps', 'ω': 'o',
+    # Árabe y persa (sin vocales cortas; las harakat se eliminan como marcas diacríticas)
+    'ا': 'a', 'أ': 'a', 'إ': 'i', 'آ': 'a', 'ٱ': 'a', 'ء': '', 'ؤ': '', 'ئ': '', 'ب': 'b', 'ت': 't', 'ث': 'th',
+    'ج': 'j', 'ح': 'h', 'خ': 'kh', 'د': 'd', 'ذ': 'dh', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's',
+    'ض': 'd', 'ط': 't', 'ظ': 'z', 'ع': '', 'غ': 'gh', 'ف': 'f', 'ق': 'q', 'ك': 'k', 'ل': 'l', 'م': 'm',
+    'ن': 'n', 'ه': 'h', 'ة': 'a', 'و': 'u', 'ي': 'i', 'ى': 'a', 'ـ': '', 'پ': 'p', 'چ': 'ch', 'ژ': 'zh',
+    'گ': 'g', 'ک': 'k', 'ی': 'i',
+    # Latinas sin descomposición NFKD
+    'ß': 'ss', 'æ': 'ae', 'œ': 'oe', 'ø': 'o', 'đ': 'd', 'ð': 'd', 'ł': 'l', 'ı': 'i', 'þ': 'th', 'ħ': 'h',
+}
+# Clave fonética: grupos de sonidos que se escriben distinto según la lista o la transliteración.
+_PHONETIC_DIGRAPHS = [('shch', 's'), ('sch', 's'), ('sh', 's'), ('ch', 'j'), ('zh', 'j'), ('dj', 'j'), ('dz', 'j'),
+                      ('kh', 'h'), ('gh', 'g'), ('ph', 'f'), ('th', 't'), ('dh', 'd'), ('ts', 's'), ('tz', 's'), ('ck', 'k')]
+# Escrituras que no anotan las vocales cortas (árabe, persa, hebreo): sus nombres se comparan por esqueleto consonántico.
+_ABJAD_RE = re.compile(r'[\u0590-\u05FF\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB1D-\uFDFF\uFE70-\uFEFF]')
+_PHONETIC_CLASSES = {'b': 'B', 'p': 'B', 'f': 'F', 'v': 'F', 'c': 'K', 'g': 'K', 'j': 'K', 'k': 'K', 'q': 'K',
+                     'x': 'K', 's': 'S', 'z': 'S', 'd': 'T', 't': 'T', 'l': 'L', 'm': 'M', 'n': 'N', 'r': 'R', 'h': 'H'}
+
+def normalize_string(s):
+    """Normaliza un string para la comparación difusa."""
+    if not s: return ""
+    s = s.lower()
+    s = re.sub(r'[^\w\s]', '', s)
+    s = re.sub(r'\s+', ' ', s).strip()
+    return s
+
+def transliterate(s):
+    """Devuelve el nombre en alfabeto latino sin diacríticos y normalizado (p. ej. "Мухаммад" -> "mukhammad").
+
+    Cada carácter (en NFC) se busca primero en _TRANSLITERATION, que tiene letras precompuestas propias
+    ('й' -> 'y', 'ї' -> 'yi', 'إ' -> 'i'); solo los que no están se descomponen con NFKD para quitarles
+    las marcas diacríticas.
+    """
+    if not s: return ""
+    chars = []
+    for ch in unicodedata.normalize('NFC', s.lower()):
+        if ch in _TRANSLITERATION:
+            chars.append(_TRANSLITERATION[ch])
+            continue
+        for part in unicodedata.normalize('NFKD', ch):
+            if part in _TRANSLITERATION: chars.append(_TRANSLITERATION[part])
+            elif not unicodedata.combining(part): chars.append(part)
+    return normalize_string("".join(chars))
+
+def phonetic_key(token):
+    """Devuelve el esqueleto consonántico de un token transliterado (p. ej. "muhammad" y "mukhammad" -> "MHMT").
+
+    Se unifican los dígrafos y las consonantes de sonido parecido, se eliminan las vocales (a, e, i, o, u, w, y)
+    y se colapsan las repeticiones. Es deliberadamente más grueso que Double Metaphone: los alias árabes
+    transliterados no llevan vocales cortas, así que solo las consonantes son comparables entre escrituras.
+    """
+    token = re.sub(r'[^a-z]', '', token)
+    for digraph, replacement in _PHONETIC_DIGRAPHS:
+        token = token.replace(digraph, replacement)
+    key = []
+    for ch in token:
+        code = _PHONETIC_CLASSES.get(ch)
+        if code and (not key or key[-1] != code):
+            key.append(code)
+    return "".join(key)
+
+def phonetic_keys(transliterated):
+    """Devuelve el conjunto de claves fonéticas de los tokens de un nombre transliterado."""
+    return {key for key in (phonetic_key(token) for token in transliterated.split()) if key}
+
+def is_abjad(s):
+    """Indica si el nombre está escrito (al menos en parte) en árabe, persa o hebreo."""
+    return bool(s) and _ABJAD_RE.search(s) is not None
+
+def skeleton(transliterated):
+    """Devuelve las claves fonéticas de cada token, en orden y en minúsculas, para puntuarlas con token_sort_ratio."""
+    return " ".join(key for key in (phonetic_key(token) for token in transliterated.split()) if key).lower()
+
+def prepare_for_scoring(normalized):
+    """Aplica a un nombre ya normalizado el mismo preprocesado que fuzz.token_sort_ratio hace internamente.
+
+    thefuzz llama a utils.full_process(force_ascii=True) antes de puntuar; hacerlo una sola vez al
+    construir el corpus permite llamar después al scorer de rapidfuzz sin procesador.
+    """
+    return fuzz_utils.full_process(normalized, force_ascii=True)
+
+def score_corpus(query, choices, threshold, workers=None, presorted=False):
+    """Puntúa ``query`` contra todo ``choices`` de una vez y devuelve [(posición, puntuación)] de los que alcanzan ``threshold``.
+
+    ``query`` y ``choices`` deben venir de prepare_for_scoring. Las puntuaciones son enteras e idénticas
+    a ``fuzz.token_sort_ratio(normalize_string(a), normalize_string(b))``: thefuzz redondea con round(),
+    así que el corte que se pasa a rapidfuzz es ``threshold - 0.5`` (como mucho 100, el máximo que admite) y luego
+    se comprueba el valor redondeado.
+    El resultado está ordenado por posición.
+
+    Con ``presorted``, ``query`` y ``choices`` ya han pasado además por token_sort y se puntúan con fuzz.ratio:
+    mismas puntuaciones, sin ordenar de nuevo los tokens de cada nombre en cada comparación (unas cuatro veces
+    más rápido).
+    """
+    scorer = rf_fuzz.ratio if presorted else rf_fuzz.token_sort_ratio
+    # Con threshold <= 0 no hay corte: cuentan todos los nombres, también los que puntúan 0.
+    score_cutoff = min(max(threshold - 0.5, 0), 100) if threshold > 0 else None
+    if workers is None:
+        workers = FUZZY_WORKERS if len(choices) >= FUZZY_PARALLEL_MIN_CHOICES else 1
+
+    if np is None:
+        results = rf_process.extract(query, choices, scorer=scorer, processor=None, limit=None, score_cutoff=score_cutoff)
+        hits = [(pos, int(round(score))) for _, score, pos in results]
+        hits = [(pos, score) for pos, score in hits if score >= threshold]
+        hits.sort()
+        return hits
+
+    hits = []
+    for start in range(0, len(choices), FUZZY_CHUNK_SIZE):
+        chunk = choices[start:start + FUZZY_CHUNK_SIZE]
+        scores = rf_process.cdist([query], chunk, scorer=scorer, processor=None, score_cutoff=score_cutoff, dtype=np.float64, workers=workers)[0]
+        for pos in np.flatnonzero(scores >= (score_cutoff or 0)).tolist():
+            score = int(round(float(scores[pos])))
+            if score >= threshold:
+                hits.append((start + pos, score))
+    return hits
+
+def token_sort(processed):
+    """Devuelve el string que compara token_sort_ratio: los tokens ordenados y unidos por un espacio."""
+    return " ".join(sorted(processed.split()))
+
+def ngrams(processed):
+    """Devuelve el conjunto de trigramas (con un espacio de relleno a cada lado) del nombre ordenado por tokens."""
+    s = token_sort(processed)
+    if not s: return set()
+    padded = f" {s} "
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+class NGramIndex:
+    """Índice invertido trigrama -> posiciones de nombre, usado para descartar candidatos antes de puntuar.
+
+    Un nombre es candidato si su longitud permite llegar al umbral (filtro exacto: token_sort_ratio
+    nunca supera 2 * min(l1, l2) / (l1 + l2)) y comparte con la consulta al menos ``min_shared``
+    trigramas, la cota del lema de q-gramas para dos nombres de la misma longitud y nunca menos de 1.
+    Este segundo filtro es una aproximación; por eso solo se aplica desde NGRAM_BLOCKING_MIN_THRESHOLD.
+    """
+
+    def __init__(self, postings, lengths):
+        self.lengths = np.asarray(lengths, dtype=np.int32) if np is not None else lengths
+        if np is not None:
+            postings = {gram: np.frombuffer(positions, dtype=np.int32) for gram, positions in postings.items()}
+        self.postings = postings
+
+    @classmethod
+    def from_strings(cls, processed):
+        postings = {}
+        for pos, name in enumerate(processed):
+            for gram in ngrams(name):
+                postings.setdefault(gram, array('i')).append(pos)
+        return cls(postings, [len(token_sort(name)) for name in processed])
+
+    @classmethod
+    def from_postings(cls, rows, processed):
+        """Construye el índice a partir de filas (ngrama, posición) ordenadas por ngrama, p. ej. de IndiceNGramas."""
+        postings = {}
+        for gram, pos in rows:
+            postings.setdefault(gram, array('i')).append(pos)
+        return cls(postings, [len(token_sort(name)) for name in processed])
+
+    @classmethod
+    def from_mapping(cls, postings, lengths):
+        """Índice sobre ``postings`` ({ngrama: posiciones int32}) y ``lengths`` ya construidos, sin copiarlos (ver mapped_corpus)."""
+        index = cls.__new__(cls)
+        index.postings, index.lengths = postings, lengths
+        return index
+
+    def candidates(self, query, threshold):
+        """Devuelve las posiciones (ordenadas) que vale la pena puntuar, o None si hay que puntuar todo el corpus."""
+        grams = ngrams(query)
+        if not grams or threshold < NGRAM_BLOCKING_MIN_THRESHOLD:
+            return None
+        cutoff = max(threshold - 0.5, 0) / 100
+        query_len = len(token_sort(query))
+        min_shared = max(1, math.ceil(len(grams) - NGRAM_SIZE * 2 * (1 - cutoff) * query_len))
+        min_len = query_len * cutoff / (2 - cutoff)
+        max_len = query_len * (2 - cutoff) / cutoff if cutoff > 0 else float('inf')
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+
+        if np is not None:
+            counts = np.bincount(np.concatenate(lists), minlength=len(self.lengths))
+            mask = (counts >= min_shared) & (self.lengths >= min_len) & (self.lengths <= max_len)
+            return np.flatnonzero(mask).tolist()
+
+        counts = Counter()
+        for positions in lists:
+            counts.update(positions)
+        return sorted(pos for pos, shared in counts.items() if shared >= min_shared and min_len <= self.lengths[pos] <= max_len)
+
+class PhoneticIndex:
+    """Índice invertido clave fonética -> posiciones de nombre.
+
+    Un nombre es candidato si comparte con la consulta al menos la mitad (redondeando hacia arriba) de
+    sus claves fonéticas; así un alias en otra escritura llega a la puntuación fina aunque no comparta
+    ningún trigrama con la consulta.
+    """
+
+    def __init__(self, postings, size):
+        if np is not None:
+            postings = {key: np.frombuffer(positions, dtype=np.int32) for key, positions in postings.items()}
+        self.postings = postings
+        self.size = size
+
+    @classmethod
+    def from_strings(cls, transliterated):
+        postings = {}
+        for pos, name in enumerate(transliterated):
+            for key in phonetic_keys(name):
+                postings.setdefault(key, array('i')).append(pos)
+        return cls(postings, len(transliterated))
+
+    @classmethod
+    def from_postings(cls, rows, size):
+        """Construye el índice a partir de filas (clave, posición), p. ej. de ClavesFoneticas."""
+        postings = {}
+        for key, pos in rows:
+            postings.setdefault(key, array('i')).append(pos)
+        return cls(postings, size)
+
+    @classmethod
+    def from_mapping(cls, postings, size):
+        """Índice sobre ``postings`` ({clave: posiciones int32}) ya construido, sin copiarlo (ver mapped_corpus)."""
+        index = cls.__new__(cls)
+        index.postings, index.size = postings, size
+        return index
+
+    def candidates(self, transliterated_query):
+        """Devuelve las posiciones (ordenadas) que comparten suficientes claves fonéticas con la consulta."""
+        keys = phonetic_keys(transliterated_query)
+        lists = [self.postings[key] for key in keys if key in self.postings]
+        min_shared = max(1, math.ceil(len(keys) / 2))
+        if len(lists) < min_shared:
+            return []
+
+        if np is not None:
+            counts = np.bincount(np.concatenate(lists), minlength=self.size)
+            return np.flatnonzero(counts >= min_shared).tolist()
+
+        counts = Counter()
+        for positions in lists:
+            counts.update(positions)
+        return sorted(pos for pos, shared in counts.items() if shared >= min_shared)
+
+class NameCorpus:
+    """Nombres de un conjunto de entidades en listas planas, agrupados por UID.
+
+    Los nombres de la entidad ``uids[i]`` ocupan las posiciones ``offsets[i]:offsets[i + 1]``
+    de ``names`` (texto original, para ``matched_on``), ``normalized`` (ya pasado por
+    ``normalize_string``) y ``token_sorted`` (pasado por prepare_for_scoring y token_sort, para puntuarlo con
+    ``score_corpus(..., presorted=True)``); ``owners[j]`` es la
+    posición en ``uids`` de la entidad a la que pertenece el nombre ``j``. ``ngram_index``
+    es el índice de trigramas que descarta candidatos antes de puntuar.
+
+    Para la búsqueda fonética, ``transliterated`` guarda cada nombre en alfabeto latino,
+    ``skeletons`` su esqueleto consonántico, ``abjad`` si su escritura omite las vocales y
+    ``phonetic_index`` el índice de claves fonéticas.
+    """
+
+    def __init__(self, entries, ngram_rows=None, phonetic_rows=None):
+        """``entries`` son tuplas (uid, nombre, nombre_normalizado, nombre_transliterado) contiguas por UID;
+        ``ngram_rows`` y ``phonetic_rows``, si se dan, son filas (clave, posición) precalculadas en la ingesta."""
+        self.uids, self.offsets, self.owners = [], [0], []
+        self.names, self.normalized, self.token_sorted = [], [], []
+        self.transliterated, self.skeletons, self.abjad = [], [], []
+        for uid, name, normalized, transliterated in entries:
+            if not self.uids or self.uids[-1] != uid:
+                if self.uids: self.offsets.append(len(self.names))
+                self.uids.append(uid)
+            self.names.append(name)
+            self.normalized.append(normalized)
+            self.token_sorted.append(token_sort(prepare_for_scoring(normalized)))
+            self.owners.append(len(self.uids) - 1)
+            self.transliterated.append(transliterated)
+            self.skeletons.append(skeleton(transliterated))
+            self.abjad.append(is_abjad(name))
+        if self.uids: self.offsets.append(len(self.names))
+        if ngram_rows is None:
+            self.ngram_index = NGramIndex.from_strings(self.token_sorted)
+        else:
+            self.ngram_index = NGramIndex.from_postings(ngram_rows, self.token_sorted)
+        if phonetic_rows is None:
+            self.phonetic_index = PhoneticIndex.from_strings(self.transliterated)
+        else:
+            self.phonetic_index = PhoneticIndex.from_postings(phonetic_rows, len(self.names))
+
+    @classmethod
+    def from_candidates(cls, rows):
+        """Corpus con los nombres candidatos que elige PostgreSQL: filas (uid, nombre, fonético) contiguas por UID.
+
+        Se puntúan todos; la forma transliterada y el esqueleto solo se calculan para los nombres que la
+        base de datos ha marcado como candidatos fonéticos, los únicos que los usan.
+        """
+        corpus = cls.__new__(cls)
+        corpus.uids, corpus.offsets, corpus.owners = [], [0], []
+        corpus.names, corpus.normalized, corpus.token_sorted = [], [], []
+        corpus.transliterated, corpus.skeletons, corpus.abjad = [], [], []
+        phonetic_positions = []
+        for uid, name, phonetic in rows:
+            if not corpus.uids or corpus.uids[-1] != uid:
+                if corpus.uids: corpus.offsets.append(len(corpus.names))
+                corpus.uids.append(uid)
+            if phonetic:
+                phonetic_positions.append(len(corpus.names))
+            transliterated = transliterate(name) if phonetic else None
+            corpus.names.append(name)
+            corpus.normalized.append(normalize_string(name))
+            corpus.token_sorted.append(token_sort(prepare_for_scoring(corpus.normalized[-1])))
+            corpus.owners.append(len(corpus.uids) - 1)
+            corpus.transliterated.append(transliterated)
+            corpus.skeletons.append(skeleton(transliterated) if phonetic else None)
+            corpus.abjad.append(phonetic and is_abjad(name))
+        if corpus.uids: corpus.offsets.append(len(corpus.names))
+        corpus.ngram_index = FixedCandidates(None)
+        corpus.phonetic_index = FixedCandidates(phonetic_positions)
+        return corpus
+
+    def __len__(self):
+        return len(self.names)
+
+class FixedCandidates:
+    """Ocupa el lugar de NGramIndex o PhoneticIndex en un corpus cuyos candidatos ya ha elegido la base de
+    datos: devuelve siempre ``positions`` (None: puntuar todo el corpus)."""
+
+    def __init__(self, positions):
+        self.positions = positions
+
+    def candidates(self, *args):
+        return self.positions
+
+class NameIndex:
+    """Índice de nombres residente en memoria, compartido por todas las peticiones de un proceso del servidor.
+
+    ``full`` contiene nombre principal y alias de cada entidad; ``primary`` solo el nombre
+    principal (búsquedas con ``exclude_aliases``). ``signature`` identifica la versión del
+    archivo de base de datos a partir de la cual se construyó.
+    """
+
+    def __init__(self, signature, full, primary):
+        self.signature = signature
+        self.full = full
+        self.primary = primary
+
+    @classmethod
+    def load(cls, conn, signature):
+        """Carga el índice desde NombresIndexados, IndiceNGramas y ClavesFoneticas (generados por
+        ofac_parser.py) o, en bases de datos anteriores a esas tablas, desde Entidades y Alias."""
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'ClavesFoneticas'")
+        if cursor.fetchone() and cursor.execute("SELECT EXISTS (SELECT 1 FROM NombresIndexados)").fetchone()[0]:
+            cursor.execute("SELECT id, entidad_uid, nombre, nombre_normalizado, nombre_transliterado, es_alias FROM NombresIndexados ORDER BY id")
+            rows = [tuple(row) for row in cursor]
+            ngram_rows = cursor.execute("SELECT ngrama, nombre_id FROM IndiceNGramas").fetchall()
+            phonetic_rows = cursor.execute("SELECT clave, nombre_id FROM ClavesFoneticas").fetchall()
+        else:
+            rows, ngram_rows, phonetic_rows, seen = [], None, None, set()
+            cursor.execute("SELECT e.uid, e.nombre_principal, a.nombre_alias FROM Entidades e LEFT JOIN Alias a ON e.uid = a.entidad_uid")
+            for uid, nombre_principal, nombre_alias in cursor:
+                for name, es_alias in ((nombre_principal, 0), (nombre_alias, 1)):
+                    if name and (uid, name) not in seen:
+                        seen.add((uid, name))
+                        rows.append((len(rows) + 1, uid, name, normalize_string(name), transliterate(name), es_alias))
+
+        primary_rows = [row for row in rows if not row[5]]
+        full = NameCorpus([row[1:5] for row in rows], *_corpus_postings(rows, ngram_rows, phonetic_rows))
+        primary = NameCorpus([row[1:5] for row in primary_rows], *_corpus_postings(primary_rows, ngram_rows, phonetic_rows))
+        index = cls(signature, full, primary)
+        logging.info(f"Índice de nombres cargado: {len(index.full.uids)} entidades, {len(index.full)} nombres.")
+        return index
+
+def _corpus_postings(rows, *postings):
+    """Traduce filas (clave, nombre_id) de la base de datos a (clave, posición) dentro de ``rows``."""
+    positions = {row[0]: pos for pos, row in enumerate(rows)}
+    return [None if key_rows is None else [(key, positions[name_id]) for key, name_id in key_rows if name_id in positions]
+            for key_rows in postings]
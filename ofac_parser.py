@@ -2,10 +2,33 @@
 import requests
 import xml.etree.ElementTree as ET
 import os
+import sys
+import time
+import pickle
+import hashlib
+import json
+import collections
+import tempfile
+import itertools
+import functools
+import operator
+import contextlib
+import pathlib
+import stat
+import cProfile
 import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import psycopg2
-from psycopg2.extras import execute_values
 import sqlite3 # <--- AÑADIDO: Import para SQLite
+from mapped_corpus import write_name_index
+from name_matching import NameIndex, normalize_string, prepare_for_scoring, ngrams, transliterate, phonetic_keys
+from structured_attributes import birth_date_rows, country_codes, is_birth_date_type, is_nationality_type
+
+# resource no existe en Windows: allí no se informa de la memoria pico por fuente.
+try:
+    import resource
+except ModuleNotFoundError:
+    resource = None
 
 # Intenta importar dotenv para desarrollo local, pero no falles si no está (para GitHub Actions)
 try:
@@ -22,14 +45,61 @@ def get_namespace_uri(element):
         return element.tag.split('}')[0][1:]
     return None
 
-# --- TODAS LAS FUNCIONES DE PARSING (analizar_ofac_xml_sdn_enhanced, analizar_onu_xml, etc.) PERMANECEN EXACTAMENTE IGUAL ---
+def reiniciar_memoria_pico():
+    """En Linux, reinicia el pico de memoria residente del proceso para poder medirlo fuente a fuente."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+    except OSError:
+        pass
+
+def memoria_pico_mib():
+    """Pico de memoria residente del proceso en MiB desde el último reinicio, o None si no se puede medir."""
+    if resource is None: return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == "darwin" else pico / 1024 # macOS lo da en bytes, Linux en KiB
+
+def leer_raiz_xml(ruta_archivo_xml):
+    """Devuelve el elemento raíz (solo etiqueta y atributos) sin leer el resto del archivo."""
+    for _, elem in ET.iterparse(ruta_archivo_xml, events=("start",)):
+        return elem
+
+def iterar_elementos_xml(ruta_archivo_xml, rutas):
+    """Recorre el XML con iterparse y devuelve, uno a uno y ya completos, los elementos cuya ruta de
+    etiquetas desde la raíz (sin incluirla) está en ``rutas``, p. ej. [("entities", "entity")].
+
+    Cada elemento devuelto se vacía y se separa de su padre en cuanto se pide el siguiente, y lo que
+    queda fuera de esas rutas se descarta al cerrarse, de modo que la memoria no depende del tamaño
+    del archivo sino del de un solo elemento.
+    """
+    rutas = {tuple(ruta) for ruta in rutas}
+    pila, etiquetas, profundidad_objetivo = [], [], None
+    for evento, elem in ET.iterparse(ruta_archivo_xml, events=("start", "end")):
+        if evento == "start":
+            pila.append(elem)
+            etiquetas.append(elem.tag)
+            if profundidad_objetivo is None and tuple(etiquetas[1:]) in rutas:
+                profundidad_objetivo = len(pila)
+            continue
+        if len(pila) == profundidad_objetivo:
+            yield elem
+            profundidad_objetivo = None
+        if profundidad_objetivo is None:
+            elem.clear()
+            if len(pila) > 1: pila[-2].remove(elem)
+        pila.pop(); etiquetas.pop()
+
+# --- FUNCIONES DE PARSING: generadores basados en iterparse que devuelven las entidades de una en una ---
 # --- FUNCIÓN DE PARSING PARA OFAC SDN_ENHANCED.XML (basada en el XSD "ofacEnhancedXml") ---
 def analizar_ofac_xml_sdn_enhanced(ruta_archivo_xml):
-    lista_completa_entidades = []
+    """Genera las entidades de SDN_ENHANCED.XML de una en una.
+
+    Se lee el archivo dos veces con iterparse: la primera solo para cachear referenceValues (los
+    <entity> hacen referencia a ellos por refId) y la segunda para procesar cada <entity>.
+    """
+    total_entidades = 0
     logging.info(f"Iniciando análisis del archivo XML OFAC SDN Enhanced (schema 'ofacEnhancedXml'): {ruta_archivo_xml}")
     try:
-        tree = ET.parse(ruta_archivo_xml)
-        root = tree.getroot() 
+        root = leer_raiz_xml(ruta_archivo_xml)
 
         expected_ns_uri = "https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/ENHANCED_XML"
         actual_ns_uri = get_namespace_uri(root)
@@ -74,31 +144,19 @@ def analizar_ofac_xml_sdn_enhanced(ruta_archivo_xml):
             return []
         
         reference_values_map = {}
-        reference_values_node = find_node(root, ["referenceValues"])
-        if reference_values_node is not None:
-            for ref_val_node in findall_nodes(reference_values_node, ["referenceValue"]):
-                ref_id = ref_val_node.get("refId")
-                value = find_node_text(ref_val_node, ["value"]) 
-                if ref_id and value:
-                    reference_values_map[ref_id] = value
+        for ref_val_node in iterar_elementos_xml(ruta_archivo_xml, [(build_tag("referenceValues"), build_tag("referenceValue"))]):
+            ref_id = ref_val_node.get("refId")
+            value = find_node_text(ref_val_node, ["value"])
+            if ref_id and value:
+                reference_values_map[ref_id] = value
         logging.info(f"OFAC SDN Enhanced: {len(reference_values_map)} valores de referencia cacheados.")
 
-        sanctions_entries_container_base_tag = "entities" 
-        sanction_entry_base_tag = "entity"      
-
-        entities_container_node = find_node(root, [sanctions_entries_container_base_tag])
-        if entities_container_node is None:
-            logging.error(f"OFAC SDN Enhanced: No se encontró el contenedor <{sanctions_entries_container_base_tag}>. Verifica la estructura del XML.")
-            return []
-
-        entity_elements = findall_nodes(entities_container_node, [sanction_entry_base_tag])
-        if not entity_elements:
-            logging.error(f"OFAC SDN Enhanced: No se encontraron elementos <{sanction_entry_base_tag}> para procesar.")
-            return []
-            
-        logging.info(f"OFAC SDN Enhanced: Procesando {len(entity_elements)} nodos <{sanction_entry_base_tag}> encontrados.")
+        sanctions_entries_container_base_tag = "entities"
+        sanction_entry_base_tag = "entity"
 
-        for entry_node in entity_elements: 
+        nodos_procesados = 0
+        for entry_node in iterar_elementos_xml(ruta_archivo_xml, [(build_tag(sanctions_entries_container_base_tag), build_tag(sanction_entry_base_tag))]):
+            nodos_procesados += 1
             entidad = {'fuente_lista': 'OFAC'}
             aliases, direcciones, identificadores, caracteristicas, programas = [], [], [], [], []
             
@@ -121,7 +179,7 @@ def analizar_ofac_xml_sdn_enhanced(ruta_archivo_xml):
                     program_ref_id = prog_node.get("refId")
                     program_name = reference_values_map.get(program_ref_id, prog_node.text)
                     if program_name: programas.append(program_name)
-            entidad['programas'] = list(set(programas))
+            entidad['programas'] = list(dict.fromkeys(programas))
 
             names_node = find_node(entry_node, ["names"])
             if names_node:
@@ -237,29 +295,33 @@ def analizar_ofac_xml_sdn_enhanced(ruta_archivo_xml):
             entidad['caracteristicas'] = list({frozenset(item.items()): item for item in caracteristicas}.values())
             
             if entidad.get('uid') or entidad.get('nombre_principal'):
-                lista_completa_entidades.append(entidad)
+                total_entidades += 1
+                yield entidad
             else:
                 entity_id_attr = entry_node.get("id")
                 logging.warning(f"OFAC SDN Enhanced: Entidad (XML ID: {entity_id_attr}) sin UID de <identityId> ni nombre_principal. Saltada.")
-        
-        logging.info(f"OFAC SDN Enhanced: Análisis XML completado. Se extrajeron {len(lista_completa_entidades)} entidades.")
+
+        if not nodos_procesados:
+            logging.error(f"OFAC SDN Enhanced: No se encontraron elementos <{sanctions_entries_container_base_tag}>/<{sanction_entry_base_tag}> para procesar. Verifica la estructura del XML.")
+        logging.info(f"OFAC SDN Enhanced: Análisis XML completado. Se procesaron {nodos_procesados} nodos <{sanction_entry_base_tag}> y se extrajeron {total_entidades} entidades.")
 
     except ET.ParseError as e:
+        # Un XML mal formado, o un error a mitad del archivo, deja la fuente incompleta: se propaga para que el
+        # guardado la descarte en lugar de guardar solo las entidades generadas hasta ese punto.
         logging.error(f"Error de parsing XML en archivo OFAC SDN Enhanced {ruta_archivo_xml}: {e}")
+        raise
     except Exception as e:
         logging.error(f"Error inesperado al analizar OFAC SDN Enhanced {ruta_archivo_xml}: {e}", exc_info=True)
-    return lista_completa_entidades
+        raise
 
 def analizar_onu_xml(ruta_archivo_xml):
-    # ... (el código de esta función no cambia)
-    lista_completa_entidades = []
+    """Genera las entidades (INDIVIDUALS/INDIVIDUAL y ENTITIES/ENTITY) del XML consolidado de la ONU, en el orden del archivo."""
+    total_entidades = 0
     logging.info(f"Iniciando análisis del archivo XML de ONU: {ruta_archivo_xml}")
     try:
-        tree = ET.parse(ruta_archivo_xml)
-        root = tree.getroot() 
-        individuals_container = root.find("INDIVIDUALS")
-        if individuals_container is not None:
-            for ind_node in individuals_container.findall("INDIVIDUAL"):
+        for node in iterar_elementos_xml(ruta_archivo_xml, [("INDIVIDUALS", "INDIVIDUAL"), ("ENTITIES", "ENTITY")]):
+            if node.tag == "INDIVIDUAL":
+                ind_node = node
                 entidad = {'fuente_lista': 'ONU', 'tipo': 'Individual'}; aliases, direcciones, identificadores, caracteristicas, programas = [], [], [], [], []
                 data_id_node_text = ind_node.findtext("DATAID"); ref_num_node_uid_text = ind_node.findtext("REFERENCE_NUMBER") 
                 entidad['uid'] = f"UN-{data_id_node_text}" if data_id_node_text else (f"UN-REF-{ref_num_node_uid_text}" if ref_num_node_uid_text else None)
@@ -292,11 +354,10 @@ def analizar_onu_xml(ruta_archivo_xml):
                 entidad['caracteristicas'] = caracteristicas
                 un_list_type = ind_node.findtext("UN_LIST_TYPE", default="").strip();_ = programas.append(un_list_type) if un_list_type else None
                 if ref_num_node_uid_text: programas.append(f"UN Ref: {ref_num_node_uid_text.strip()}")
-                entidad['programas'] = list(set(programas)); entidad['identificadores'] = identificadores
-                if entidad.get('uid') or entidad.get('nombre_principal'): lista_completa_entidades.append(entidad)
-        entities_container = root.find("ENTITIES")
-        if entities_container is not None:
-            for ent_node in entities_container.findall("ENTITY"):
+                entidad['programas'] = list(dict.fromkeys(programas)); entidad['identificadores'] = identificadores
+                if entidad.get('uid') or entidad.get('nombre_principal'): total_entidades += 1; yield entidad
+            else:
+                ent_node = node
                 entidad_obj = {'fuente_lista': 'ONU', 'tipo': 'Entity'}; aliases_ent, direcciones_ent, identificadores_ent, caracteristicas_ent, programas_ent = [], [], [], [], []
                 data_id_ent_text = ent_node.findtext("DATAID"); ref_num_ent_uid_text = ent_node.findtext("REFERENCE_NUMBER")
                 entidad_obj['uid'] = f"UN-{data_id_ent_text}" if data_id_ent_text else (f"UN-REF-{ref_num_ent_uid_text}" if ref_num_ent_uid_text else None)
@@ -310,28 +371,26 @@ def analizar_onu_xml(ruta_archivo_xml):
                 entidad_obj['caracteristicas'] = caracteristicas_ent
                 un_list_type_ent = ent_node.findtext("UN_LIST_TYPE", default="").strip();_ = programas_ent.append(un_list_type_ent) if un_list_type_ent else None
                 if ref_num_ent_uid_text: programas_ent.append(f"UN Ref: {ref_num_ent_uid_text.strip()}")
-                entidad_obj['programas'] = list(set(programas_ent)); entidad_obj['identificadores'] = identificadores_ent
-                if entidad_obj.get('uid') or entidad_obj.get('nombre_principal'): lista_completa_entidades.append(entidad_obj)
-        logging.info(f"ONU: Análisis XML completado. Se extrajeron {len(lista_completa_entidades)} entidades.")
-    except ET.ParseError as e: logging.error(f"Error de parsing XML en archivo ONU {ruta_archivo_xml}: {e}")
-    except Exception as e: logging.error(f"Error inesperado al analizar ONU {ruta_archivo_xml}: {e}", exc_info=True)
-    return lista_completa_entidades
+                entidad_obj['programas'] = list(dict.fromkeys(programas_ent)); entidad_obj['identificadores'] = identificadores_ent
+                if entidad_obj.get('uid') or entidad_obj.get('nombre_principal'): total_entidades += 1; yield entidad_obj
+        logging.info(f"ONU: Análisis XML completado. Se extrajeron {total_entidades} entidades.")
+    except ET.ParseError as e: logging.error(f"Error de parsing XML en archivo ONU {ruta_archivo_xml}: {e}"); raise
+    except Exception as e: logging.error(f"Error inesperado al analizar ONU {ruta_archivo_xml}: {e}", exc_info=True); raise
 
 def analizar_ue_xml(ruta_archivo_xml):
-    # ... (el código de esta función no cambia)
-    lista_completa_entidades = []
+    """Genera las entidades (<sanctionEntity>) de la lista consolidada de la UE de una en una."""
+    total_entidades = 0
     logging.info(f"Iniciando análisis del archivo XML de UE: {ruta_archivo_xml}")
     try:
-        tree = ET.parse(ruta_archivo_xml)
-        root = tree.getroot() 
+        root = leer_raiz_xml(ruta_archivo_xml)
         ns_uri = get_namespace_uri(root)
         ns = {'eu': ns_uri} if ns_uri else {}
         def get_tag(base_tag): return f"{{{ns_uri}}}{base_tag}" if ns_uri else base_tag
         entity_tag = get_tag("sanctionEntity")
-        for se_node in root.findall(entity_tag): 
+        for se_node in iterar_elementos_xml(ruta_archivo_xml, [(entity_tag,)]):
             entidad = {'fuente_lista': 'UE'}; aliases, direcciones, identificadores, caracteristicas, programas = [], [], [], [], []
             logical_id = se_node.get("logicalId"); eu_ref = se_node.get("euReferenceNumber"); un_id = se_node.get("unitedNationId")
-            entidad['uid'] = f"EU-{logical_id}" if logical_id else (f"EU-REF-{eu_ref}" if eu_ref else (f"EU-UNID-{un_id}" if un_id else f"EU-TEMP-{len(lista_completa_entidades)+1}"))
+            entidad['uid'] = f"EU-{logical_id}" if logical_id else (f"EU-REF-{eu_ref}" if eu_ref else (f"EU-UNID-{un_id}" if un_id else f"EU-TEMP-{total_entidades+1}"))
             if eu_ref: identificadores.append({'tipo_identificador': 'EU Reference Number', 'numero_identificador': eu_ref, 'pais_emisor': 'EU'});
             if un_id: identificadores.append({'tipo_identificador': 'UN ID (from EU list)', 'numero_identificador': un_id, 'pais_emisor': 'UN'})
             subject_type_node = se_node.find(get_tag("subjectType"))
@@ -339,7 +398,7 @@ def analizar_ue_xml(ruta_archivo_xml):
             else: entidad['tipo'] = "Desconocido"
             regulation_node = se_node.find(get_tag("regulation"))
             if regulation_node is not None: programme = regulation_node.get("programme", "").strip();_ = programas.append(programme) if programme else None
-            entidad['programas'] = list(set(programas))
+            entidad['programas'] = list(dict.fromkeys(programas))
             remark_node = se_node.find(get_tag("remark"))
             if remark_node is not None and remark_node.text: caracteristicas.append({'tipo_caracteristica': 'Remark', 'valor_caracteristica': remark_node.text.strip()})
             for cit_node in se_node.findall(get_tag("citizenship")): country_desc = cit_node.get("countryDescription", "").strip();_ = caracteristicas.append({'tipo_caracteristica': 'Nationality/Citizenship', 'valor_caracteristica': country_desc}) if country_desc else None
@@ -383,75 +442,84 @@ def analizar_ue_xml(ruta_archivo_xml):
             entidad['nombre_principal'] = nombre_principal_val
             entidad['aliases'] = list({frozenset(item.items()): item for item in aliases}.values())
             entidad['caracteristicas'] = list({frozenset(item.items()): item for item in caracteristicas}.values())
-            if entidad.get('uid') or entidad.get('nombre_principal'): lista_completa_entidades.append(entidad)
-        logging.info(f"UE: Análisis XML completado. Se extrajeron {len(lista_completa_entidades)} entidades.")
-    except ET.ParseError as e: logging.error(f"Error de parsing XML en archivo UE {ruta_archivo_xml}: {e}")
-    except Exception as e: logging.error(f"Error inesperado al analizar UE {ruta_archivo_xml}: {e}", exc_info=True)
-    return lista_completa_entidades
+            if entidad.get('uid') or entidad.get('nombre_principal'): total_entidades += 1; yield entidad
+        logging.info(f"UE: Análisis XML completado. Se extrajeron {total_entidades} entidades.")
+    except ET.ParseError as e: logging.error(f"Error de parsing XML en archivo UE {ruta_archivo_xml}: {e}"); raise
+    except Exception as e: logging.error(f"Error inesperado al analizar UE {ruta_archivo_xml}: {e}", exc_info=True); raise
 
 def analizar_uk_xml(ruta_archivo_xml):
-    # ... (el código de esta función no cambia)
-    lista_completa_entidades = []
+    """Genera las entidades de la lista consolidada de UK (OFSI), una por GroupID.
+
+    Los FinancialSanctionsTarget se leen con iterparse, pero un GroupID puede repartirse por todo el
+    archivo, así que se acumulan los datos ya extraídos de cada grupo (no los elementos XML) y las
+    entidades se generan al terminar la lectura.
+    """
+    total_entidades = 0
     logging.info(f"Iniciando análisis del archivo XML de UK (OFSI): {ruta_archivo_xml}")
     try:
-        tree = ET.parse(ruta_archivo_xml)
-        root = tree.getroot() 
+        root = leer_raiz_xml(ruta_archivo_xml)
         ns_uri_uk = get_namespace_uri(root)
         ns_uk_find = {'uk': ns_uri_uk} if ns_uri_uk else {} 
         def get_uk_tag(base_tag): return f"{{{ns_uri_uk}}}{base_tag}" if ns_uri_uk else base_tag
         target_tag = get_uk_tag("FinancialSanctionsTarget")
-        targets_por_grupo = {}
-        for fst_node in root.findall(target_tag):
+        grupos = {}
+        for fst_node in iterar_elementos_xml(ruta_archivo_xml, [(target_tag,)]):
             group_id_node = fst_node.find(get_uk_tag("GroupID"))
-            if group_id_node is not None and group_id_node.text:
-                group_id = group_id_node.text; targets_por_grupo.setdefault(group_id, []).append(fst_node)
-        logging.info(f"UK: {len(targets_por_grupo)} grupos de entidades (GroupID) encontrados.")
-        for group_id, fst_nodes_grupo in targets_por_grupo.items():
-            entidad = {'fuente_lista': 'UK', 'uid': f"UK-{group_id}"}; aliases, direcciones, identificadores, caracteristicas, programas = [], [], [], [], []
-            nombre_principal_val, tipo_entidad_val = None, None; nombres_candidatos_del_grupo = []
-            for idx, fst_node in enumerate(fst_nodes_grupo):
-                if tipo_entidad_val is None: group_type_node = fst_node.find(get_uk_tag("GroupTypeDescription")); tipo_entidad_val = group_type_node.text.strip() if group_type_node is not None and group_type_node.text else "Desconocido"
-                nombre_parts = [fst_node.findtext(get_uk_tag(f"Name{i}"), default="").strip() for i in range(1, 7)]; nombre_concatenado = " ".join(filter(None, nombre_parts)).strip()
-                title_node = fst_node.find(get_uk_tag("Title")); title = title_node.text.strip() if title_node is not None and title_node.text else ""
-                if title and nombre_concatenado: nombre_concatenado = f"{title} {nombre_concatenado}".strip()
-                elif title and not nombre_concatenado: nombre_concatenado = title
-                alias_type_node = fst_node.find(get_uk_tag("AliasType")); tipo_alias_actual = alias_type_node.text.strip() if alias_type_node is not None and alias_type_node.text else "Alias"
-                if nombre_concatenado: nombres_candidatos_del_grupo.append({'nombre': nombre_concatenado, 'tipo': tipo_alias_actual, 'idioma_escritura': None})
-                name_non_latin_node = fst_node.find(get_uk_tag("NameNonLatinScript"))
-                if name_non_latin_node is not None and name_non_latin_node.text:
-                    non_latin_name = name_non_latin_node.text.strip(); script_type_node = fst_node.find(get_uk_tag("NonLatinScriptType")); script_lang_node = fst_node.find(get_uk_tag("NonLatinScriptLanguage")); script_info_parts = []
-                    if script_type_node is not None and script_type_node.text: script_info_parts.append(script_type_node.text.strip())
-                    if script_lang_node is not None and script_lang_node.text: script_info_parts.append(script_lang_node.text.strip())
-                    script_info = ", ".join(script_info_parts) if script_info_parts else "Escritura No Latina"
-                    nombres_candidatos_del_grupo.append({'nombre': non_latin_name, 'tipo': 'Nombre en Escritura Original', 'idioma_escritura': script_info})
-                regime_name_node = fst_node.find(get_uk_tag("RegimeName"))
-                if regime_name_node is not None and regime_name_node.text: programas.append(regime_name_node.text.strip())
-                if idx == 0: 
-                    uk_ref_node = fst_node.find(get_uk_tag("UKSanctionsListRef"));_ = identificadores.append({'tipo_identificador': 'UKSanctionsListRef', 'numero_identificador': uk_ref_node.text.strip(), 'pais_emisor': 'UK'}) if uk_ref_node is not None and uk_ref_node.text else None
-                    un_ref_node = fst_node.find(get_uk_tag("UNRef"));_ = identificadores.append({'tipo_identificador': 'UNRef (from UK list)', 'numero_identificador': un_ref_node.text.strip(), 'pais_emisor': 'UN'}) if un_ref_node is not None and un_ref_node.text else None
-                    addr_parts_uk = [fst_node.findtext(get_uk_tag(f"Address{i}"), default="").strip() for i in range(1, 7)]; post_code_uk = fst_node.findtext(get_uk_tag("PostCode"), default="").strip(); country_uk_val = fst_node.findtext(get_uk_tag("Country"), default="").strip()
-                    if post_code_uk: addr_parts_uk.append(post_code_uk);
-                    if country_uk_val: addr_parts_uk.append(country_uk_val)
-                    dir_completa_uk = ", ".join(filter(None, addr_parts_uk))
-                    if dir_completa_uk: direcciones.append({'calle1': fst_node.findtext(get_uk_tag("Address1"), default=""), 'ciudad': None, 'pais': country_uk_val or None, 'codigo_postal': post_code_uk or None, 'direccion_completa': dir_completa_uk, 'region': None, 'lugar': None, 'po_box': None})
-                    reasons_node = fst_node.find(get_uk_tag("UKStatementOfReasons"));_ = caracteristicas.append({'tipo_caracteristica': 'UK Statement Of Reasons', 'valor_caracteristica': reasons_node.text.strip()}) if reasons_node is not None and reasons_node.text else None
-                    other_info_node = fst_node.find(get_uk_tag("OtherInformation"));_ = caracteristicas.append({'tipo_caracteristica': 'Other Information', 'valor_caracteristica': other_info_node.text.strip()}) if other_info_node is not None and other_info_node.text else None
-                    dob_container_node = fst_node.find(get_uk_tag("Individual_DateOfBirth")) 
-                    if dob_container_node is not None: [caracteristicas.append({'tipo_caracteristica': 'Date of Birth', 'valor_caracteristica': date_node.text.strip()}) for date_node in dob_container_node.findall(get_uk_tag("Date")) if date_node.text]
-                    pob_town_node = fst_node.find(get_uk_tag("Individual_TownOfBirth")); pob_country_node = fst_node.find(get_uk_tag("Individual_CountryOfBirth")); pob_uk_parts = []
-                    if pob_town_node is not None and pob_town_node.text: pob_uk_parts.append(pob_town_node.text.strip())
-                    if pob_country_node is not None and pob_country_node.text: pob_uk_parts.append(pob_country_node.text.strip())
-                    if pob_uk_parts: caracteristicas.append({'tipo_caracteristica': 'Place of Birth', 'valor_caracteristica': ", ".join(pob_uk_parts)})
-                    nat_container_node = fst_node.find(get_uk_tag("Individual_Nationality"))
-                    if nat_container_node is not None: [caracteristicas.append({'tipo_caracteristica': 'Nationality', 'valor_caracteristica': nat_val_node.text.strip()}) for nat_val_node in nat_container_node.findall(get_uk_tag("Nationality")) if nat_val_node.text]
-                    pos_node = fst_node.find(get_uk_tag("Individual_Position"));_ = caracteristicas.append({'tipo_caracteristica': 'Position', 'valor_caracteristica': pos_node.text.strip()}) if pos_node is not None and pos_node.text else None
-                    gender_node = fst_node.find(get_uk_tag("Individual_Gender"));_ = caracteristicas.append({'tipo_caracteristica': 'Gender', 'valor_caracteristica': gender_node.text.strip()}) if gender_node is not None and gender_node.text else None
-                    entity_type_node_uk = fst_node.find(get_uk_tag("Entity_Type"));_ = caracteristicas.append({'tipo_caracteristica': 'Entity Specific Type (UK)', 'valor_caracteristica': entity_type_node_uk.text.strip()}) if entity_type_node_uk is not None and entity_type_node_uk.text else None
-                    date_listed_node = fst_node.find(get_uk_tag("DateListed"));_ = caracteristicas.append({'tipo_caracteristica': 'Date Listed', 'valor_caracteristica': date_listed_node.text.split('T')[0]}) if date_listed_node is not None and date_listed_node.text else None
-                    last_updated_node = fst_node.find(get_uk_tag("LastUpdated"));_ = caracteristicas.append({'tipo_caracteristica': 'Last Updated', 'valor_caracteristica': last_updated_node.text.split('T')[0]}) if last_updated_node is not None and last_updated_node.text else None
-                    passport_node = fst_node.find(get_uk_tag("Individual_PassportNumber"));_ = identificadores.append({'tipo_identificador': 'Passport Number', 'numero_identificador': passport_node.text.strip(), 'pais_emisor': None}) if passport_node is not None and passport_node.text else None
-                    ni_node = fst_node.find(get_uk_tag("Individual_NINumber"));_ = identificadores.append({'tipo_identificador': 'National Insurance Number', 'numero_identificador': ni_node.text.strip(), 'pais_emisor': 'UK'}) if ni_node is not None and ni_node.text else None
-                    biz_reg_node = fst_node.find(get_uk_tag("Entity_BusinessRegNumber"));_ = identificadores.append({'tipo_identificador': 'Business Registration Number', 'numero_identificador': biz_reg_node.text.strip(), 'pais_emisor': None}) if biz_reg_node is not None and biz_reg_node.text else None
+            if group_id_node is None or not group_id_node.text: continue
+            group_id = group_id_node.text
+            if group_id not in grupos:
+                grupos[group_id] = {'nodos': 0, 'tipo': None, 'nombres': [], 'direcciones': [], 'identificadores': [], 'caracteristicas': [], 'programas': []}
+            grupo = grupos[group_id]; idx = grupo['nodos']; grupo['nodos'] += 1
+            tipo_entidad_val, nombres_candidatos_del_grupo = grupo['tipo'], grupo['nombres']
+            direcciones, identificadores, caracteristicas, programas = grupo['direcciones'], grupo['identificadores'], grupo['caracteristicas'], grupo['programas']
+            if tipo_entidad_val is None: group_type_node = fst_node.find(get_uk_tag("GroupTypeDescription")); tipo_entidad_val = group_type_node.text.strip() if group_type_node is not None and group_type_node.text else "Desconocido"
+            nombre_parts = [fst_node.findtext(get_uk_tag(f"Name{i}"), default="").strip() for i in range(1, 7)]; nombre_concatenado = " ".join(filter(None, nombre_parts)).strip()
+            title_node = fst_node.find(get_uk_tag("Title")); title = title_node.text.strip() if title_node is not None and title_node.text else ""
+            if title and nombre_concatenado: nombre_concatenado = f"{title} {nombre_concatenado}".strip()
+            elif title and not nombre_concatenado: nombre_concatenado = title
+            alias_type_node = fst_node.find(get_uk_tag("AliasType")); tipo_alias_actual = alias_type_node.text.strip() if alias_type_node is not None and alias_type_node.text else "Alias"
+            if nombre_concatenado: nombres_candidatos_del_grupo.append({'nombre': nombre_concatenado, 'tipo': tipo_alias_actual, 'idioma_escritura': None})
+            name_non_latin_node = fst_node.find(get_uk_tag("NameNonLatinScript"))
+            if name_non_latin_node is not None and name_non_latin_node.text:
+                non_latin_name = name_non_latin_node.text.strip(); script_type_node = fst_node.find(get_uk_tag("NonLatinScriptType")); script_lang_node = fst_node.find(get_uk_tag("NonLatinScriptLanguage")); script_info_parts = []
+                if script_type_node is not None and script_type_node.text: script_info_parts.append(script_type_node.text.strip())
+                if script_lang_node is not None and script_lang_node.text: script_info_parts.append(script_lang_node.text.strip())
+                script_info = ", ".join(script_info_parts) if script_info_parts else "Escritura No Latina"
+                nombres_candidatos_del_grupo.append({'nombre': non_latin_name, 'tipo': 'Nombre en Escritura Original', 'idioma_escritura': script_info})
+            regime_name_node = fst_node.find(get_uk_tag("RegimeName"))
+            if regime_name_node is not None and regime_name_node.text: programas.append(regime_name_node.text.strip())
+            if idx == 0: 
+                uk_ref_node = fst_node.find(get_uk_tag("UKSanctionsListRef"));_ = identificadores.append({'tipo_identificador': 'UKSanctionsListRef', 'numero_identificador': uk_ref_node.text.strip(), 'pais_emisor': 'UK'}) if uk_ref_node is not None and uk_ref_node.text else None
+                un_ref_node = fst_node.find(get_uk_tag("UNRef"));_ = identificadores.append({'tipo_identificador': 'UNRef (from UK list)', 'numero_identificador': un_ref_node.text.strip(), 'pais_emisor': 'UN'}) if un_ref_node is not None and un_ref_node.text else None
+                addr_parts_uk = [fst_node.findtext(get_uk_tag(f"Address{i}"), default="").strip() for i in range(1, 7)]; post_code_uk = fst_node.findtext(get_uk_tag("PostCode"), default="").strip(); country_uk_val = fst_node.findtext(get_uk_tag("Country"), default="").strip()
+                if post_code_uk: addr_parts_uk.append(post_code_uk);
+                if country_uk_val: addr_parts_uk.append(country_uk_val)
+                dir_completa_uk = ", ".join(filter(None, addr_parts_uk))
+                if dir_completa_uk: direcciones.append({'calle1': fst_node.findtext(get_uk_tag("Address1"), default=""), 'ciudad': None, 'pais': country_uk_val or None, 'codigo_postal': post_code_uk or None, 'direccion_completa': dir_completa_uk, 'region': None, 'lugar': None, 'po_box': None})
+                reasons_node = fst_node.find(get_uk_tag("UKStatementOfReasons"));_ = caracteristicas.append({'tipo_caracteristica': 'UK Statement Of Reasons', 'valor_caracteristica': reasons_node.text.strip()}) if reasons_node is not None and reasons_node.text else None
+                other_info_node = fst_node.find(get_uk_tag("OtherInformation"));_ = caracteristicas.append({'tipo_caracteristica': 'Other Information', 'valor_caracteristica': other_info_node.text.strip()}) if other_info_node is not None and other_info_node.text else None
+                dob_container_node = fst_node.find(get_uk_tag("Individual_DateOfBirth")) 
+                if dob_container_node is not None: [caracteristicas.append({'tipo_caracteristica': 'Date of Birth', 'valor_caracteristica': date_node.text.strip()}) for date_node in dob_container_node.findall(get_uk_tag("Date")) if date_node.text]
+                pob_town_node = fst_node.find(get_uk_tag("Individual_TownOfBirth")); pob_country_node = fst_node.find(get_uk_tag("Individual_CountryOfBirth")); pob_uk_parts = []
+                if pob_town_node is not None and pob_town_node.text: pob_uk_parts.append(pob_town_node.text.strip())
+                if pob_country_node is not None and pob_country_node.text: pob_uk_parts.append(pob_country_node.text.strip())
+                if pob_uk_parts: caracteristicas.append({'tipo_caracteristica': 'Place of Birth', 'valor_caracteristica': ", ".join(pob_uk_parts)})
+                nat_container_node = fst_node.find(get_uk_tag("Individual_Nationality"))
+                if nat_container_node is not None: [caracteristicas.append({'tipo_caracteristica': 'Nationality', 'valor_caracteristica': nat_val_node.text.strip()}) for nat_val_node in nat_container_node.findall(get_uk_tag("Nationality")) if nat_val_node.text]
+                pos_node = fst_node.find(get_uk_tag("Individual_Position"));_ = caracteristicas.append({'tipo_caracteristica': 'Position', 'valor_caracteristica': pos_node.text.strip()}) if pos_node is not None and pos_node.text else None
+                gender_node = fst_node.find(get_uk_tag("Individual_Gender"));_ = caracteristicas.append({'tipo_caracteristica': 'Gender', 'valor_caracteristica': gender_node.text.strip()}) if gender_node is not None and gender_node.text else None
+                entity_type_node_uk = fst_node.find(get_uk_tag("Entity_Type"));_ = caracteristicas.append({'tipo_caracteristica': 'Entity Specific Type (UK)', 'valor_caracteristica': entity_type_node_uk.text.strip()}) if entity_type_node_uk is not None and entity_type_node_uk.text else None
+                date_listed_node = fst_node.find(get_uk_tag("DateListed"));_ = caracteristicas.append({'tipo_caracteristica': 'Date Listed', 'valor_caracteristica': date_listed_node.text.split('T')[0]}) if date_listed_node is not None and date_listed_node.text else None
+                last_updated_node = fst_node.find(get_uk_tag("LastUpdated"));_ = caracteristicas.append({'tipo_caracteristica': 'Last Updated', 'valor_caracteristica': last_updated_node.text.split('T')[0]}) if last_updated_node is not None and last_updated_node.text else None
+                passport_node = fst_node.find(get_uk_tag("Individual_PassportNumber"));_ = identificadores.append({'tipo_identificador': 'Passport Number', 'numero_identificador': passport_node.text.strip(), 'pais_emisor': None}) if passport_node is not None and passport_node.text else None
+                ni_node = fst_node.find(get_uk_tag("Individual_NINumber"));_ = identificadores.append({'tipo_identificador': 'National Insurance Number', 'numero_identificador': ni_node.text.strip(), 'pais_emisor': 'UK'}) if ni_node is not None and ni_node.text else None
+                biz_reg_node = fst_node.find(get_uk_tag("Entity_BusinessRegNumber"));_ = identificadores.append({'tipo_identificador': 'Business Registration Number', 'numero_identificador': biz_reg_node.text.strip(), 'pais_emisor': None}) if biz_reg_node is not None and biz_reg_node.text else None
+            grupo['tipo'] = tipo_entidad_val
+        logging.info(f"UK: {len(grupos)} grupos de entidades (GroupID) encontrados.")
+        for group_id, grupo in grupos.items():
+            entidad = {'fuente_lista': 'UK', 'uid': f"UK-{group_id}"}; aliases = []
+            direcciones, identificadores, caracteristicas, programas = grupo['direcciones'], grupo['identificadores'], grupo['caracteristicas'], grupo['programas']
+            nombre_principal_val, tipo_entidad_val = None, grupo['tipo']; nombres_candidatos_del_grupo = grupo['nombres']
             if nombres_candidatos_del_grupo:
                 primary_name_entry = next((n for n in nombres_candidatos_del_grupo if "primary name" in n['tipo'].lower()), None)
                 if primary_name_entry: nombre_principal_val = primary_name_entry['nombre']; aliases.extend([nc for nc in nombres_candidatos_del_grupo if nc['nombre'].lower() != nombre_principal_val.lower()])
@@ -461,12 +529,11 @@ def analizar_uk_xml(ruta_archivo_xml):
             entidad['direcciones'] = list({frozenset(item.items()): item for item in direcciones}.values()) 
             entidad['identificadores'] = list({frozenset(item.items()): item for item in identificadores}.values()) 
             entidad['caracteristicas'] = list({frozenset(item.items()): item for item in caracteristicas}.values()) 
-            entidad['programas'] = list(set(programas))
-            if entidad.get('uid') or entidad.get('nombre_principal'): lista_completa_entidades.append(entidad)
-        logging.info(f"UK: Análisis XML completado. Se extrajeron {len(lista_completa_entidades)} entidades únicas por GroupID.")
-    except ET.ParseError as e: logging.error(f"Error de parsing XML en archivo UK {ruta_archivo_xml}: {e}")
-    except Exception as e: logging.error(f"Error inesperado al analizar UK {ruta_archivo_xml}: {e}", exc_info=True)
-    return lista_completa_entidades
+            entidad['programas'] = list(dict.fromkeys(programas))
+            if entidad.get('uid') or entidad.get('nombre_principal'): total_entidades += 1; yield entidad
+        logging.info(f"UK: Análisis XML completado. Se extrajeron {total_entidades} entidades únicas por GroupID.")
+    except ET.ParseError as e: logging.error(f"Error de parsing XML en archivo UK {ruta_archivo_xml}: {e}"); raise
+    except Exception as e: logging.error(f"Error inesperado al analizar UK {ruta_archivo_xml}: {e}", exc_info=True); raise
 
 # --- Configuración de URLs y Nombres de Archivo ---
 SOURCES_CONFIG = {
@@ -493,24 +560,66 @@ SOURCES_CONFIG = {
 }
 
 # --- Funciones de Descarga ---
-def descargar_archivo(url, nombre_archivo_local, fuente_nombre):
+# Las descargas se escriben por bloques en un archivo temporal del mismo directorio y se renombran al
+# terminar, así que una descarga interrumpida nunca deja un XML a medias en lugar del anterior.
+DIRECTORIO_DESCARGAS = "downloaded_lists"
+TAMANO_BLOQUE_DESCARGA = 1024 * 1024
+# Con FORZAR_ACTUALIZACION=1 se ignoran los validadores y los SHA-256 guardados y se recargan todas las fuentes.
+FORZAR_ACTUALIZACION = os.environ.get("FORZAR_ACTUALIZACION", "0") == "1"
+
+def sha256_archivo(ruta_archivo):
+    """SHA-256 (hexadecimal) de un archivo, leído por bloques."""
+    sha256 = hashlib.sha256()
+    with open(ruta_archivo, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_DESCARGA), b""):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+def descargar_archivo(url, nombre_archivo_local, fuente_nombre, validadores=None):
+    """Descarga una lista y devuelve {"ruta", "sha256", "etag", "last_modified", "bytes_descargados"}, o None
+    si no hay ni descarga ni copia local que usar.
+
+    Si ya hay una copia local y ``validadores`` trae el ETag/Last-Modified de la última carga, la
+    petición es condicional: ante un 304 no se descarga nada y se devuelve la copia local.
+    """
     logging.info(f"Intentando descargar {fuente_nombre} desde {url}...")
+    path_completo_local = os.path.join(DIRECTORIO_DESCARGAS, nombre_archivo_local)
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    validadores = validadores or {}
+    if os.path.exists(path_completo_local):
+        if validadores.get("etag"): headers['If-None-Match'] = validadores["etag"]
+        if validadores.get("last_modified"): headers['If-Modified-Since'] = validadores["last_modified"]
+    ruta_temporal = None
     try:
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=120)
-        response.raise_for_status()
-        download_dir = "downloaded_lists"
-        if not os.path.exists(download_dir): os.makedirs(download_dir)
-        path_completo_local = os.path.join(download_dir, nombre_archivo_local)
-        with open(path_completo_local, 'wb') as f: f.write(response.content)
-        logging.info(f"{fuente_nombre} descargado exitosamente y guardado como {path_completo_local}")
-        return path_completo_local
-    except requests.exceptions.RequestException as e:
+        os.makedirs(DIRECTORIO_DESCARGAS, exist_ok=True)
+        with requests.get(url, headers=headers, timeout=120, stream=True) as response:
+            if response.status_code == 304:
+                logging.info(f"{fuente_nombre} no ha cambiado en origen (304); se usa {path_completo_local}.")
+                return {"ruta": path_completo_local, "sha256": sha256_archivo(path_completo_local), "etag": validadores.get("etag"), "last_modified": validadores.get("last_modified"), "bytes_descargados": 0}
+            response.raise_for_status()
+            sha256 = hashlib.sha256()
+            bytes_descargados = 0
+            fd, ruta_temporal = tempfile.mkstemp(dir=DIRECTORIO_DESCARGAS, prefix=f".{nombre_archivo_local}.", suffix=".part")
+            with os.fdopen(fd, 'wb') as f:
+                for bloque in response.iter_content(chunk_size=TAMANO_BLOQUE_DESCARGA):
+                    f.write(bloque)
+                    sha256.update(bloque)
+                    bytes_descargados += len(bloque)
+            os.replace(ruta_temporal, path_completo_local)
+            ruta_temporal = None
+            logging.info(f"{fuente_nombre} descargado exitosamente y guardado como {path_completo_local}")
+            return {"ruta": path_completo_local, "sha256": sha256.hexdigest(), "etag": response.headers.get('ETag'), "last_modified": response.headers.get('Last-Modified'), "bytes_descargados": bytes_descargados}
+    except (requests.exceptions.RequestException, OSError) as e:
         logging.error(f"Error al descargar {fuente_nombre} desde {url}: {e}")
-        path_completo_local_fallback = os.path.join("downloaded_lists", nombre_archivo_local)
-        if os.path.exists(path_completo_local_fallback): logging.warning(f"Usando archivo local existente {path_completo_local_fallback} para {fuente_nombre}."); return path_completo_local_fallback
-        elif os.path.exists(nombre_archivo_local): logging.warning(f"Usando archivo local existente {nombre_archivo_local} (en raíz) para {fuente_nombre}."); return nombre_archivo_local
+        # La copia local no tiene validadores conocidos: la siguiente petición no será condicional.
+        if os.path.exists(path_completo_local): logging.warning(f"Usando archivo local existente {path_completo_local} para {fuente_nombre}."); ruta = path_completo_local
+        elif os.path.exists(nombre_archivo_local): logging.warning(f"Usando archivo local existente {nombre_archivo_local} (en raíz) para {fuente_nombre}."); ruta = nombre_archivo_local
         else: logging.error(f"Archivo local {nombre_archivo_local} no encontrado. No se puede procesar {fuente_nombre}."); return None
+        return {"ruta": ruta, "sha256": sha256_archivo(ruta), "etag": None, "last_modified": None, "bytes_descargados": 0}
+    finally:
+        if ruta_temporal:
+            try: os.remove(ruta_temporal)
+            except OSError: pass
 
 # --- INICIO: NUEVAS FUNCIONES DE BASE DE DATOS SQLite ---
 def conectar_db_sqlite(db_file="sanctions.db"):
@@ -518,14 +627,27 @@ def conectar_db_sqlite(db_file="sanctions.db"):
     try:
         conn = sqlite3.connect(db_file)
         conn.execute("PRAGMA foreign_keys = ON;")
+        # WAL reduce las escrituras síncronas durante la carga; al publicar la generación se vuelve a DELETE.
+        conn.execute("PRAGMA journal_mode = WAL;")
         logging.info(f"Conexión exitosa a la base de datos SQLite en '{db_file}'.")
         return conn
     except sqlite3.Error as e:
         logging.error(f"Error al conectar a SQLite: {e}")
         return None
 
-def crear_tablas_sqlite(conn):
-    """Crea las tablas en la base de datos SQLite si no existen."""
+# Índices secundarios para las búsquedas del servidor. Los índices únicos de CLAVES_UNICAS_SQLITE ya
+# indexan las tablas hijas por entidad_uid; estos cubren la búsqueda exacta por nombre y los filtros
+# por tipo de característica e identificador, devolviendo entidad_uid sin leer la tabla.
+INDICES_BUSQUEDA_SQLITE = [
+    "CREATE INDEX IF NOT EXISTS idx_entidades_nombre ON Entidades (nombre_principal)",
+    "CREATE INDEX IF NOT EXISTS idx_alias_nombre ON Alias (nombre_alias, entidad_uid)",
+    "CREATE INDEX IF NOT EXISTS idx_identificadores_numero ON Identificadores (numero_identificador, entidad_uid)",
+    "CREATE INDEX IF NOT EXISTS idx_caracteristicas_tipo ON CaracteristicasAdicionales (tipo_caracteristica, valor_caracteristica, entidad_uid)",
+]
+
+def crear_tablas_sqlite(conn, con_indices=True):
+    """Crea las tablas en la base de datos SQLite si no existen. Con ``con_indices=False`` (carga rápida de una
+    generación vacía) las restricciones UNIQUE y los índices se crean al final con crear_indices_sqlite."""
     try:
         cursor = conn.cursor()
         cursor.execute("""
@@ -536,47 +658,94 @@ def crear_tablas_sqlite(conn):
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS Alias (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, entidad_uid TEXT, nombre_alias TEXT, tipo_alias TEXT, idioma_escritura TEXT,
-                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE,
-                UNIQUE(entidad_uid, nombre_alias, tipo_alias, idioma_escritura)
+                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE
             )""")
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS Direcciones (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, entidad_uid TEXT, calle1 TEXT, ciudad TEXT, pais TEXT, codigo_postal TEXT,
                 direccion_completa TEXT, region TEXT, lugar TEXT, po_box TEXT,
-                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE,
-                UNIQUE(entidad_uid, direccion_completa)
+                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE
             )""")
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS Programas (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, entidad_uid TEXT, programa TEXT,
-                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE,
-                UNIQUE(entidad_uid, programa)
+                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE
             )""")
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS Identificadores (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, entidad_uid TEXT, tipo_identificador TEXT, numero_identificador TEXT,
                 pais_emisor TEXT, comentarios TEXT,
-                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE,
-                UNIQUE(entidad_uid, tipo_identificador, numero_identificador)
+                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE
             )""")
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS CaracteristicasAdicionales (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, entidad_uid TEXT, tipo_caracteristica TEXT, valor_caracteristica TEXT,
-                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE,
-                UNIQUE(entidad_uid, tipo_caracteristica, valor_caracteristica)
+                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE
             )""")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS HuellasEntidades (
+                entidad_uid TEXT PRIMARY KEY, fuente_lista TEXT, huella TEXT,
+                FOREIGN KEY (entidad_uid) REFERENCES Entidades (uid) ON DELETE CASCADE
+            )""")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS EstadoFuentes (
+                fuente_lista TEXT PRIMARY KEY, sha256 TEXT, etag TEXT, last_modified TEXT,
+                fecha_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""")
+        if con_indices:
+            crear_indices_sqlite(cursor)
         conn.commit()
         logging.info("Todas las tablas verificadas/creadas en SQLite.")
     except sqlite3.Error as e:
         logging.error(f"Error al crear/verificar las tablas en SQLite: {e}")
         conn.rollback()
 
+def crear_indices_sqlite(cursor):
+    """Crea, si no existen, las restricciones UNIQUE de las tablas hijas (CLAVES_UNICAS_SQLITE, como índices
+    únicos), el índice de HuellasEntidades por fuente e INDICES_BUSQUEDA_SQLITE. Sin commit."""
+    for tabla, columnas in CLAVES_UNICAS_SQLITE.items():
+        # Las bases creadas por versiones anteriores tienen la restricción dentro de CREATE TABLE (origen 'u').
+        if any(origen == 'u' for _, _, _, origen, _ in cursor.execute(f"PRAGMA index_list({tabla})").fetchall()):
+            continue
+        cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{tabla.lower()} ON {tabla} (entidad_uid, {', '.join(columnas)})")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_huellas_fuente ON HuellasEntidades (fuente_lista)")
+    for ddl in INDICES_BUSQUEDA_SQLITE:
+        cursor.execute(ddl)
+
+# Tablas derivadas de Entidades/Alias para la búsqueda difusa del servidor. Se borran y se vuelven a
+# crear en cada carga (ver construir_indice_nombres_sqlite), así que su esquema puede cambiar libremente.
+TABLAS_INDICE_NOMBRES_SQLITE = {
+    "NombresIndexados": "CREATE TABLE NombresIndexados (id INTEGER PRIMARY KEY, entidad_uid TEXT, nombre TEXT, nombre_normalizado TEXT, nombre_transliterado TEXT, es_alias INTEGER)",
+    "IndiceNGramas": "CREATE TABLE IndiceNGramas (ngrama TEXT, nombre_id INTEGER, PRIMARY KEY (ngrama, nombre_id)) WITHOUT ROWID",
+    "ClavesFoneticas": "CREATE TABLE ClavesFoneticas (clave TEXT, nombre_id INTEGER, PRIMARY KEY (clave, nombre_id)) WITHOUT ROWID",
+}
+
+# Tablas FTS5 (tokenizador trigram) sobre los valores que el servidor filtra con LIKE '%...%': con ellas
+# SQLite resuelve la subcadena con el índice de trigramas en vez de recorrer la tabla. Son de contenido
+# externo, así que no duplican los datos; se reconstruyen al final de cada carga (ver
+# construir_indices_busqueda_sqlite).
+TABLAS_BUSQUEDA_TEXTO_SQLITE = {
+    "BusquedaIdentificadores": "CREATE VIRTUAL TABLE BusquedaIdentificadores USING fts5(entidad_uid UNINDEXED, numero_identificador, content='Identificadores', content_rowid='id', tokenize='trigram')",
+    "BusquedaCaracteristicas": "CREATE VIRTUAL TABLE BusquedaCaracteristicas USING fts5(entidad_uid UNINDEXED, tipo_caracteristica, valor_caracteristica, content='CaracteristicasAdicionales', content_rowid='id', tokenize='trigram')",
+}
+
+# Fechas de nacimiento y nacionalidades de CaracteristicasAdicionales ya interpretadas (ver structured_attributes.py):
+# una fila por año (mes y día 0 si no se conocen) y un código ISO 3166-1 alfa-2 por país. Las claves primarias
+# empiezan por el valor, así que los filtros del servidor son búsquedas por rango o igualdad en el índice. Se
+# reconstruyen al final de cada carga (ver construir_atributos_sqlite).
+TABLAS_ATRIBUTOS_SQLITE = {
+    "FechasNacimiento": "CREATE TABLE FechasNacimiento (anio INTEGER, mes INTEGER, dia INTEGER, entidad_uid TEXT, PRIMARY KEY (anio, mes, dia, entidad_uid)) WITHOUT ROWID",
+    "Nacionalidades": "CREATE TABLE Nacionalidades (codigo_pais TEXT, entidad_uid TEXT, PRIMARY KEY (codigo_pais, entidad_uid)) WITHOUT ROWID",
+}
+
 def limpiar_tablas_sqlite(conn):
     """Limpia todas las tablas en SQLite usando DELETE."""
     try:
         cursor = conn.cursor()
         logging.info("Limpiando tablas existentes en SQLite (DELETE)...")
-        tablas = ["Alias", "Direcciones", "Programas", "Identificadores", "CaracteristicasAdicionales", "Entidades"]
+        for tabla in list(TABLAS_INDICE_NOMBRES_SQLITE) + list(TABLAS_BUSQUEDA_TEXTO_SQLITE) + list(TABLAS_ATRIBUTOS_SQLITE):
+            cursor.execute(f"DROP TABLE IF EXISTS {tabla};")
+        tablas = ["Alias", "Direcciones", "Programas", "Identificadores", "CaracteristicasAdicionales", "HuellasEntidades", "Entidades", "EstadoFuentes"]
         for tabla in tablas:
             cursor.execute(f"DELETE FROM {tabla};")
         cursor.execute("DELETE FROM sqlite_sequence;") # Resetea contadores de AUTOINCREMENT
@@ -586,61 +755,701 @@ def limpiar_tablas_sqlite(conn):
         logging.error(f"Error al limpiar las tablas de SQLite: {e}")
         conn.rollback()
 
+# Entidades que se acumulan antes de cada executemany al guardar en SQLite.
+LOTE_GUARDADO_SQLITE = 2000
+
+def carga_suficiente(fuente_lista_actual, total_entidades, anteriores):
+    """Indica si las ``total_entidades`` analizadas pueden sustituir a las ``anteriores`` de la fuente.
+
+    Una lista vacía, o con menos de VALIDACION_PROPORCION_MINIMA de las entidades que había (un XML truncado,
+    o un parser que falló a medias sin lanzar la excepción), no se guarda: la fuente conserva sus datos y su
+    SHA-256 no se registra, así que la siguiente ejecución vuelve a analizar el archivo.
+    """
+    if total_entidades and total_entidades >= anteriores * VALIDACION_PROPORCION_MINIMA:
+        return True
+    logging.error(f"{fuente_lista_actual}: el análisis ha dado {total_entidades} entidades frente a {anteriores} de la carga anterior; no se guarda la fuente.")
+    return False
+
+def contar_entidades_fuente(cursor, fuente_lista_actual, marcador="?"):
+    cursor.execute(f"SELECT COUNT(*) FROM Entidades WHERE fuente_lista = {marcador}", (fuente_lista_actual,))
+    return cursor.fetchone()[0]
+
 def guardar_datos_en_db_sqlite(conn, lista_entidades, fuente_lista_actual):
-    """Guarda una lista de entidades en la BD SQLite usando executemany y ON CONFLICT."""
-    if not lista_entidades:
-        logging.warning(f"La lista de entidades para guardar de {fuente_lista_actual} está vacía.")
-        return
+    """Sustituye las entidades de la fuente por las de ``lista_entidades`` (lista o generador de un parser)
+    usando executemany y ON CONFLICT. Devuelve el número de entidades guardadas, o None si hubo un error.
 
-    logging.info(f"Iniciando guardado de {len(lista_entidades)} entidades de {fuente_lista_actual} en SQLite...")
+    Las entidades anteriores de la fuente se borran (en cascada con sus tablas hijas) y las nuevas se
+    insertan por lotes de LOTE_GUARDADO_SQLITE a medida que llegan, todo en una única transacción: si el
+    parser o la base de datos fallan, o la lista no pasa carga_suficiente, la fuente conserva los datos de la
+    carga anterior.
+    """
+    logging.info(f"Iniciando guardado de entidades de {fuente_lista_actual} en SQLite...")
     cursor = conn.cursor()
-    
-    entidades_tuples, alias_tuples, direcciones_tuples, programas_tuples, identificadores_tuples, caracteristicas_tuples = [], [], [], [], [], []
+    total_entidades, lote = 0, []
 
-    for entidad in lista_entidades:
-        uid = entidad.get('uid')
+    try:
+        anteriores = contar_entidades_fuente(cursor, fuente_lista_actual)
+        cursor.execute("DELETE FROM Entidades WHERE fuente_lista = ?", (fuente_lista_actual,))
+        for entidad in lista_entidades:
+            lote.append(entidad)
+            if len(lote) >= LOTE_GUARDADO_SQLITE:
+                insertar_lote_sqlite(cursor, lote, fuente_lista_actual)
+                total_entidades += len(lote); lote = []
+        if lote:
+            insertar_lote_sqlite(cursor, lote, fuente_lista_actual)
+            total_entidades += len(lote)
+
+        if not carga_suficiente(fuente_lista_actual, total_entidades, anteriores):
+            conn.rollback()
+            return None
+        conn.commit()
+        logging.info(f"Guardado de {fuente_lista_actual} en SQLite completado: {total_entidades} entidades.")
+        return total_entidades
+
+    except sqlite3.Error as e:
+        logging.error(f"Error durante guardado de {fuente_lista_actual} en DB SQLite: {e}")
+        conn.rollback()
+    except ET.ParseError:
+        logging.error(f"{fuente_lista_actual}: XML no válido; no se guarda ninguna entidad de esta fuente.")
+        conn.rollback()
+    except Exception as e:
+        logging.error(f"Error general inesperado durante guardado de {fuente_lista_actual} en SQLite: {e}", exc_info=True)
+        conn.rollback()
+    return None
+
+# Máximo de parámetros por consulta IN (...) al leer o borrar filas de las entidades de un lote.
+TROZO_CONSULTA_SQLITE = 500
+
+def guardar_delta_sqlite(conn, lista_entidades, fuente_lista_actual):
+    """Aplica a la BD SQLite solo los cambios de la fuente respecto a la última carga y devuelve el informe
+    de cambios ({"añadidas", "modificadas", "eliminadas": [uids], "sin_cambios": n}), o None si hubo un error.
+
+    Cada entidad se compara por su huella (ver huella_entidad) con la guardada en HuellasEntidades: las
+    nuevas se insertan, en las modificadas solo se borran o insertan las filas hijas que difieren, las
+    que ya no están en la lista se borran (en cascada) y las iguales no se tocan. Si la fuente no tiene
+    huellas (primera carga, o base creada por una versión anterior) se sustituye entera. Todo ocurre en
+    una única transacción, como en guardar_datos_en_db_sqlite, que se deshace si la lista no pasa carga_suficiente.
+    """
+    logging.info(f"Iniciando guardado incremental de {fuente_lista_actual} en SQLite...")
+    cursor = conn.cursor()
+    informe = {"añadidas": [], "modificadas": [], "eliminadas": [], "sin_cambios": 0}
+    total_entidades = 0
+
+    try:
+        anteriores = contar_entidades_fuente(cursor, fuente_lista_actual)
+        cursor.execute("SELECT entidad_uid, huella FROM HuellasEntidades WHERE fuente_lista = ?", (fuente_lista_actual,))
+        huellas_guardadas = dict(cursor.fetchall())
+        if not huellas_guardadas:
+            cursor.execute("DELETE FROM Entidades WHERE fuente_lista = ?", (fuente_lista_actual,))
+        vistas = {}
+
+        for lote in agrupar_en_lotes(lista_entidades, LOTE_GUARDADO_SQLITE):
+            total_entidades += len(lote)
+            nuevas, modificadas, huellas_tuples = [], [], []
+            for entidad in lote:
+                uid = uid_entidad(entidad, fuente_lista_actual)
+                huella = entidad.get('huella') or huella_entidad(entidad)
+                if uid in vistas:
+                    # UID repetido en la misma lista: como en la carga completa, sus filas se suman a las de la
+                    # aparición anterior, y la huella guardada combina las de ambas.
+                    huella = hashlib.sha256((vistas[uid] + huella).encode()).hexdigest()
+                    nuevas.append(entidad)
+                elif uid not in huellas_guardadas:
+                    informe["añadidas"].append(uid); nuevas.append(entidad)
+                elif huellas_guardadas[uid] != huella:
+                    informe["modificadas"].append(uid); modificadas.append(entidad)
+                else:
+                    informe["sin_cambios"] += 1
+                vistas[uid] = huella
+                if huellas_guardadas.get(uid) != huella:
+                    huellas_tuples.append((uid, fuente_lista_actual, huella))
+            if modificadas: actualizar_entidades_sqlite(cursor, modificadas, fuente_lista_actual)
+            if nuevas: insertar_lote_sqlite(cursor, nuevas, fuente_lista_actual)
+            cursor.executemany(SQL_HUELLAS_SQLITE, huellas_tuples)
+
+        if not carga_suficiente(fuente_lista_actual, total_entidades, anteriores):
+            conn.rollback()
+            return None
+        informe["eliminadas"] = [uid for uid in huellas_guardadas if uid not in vistas]
+        for trozo in agrupar_en_lotes(informe["eliminadas"], TROZO_CONSULTA_SQLITE):
+            cursor.execute(f"DELETE FROM Entidades WHERE uid IN ({', '.join('?' * len(trozo))})", trozo)
+
+        conn.commit()
+        logging.info(f"Guardado incremental de {fuente_lista_actual} completado: {len(informe['añadidas'])} añadidas, {len(informe['modificadas'])} modificadas, {len(informe['eliminadas'])} eliminadas, {informe['sin_cambios']} sin cambios.")
+        return informe
+
+    except sqlite3.Error as e:
+        logging.error(f"Error durante guardado de {fuente_lista_actual} en DB SQLite: {e}")
+        conn.rollback()
+    except ET.ParseError:
+        logging.error(f"{fuente_lista_actual}: XML no válido; no se guarda ninguna entidad de esta fuente.")
+        conn.rollback()
+    except Exception as e:
+        logging.error(f"Error general inesperado durante guardado de {fuente_lista_actual} en SQLite: {e}", exc_info=True)
+        conn.rollback()
+    return None
+
+def actualizar_entidades_sqlite(cursor, lista_entidades, fuente_lista_actual):
+    """Actualiza entidades que ya existen: su fila en Entidades y, en cada tabla hija, borra las filas que
+    sobran e inserta las que faltan (comparadas como multiconjuntos), sin tocar las que no cambian."""
+    uids = [uid_entidad(entidad, fuente_lista_actual) for entidad in lista_entidades]
+    cursor.executemany(SQL_ENTIDADES_SQLITE, [(uid, entidad.get('nombre_principal'), entidad.get('tipo'), fuente_lista_actual) for uid, entidad in zip(uids, lista_entidades)])
+
+    deseadas = {tabla: collections.Counter() for tabla in COLUMNAS_TABLAS_HIJAS_SQLITE}
+    for uid, entidad in zip(uids, lista_entidades):
+        for tabla, filas in filas_hijas_entidad(entidad, uid).items():
+            deseadas[tabla].update(filas)
+
+    for tabla, columnas in COLUMNAS_TABLAS_HIJAS_SQLITE.items():
+        pendientes, ids_sobrantes = deseadas[tabla].copy(), []
+        for trozo in agrupar_en_lotes(uids, TROZO_CONSULTA_SQLITE):
+            cursor.execute(f"SELECT id, entidad_uid, {', '.join(columnas)} FROM {tabla} WHERE entidad_uid IN ({', '.join('?' * len(trozo))}) ORDER BY id", trozo)
+            for id_fila, *fila in cursor.fetchall():
+                fila = tuple(fila)
+                if pendientes[fila] > 0: pendientes[fila] -= 1
+                else: ids_sobrantes.append((id_fila,))
+        cursor.executemany(f"DELETE FROM {tabla} WHERE id = ?", ids_sobrantes)
+        cursor.executemany(sql_insertar_hijas_sqlite(tabla), list(pendientes.elements()))
+
+def leer_estado_fuentes(conn):
+    """Devuelve {fuente: {"sha256", "etag", "last_modified"}} de la última carga correcta de cada fuente."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT fuente_lista, sha256, etag, last_modified FROM EstadoFuentes")
+        return {fuente: {"sha256": sha256, "etag": etag, "last_modified": last_modified} for fuente, sha256, etag, last_modified in cursor.fetchall()}
+    except (sqlite3.Error, psycopg2.Error) as e:
+        logging.warning(f"No se pudo leer el estado de las fuentes; se recargarán todas: {e}")
+        conn.rollback()
+        return {}
+
+def registrar_estado_fuente(conn, fuente_lista_actual, descarga, marcador="?", confirmar=True):
+    """Guarda el SHA-256 y los validadores HTTP del archivo que se acaba de cargar para la fuente.
+    ``marcador`` es el estilo de parámetros del driver ("?" en SQLite, "%s" en psycopg2); con
+    ``confirmar=False`` (carga rápida) la fila queda en la transacción en curso."""
+    sql = ("INSERT INTO EstadoFuentes (fuente_lista, sha256, etag, last_modified, fecha_carga) VALUES ({0}, {0}, {0}, {0}, CURRENT_TIMESTAMP) "
+           "ON CONFLICT (fuente_lista) DO UPDATE SET sha256 = excluded.sha256, etag = excluded.etag, last_modified = excluded.last_modified, fecha_carga = excluded.fecha_carga").format(marcador)
+    try:
+        conn.cursor().execute(sql, (fuente_lista_actual, descarga["sha256"], descarga["etag"], descarga["last_modified"]))
+        if confirmar: conn.commit()
+    except (sqlite3.Error, psycopg2.Error) as e:
+        logging.error(f"No se pudo registrar el estado de {fuente_lista_actual}: {e}")
+        if confirmar: conn.rollback()
+
+# Columnas de cada tabla hija además de entidad_uid, en el orden en que siguen a este en las tuplas de filas_hijas_entidad.
+COLUMNAS_TABLAS_HIJAS_SQLITE = {
+    "Alias": ("nombre_alias", "tipo_alias", "idioma_escritura"),
+    "Direcciones": ("calle1", "ciudad", "pais", "codigo_postal", "direccion_completa", "region", "lugar", "po_box"),
+    "Programas": ("programa",),
+    "Identificadores": ("tipo_identificador", "numero_identificador", "pais_emisor", "comentarios"),
+    "CaracteristicasAdicionales": ("tipo_caracteristica", "valor_caracteristica"),
+}
+
+# Restricciones UNIQUE de cada tabla hija: entidad_uid más estas columnas (ver crear_indices_sqlite).
+CLAVES_UNICAS_SQLITE = {
+    "Alias": ("nombre_alias", "tipo_alias", "idioma_escritura"),
+    "Direcciones": ("direccion_completa",),
+    "Programas": ("programa",),
+    "Identificadores": ("tipo_identificador", "numero_identificador"),
+    "CaracteristicasAdicionales": ("tipo_caracteristica", "valor_caracteristica"),
+}
+# Posición de esas columnas en las tuplas de filas_hijas_entidad (la 0 es entidad_uid, igual en todas las filas de una entidad).
+POSICIONES_CLAVES_UNICAS_SQLITE = {tabla: [COLUMNAS_TABLAS_HIJAS_SQLITE[tabla].index(columna) + 1 for columna in columnas] for tabla, columnas in CLAVES_UNICAS_SQLITE.items()}
+EXTRAER_CLAVES_UNICAS_SQLITE = {tabla: operator.itemgetter(*posiciones) for tabla, posiciones in POSICIONES_CLAVES_UNICAS_SQLITE.items()}
+
+def uid_entidad(entidad, fuente_lista_actual):
+    """UID con el que se guarda la entidad; si el parser no le dio uno, se deriva del nombre principal."""
+    uid = entidad.get('uid')
+    if not uid:
         nombre_principal = entidad.get('nombre_principal')
-        if not uid:
-            uid = f"{fuente_lista_actual}_NO_UID_{nombre_principal[:40].replace(' ', '_') if nombre_principal else 'UNKNOWN'}"
-        
-        entidades_tuples.append((uid, nombre_principal, entidad.get('tipo'), fuente_lista_actual))
-        for item in entidad.get('aliases', []): alias_tuples.append((uid, item.get('nombre_alias'), item.get('tipo_alias'), item.get('idioma_escritura')))
-        for item in entidad.get('direcciones', []): direcciones_tuples.append((uid, item.get('calle1'), item.get('ciudad'), item.get('pais'), item.get('codigo_postal'), item.get('direccion_completa'), item.get('region'), item.get('lugar'), item.get('po_box')))
-        for item in entidad.get('programas', []): programas_tuples.append((uid, item))
-        for item in entidad.get('identificadores', []): identificadores_tuples.append((uid, item.get('tipo_identificador'), item.get('numero_identificador'), item.get('pais_emisor'), item.get('comentarios')))
-        for item in entidad.get('caracteristicas', []): caracteristicas_tuples.append((uid, item.get('tipo_caracteristica'), item.get('valor_caracteristica')))
+        uid = f"{fuente_lista_actual}_NO_UID_{nombre_principal[:40].replace(' ', '_') if nombre_principal else 'UNKNOWN'}"
+    return uid
+
+def filas_hijas_entidad(entidad, uid):
+    """Devuelve {tabla: [tupla de valores, ...]} con las filas hijas de la entidad, con ``uid`` como entidad_uid en primera posición."""
+    return {
+        "Alias": [(uid, item.get('nombre_alias'), item.get('tipo_alias'), item.get('idioma_escritura')) for item in entidad.get('aliases', [])],
+        "Direcciones": [(uid, item.get('calle1'), item.get('ciudad'), item.get('pais'), item.get('codigo_postal'), item.get('direccion_completa'), item.get('region'), item.get('lugar'), item.get('po_box')) for item in entidad.get('direcciones', [])],
+        "Programas": [(uid, item) for item in entidad.get('programas', [])],
+        "Identificadores": [(uid, item.get('tipo_identificador'), item.get('numero_identificador'), item.get('pais_emisor'), item.get('comentarios')) for item in entidad.get('identificadores', [])],
+        "CaracteristicasAdicionales": [(uid, item.get('tipo_caracteristica'), item.get('valor_caracteristica')) for item in entidad.get('caracteristicas', [])],
+    }
+
+SQL_ENTIDADES_SQLITE = "INSERT INTO Entidades (uid, nombre_principal, tipo, fuente_lista) VALUES (?, ?, ?, ?) ON CONFLICT (uid) DO UPDATE SET nombre_principal = excluded.nombre_principal, tipo = excluded.tipo, fuente_lista = excluded.fuente_lista, fecha_actualizacion_registro = CURRENT_TIMESTAMP"
+SQL_HUELLAS_SQLITE = "INSERT INTO HuellasEntidades (entidad_uid, fuente_lista, huella) VALUES (?, ?, ?) ON CONFLICT (entidad_uid) DO UPDATE SET fuente_lista = excluded.fuente_lista, huella = excluded.huella"
+
+def sql_insertar_hijas_sqlite(tabla, ignorar_duplicados=True):
+    columnas = COLUMNAS_TABLAS_HIJAS_SQLITE[tabla]
+    sql = f"INSERT INTO {tabla} (entidad_uid, {', '.join(columnas)}) VALUES ({', '.join('?' * (len(columnas) + 1))})"
+    return sql + " ON CONFLICT DO NOTHING" if ignorar_duplicados else sql
+
+def insertar_lote_sqlite(cursor, lista_entidades, fuente_lista_actual):
+    """Inserta un lote de entidades y sus tablas hijas, sin hacer commit."""
+    entidades_tuples = []
+    filas_tuples = {tabla: [] for tabla in COLUMNAS_TABLAS_HIJAS_SQLITE}
+
+    for entidad in lista_entidades:
+        uid = uid_entidad(entidad, fuente_lista_actual)
+        entidades_tuples.append((uid, entidad.get('nombre_principal'), entidad.get('tipo'), fuente_lista_actual))
+        for tabla, filas in filas_hijas_entidad(entidad, uid).items():
+            filas_tuples[tabla].extend(filas)
+
+    cursor.executemany(SQL_ENTIDADES_SQLITE, entidades_tuples)
+    for tabla, filas in filas_tuples.items():
+        cursor.executemany(sql_insertar_hijas_sqlite(tabla), filas)
+
+# --- Carga rápida: generaciones que empiezan vacías (primera carga o FORZAR_ACTUALIZACION) ---
+# Toda la carga es una única transacción (una SAVEPOINT por fuente) con el diario en memoria y sin
+# sincronizar el disco: el archivo no es visible para el servidor hasta que se publica, así que una
+# interrupción solo deja una generación sin publicar que preparar_generacion_sqlite borra en la siguiente
+# ejecución. Las restricciones UNIQUE y los índices se crean al final, de una vez, en lugar de
+# mantenerse fila a fila; los duplicados se descartan antes en Python.
+PRAGMAS_CARGA_RAPIDA_SQLITE = [
+    "PRAGMA foreign_keys = OFF;",
+    "PRAGMA journal_mode = MEMORY;",
+    "PRAGMA synchronous = OFF;",
+    "PRAGMA cache_size = -65536;",
+]
+# Configuración de conectar_db_sqlite que se restablece al terminar; desde aquí las escrituras vuelven a sincronizarse.
+PRAGMAS_NORMALES_SQLITE = [
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA synchronous = FULL;",
+    "PRAGMA journal_mode = WAL;",
+]
+
+def filas_sin_duplicados(tabla, filas):
+    """Quita de las filas hijas de una entidad las que repiten su clave de CLAVES_UNICAS_SQLITE, como haría
+    ON CONFLICT DO NOTHING (se queda la primera). Igual que en SQLite, una clave con algún NULL no se repite."""
+    if len(filas) < 2 or len(set(map(EXTRAER_CLAVES_UNICAS_SQLITE[tabla], filas))) == len(filas):
+        return filas
+    posiciones = POSICIONES_CLAVES_UNICAS_SQLITE[tabla]
+    vistas, unicas = set(), []
+    for fila in filas:
+        clave = tuple(fila[i] for i in posiciones)
+        if None not in clave:
+            if clave in vistas: continue
+            vistas.add(clave)
+        unicas.append(fila)
+    return unicas
+
+def iniciar_carga_rapida_sqlite(conn):
+    """Aplica PRAGMAS_CARGA_RAPIDA_SQLITE y abre la transacción de la carga. Devuelve el estado que comparten
+    guardar_carga_rapida_sqlite y terminar_carga_rapida_sqlite."""
+    for pragma in PRAGMAS_CARGA_RAPIDA_SQLITE:
+        conn.execute(pragma)
+    conn.execute("BEGIN")
+    logging.info("Carga rápida: generación vacía, restricciones e índices al final de la carga.")
+    # uids: UIDs ya insertados; repetidas: (fuente, entidad) de los UIDs que vuelven a aparecer, que se aplican
+    # con las restricciones ya creadas para que se sumen a la aparición anterior como en la carga ordinaria.
+    return {"uids": set(), "repetidas": []}
+
+def guardar_carga_rapida_sqlite(conn, lista_entidades, fuente_lista_actual, carga):
+    """Inserta las entidades de la fuente en la transacción de la carga rápida con INSERT simples, por lotes
+    de LOTE_GUARDADO_SQLITE, sin restricciones que mantener. Devuelve el número de entidades, o None si hubo
+    un error (la fuente se deshace hasta su SAVEPOINT y las demás se conservan)."""
+    logging.info(f"Iniciando carga rápida de {fuente_lista_actual} en SQLite...")
+    cursor = conn.cursor()
+    total_entidades, uids_fuente, repetidas = 0, set(), []
+    sql_hijas = {tabla: sql_insertar_hijas_sqlite(tabla, ignorar_duplicados=False) for tabla in COLUMNAS_TABLAS_HIJAS_SQLITE}
+
+    try:
+        cursor.execute("SAVEPOINT carga_fuente")
+        for lote in agrupar_en_lotes(lista_entidades, LOTE_GUARDADO_SQLITE):
+            entidades_tuples, huellas_tuples = [], []
+            filas_tuples = {tabla: [] for tabla in COLUMNAS_TABLAS_HIJAS_SQLITE}
+            for entidad in lote:
+                uid = uid_entidad(entidad, fuente_lista_actual)
+                if uid in uids_fuente or uid in carga["uids"]:
+                    repetidas.append(entidad)
+                    continue
+                uids_fuente.add(uid)
+                entidades_tuples.append((uid, entidad.get('nombre_principal'), entidad.get('tipo'), fuente_lista_actual))
+                huellas_tuples.append((uid, fuente_lista_actual, entidad.get('huella') or huella_entidad(entidad)))
+                for tabla, filas in filas_hijas_entidad(entidad, uid).items():
+                    filas_tuples[tabla].extend(filas_sin_duplicados(tabla, filas))
+            # Entidades conserva el orden de la lista (su rowid decide los empates del ranking) y las tablas hijas
+            # se añaden al final por id; HuellasEntidades, que se ordena por UID, se inserta en ese orden.
+            cursor.executemany("INSERT INTO Entidades (uid, nombre_principal, tipo, fuente_lista) VALUES (?, ?, ?, ?)", entidades_tuples)
+            cursor.executemany("INSERT INTO HuellasEntidades (entidad_uid, fuente_lista, huella) VALUES (?, ?, ?)", sorted(huellas_tuples))
+            for tabla, filas in filas_tuples.items():
+                cursor.executemany(sql_hijas[tabla], filas)
+            total_entidades += len(lote)
+        if not carga_suficiente(fuente_lista_actual, total_entidades, 0):
+            deshacer_fuente_carga_rapida(cursor)
+            return None
+        cursor.execute("RELEASE carga_fuente")
+
+    except sqlite3.Error as e:
+        logging.error(f"Error durante guardado de {fuente_lista_actual} en DB SQLite: {e}")
+        deshacer_fuente_carga_rapida(cursor)
+        return None
+    except ET.ParseError:
+        logging.error(f"{fuente_lista_actual}: XML no válido; no se guarda ninguna entidad de esta fuente.")
+        deshacer_fuente_carga_rapida(cursor)
+        return None
+    except Exception as e:
+        logging.error(f"Error general inesperado durante guardado de {fuente_lista_actual} en SQLite: {e}", exc_info=True)
+        deshacer_fuente_carga_rapida(cursor)
+        return None
+
+    carga["uids"] |= uids_fuente
+    carga["repetidas"].extend((fuente_lista_actual, entidad) for entidad in repetidas)
+    logging.info(f"Carga rápida de {fuente_lista_actual} completada: {total_entidades} entidades.")
+    return total_entidades
 
+def deshacer_fuente_carga_rapida(cursor):
+    """Deshace lo insertado por la fuente en curso sin tocar las fuentes ya guardadas en la transacción."""
     try:
-        sql_entidades = "INSERT INTO Entidades (uid, nombre_principal, tipo, fuente_lista) VALUES (?, ?, ?, ?) ON CONFLICT (uid) DO UPDATE SET nombre_principal = excluded.nombre_principal, tipo = excluded.tipo, fuente_lista = excluded.fuente_lista, fecha_actualizacion_registro = CURRENT_TIMESTAMP"
-        cursor.executemany(sql_entidades, entidades_tuples)
+        cursor.execute("ROLLBACK TO carga_fuente")
+        cursor.execute("RELEASE carga_fuente")
+    except sqlite3.Error as e:
+        logging.error(f"No se pudo deshacer la fuente en la carga rápida: {e}")
 
-        sql_alias = "INSERT INTO Alias (entidad_uid, nombre_alias, tipo_alias, idioma_escritura) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING"
-        cursor.executemany(sql_alias, alias_tuples)
+def terminar_carga_rapida_sqlite(conn, carga):
+    """Crea las restricciones UNIQUE y los índices, aplica las entidades con UID repetido, comprueba las
+    claves foráneas y confirma la transacción; después restablece PRAGMAS_NORMALES_SQLITE.
+    Devuelve True si la carga quedó confirmada; si no, la generación queda vacía y no pasa la validación."""
+    cursor = conn.cursor()
+    inicio = time.perf_counter()
+    confirmada = False
+    try:
+        crear_indices_sqlite(cursor)
+        for fuente_lista_actual, grupo in itertools.groupby(carga["repetidas"], key=lambda par: par[0]):
+            entidades = [entidad for _, entidad in grupo]
+            insertar_lote_sqlite(cursor, entidades, fuente_lista_actual)
+            for entidad in entidades:
+                # Como en guardar_delta_sqlite, la huella de un UID repetido combina las de sus apariciones.
+                uid = uid_entidad(entidad, fuente_lista_actual)
+                huella = entidad.get('huella') or huella_entidad(entidad)
+                anterior = cursor.execute("SELECT huella FROM HuellasEntidades WHERE entidad_uid = ?", (uid,)).fetchone()
+                if anterior: huella = hashlib.sha256((anterior[0] + huella).encode()).hexdigest()
+                cursor.execute(SQL_HUELLAS_SQLITE, (uid, fuente_lista_actual, huella))
+        huerfanas = cursor.execute("PRAGMA foreign_key_check").fetchall()
+        if huerfanas:
+            raise sqlite3.IntegrityError(f"{len(huerfanas)} filas hijas sin entidad (p. ej. en {huerfanas[0][0]})")
+        conn.commit()
+        confirmada = True
+        logging.info(f"Carga rápida confirmada: restricciones, índices y {len(carga['repetidas'])} entidades repetidas en {time.perf_counter() - inicio:.1f} s.")
+    except sqlite3.Error as e:
+        logging.error(f"Error al terminar la carga rápida en SQLite; no se guarda ninguna fuente: {e}")
+        conn.rollback()
+    for pragma in PRAGMAS_NORMALES_SQLITE:
+        conn.execute(pragma)
+    return confirmada
 
-        sql_direcciones = "INSERT INTO Direcciones (entidad_uid, calle1, ciudad, pais, codigo_postal, direccion_completa, region, lugar, po_box) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING"
-        cursor.executemany(sql_direcciones, direcciones_tuples)
+def construir_indice_nombres_sqlite(conn):
+    """Reconstruye NombresIndexados, IndiceNGramas y ClavesFoneticas a partir de Entidades y Alias.
 
-        sql_programas = "INSERT INTO Programas (entidad_uid, programa) VALUES (?, ?) ON CONFLICT DO NOTHING"
-        cursor.executemany(sql_programas, programas_tuples)
+    NombresIndexados guarda, en el orden en que el servidor los recorre, los nombres distintos de cada
+    entidad (primero el principal) normalizados y transliterados al alfabeto latino; IndiceNGramas es el
+    índice invertido de trigramas y ClavesFoneticas el de claves fonéticas, con los que server.py
+    selecciona los candidatos antes de la puntuación difusa.
+    """
+    logging.info("Construyendo el índice de nombres, trigramas y claves fonéticas en SQLite...")
+    cursor = conn.cursor()
+    try:
+        for tabla, ddl in TABLAS_INDICE_NOMBRES_SQLITE.items():
+            cursor.execute(f"DROP TABLE IF EXISTS {tabla};")
+            cursor.execute(ddl)
+        nombres_tuples, ngramas_tuples, claves_tuples, vistos = [], [], [], set()
+        # Las fuentes se recorren en el orden de SOURCES_CONFIG y cada una en su orden de carga: así el orden de
+        # los nombres, que decide los empates del ranking, no depende de qué fuentes se hayan recargado (en
+        # modo delta, las entidades añadidas quedan detrás de las que ya tenía su fuente).
+        orden_fuentes = "CASE e.fuente_lista " + " ".join(f"WHEN ? THEN {i}" for i in range(len(SOURCES_CONFIG))) + f" ELSE {len(SOURCES_CONFIG)} END"
+        sql_nombres = f"SELECT e.uid, e.nombre_principal, a.nombre_alias FROM Entidades e LEFT JOIN Alias a ON e.uid = a.entidad_uid ORDER BY {orden_fuentes}, e.rowid, a.nombre_alias, a.tipo_alias, a.idioma_escritura"
+        for uid, nombre_principal, nombre_alias in conn.execute(sql_nombres, tuple(SOURCES_CONFIG)).fetchall():
+            for nombre, es_alias in ((nombre_principal, 0), (nombre_alias, 1)):
+                if not nombre or (uid, nombre) in vistos: continue
+                vistos.add((uid, nombre))
+                nombre_id = len(nombres_tuples) + 1
+                nombre_normalizado = normalize_string(nombre)
+                nombre_transliterado = transliterate(nombre)
+                nombres_tuples.append((nombre_id, uid, nombre, nombre_normalizado, nombre_transliterado, es_alias))
+                ngramas_tuples.extend((ngrama, nombre_id) for ngrama in ngrams(prepare_for_scoring(nombre_normalizado)))
+                claves_tuples.extend((clave, nombre_id) for clave in phonetic_keys(nombre_transliterado))
+        cursor.executemany("INSERT INTO NombresIndexados (id, entidad_uid, nombre, nombre_normalizado, nombre_transliterado, es_alias) VALUES (?, ?, ?, ?, ?, ?)", nombres_tuples)
+        cursor.executemany("INSERT INTO IndiceNGramas (ngrama, nombre_id) VALUES (?, ?)", ngramas_tuples)
+        cursor.executemany("INSERT INTO ClavesFoneticas (clave, nombre_id) VALUES (?, ?)", claves_tuples)
+        conn.commit()
+        logging.info(f"Índice de nombres construido: {len(nombres_tuples)} nombres, {len(ngramas_tuples)} entradas de trigramas, {len(claves_tuples)} claves fonéticas.")
+    except sqlite3.Error as e:
+        logging.error(f"Error al construir el índice de nombres en SQLite: {e}")
+        conn.rollback()
+
+def tablas_sqlite_existen(conn, tablas):
+    """Indica si están todas las ``tablas`` en la base de datos."""
+    marcadores = ", ".join("?" * len(tablas))
+    cursor = conn.execute(f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({marcadores})", tuple(tablas))
+    return cursor.fetchone()[0] == len(tablas)
 
-        sql_identificadores = "INSERT INTO Identificadores (entidad_uid, tipo_identificador, numero_identificador, pais_emisor, comentarios) VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING"
-        cursor.executemany(sql_identificadores, identificadores_tuples)
+def indice_nombres_sqlite_existe(conn):
+    """Indica si están todas las tablas de TABLAS_INDICE_NOMBRES_SQLITE (p. ej. tras una carga interrumpida no lo están)."""
+    return tablas_sqlite_existen(conn, TABLAS_INDICE_NOMBRES_SQLITE)
 
-        sql_caracteristicas = "INSERT INTO CaracteristicasAdicionales (entidad_uid, tipo_caracteristica, valor_caracteristica) VALUES (?, ?, ?) ON CONFLICT DO NOTHING"
-        cursor.executemany(sql_caracteristicas, caracteristicas_tuples)
+def filas_atributos(uid, caracteristicas):
+    """Filas de FechasNacimiento {(año, mes, día)} y de Nacionalidades {código ISO} que se obtienen de las
+    características [(tipo, valor)] de la entidad ``uid``, sin duplicados."""
+    fechas, paises = {}, {}
+    for tipo, valor in caracteristicas:
+        if not valor: continue
+        if is_birth_date_type(tipo):
+            fechas.update(dict.fromkeys((uid,) + fila for fila in birth_date_rows(valor)))
+        elif is_nationality_type(tipo):
+            paises.update(dict.fromkeys((uid, codigo) for codigo in country_codes(valor)))
+    return list(fechas), list(paises)
 
+def construir_atributos_sqlite(conn):
+    """Reconstruye FechasNacimiento y Nacionalidades a partir de CaracteristicasAdicionales."""
+    logging.info("Construyendo las tablas de fechas de nacimiento y nacionalidades en SQLite...")
+    cursor = conn.cursor()
+    try:
+        for tabla, ddl in TABLAS_ATRIBUTOS_SQLITE.items():
+            cursor.execute(f"DROP TABLE IF EXISTS {tabla};")
+            cursor.execute(ddl)
+        fechas, paises, sin_interpretar = [], [], collections.Counter()
+        sql = "SELECT entidad_uid, tipo_caracteristica, valor_caracteristica FROM CaracteristicasAdicionales ORDER BY entidad_uid"
+        for uid, filas in itertools.groupby(conn.execute(sql).fetchall(), key=operator.itemgetter(0)):
+            caracteristicas = [(tipo, valor) for _, tipo, valor in filas]
+            fechas_entidad, paises_entidad = filas_atributos(uid, caracteristicas)
+            fechas.extend(fechas_entidad)
+            paises.extend(paises_entidad)
+            for tipo, valor in caracteristicas:
+                if valor and ((is_birth_date_type(tipo) and not birth_date_rows(valor)) or (is_nationality_type(tipo) and not country_codes(valor))):
+                    sin_interpretar["fechas" if is_birth_date_type(tipo) else "nacionalidades"] += 1
+        cursor.executemany("INSERT OR IGNORE INTO FechasNacimiento (entidad_uid, anio, mes, dia) VALUES (?, ?, ?, ?)", fechas)
+        cursor.executemany("INSERT OR IGNORE INTO Nacionalidades (entidad_uid, codigo_pais) VALUES (?, ?)", paises)
         conn.commit()
-        logging.info(f"Guardado de {fuente_lista_actual} en SQLite completado.")
+        logging.info(f"Atributos construidos: {len(fechas)} años de nacimiento, {len(paises)} nacionalidades; sin interpretar: "
+                     f"{sin_interpretar['fechas']} fechas y {sin_interpretar['nacionalidades']} nacionalidades, que los filtros de fecha y nacionalidad no encontrarán.")
+    except sqlite3.Error as e:
+        logging.error(f"Error al construir las tablas de atributos en SQLite: {e}")
+        conn.rollback()
+
+def construir_indices_busqueda_sqlite(conn):
+    """Reconstruye las tablas FTS5 de identificadores y características a partir de sus tablas de contenido.
 
+    Requiere SQLite 3.34 o superior (tokenizador trigram); con versiones anteriores se omiten y el
+    servidor filtra con LIKE sobre las tablas originales.
+    """
+    logging.info("Construyendo los índices de texto (FTS5) de identificadores y características en SQLite...")
+    cursor = conn.cursor()
+    try:
+        for tabla, ddl in TABLAS_BUSQUEDA_TEXTO_SQLITE.items():
+            cursor.execute(f"DROP TABLE IF EXISTS {tabla};")
+            cursor.execute(ddl)
+            cursor.execute(f"INSERT INTO {tabla} ({tabla}) VALUES ('rebuild');")
+        conn.commit()
+        logging.info("Índices de texto construidos.")
+    except sqlite3.OperationalError as e:
+        logging.warning(f"No se pudieron crear las tablas FTS5 (SQLite {sqlite3.sqlite_version}): {e}. Los filtros usarán LIKE.")
+        conn.rollback()
+        for tabla in TABLAS_BUSQUEDA_TEXTO_SQLITE:
+            cursor.execute(f"DROP TABLE IF EXISTS {tabla};")
+        conn.commit()
     except sqlite3.Error as e:
-        logging.error(f"Error durante guardado de {fuente_lista_actual} en DB SQLite: {e}")
+        logging.error(f"Error al construir los índices de texto en SQLite: {e}")
         conn.rollback()
+# --- Generaciones de la base de datos SQLite: se construye una copia y se publica de forma atómica ---
+# Cada carga escribe en un archivo nuevo (sanctions_lists.g000042.db), copia de la generación vigente, y solo
+# si pasa la validación se publica: el archivo pasa a ser de solo lectura (el servidor lo abre con
+# immutable=1), el marcador sanctions_lists.db.generation (JSON con el número de generación y el archivo)
+# se sustituye con os.replace y sanctions_lists.db pasa a ser un enlace simbólico al archivo nuevo. El
+# servidor sigue leyendo la generación anterior, sin bloqueos, hasta que ve el marcador.
+SQLITE_DB_FILE = os.environ.get("SQLITE_DB_FILE", "sanctions_lists.db")
+SUFIJO_MARCADOR_GENERACION = ".generation"
+# Generaciones que se conservan en disco (la vigente incluida); la anterior sigue abierta en el servidor mientras cambia.
+GENERACIONES_CONSERVADAS = int(os.environ.get("GENERACIONES_CONSERVADAS", "2"))
+# Una generación que excede GENERACIONES_CONSERVADAS no se borra hasta que han pasado estos segundos desde que se
+# publicó la siguiente: un servidor que aún no ha visto el marcador nuevo, o una búsqueda lenta, puede seguir leyéndola.
+PLAZO_BORRADO_GENERACIONES = int(os.environ.get("PLAZO_BORRADO_GENERACIONES", "3600"))
+# Una fuente no puede quedarse con menos de esta proporción de las entidades que tenía en la generación anterior.
+VALIDACION_PROPORCION_MINIMA = float(os.environ.get("VALIDACION_PROPORCION_MINIMA", "0.5"))
+# Índice de nombres precompilado de cada generación (sanctions_lists.g000042.corpus, ver mapped_corpus): el servidor
+# lo abre con mmap en lugar de construir el índice a partir de las tablas ('0' para no escribirlo).
+INDICE_NOMBRES_PRECOMPILADO = os.environ.get("INDICE_NOMBRES_PRECOMPILADO", "1") != "0"
+SUFIJO_INDICE_NOMBRES = ".corpus"
+
+def leer_marcador_generacion(db_file):
+    """Devuelve el marcador de la generación publicada ({"generacion", "archivo", "publicada", "entidades"}) o None."""
+    try:
+        with open(db_file + SUFIJO_MARCADOR_GENERACION, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"No se pudo leer el marcador de generación de {db_file}: {e}")
+        return None
+
+def ruta_generacion(db_file, generacion):
+    base, extension = os.path.splitext(db_file)
+    return f"{base}.g{generacion:06d}{extension}"
+
+def ruta_indice_nombres(ruta):
+    return os.path.splitext(ruta)[0] + SUFIJO_INDICE_NOMBRES
+
+def borrar_archivo_sqlite(ruta):
+    """Borra un archivo SQLite, sus archivos auxiliares (-wal, -shm, -journal) y su índice de nombres precompilado si existen."""
+    for archivo in [ruta + sufijo for sufijo in ("", "-wal", "-shm", "-journal")] + [ruta_indice_nombres(ruta)]:
+        try: os.remove(archivo)
+        except FileNotFoundError: pass
+        except PermissionError: # Generación publicada, de solo lectura (en Windows no se puede borrar así).
+            os.chmod(archivo, stat.S_IREAD | stat.S_IWRITE)
+            os.remove(archivo)
+
+def preparar_generacion_sqlite(db_file):
+    """Decide la generación siguiente y devuelve {"generacion", "ruta", "anterior", "origen", "vacia"}; None si falla.
+
+    ``origen`` es la generación vigente, o db_file si aún no hay generaciones. La generación nueva empieza
+    vacía si no hay origen o con FORZAR_ACTUALIZACION; si no, es una copia del origen que abrir_generacion_sqlite
+    hace solo cuando alguna fuente tiene que guardarse, para que una ejecución sin cambios no copie la base de datos.
+    """
+    marcador = leer_marcador_generacion(db_file)
+    if marcador:
+        origen = os.path.join(os.path.dirname(os.path.abspath(db_file)), marcador["archivo"])
+    else:
+        origen = db_file if os.path.exists(db_file) else None
+    generacion = (marcador["generacion"] if marcador else 0) + 1
+    ruta = ruta_generacion(db_file, generacion)
+    try:
+        borrar_archivo_sqlite(ruta) # Restos de una carga anterior que no llegó a publicarse.
+    except OSError as e:
+        logging.error(f"No se pudo preparar la generación {generacion} en {ruta}: {e}")
+        return None
+    vacia = not origen or FORZAR_ACTUALIZACION
+    if vacia:
+        logging.info(f"Generación {generacion}: se construye desde cero en {ruta}.")
+    return {"generacion": generacion, "ruta": ruta, "anterior": marcador, "origen": origen, "vacia": vacia}
+
+def conectar_origen_sqlite(generacion):
+    """Conexión de solo lectura al origen de la generación (la vigente), del que se lee el estado de las fuentes."""
+    try:
+        return sqlite3.connect(f"{pathlib.Path(generacion['origen']).resolve().as_uri()}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        logging.error(f"Error al conectar a SQLite: {e}")
+        return None
+
+def abrir_generacion_sqlite(generacion):
+    """Copia el origen en el archivo de la generación (API de backup de SQLite) y lo abre con las tablas al día.
+    Devuelve la conexión, o None si falla."""
+    ruta, origen = generacion["ruta"], generacion["origen"]
+    try:
+        inicio = time.perf_counter()
+        fuente_db = sqlite3.connect(origen)
+        destino_db = sqlite3.connect(ruta)
+        try:
+            fuente_db.backup(destino_db)
+        finally:
+            destino_db.close(); fuente_db.close()
+        logging.info(f"Generación {generacion['generacion']}: copia de {origen} en {ruta} en {time.perf_counter() - inicio:.1f} s.")
+    except (sqlite3.Error, OSError) as e:
+        logging.error(f"No se pudo copiar {origen} en la generación {generacion['generacion']} ({ruta}): {e}")
+        return None
+    conn = conectar_db_sqlite(ruta)
+    if conn: crear_tablas_sqlite(conn)
+    return conn
+
+def validar_generacion_sqlite(conn, conteos_anteriores):
+    """Comprueba la generación antes de publicarla: integridad (PRAGMA quick_check), que haya entidades e
+    índice de nombres, y que ninguna fuente baje de VALIDACION_PROPORCION_MINIMA de las entidades que tenía.
+    Devuelve (es_válida, {fuente: entidades})."""
+    cursor = conn.cursor()
+    try:
+        resultado = cursor.execute("PRAGMA quick_check").fetchone()[0]
+        conteos = dict(cursor.execute("SELECT fuente_lista, COUNT(*) FROM Entidades GROUP BY fuente_lista").fetchall())
+        problemas = [] if resultado == "ok" else [f"quick_check: {resultado}"]
+        if not conteos:
+            problemas.append("la base de datos no tiene entidades")
+        elif not indice_nombres_sqlite_existe(conn) or not cursor.execute("SELECT EXISTS (SELECT 1 FROM NombresIndexados)").fetchone()[0]:
+            problemas.append("falta el índice de nombres")
+        for fuente, anterior in (conteos_anteriores or {}).items():
+            if conteos.get(fuente, 0) < anterior * VALIDACION_PROPORCION_MINIMA:
+                problemas.append(f"{fuente} tiene {conteos.get(fuente, 0)} entidades frente a {anterior} en la generación anterior")
+    except sqlite3.Error as e:
+        conteos, problemas = {}, [str(e)]
+    for problema in problemas:
+        logging.error(f"Validación de la generación: {problema}")
+    return not problemas, conteos
+
+def escribir_indice_nombres(ruta, generacion):
+    """Escribe el índice de nombres del servidor (name_matching.NameIndex) de la generación ``ruta`` en
+    ruta_indice_nombres(ruta). Se llama con la base de datos ya terminada, porque el índice guarda su número de
+    generación, nombre, tamaño y fecha de modificación, y el servidor lo descarta si no coinciden.
+    Devuelve la ruta del índice, o None si no se pudo escribir (el servidor construirá el índice por su cuenta)."""
+    ruta_indice = ruta_indice_nombres(ruta)
+    try:
+        conn = sqlite3.connect(ruta)
+        try:
+            indice = NameIndex.load(conn, None)
+        finally:
+            conn.close()
+        st = os.stat(ruta)
+        write_name_index(ruta_indice, indice, {"generacion": generacion, "base_datos": os.path.basename(ruta), "tamano": st.st_size, "mtime_ns": st.st_mtime_ns})
+    except (sqlite3.Error, OSError) as e:
+        logging.warning(f"No se pudo escribir el índice de nombres precompilado {ruta_indice}: {e}")
+        return None
+    logging.info(f"Índice de nombres precompilado escrito en {ruta_indice} ({os.path.getsize(ruta_indice) / 2**20:.1f} MiB).")
+    return ruta_indice
+
+def publicar_generacion_sqlite(db_file, generacion, conteos):
+    """Publica la generación: deja su archivo y su índice de nombres en solo lectura, sustituye atómicamente el
+    marcador y el enlace db_file, y borra las generaciones que exceden GENERACIONES_CONSERVADAS una vez pasado
+    PLAZO_BORRADO_GENERACIONES. Devuelve True si el marcador quedó publicado."""
+    ruta = ruta_generacion(db_file, generacion)
+    marcador = {"generacion": generacion, "archivo": os.path.basename(ruta), "publicada": time.strftime("%Y-%m-%dT%H:%M:%S"), "entidades": conteos}
+    ruta_marcador = db_file + SUFIJO_MARCADOR_GENERACION
+    for archivo in (ruta, ruta_indice_nombres(ruta)):
+        try: os.chmod(archivo, stat.S_IMODE(os.stat(archivo).st_mode) & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+        except FileNotFoundError: pass
+        except OSError as e: logging.warning(f"No se pudo dejar {archivo} en solo lectura: {e}")
+    try:
+        with open(ruta_marcador + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(marcador, f, ensure_ascii=False, indent=2)
+        os.replace(ruta_marcador + ".tmp", ruta_marcador)
+    except OSError as e:
+        logging.error(f"No se pudo publicar la generación {generacion}: {e}")
+        return False
+    logging.info(f"Generación {generacion} publicada ({ruta}).")
+
+    # db_file sigue sirviendo a herramientas que abren el archivo directamente. Es un enlace simbólico (relativo,
+    # en el mismo directorio), no un enlace duro: quien lo abra para escribir no modifica el inodo que el servidor
+    # tiene abierto con immutable=1 sin darse cuenta, porque la generación es de solo lectura. Si el sistema no
+    # permite enlaces simbólicos se usa un enlace duro, y si no permite sustituirlo (p. ej. Windows con el
+    # archivo abierto) basta con el marcador.
+    try:
+        if os.path.lexists(db_file + ".tmp"): os.remove(db_file + ".tmp")
+        try: os.symlink(os.path.basename(ruta), db_file + ".tmp")
+        except (OSError, NotImplementedError): os.link(ruta, db_file + ".tmp")
+        os.replace(db_file + ".tmp", db_file)
+        for sufijo in ("-wal", "-shm"): # Restos de cuando db_file se escribía directamente en modo WAL.
+            try: os.remove(db_file + sufijo)
+            except FileNotFoundError: pass
+    except OSError as e:
+        logging.warning(f"No se pudo actualizar {db_file} como enlace a la generación {generacion}: {e}")
+
+    # La fecha de modificación de una generación publicada es la de su publicación (no se vuelve a escribir).
+    ahora = time.time()
+    try: publicada_siguiente = os.path.getmtime(ruta_generacion(db_file, generacion - GENERACIONES_CONSERVADAS + 1))
+    except OSError: publicada_siguiente = ahora
+    for antigua in range(generacion - GENERACIONES_CONSERVADAS, 0, -1):
+        ruta_antigua = ruta_generacion(db_file, antigua)
+        if not os.path.exists(ruta_antigua): break
+        publicada = os.path.getmtime(ruta_antigua)
+        if ahora - publicada_siguiente < PLAZO_BORRADO_GENERACIONES:
+            logging.info(f"La generación {antigua} se conserva hasta que pasen {PLAZO_BORRADO_GENERACIONES} s desde que se publicó la siguiente.")
+        else:
+            try:
+                borrar_archivo_sqlite(ruta_antigua)
+            except OSError as e:
+                logging.warning(f"No se pudo borrar la generación {antigua}: {e}")
+        publicada_siguiente = publicada
+    return True
+
 # --- FIN: NUEVAS FUNCIONES DE BASE DE DATOS SQLite ---
 
 # --- Funciones de Base de Datos PostgreSQL (Originales) ---
-def conectar_db_postgres():
+def conectar_db_postgres(**opciones):
+    """Conecta con las variables DB_*; ``opciones`` se pasan a psycopg2.connect (p. ej. cursor_factory en server.py)."""
     try:
-        conn = psycopg2.connect(host=os.environ.get('DB_HOST'), database=os.environ.get('DB_NAME'), user=os.environ.get('DB_USER'), password=os.environ.get('DB_PASSWORD'), port=os.environ.get('DB_PORT', '5432'))
+        conn = psycopg2.connect(host=os.environ.get('DB_HOST'), database=os.environ.get('DB_NAME'), user=os.environ.get('DB_USER'), password=os.environ.get('DB_PASSWORD'), port=os.environ.get('DB_PORT', '5432'), **opciones)
         logging.info("Conexión exitosa a la base de datos PostgreSQL.")
         return conn
     except Exception as e: logging.error(f"Error al conectar a PostgreSQL: {e}"); return None
@@ -654,140 +1463,680 @@ def crear_tablas_postgres(conn):
         cursor.execute("""CREATE TABLE IF NOT EXISTS Programas (id SERIAL PRIMARY KEY, entidad_uid TEXT REFERENCES Entidades (uid) ON DELETE CASCADE, programa TEXT, UNIQUE(entidad_uid, programa))""")
         cursor.execute("""CREATE TABLE IF NOT EXISTS Identificadores (id SERIAL PRIMARY KEY, entidad_uid TEXT REFERENCES Entidades (uid) ON DELETE CASCADE, tipo_identificador TEXT, numero_identificador TEXT, pais_emisor TEXT, comentarios TEXT, UNIQUE(entidad_uid, tipo_identificador, numero_identificador))""")
         cursor.execute("""CREATE TABLE IF NOT EXISTS CaracteristicasAdicionales (id SERIAL PRIMARY KEY, entidad_uid TEXT REFERENCES Entidades (uid) ON DELETE CASCADE, tipo_caracteristica TEXT, valor_caracteristica TEXT, UNIQUE(entidad_uid, tipo_caracteristica, valor_caracteristica))""")
+        # Tablas derivadas para la búsqueda de server.py con SEARCH_BACKEND=postgres: las claves fonéticas de cada
+        # nombre (principal y alias) y las fechas de nacimiento y nacionalidades interpretadas (ver TABLAS_ATRIBUTOS_SQLITE).
+        # Si alguna es nueva en una base de datos ya cargada, se olvidan las huellas y el estado de las fuentes
+        # para que la siguiente ejecución vuelva a cargar todas las entidades y la rellene.
+        cursor.execute("SELECT bool_or(to_regclass(tabla) IS NULL) FROM unnest(%s) AS tabla", (["clavesfoneticas", "fechasnacimiento", "nacionalidades"],))
+        derivadas_nuevas = cursor.fetchone()[0]
+        cursor.execute("""CREATE TABLE IF NOT EXISTS ClavesFoneticas (id SERIAL PRIMARY KEY, entidad_uid TEXT REFERENCES Entidades (uid) ON DELETE CASCADE, nombre TEXT, clave TEXT, UNIQUE(entidad_uid, nombre, clave))""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS FechasNacimiento (id SERIAL PRIMARY KEY, entidad_uid TEXT REFERENCES Entidades (uid) ON DELETE CASCADE, anio INTEGER, mes INTEGER, dia INTEGER, UNIQUE(entidad_uid, anio, mes, dia))""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS Nacionalidades (id SERIAL PRIMARY KEY, entidad_uid TEXT REFERENCES Entidades (uid) ON DELETE CASCADE, codigo_pais TEXT, UNIQUE(entidad_uid, codigo_pais))""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS HuellasEntidades (entidad_uid TEXT PRIMARY KEY REFERENCES Entidades (uid) ON DELETE CASCADE, fuente_lista TEXT, huella TEXT)""")
+        cursor.execute("""CREATE TABLE IF NOT EXISTS EstadoFuentes (fuente_lista TEXT PRIMARY KEY, sha256 TEXT, etag TEXT, last_modified TEXT, fecha_carga TIMESTAMP WITHOUT TIME ZONE DEFAULT CURRENT_TIMESTAMP)""")
+        if derivadas_nuevas:
+            cursor.execute("DELETE FROM HuellasEntidades")
+            cursor.execute("DELETE FROM EstadoFuentes")
+        # Las tablas de carga permanentes de versiones anteriores; ahora son temporales de cada guardado.
+        cursor.execute("DROP TABLE IF EXISTS " + ", ".join(tabla_carga_postgres(tabla) for tabla in COLUMNAS_CARGA_POSTGRES))
         conn.commit(); logging.info("Todas las tablas verificadas/creadas en PostgreSQL.")
-    except psycopg2.Error as e: logging.error(f"Error al crear/verificar las tablas en PostgreSQL: {e}"); conn.rollback()
+    except psycopg2.Error as e: logging.error(f"Error al crear/verificar las tablas en PostgreSQL: {e}"); conn.rollback(); return
+    crear_indices_busqueda_postgres(conn)
+
+# Índices GIN de trigramas (pg_trgm) para la búsqueda de server.py con SEARCH_BACKEND=postgres, sobre
+# texto_busqueda(columna): candidatos por similitud de nombre y filtros LIKE '%...%' por ID, fecha de
+# nacimiento y nacionalidad.
+INDICES_TRIGRAMAS_POSTGRES = {
+    "idx_entidades_nombre_trgm": ("Entidades", "nombre_principal"),
+    "idx_alias_nombre_trgm": ("Alias", "nombre_alias"),
+    "idx_identificadores_numero_trgm": ("Identificadores", "numero_identificador"),
+    "idx_caracteristicas_valor_trgm": ("CaracteristicasAdicionales", "valor_caracteristica"),
+}
+
+def extension_postgres(cursor, nombre):
+    """Crea la extensión si no existe y devuelve el esquema en que está instalada, o None si no se puede
+    (no está instalada en el servidor o el usuario no tiene permiso)."""
+    try:
+        cursor.execute("SAVEPOINT extension")
+        cursor.execute(f"CREATE EXTENSION IF NOT EXISTS {nombre}")
+        cursor.execute("RELEASE SAVEPOINT extension")
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT extension")
+        logging.warning(f"No se pudo crear la extensión {nombre} de PostgreSQL: {e}".strip())
+    cursor.execute("SELECT extnamespace::regnamespace::text FROM pg_extension WHERE extname = %s", (nombre,))
+    fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+def crear_indices_busqueda_postgres(conn):
+    """Prepara la búsqueda de server.py con SEARCH_BACKEND=postgres: las extensiones pg_trgm y unaccent, la
+    función texto_busqueda() (minúsculas y sin acentos; IMMUTABLE para poder indexarla) y los índices de
+    nombres, de claves fonéticas, de años de nacimiento y de nacionalidades. Sin pg_trgm no se crean los índices de trigramas y el servidor recorre todos los nombres; sin
+    unaccent, texto_busqueda() solo pasa a minúsculas."""
+    try:
+        cursor = conn.cursor()
+        esquema_trgm = extension_postgres(cursor, "pg_trgm")
+        esquema_unaccent = extension_postgres(cursor, "unaccent")
+        # Las funciones se cualifican con su esquema: los índices se evalúan también con otro search_path.
+        cursor.execute("SELECT to_regprocedure('texto_busqueda(text)') IS NULL")
+        if cursor.fetchone()[0]:
+            cuerpo = f"lower({esquema_unaccent}.unaccent('{esquema_unaccent}.unaccent'::regdictionary, texto))" if esquema_unaccent else "lower(texto)"
+            cursor.execute(f"CREATE FUNCTION texto_busqueda(texto TEXT) RETURNS TEXT LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$ SELECT {cuerpo} $$")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_entidades_nombre_principal ON Entidades (nombre_principal)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alias_nombre ON Alias (nombre_alias)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_claves_foneticas_clave ON ClavesFoneticas (clave)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fechas_nacimiento_anio ON FechasNacimiento (anio, mes, dia, entidad_uid)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_nacionalidades_codigo ON Nacionalidades (codigo_pais, entidad_uid)")
+        if esquema_trgm:
+            for indice, (tabla, columna) in INDICES_TRIGRAMAS_POSTGRES.items():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {indice} ON {tabla} USING gin (texto_busqueda({columna}) {esquema_trgm}.gin_trgm_ops)")
+        else:
+            logging.warning("Sin pg_trgm no se crean los índices de trigramas: la búsqueda en PostgreSQL recorrerá todos los nombres.")
+        conn.commit(); logging.info("Índices de búsqueda verificados/creados en PostgreSQL.")
+    except psycopg2.Error as e: logging.error(f"Error al crear los índices de búsqueda en PostgreSQL: {e}"); conn.rollback()
 
 def limpiar_tablas_postgres(conn):
     try:
         cursor = conn.cursor(); logging.info("Limpiando tablas existentes (TRUNCATE)...")
-        cursor.execute("TRUNCATE TABLE Alias, Direcciones, Programas, Identificadores, CaracteristicasAdicionales, Entidades RESTART IDENTITY CASCADE")
+        cursor.execute("TRUNCATE TABLE Alias, Direcciones, Programas, Identificadores, CaracteristicasAdicionales, ClavesFoneticas, FechasNacimiento, Nacionalidades, HuellasEntidades, Entidades, EstadoFuentes RESTART IDENTITY CASCADE")
         conn.commit(); logging.info("Tablas limpiadas exitosamente.")
     except psycopg2.Error as e: logging.error(f"Error al limpiar las tablas: {e}"); conn.rollback()
 
+# --- Carga en PostgreSQL con COPY ---
+# Cada fuente se vuelca, en una sola pasada por sus entidades, a archivos temporales en formato de texto de
+# COPY; cada archivo se envía con COPY ... FROM STDIN a su tabla de carga y desde ahí se fusiona con la
+# tabla definitiva con un único INSERT ... SELECT ... ON CONFLICT por tabla. Las tablas de carga son
+# temporales (sin WAL, propias de la sesión y borradas al confirmar), así que dos cargas simultáneas no se
+# mezclan. Como en guardar_delta_sqlite, solo se tocan las entidades cuya huella ha cambiado. Todo el
+# guardado de la fuente es una sola transacción.
+COLUMNAS_CARGA_POSTGRES = {
+    "Entidades": ("uid", "nombre_principal", "tipo", "fuente_lista", "huella"),
+    "Alias": ("entidad_uid", "nombre_alias", "tipo_alias", "idioma_escritura"),
+    "Direcciones": ("entidad_uid", "calle1", "ciudad", "pais", "codigo_postal", "direccion_completa", "region", "lugar", "po_box"),
+    "Programas": ("entidad_uid", "programa"),
+    "Identificadores": ("entidad_uid", "tipo_identificador", "numero_identificador", "pais_emisor", "comentarios"),
+    "CaracteristicasAdicionales": ("entidad_uid", "tipo_caracteristica", "valor_caracteristica"),
+    "ClavesFoneticas": ("entidad_uid", "nombre", "clave"),
+    "FechasNacimiento": ("entidad_uid", "anio", "mes", "dia"),
+    "Nacionalidades": ("entidad_uid", "codigo_pais"),
+}
+# Columnas de las tablas de carga que no son TEXT (las de destino son INTEGER y el INSERT ... SELECT no convierte).
+TIPOS_CARGA_POSTGRES = {"anio": "INTEGER", "mes": "INTEGER", "dia": "INTEGER"}
+# Restricción UNIQUE de cada tabla hija, para su ON CONFLICT.
+CONFLICTOS_CARGA_POSTGRES = {
+    "Alias": "(entidad_uid, nombre_alias, tipo_alias, idioma_escritura)",
+    "Direcciones": "(entidad_uid, direccion_completa)",
+    "Programas": "(entidad_uid, programa)",
+    "Identificadores": "(entidad_uid, tipo_identificador, numero_identificador)",
+    "CaracteristicasAdicionales": "(entidad_uid, tipo_caracteristica, valor_caracteristica)",
+    "ClavesFoneticas": "(entidad_uid, nombre, clave)",
+    "FechasNacimiento": "(entidad_uid, anio, mes, dia)",
+    "Nacionalidades": "(entidad_uid, codigo_pais)",
+}
+ESCAPES_COPY_POSTGRES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+def tabla_carga_postgres(tabla):
+    return f"Carga{tabla}"
+
+def linea_copy_postgres(valores):
+    """Una fila en el formato de texto de COPY: campos separados por tabuladores, NULL como \\N."""
+    return "\t".join("\\N" if valor is None else str(valor).translate(ESCAPES_COPY_POSTGRES) for valor in valores) + "\n"
+
+def filas_entidad_postgres(entidad_data_dict, fuente_lista_actual):
+    """Devuelve {tabla: [tupla de valores, ...]} con la fila de Entidades (con su huella) y las filas hijas de la
+    entidad, o None si no tiene UID ni nombre principal. Las filas hijas sin su valor principal no se guardan."""
+    uid = entidad_data_dict.get('uid')
+    nombre_principal = entidad_data_dict.get('nombre_principal')
+    if not uid and nombre_principal:
+        entidad_uid_str = f"{fuente_lista_actual}_NO_UID_{nombre_principal[:40].replace(' ', '_').replace('/', '_').replace(':', '_')}"
+    elif not uid and not nombre_principal:
+        return None
+    else:
+        entidad_uid_str = str(uid)
+    huella = entidad_data_dict.get('huella') or huella_entidad(entidad_data_dict)
+    nombres = [nombre_principal] + [alias.get('nombre_alias') for alias in entidad_data_dict.get('aliases', [])]
+    fechas, paises = filas_atributos(entidad_uid_str, [(caracteristica.get('tipo_caracteristica'), caracteristica.get('valor_caracteristica')) for caracteristica in entidad_data_dict.get('caracteristicas', [])])
+    return {
+        "Entidades": [(entidad_uid_str, nombre_principal, entidad_data_dict.get('tipo'), fuente_lista_actual, huella)],
+        "Alias": [(entidad_uid_str, alias.get('nombre_alias'), alias.get('tipo_alias'), alias.get('idioma_escritura')) for alias in entidad_data_dict.get('aliases', []) if alias.get('nombre_alias')],
+        "Direcciones": [(entidad_uid_str, direccion.get('calle1'), direccion.get('ciudad'), direccion.get('pais'), direccion.get('codigo_postal'), direccion.get('direccion_completa'), direccion.get('region'), direccion.get('lugar'), direccion.get('po_box')) for direccion in entidad_data_dict.get('direcciones', []) if direccion.get('direccion_completa')],
+        "Programas": [(entidad_uid_str, programa_item) for programa_item in entidad_data_dict.get('programas', []) if programa_item],
+        "Identificadores": [(entidad_uid_str, identificador.get('tipo_identificador'), identificador.get('numero_identificador'), identificador.get('pais_emisor'), identificador.get('comentarios')) for identificador in entidad_data_dict.get('identificadores', []) if identificador.get('numero_identificador')],
+        "CaracteristicasAdicionales": [(entidad_uid_str, caracteristica.get('tipo_caracteristica'), caracteristica.get('valor_caracteristica')) for caracteristica in entidad_data_dict.get('caracteristicas', []) if caracteristica.get('valor_caracteristica')],
+        "ClavesFoneticas": list(dict.fromkeys((entidad_uid_str, nombre, clave) for nombre in nombres if nombre for clave in sorted(phonetic_keys(transliterate(nombre))))),
+        "FechasNacimiento": fechas,
+        "Nacionalidades": paises,
+    }
+
+# Entidades de la carga cuya huella no coincide con la guardada (todas en MODO_CARGA=completa). Un UID repetido
+# en la lista combina las huellas de sus apariciones, en orden.
+SQL_CAMBIOS_CARGA_POSTGRES = """
+    CREATE TEMPORARY TABLE CambiosCarga ON COMMIT DROP AS
+    SELECT c.uid, c.huella, e.uid IS NULL AS nueva
+    FROM (SELECT uid, CASE WHEN COUNT(*) = 1 THEN MIN(huella) ELSE md5(string_agg(huella, '' ORDER BY orden)) END AS huella
+          FROM CargaEntidades GROUP BY uid) c
+    LEFT JOIN HuellasEntidades h ON h.entidad_uid = c.uid
+    LEFT JOIN Entidades e ON e.uid = c.uid
+    WHERE %(completa)s OR e.uid IS NULL OR h.huella IS DISTINCT FROM c.huella"""
+SQL_ENTIDADES_CARGA_POSTGRES = """
+    INSERT INTO Entidades (uid, nombre_principal, tipo, fuente_lista)
+    SELECT DISTINCT ON (c.uid) c.uid, c.nombre_principal, c.tipo, c.fuente_lista
+    FROM CargaEntidades c JOIN CambiosCarga USING (uid) ORDER BY c.uid, c.orden DESC
+    ON CONFLICT (uid) DO UPDATE SET nombre_principal = EXCLUDED.nombre_principal, tipo = EXCLUDED.tipo, fuente_lista = EXCLUDED.fuente_lista, fecha_actualizacion_registro = CURRENT_TIMESTAMP"""
+
 def guardar_datos_en_db_postgres(conn, lista_entidades, fuente_lista_actual):
-    if not lista_entidades:
-        logging.warning(f"La lista de entidades para guardar de {fuente_lista_actual} está vacía.")
-        return
+    """Aplica a PostgreSQL las entidades de la fuente con COPY y una fusión por tabla, en una única transacción:
+    si algo falla, la fuente conserva los datos de la carga anterior.
 
-    logging.info(f"Iniciando guardado de {len(lista_entidades)} entidades de {fuente_lista_actual} en PostgreSQL usando execute_values...")
+    Las entidades que ya no están en la lista se borran (en cascada); de las nuevas o con otra huella se
+    sustituyen las filas hijas, y las demás no se tocan. Devuelve el informe de cambios, como
+    guardar_delta_sqlite, más "rendimiento": {"filas", "segundos", "filas_por_segundo", "tablas"} (las filas
+    son las que se envían con COPY), o None si hubo un error o la lista no pasa carga_suficiente.
+    """
+    logging.info(f"Iniciando guardado de entidades de {fuente_lista_actual} en PostgreSQL con COPY...")
     cursor = conn.cursor()
-    
-    entidades_data_tuples, alias_data_tuples, direcciones_data_tuples, programas_data_tuples, identificadores_data_tuples, caracteristicas_data_tuples = [], [], [], [], [], []
-    TRANSACTION_BATCH_SIZE = 200 
-    EXECUTE_VALUES_PAGE_SIZE = 100 
-    ent_proc_total = 0
+    inicio = time.perf_counter()
+    archivos = {tabla: tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='\n') for tabla in COLUMNAS_CARGA_POSTGRES}
+    filas_por_tabla = dict.fromkeys(COLUMNAS_CARGA_POSTGRES, 0)
+    tablas = {}
 
     try:
-        for i, entidad_data_dict in enumerate(lista_entidades):
-            uid = entidad_data_dict.get('uid')
-            nombre_principal = entidad_data_dict.get('nombre_principal')
-            tipo = entidad_data_dict.get('tipo')
-
-            if not uid and nombre_principal:
-                entidad_uid_str = f"{fuente_lista_actual}_NO_UID_{nombre_principal[:40].replace(' ', '_').replace('/', '_').replace(':', '_')}"
-            elif not uid and not nombre_principal:
+        # Cada fila lleva su número de orden en la lista, para respetarlo al fusionar.
+        for entidad_data_dict in lista_entidades:
+            filas = filas_entidad_postgres(entidad_data_dict, fuente_lista_actual)
+            if filas is None:
                 logging.warning(f"Entidad de {fuente_lista_actual} sin UID ni nombre principal. Saltando: {entidad_data_dict}")
                 continue
-            else:
-                entidad_uid_str = str(uid)
-
-            entidades_data_tuples.append((entidad_uid_str, nombre_principal, tipo, fuente_lista_actual))
-            for alias in entidad_data_dict.get('aliases', []):
-                if alias.get('nombre_alias'): alias_data_tuples.append((entidad_uid_str, alias.get('nombre_alias'), alias.get('tipo_alias'), alias.get('idioma_escritura')))
-            for direccion in entidad_data_dict.get('direcciones', []):
-                 if direccion.get('direccion_completa'): direcciones_data_tuples.append((entidad_uid_str, direccion.get('calle1'), direccion.get('ciudad'), direccion.get('pais'), direccion.get('codigo_postal'), direccion.get('direccion_completa'), direccion.get('region'), direccion.get('lugar'), direccion.get('po_box')))
-            for programa_item in entidad_data_dict.get('programas', []):
-                if programa_item: programas_data_tuples.append((entidad_uid_str, programa_item))
-            for identificador in entidad_data_dict.get('identificadores', []):
-                if identificador.get('numero_identificador'): identificadores_data_tuples.append((entidad_uid_str, identificador.get('tipo_identificador'), identificador.get('numero_identificador'), identificador.get('pais_emisor'), identificador.get('comentarios')))
-            for caracteristica in entidad_data_dict.get('caracteristicas', []):
-                if caracteristica.get('valor_caracteristica'): caracteristicas_data_tuples.append((entidad_uid_str, caracteristica.get('tipo_caracteristica'), caracteristica.get('valor_caracteristica')))
-            
-            ent_proc_total += 1
-
-            if (i + 1) % TRANSACTION_BATCH_SIZE == 0 or (i + 1) == len(lista_entidades):
-                if entidades_data_tuples:
-                    sql_entidades = "INSERT INTO Entidades (uid, nombre_principal, tipo, fuente_lista) VALUES %s ON CONFLICT (uid) DO UPDATE SET nombre_principal = EXCLUDED.nombre_principal, tipo = EXCLUDED.tipo, fuente_lista = EXCLUDED.fuente_lista, fecha_actualizacion_registro = CURRENT_TIMESTAMP"
-                    execute_values(cursor, sql_entidades, entidades_data_tuples, page_size=EXECUTE_VALUES_PAGE_SIZE)
-                    entidades_data_tuples = []
-                if alias_data_tuples:
-                    sql_alias = "INSERT INTO Alias (entidad_uid, nombre_alias, tipo_alias, idioma_escritura) VALUES %s ON CONFLICT (entidad_uid, nombre_alias, tipo_alias, idioma_escritura) DO NOTHING"
-                    execute_values(cursor, sql_alias, alias_data_tuples, page_size=EXECUTE_VALUES_PAGE_SIZE)
-                    alias_data_tuples = []
-                if direcciones_data_tuples:
-                    sql_direcciones = "INSERT INTO Direcciones (entidad_uid, calle1, ciudad, pais, codigo_postal, direccion_completa, region, lugar, po_box) VALUES %s ON CONFLICT (entidad_uid, direccion_completa) DO NOTHING"
-                    execute_values(cursor, sql_direcciones, direcciones_data_tuples, page_size=EXECUTE_VALUES_PAGE_SIZE)
-                    direcciones_data_tuples = []
-                if programas_data_tuples:
-                    sql_programas = "INSERT INTO Programas (entidad_uid, programa) VALUES %s ON CONFLICT (entidad_uid, programa) DO NOTHING"
-                    execute_values(cursor, sql_programas, programas_data_tuples, page_size=EXECUTE_VALUES_PAGE_SIZE)
-                    programas_data_tuples = []
-                if identificadores_data_tuples:
-                    sql_identificadores = "INSERT INTO Identificadores (entidad_uid, tipo_identificador, numero_identificador, pais_emisor, comentarios) VALUES %s ON CONFLICT (entidad_uid, tipo_identificador, numero_identificador) DO NOTHING"
-                    execute_values(cursor, sql_identificadores, identificadores_data_tuples, page_size=EXECUTE_VALUES_PAGE_SIZE)
-                    identificadores_data_tuples = []
-                if caracteristicas_data_tuples:
-                    sql_caracteristicas = "INSERT INTO CaracteristicasAdicionales (entidad_uid, tipo_caracteristica, valor_caracteristica) VALUES %s ON CONFLICT (entidad_uid, tipo_caracteristica, valor_caracteristica) DO NOTHING"
-                    execute_values(cursor, sql_caracteristicas, caracteristicas_data_tuples, page_size=EXECUTE_VALUES_PAGE_SIZE)
-                    caracteristicas_data_tuples = []
-                conn.commit()
-                logging.info(f"Commit de transacción realizado después de procesar {ent_proc_total} entidades principales de {fuente_lista_actual}.")
-        
-        logging.info(f"Guardado de {fuente_lista_actual} completado. Total entidades principales procesadas: {ent_proc_total}.")
+            for tabla, filas_tabla in filas.items():
+                for fila in filas_tabla:
+                    filas_por_tabla[tabla] += 1
+                    archivos[tabla].write(linea_copy_postgres((filas_por_tabla[tabla],) + fila))
+
+        if not carga_suficiente(fuente_lista_actual, filas_por_tabla["Entidades"], contar_entidades_fuente(cursor, fuente_lista_actual, "%s")):
+            conn.rollback()
+            return None
+
+        for tabla, columnas in COLUMNAS_CARGA_POSTGRES.items():
+            inicio_tabla = time.perf_counter()
+            definiciones = ", ".join(f"{columna} {TIPOS_CARGA_POSTGRES.get(columna, 'TEXT')}" for columna in columnas)
+            cursor.execute(f"CREATE TEMPORARY TABLE {tabla_carga_postgres(tabla)} (orden BIGINT, {definiciones}) ON COMMIT DROP")
+            archivos[tabla].seek(0)
+            cursor.copy_expert(f"COPY {tabla_carga_postgres(tabla)} (orden, {', '.join(columnas)}) FROM STDIN", archivos[tabla])
+            tablas[tabla] = {"filas": filas_por_tabla[tabla], "copia": time.perf_counter() - inicio_tabla}
+
+        inicio_tabla = time.perf_counter()
+        cursor.execute(SQL_CAMBIOS_CARGA_POSTGRES, {"completa": MODO_CARGA != 'delta'})
+        cursor.execute("DELETE FROM Entidades e WHERE e.fuente_lista = %s AND NOT EXISTS (SELECT 1 FROM CargaEntidades c WHERE c.uid = e.uid) RETURNING e.uid", (fuente_lista_actual,))
+        eliminadas = sorted(uid for (uid,) in cursor.fetchall())
+        cursor.execute(SQL_ENTIDADES_CARGA_POSTGRES)
+        cursor.execute("INSERT INTO HuellasEntidades (entidad_uid, fuente_lista, huella) SELECT uid, %s, huella FROM CambiosCarga ON CONFLICT (entidad_uid) DO UPDATE SET fuente_lista = EXCLUDED.fuente_lista, huella = EXCLUDED.huella", (fuente_lista_actual,))
+        tablas["Entidades"]["fusion"] = time.perf_counter() - inicio_tabla
+        for tabla, conflicto in CONFLICTOS_CARGA_POSTGRES.items():
+            inicio_tabla = time.perf_counter()
+            columnas = ", ".join(COLUMNAS_CARGA_POSTGRES[tabla])
+            cursor.execute(f"DELETE FROM {tabla} WHERE entidad_uid IN (SELECT uid FROM CambiosCarga WHERE NOT nueva)")
+            cursor.execute(f"INSERT INTO {tabla} ({columnas}) SELECT {columnas} FROM {tabla_carga_postgres(tabla)} WHERE entidad_uid IN (SELECT uid FROM CambiosCarga) ORDER BY orden ON CONFLICT {conflicto} DO NOTHING")
+            tablas[tabla]["fusion"] = time.perf_counter() - inicio_tabla
+
+        cursor.execute("SELECT uid, nueva FROM CambiosCarga ORDER BY uid")
+        cambios = cursor.fetchall()
+        cursor.execute("SELECT COUNT(DISTINCT uid) FROM CargaEntidades")
+        total_uids = cursor.fetchone()[0]
+        conn.commit()
+
+        segundos = time.perf_counter() - inicio
+        total_filas = sum(filas_por_tabla.values())
+        informe = {"añadidas": [uid for uid, nueva in cambios if nueva], "modificadas": [uid for uid, nueva in cambios if not nueva],
+                   "eliminadas": eliminadas, "sin_cambios": total_uids - len(cambios)}
+        for tabla, tiempos in tablas.items():
+            logging.info(f"  {tabla}: {tiempos['filas']} filas, COPY {tiempos['copia']:.2f} s, fusión {tiempos['fusion']:.2f} s")
+        logging.info(f"Guardado de {fuente_lista_actual} en PostgreSQL completado: {len(informe['añadidas'])} añadidas, {len(informe['modificadas'])} modificadas, {len(eliminadas)} eliminadas, {informe['sin_cambios']} sin cambios; {total_filas} filas en {segundos:.1f} s ({total_filas / max(segundos, 1e-9):.0f} filas/s).")
+        informe["rendimiento"] = {"filas": total_filas, "segundos": round(segundos, 3), "filas_por_segundo": round(total_filas / max(segundos, 1e-9)),
+                                  "tablas": {tabla: {clave: round(valor, 3) for clave, valor in tiempos.items()} for tabla, tiempos in tablas.items()}}
+        return informe
 
     except psycopg2.Error as e:
         logging.error(f"Error durante guardado de {fuente_lista_actual} en DB PostgreSQL: {e}")
-        try: conn.rollback(); logging.info("Rollback realizado debido a error en el lote.")
+        try: conn.rollback(); logging.info("Rollback realizado; la fuente conserva los datos de la carga anterior.")
         except psycopg2.Error as rb_error: logging.error(f"Error durante el rollback: {rb_error}. La conexión puede estar cerrada.")
-        if "closed the connection unexpectedly" in str(e).lower() or "connection already closed" in str(e).lower() or "no connection to the server" in str(e).lower():
-             logging.error("La conexión con el servidor se perdió. No se pueden procesar más lotes para esta fuente.")
+    except ET.ParseError:
+        logging.error(f"{fuente_lista_actual}: XML no válido; no se guarda ninguna entidad de esta fuente.")
+        conn.rollback()
     except Exception as general_e:
         logging.error(f"Error general inesperado durante guardado de {fuente_lista_actual}: {general_e}", exc_info=True)
         try: conn.rollback(); logging.info("Rollback realizado debido a error general.")
         except Exception as rb_general_error: logging.error(f"Error durante el rollback general: {rb_general_error}.")
+    finally:
+        for archivo in archivos.values():
+            archivo.close()
+    return None
+
+# --- Orquestación de la actualización: descargas concurrentes, análisis en procesos y un único escritor ---
+# Descargas simultáneas (hilos) y procesos que analizan los XML en paralelo; con PROCESOS_ANALISIS=0 cada
+# fuente se analiza en el proceso principal a medida que se guarda, como en la versión secuencial.
+DESCARGAS_CONCURRENTES = int(os.environ.get("DESCARGAS_CONCURRENTES", "4"))
+PROCESOS_ANALISIS = int(os.environ.get("PROCESOS_ANALISIS", str(min(len(SOURCES_CONFIG), os.cpu_count() or 1))))
+# "delta" (por defecto) aplica solo las entidades que han cambiado (ver guardar_delta_sqlite y
+# guardar_datos_en_db_postgres); "completa" sustituye todas las entidades de cada fuente que haya cambiado.
+MODO_CARGA = os.environ.get("MODO_CARGA", "delta")
+# Las generaciones SQLite que empiezan vacías se llenan con la carga rápida (ver iniciar_carga_rapida_sqlite); 0 usa el modo de MODO_CARGA.
+CARGA_RAPIDA_SQLITE = os.environ.get("CARGA_RAPIDA_SQLITE", "1") == "1"
+INFORME_CAMBIOS_FILE = os.environ.get("INFORME_CAMBIOS_FILE", "informe_cambios.json")
+# Cada ejecución deja en INFORMES_EJECUCION_DIR un informe JSON con tiempos, volumen y memoria por fuente (ver
+# informe_fuentes); con PERFILAR_ACTUALIZACION=1 también un perfil cProfile (.prof) por fuente y etapa.
+INFORMES_EJECUCION_DIR = os.environ.get("INFORMES_EJECUCION_DIR", "informes_ejecucion")
+PERFILAR_ACTUALIZACION = os.environ.get("PERFILAR_ACTUALIZACION", "0") == "1"
+# Lista de cada entidad analizada que se guarda en cada tabla hija (ver filas_hijas_entidad).
+LISTAS_TABLAS_HIJAS = {"Alias": "aliases", "Direcciones": "direcciones", "Programas": "programas", "Identificadores": "identificadores", "CaracteristicasAdicionales": "caracteristicas"}
+
+def agrupar_en_lotes(iterable, tamano):
+    """Genera listas de hasta ``tamano`` elementos consecutivos de ``iterable``."""
+    iterador = iter(iterable)
+    while True:
+        lote = list(itertools.islice(iterador, tamano))
+        if not lote: return
+        yield lote
+
+def huella_entidad(entidad):
+    """Huella del contenido de una entidad: SHA-256 de su JSON canónico (claves ordenadas)."""
+    return hashlib.sha256(json.dumps(entidad, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+def con_huellas(entidades):
+    """Añade a cada entidad su clave 'huella' a medida que el parser la genera."""
+    for entidad in entidades:
+        entidad['huella'] = huella_entidad(entidad)
+        yield entidad
+
+def contando_filas(entidades, filas):
+    """Cuenta en ``filas`` ({tabla: número}) las entidades y las filas hijas que genera el parser, a medida que pasan."""
+    for entidad in entidades:
+        filas["Entidades"] = filas.get("Entidades", 0) + 1
+        for tabla, lista in LISTAS_TABLAS_HIJAS.items():
+            filas[tabla] = filas.get(tabla, 0) + len(entidad.get(lista) or ())
+        yield entidad
+
+def ruta_perfil(directorio_perfiles, *partes):
+    """Ruta del perfil cProfile de una etapa dentro de ``directorio_perfiles``, o None si no se perfila."""
+    if directorio_perfiles is None: return None
+    return os.path.join(directorio_perfiles, "_".join(partes) + ".prof")
+
+@contextlib.contextmanager
+def perfilar(ruta):
+    """Perfila el bloque con cProfile y vuelca las estadísticas en ``ruta`` (no hace nada si es None).
+
+    No se usa en los hilos de descarga: cProfile solo ve el hilo que lo activa y, desde Python 3.12,
+    no admite dos perfiladores activos a la vez en el mismo proceso.
+    """
+    if ruta is None:
+        yield
+        return
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    try:
+        yield
+    finally:
+        perfilador.disable()
+        perfilador.dump_stats(ruta)
+
+def analizar_fuente_a_archivo(fuente_nombre, ruta_archivo_xml, ruta_lotes, directorio_perfiles=None):
+    """Se ejecuta en un proceso del pool: analiza el XML de la fuente y vuelca las entidades, por lotes
+    serializados con pickle, en ``ruta_lotes``, de modo que ni el proceso ni el escritor las tienen todas en memoria.
+
+    Devuelve el número de entidades, las filas por tabla, el intervalo de análisis (time.time(), comparable
+    entre procesos) y la memoria pico del proceso durante el análisis.
+    """
+    reiniciar_memoria_pico()
+    inicio = time.time()
+    total_entidades, filas = 0, {}
+    with perfilar(ruta_perfil(directorio_perfiles, fuente_nombre, "analisis")), open(ruta_lotes, 'wb') as f:
+        entidades = contando_filas(con_huellas(SOURCES_CONFIG[fuente_nombre]["parser_function"](ruta_archivo_xml)), filas)
+        for lote in agrupar_en_lotes(entidades, LOTE_GUARDADO_SQLITE):
+            pickle.dump(lote, f, protocol=pickle.HIGHEST_PROTOCOL)
+            total_entidades += len(lote)
+    return {"entidades": total_entidades, "filas": filas, "inicio": inicio, "fin": time.time(), "memoria_pico_mib": memoria_pico_mib()}
+
+def leer_lotes(ruta_lotes):
+    """Genera de una en una las entidades volcadas por analizar_fuente_a_archivo."""
+    with open(ruta_lotes, 'rb') as f:
+        while True:
+            try:
+                lote = pickle.load(f)
+            except EOFError:
+                return
+            yield from lote
+
+def descargar_y_analizar_fuente(fuente_nombre, config, estado_fuente, procesos, archivos_lotes, directorio_perfiles=None):
+    """Se ejecuta en un hilo de descarga: descarga la fuente (de forma condicional según ``estado_fuente``)
+    y, si su SHA-256 no coincide con el de la última carga, encarga su análisis al pool de procesos en
+    cuanto el XML está en disco, sin esperar a las demás fuentes.
+
+    Devuelve el resultado de descargar_archivo, el intervalo de la descarga y el futuro del análisis (o None).
+    """
+    inicio = time.time()
+    descarga = descargar_archivo(config["url"], config["local_filename"], fuente_nombre, estado_fuente)
+    fin, futuro_analisis = time.time(), None
+    if descarga and descarga["sha256"] == estado_fuente.get("sha256"):
+        descarga["sin_cambios"] = True
+    elif descarga and procesos is not None:
+        fd, ruta_lotes = tempfile.mkstemp(prefix=f"{fuente_nombre}_", suffix=".lotes")
+        os.close(fd)
+        archivos_lotes[fuente_nombre] = ruta_lotes
+        futuro_analisis = procesos.submit(analizar_fuente_a_archivo, fuente_nombre, descarga["ruta"], ruta_lotes, directorio_perfiles)
+    return descarga, inicio, fin, futuro_analisis
+
+def actualizar_fuentes(conn, tipo_bd, carga_rapida=False, directorio_perfiles=None, abrir_generacion=None):
+    """Descarga todas las fuentes a la vez, analiza cada una en un proceso del pool en cuanto termina su
+    descarga y las guarda con un único escritor, en el orden de SOURCES_CONFIG, a medida que están listas.
+    Las fuentes cuyo archivo tiene el mismo SHA-256 que en la última carga correcta no se analizan ni se guardan.
+
+    Con ``carga_rapida`` (solo SQLite, generación vacía) todas las fuentes se guardan en una única
+    transacción con guardar_carga_rapida_sqlite, que se confirma al final con terminar_carga_rapida_sqlite;
+    si no se confirma, ninguna fuente cuenta como guardada.
+
+    Con ``abrir_generacion`` (SQLite, generación que parte de la vigente), ``conn`` es la generación vigente,
+    de solo lectura, de la que se lee el estado de las fuentes; abrir_generacion() se llama al guardar la
+    primera fuente que ha cambiado y devuelve la conexión a la generación nueva.
+
+    Con ``directorio_perfiles``, el análisis y el guardado de cada fuente se perfilan con cProfile en ese directorio.
+
+    Devuelve la cronología por fuente (segundos desde el inicio de cada fase, bytes descargados, filas por
+    tabla y memoria pico), que registran registrar_cronologia e informe_fuentes, el informe de cambios de
+    cada fuente que se ha vuelto a guardar y la conexión en que se guardan (``conn``, o la de abrir_generacion;
+    None si no se ha abierto).
+    """
+    estado = {} if FORZAR_ACTUALIZACION else leer_estado_fuentes(conn)
+    conn_guardado = conn if abrir_generacion is None else None
+    carga = None
+    if tipo_bd == 'postgres': guardar = guardar_datos_en_db_postgres
+    elif carga_rapida:
+        carga = iniciar_carga_rapida_sqlite(conn)
+        guardar = functools.partial(guardar_carga_rapida_sqlite, carga=carga)
+    elif MODO_CARGA == 'delta': guardar = guardar_delta_sqlite
+    else: guardar = guardar_datos_en_db_sqlite
+    cronologia = {fuente_nombre: {} for fuente_nombre in SOURCES_CONFIG}
+    informes = {}
+    origen = time.time()
+    archivos_lotes = {}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, DESCARGAS_CONCURRENTES)) as descargas, \
+             (ProcessPoolExecutor(max_workers=PROCESOS_ANALISIS) if PROCESOS_ANALISIS > 0 else contextlib.nullcontext()) as procesos:
+            descargas_en_curso = {}
+            for fuente_nombre, config in SOURCES_CONFIG.items():
+                logging.info(f"--- Iniciando Proceso {fuente_nombre} ---")
+                descargas_en_curso[fuente_nombre] = descargas.submit(descargar_y_analizar_fuente, fuente_nombre, config, estado.get(fuente_nombre, {}), procesos, archivos_lotes, directorio_perfiles)
+
+            for fuente_nombre, futuro_descarga in descargas_en_curso.items():
+                tiempos = cronologia[fuente_nombre]
+                try:
+                    descarga, inicio_descarga, fin_descarga, futuro_analisis = futuro_descarga.result()
+                except Exception as e:
+                    logging.error(f"{fuente_nombre}: error inesperado en la descarga: {e}", exc_info=True)
+                    descarga = None
+                else:
+                    tiempos["descarga"] = (inicio_descarga - origen, fin_descarga - origen)
+                if not descarga:
+                    logging.error(f"{fuente_nombre}: No se pudo obtener el archivo XML. Saltando esta fuente.")
+                    logging.info(f"--- Proceso {fuente_nombre} Completado ---")
+                    continue
+                tiempos["bytes_descargados"] = descarga.get("bytes_descargados", 0)
+                tiempos["tamano_archivo"] = os.path.getsize(descarga["ruta"])
+                if descarga.get("sin_cambios"):
+                    tiempos["sin_cambios"] = True
+                    logging.info(f"{fuente_nombre}: el archivo no ha cambiado desde la última carga (SHA-256 {descarga['sha256'][:12]}…); no se analiza ni se guarda.")
+                    logging.info(f"--- Proceso {fuente_nombre} Completado ---")
+                    continue
+
+                if futuro_analisis is not None:
+                    try:
+                        resultado = futuro_analisis.result()
+                    except ET.ParseError:
+                        logging.error(f"{fuente_nombre}: XML no válido; no se guarda ninguna entidad de esta fuente.")
+                        logging.info(f"--- Proceso {fuente_nombre} Completado ---")
+                        continue
+                    except Exception as e:
+                        logging.error(f"{fuente_nombre}: error inesperado en el proceso de análisis: {e}", exc_info=True)
+                        logging.info(f"--- Proceso {fuente_nombre} Completado ---")
+                        continue
+                    tiempos["análisis"] = (resultado["inicio"] - origen, resultado["fin"] - origen)
+                    tiempos["memoria_pico_mib"] = resultado["memoria_pico_mib"]
+                    tiempos["filas"] = resultado["filas"]
+                    entidades_procesadas = leer_lotes(archivos_lotes[fuente_nombre])
+                else:
+                    # Sin procesos, el parser es un generador que se consume mientras se guarda.
+                    tiempos["filas"] = {}
+                    entidades_procesadas = contando_filas(con_huellas(SOURCES_CONFIG[fuente_nombre]["parser_function"](descarga["ruta"])), tiempos["filas"])
+
+                if conn_guardado is None:
+                    conn_guardado = abrir_generacion()
+                    if conn_guardado is None:
+                        logging.error(f"{fuente_nombre}: no se pudo abrir la generación nueva; no se guarda esta fuente.")
+                        logging.info(f"--- Proceso {fuente_nombre} Completado ---")
+                        continue
+                reiniciar_memoria_pico()
+                inicio_guardado = time.time()
+                with perfilar(ruta_perfil(directorio_perfiles, fuente_nombre, "guardado" if futuro_analisis is not None else "analisis_y_guardado")):
+                    resultado_guardado = guardar(conn_guardado, entidades_procesadas, fuente_nombre)
+                if resultado_guardado is not None:
+                    registrar_estado_fuente(conn_guardado, fuente_nombre, descarga, "%s" if tipo_bd == 'postgres' else "?", confirmar=carga is None)
+                    # Las cargas completas solo devuelven el número de entidades guardadas.
+                    informes[fuente_nombre] = resultado_guardado if isinstance(resultado_guardado, dict) else {"entidades": resultado_guardado}
+                tiempos["guardado" if futuro_analisis is not None else "análisis y guardado"] = (inicio_guardado - origen, time.time() - origen)
+                tiempos["memoria_pico_guardado_mib"] = memoria_pico_mib()
+                if futuro_analisis is None: tiempos["memoria_pico_mib"] = tiempos["memoria_pico_guardado_mib"]
+                logging.info(f"--- Proceso {fuente_nombre} Completado ---")
+        if carga is not None and not terminar_carga_rapida_sqlite(conn_guardado, carga):
+            # La transacción se ha deshecho con su estado de fuentes: ninguna fuente ha quedado guardada.
+            logging.error(f"Carga rápida no confirmada; fuentes sin guardar: {', '.join(informes) or 'ninguna'}.")
+            informes.clear()
+    finally:
+        # Los archivos de lotes se borran una vez que el pool ha terminado, también si el guardado falla.
+        for ruta_lotes in archivos_lotes.values():
+            try: os.remove(ruta_lotes)
+            except OSError: pass
+
+    cronologia["_total"] = time.time() - origen
+    return cronologia, informes, conn_guardado
+
+def registrar_cronologia(cronologia):
+    """Registra cuándo empezó y terminó cada fase de cada fuente y qué fase fue la más larga (la ruta crítica)."""
+    total = cronologia.pop("_total", None)
+    logging.info("Cronología de la actualización (segundos desde el inicio):")
+    fase_mas_larga, suma_fases = None, 0.0
+    for fuente_nombre, tiempos in cronologia.items():
+        partes = []
+        for fase in ("descarga", "análisis", "guardado", "análisis y guardado"):
+            if fase not in tiempos: continue
+            inicio, fin = tiempos[fase]
+            partes.append(f"{fase} {inicio:6.1f} → {fin:6.1f}")
+            suma_fases += fin - inicio
+            if fase_mas_larga is None or fin - inicio > fase_mas_larga[2]:
+                fase_mas_larga = (fuente_nombre, fase, fin - inicio)
+        if tiempos.get("sin_cambios"): partes.append("sin cambios")
+        pico = tiempos.get("memoria_pico_mib")
+        logging.info(f"  {fuente_nombre:<5} " + (" | ".join(partes) or "sin datos") + (f" | memoria pico {pico:.0f} MiB" if pico is not None else ""))
+    if total is not None:
+        logging.info(f"Actualización completada en {total:.1f} s (suma de las fases: {suma_fases:.1f} s)." +
+                     (f" Fase más larga: {fase_mas_larga[1]} de {fase_mas_larga[0]} ({fase_mas_larga[2]:.1f} s)." if fase_mas_larga else ""))
+
+def informe_fuentes(cronologia):
+    """Resume la cronología de actualizar_fuentes por fuente para el informe de ejecución: bytes descargados,
+    segundos de cada fase, entidades y filas por tabla, entidades por segundo y memoria pico en MiB.
+
+    Sin procesos de análisis, el análisis y el guardado van juntos y solo se informa de "analisis_y_guardado".
+    La memoria del análisis es la del proceso del pool; la del guardado, la del proceso principal (el escritor).
+    """
+    informe = {}
+    for fuente_nombre in SOURCES_CONFIG:
+        tiempos = cronologia.get(fuente_nombre, {})
+        fases = {}
+        for fase in ("descarga", "análisis", "guardado", "análisis y guardado"):
+            if fase not in tiempos: continue
+            inicio, fin = tiempos[fase]
+            fases[fase.replace("á", "a").replace(" ", "_")] = round(fin - inicio, 3)
+        filas = tiempos.get("filas", {})
+        entidades = filas.get("Entidades", 0)
+        fuente = {
+            "bytes_descargados": tiempos.get("bytes_descargados"),
+            "tamano_archivo": tiempos.get("tamano_archivo"),
+            "sin_cambios": tiempos.get("sin_cambios", False),
+            "segundos": fases,
+            "entidades": entidades,
+            "filas": filas,
+        }
+        for fase in ("analisis", "guardado", "analisis_y_guardado"):
+            if fases.get(fase): fuente[f"entidades_por_segundo_{fase}"] = round(entidades / fases[fase], 1)
+        for clave, valor in (("memoria_pico_analisis_mib", tiempos.get("memoria_pico_mib") if "análisis" in tiempos else None),
+                             ("memoria_pico_guardado_mib", tiempos.get("memoria_pico_guardado_mib"))):
+            fuente[clave] = round(valor, 1) if valor is not None else None
+        informe[fuente_nombre] = fuente
+    return informe
+
+@contextlib.contextmanager
+def etapa_ejecucion(etapas, nombre, directorio_perfiles=None):
+    """Anota en ``etapas[nombre]`` los segundos que tarda el bloque y, con ``directorio_perfiles``, lo perfila."""
+    inicio = time.time()
+    with perfilar(ruta_perfil(directorio_perfiles, nombre)):
+        yield
+    etapas[nombre] = round(time.time() - inicio, 3)
+
+def guardar_informe_ejecucion(informe, directorio=None):
+    """Escribe el informe de la ejecución en ``directorio`` con la fecha en el nombre, para poder comparar
+    las ejecuciones a lo largo del tiempo (los informes anteriores no se borran)."""
+    directorio = directorio or INFORMES_EJECUCION_DIR
+    ruta = os.path.join(directorio, f"ejecucion_{informe['id']}.json")
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        logging.info(f"Informe de ejecución guardado en {ruta}.")
+    except OSError as e:
+        logging.error(f"No se pudo escribir el informe de ejecución en {ruta}: {e}")
+
+def hay_cambios(informe):
+    """Indica si el guardado de una fuente ha modificado la BD (una carga completa siempre lo hace)."""
+    return "entidades" in informe or any(informe[clave] for clave in ("añadidas", "modificadas", "eliminadas"))
+
+def guardar_informe_cambios(informes, ruta=None):
+    """Escribe en JSON los UIDs añadidos, modificados y eliminados de cada fuente guardada en esta ejecución.
+    Si ninguna fuente ha cambiado no se escribe, para no sustituir el informe de la última ejecución con cambios."""
+    ruta = ruta or INFORME_CAMBIOS_FILE
+    if not any(hay_cambios(informe) for informe in informes.values()):
+        logging.info(f"Ninguna fuente ha cambiado: se conserva el informe de cambios de {ruta}.")
+        return
+    try:
+        with open(ruta, 'w', encoding='utf-8') as f:
+            json.dump({"fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "modo": MODO_CARGA, "fuentes": informes}, f, ensure_ascii=False, indent=2)
+        logging.info(f"Informe de cambios guardado en {ruta}.")
+    except OSError as e:
+        logging.error(f"No se pudo escribir el informe de cambios en {ruta}: {e}")
 
 # --- Flujo Principal de Ejecución (MODIFICADO) ---
 if __name__ == "__main__":
     # --- SELECCIONA TU BASE DE DATOS AQUÍ ---
-    # Cambia a 'postgres' para usar PostgreSQL o 'sqlite' para usar el archivo local.
-    USE_DATABASE_TYPE = 'sqlite' 
+    # Cambia a 'postgres' para usar PostgreSQL o 'sqlite' para usar el archivo local (también con la
+    # variable de entorno USE_DATABASE_TYPE).
+    USE_DATABASE_TYPE = os.environ.get('USE_DATABASE_TYPE', 'sqlite').strip().lower()
 
     conn = None
+    generacion = None
     if USE_DATABASE_TYPE == 'postgres':
         conn = conectar_db_postgres()
     elif USE_DATABASE_TYPE == 'sqlite':
-        conn = conectar_db_sqlite("sanctions_lists.db") # El archivo se creará en la misma carpeta
-    
+        # La carga se hace sobre la generación siguiente (ver preparar_generacion_sqlite); el servidor sigue
+        # leyendo la vigente hasta que esta se publica. Si la nueva parte de la vigente, el estado de las
+        # fuentes se lee de la vigente y la copia se hace solo si alguna fuente cambia (abrir_generacion_sqlite).
+        generacion = preparar_generacion_sqlite(SQLITE_DB_FILE)
+        if generacion:
+            conn = conectar_db_sqlite(generacion["ruta"]) if generacion["vacia"] else conectar_origen_sqlite(generacion)
+    carga_rapida = generacion is not None and generacion["vacia"] and CARGA_RAPIDA_SQLITE
+    inicio_ejecucion = time.time()
+    informe = {"id": time.strftime("%Y%m%d-%H%M%S"), "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "tipo_bd": USE_DATABASE_TYPE,
+               "modo": MODO_CARGA, "carga_rapida": carga_rapida, "generacion": generacion["generacion"] if generacion else None,
+               "procesos_analisis": PROCESOS_ANALISIS, "fuentes": {}, "etapas": {}}
+    directorio_perfiles = None
+    if PERFILAR_ACTUALIZACION:
+        directorio_perfiles = os.path.join(INFORMES_EJECUCION_DIR, f"ejecucion_{informe['id']}_perfiles")
+        os.makedirs(directorio_perfiles, exist_ok=True)
+        informe["perfiles"] = directorio_perfiles
+
     if conn:
         # Creación y limpieza de tablas según el tipo de BD
         if USE_DATABASE_TYPE == 'postgres':
             crear_tablas_postgres(conn)
-            limpiar_tablas_postgres(conn)
-        elif USE_DATABASE_TYPE == 'sqlite':
-            crear_tablas_sqlite(conn)
-            limpiar_tablas_sqlite(conn)
-
-        # Bucle principal de procesamiento de fuentes
-        for fuente_nombre, config in SOURCES_CONFIG.items():
-            logging.info(f"--- Iniciando Proceso {fuente_nombre} ---")
-            ruta_archivo_xml = descargar_archivo(config["url"], config["local_filename"], fuente_nombre)
-            
-            if ruta_archivo_xml:
-                lista_entidades_procesadas = config["parser_function"](ruta_archivo_xml)
-                if lista_entidades_procesadas:
-                    # Guardado de datos en la base de datos seleccionada
-                    if USE_DATABASE_TYPE == 'postgres':
-                        guardar_datos_en_db_postgres(conn, lista_entidades_procesadas, fuente_nombre)
-                    elif USE_DATABASE_TYPE == 'sqlite':
-                        guardar_datos_en_db_sqlite(conn, lista_entidades_procesadas, fuente_nombre)
-                else:
-                    logging.warning(f"{fuente_nombre}: No se extrajeron datos del archivo XML.")
+            if FORZAR_ACTUALIZACION: limpiar_tablas_postgres(conn)
+        elif USE_DATABASE_TYPE == 'sqlite' and generacion["vacia"]:
+            crear_tablas_sqlite(conn, con_indices=not carga_rapida)
+            if FORZAR_ACTUALIZACION: limpiar_tablas_sqlite(conn)
+        abrir_generacion = None
+        if USE_DATABASE_TYPE == 'sqlite' and not generacion["vacia"]:
+            abrir_generacion = functools.partial(abrir_generacion_sqlite, generacion)
+
+        # Descarga, análisis y guardado de las fuentes que han cambiado (ver actualizar_fuentes)
+        cronologia, informes, conn_guardado = actualizar_fuentes(conn, USE_DATABASE_TYPE, carga_rapida, directorio_perfiles, abrir_generacion)
+        informe["etapas"]["actualizacion_fuentes"] = round(cronologia["_total"], 3)
+        informe["fuentes"] = informe_fuentes(cronologia)
+        registrar_cronologia(cronologia)
+        guardar_informe_cambios(informes)
+
+        if USE_DATABASE_TYPE == 'sqlite':
+            conn_tablas = conn_guardado or conn
+            hubo_cambios = any(hay_cambios(informe_fuente) for informe_fuente in informes.values()) or not indice_nombres_sqlite_existe(conn_tablas) or not tablas_sqlite_existen(conn_tablas, TABLAS_ATRIBUTOS_SQLITE)
+            publicar = hubo_cambios or generacion["anterior"] is None or FORZAR_ACTUALIZACION
+            if abrir_generacion is not None:
+                # Se deja la generación vigente y se sigue con la nueva, que se copia ahora si ninguna fuente lo ha hecho.
+                conn.close()
+                conn = conn_guardado
+                if conn is None and publicar:
+                    conn = abrir_generacion()
+                    if conn is None:
+                        logging.error(f"No se pudo abrir la generación {generacion['generacion']}; no se publica.")
+                        informe["segundos_totales"] = round(time.time() - inicio_ejecucion, 3)
+                        guardar_informe_ejecucion(informe)
+                        sys.exit(1)
+            reiniciar_memoria_pico()
+            if hubo_cambios:
+                with etapa_ejecucion(informe["etapas"], "indice_nombres", directorio_perfiles):
+                    construir_indice_nombres_sqlite(conn)
+                with etapa_ejecucion(informe["etapas"], "indices_busqueda", directorio_perfiles):
+                    construir_indices_busqueda_sqlite(conn)
+                with etapa_ejecucion(informe["etapas"], "atributos", directorio_perfiles):
+                    construir_atributos_sqlite(conn)
+            es_valida, conteos = False, {}
+            if publicar and carga_rapida and not informes:
+                logging.error("La carga rápida no ha guardado ninguna fuente; la generación está vacía.")
+            elif publicar:
+                with etapa_ejecucion(informe["etapas"], "validacion", directorio_perfiles):
+                    es_valida, conteos = validar_generacion_sqlite(conn, (generacion["anterior"] or {}).get("entidades"))
+            informe["publicada"] = False
+            pico = memoria_pico_mib()
+            informe["memoria_pico_etapas_mib"] = round(pico, 1) if pico is not None else None
+            if es_valida:
+                # El archivo publicado no se vuelve a escribir: sin WAL no deja archivos auxiliares junto a él.
+                conn.execute("PRAGMA journal_mode = DELETE;")
+            if conn: conn.close()
+            if es_valida and INDICE_NOMBRES_PRECOMPILADO:
+                with etapa_ejecucion(informe["etapas"], "indice_precompilado", directorio_perfiles):
+                    informe["indice_nombres"] = escribir_indice_nombres(generacion["ruta"], generacion["generacion"])
+            if not publicar:
+                borrar_archivo_sqlite(generacion["ruta"])
+                logging.info(f"Ninguna fuente ha cambiado: se mantiene la generación {generacion['anterior']['generacion']}.")
+                # Generaciones publicadas antes de que existiera el índice precompilado.
+                ruta_anterior = os.path.join(os.path.dirname(os.path.abspath(SQLITE_DB_FILE)), generacion["anterior"]["archivo"])
+                if INDICE_NOMBRES_PRECOMPILADO and not os.path.exists(ruta_indice_nombres(ruta_anterior)):
+                    with etapa_ejecucion(informe["etapas"], "indice_precompilado", directorio_perfiles):
+                        informe["indice_nombres"] = escribir_indice_nombres(ruta_anterior, generacion["anterior"]["generacion"])
+            elif not es_valida or not publicar_generacion_sqlite(SQLITE_DB_FILE, generacion["generacion"], conteos):
+                logging.error(f"La generación {generacion['generacion']} no se publica; queda en {generacion['ruta']} para revisarla.")
+                informe["segundos_totales"] = round(time.time() - inicio_ejecucion, 3)
+                guardar_informe_ejecucion(informe)
+                sys.exit(1)
             else:
-                logging.error(f"{fuente_nombre}: No se pudo obtener el archivo XML. Saltando esta fuente.")
-            logging.info(f"--- Proceso {fuente_nombre} Completado ---")
-            
-        conn.close()
+                informe["publicada"] = True
+        else:
+            conn.close()
         logging.info(f"Conexión a la base de datos ({USE_DATABASE_TYPE}) cerrada.")
+        informe["segundos_totales"] = round(time.time() - inicio_ejecucion, 3)
+        guardar_informe_ejecucion(informe)
     else:
         logging.error(f"No se pudo conectar a la base de datos ({USE_DATABASE_TYPE}). El script no puede continuar.")
         
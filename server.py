@@ -1,12 +1,47 @@
 # -*- coding: utf-8 -*-
 import sqlite3
 import logging
-import re
+import os
 import io
+import math
 import csv
-from flask import Flask, jsonify, render_template, request, Response
+import json
+import base64
+import binascii
+import bisect
+import contextvars
+import hashlib
+import multiprocessing
+import pathlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import datetime
+from flask import Flask, g, has_request_context, jsonify, render_template, request, Response, stream_with_context
 from flask_cors import CORS
-from thefuzz import fuzz
+from mapped_corpus import MappedNameIndex, take, write_name_index
+import name_matching
+from name_matching import (NameCorpus, NameIndex, NGRAM_BLOCKING_MIN_THRESHOLD, is_abjad, normalize_string, phonetic_keys,
+                           prepare_for_scoring, score_corpus, skeleton, token_sort, transliterate)
+from structured_attributes import country_codes, parse_birth_date_query
+
+# psycopg2 solo hace falta con SEARCH_BACKEND=postgres.
+try:
+    import psycopg2
+    import psycopg2.extras
+except ModuleNotFoundError:
+    psycopg2 = None
+
+# Intenta importar dotenv para desarrollo local (variables DB_*), pero no falles si no está.
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ModuleNotFoundError:
+    pass
 
 # Configuración básica de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,228 +50,1664 @@ app = Flask(__name__, template_folder='.')
 CORS(app)
 
 DB_FILE = "sanctions_lists.db"
+# Búsqueda fonética/transliterada además de la difusa sobre el nombre original ('0' para desactivarla).
+PHONETIC_SEARCH = os.environ.get('PHONETIC_SEARCH', '1') != '0'
+# Puntos que se restan a las puntuaciones por esqueleto consonántico (nombres en árabe, persa o hebreo): sin vocales,
+# Mahmoud, Mehmet y Muhammad dan el mismo esqueleto que محمد, así que esa coincidencia no puede valer tanto como una real.
+SKELETON_SCORE_PENALTY = int(os.environ.get('SKELETON_SCORE_PENALTY', '15'))
+# Resultados por página de /search (por defecto y máximo) y máximo de filas por exportación CSV.
+SEARCH_DEFAULT_LIMIT = int(os.environ.get('SEARCH_DEFAULT_LIMIT', '50'))
+SEARCH_MAX_LIMIT = int(os.environ.get('SEARCH_MAX_LIMIT', '500'))
+EXPORT_MAX_LIMIT = int(os.environ.get('EXPORT_MAX_LIMIT', '100000'))
+# Máximo de años de tolerancia (parámetro dob_tolerance) en el filtro por fecha de nacimiento.
+DOB_MAX_YEAR_TOLERANCE = int(os.environ.get('DOB_MAX_YEAR_TOLERANCE', '10'))
+# Caché de resultados de búsqueda (ver SearchCache): entradas (0 la desactiva), segundos que vale cada una y
+# máximo de entidades de un resultado para guardarlo.
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', '256'))
+SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL', '300'))
+SEARCH_CACHE_MAX_RESULTS = int(os.environ.get('SEARCH_CACHE_MAX_RESULTS', '20000'))
+# Cabecera Server-Timing con el tiempo de cada etapa de la búsqueda en las respuestas ('0' para no enviarla).
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') != '0'
+# Entidades hidratadas por consulta IN (...); acota también la memoria de una exportación en curso.
+HYDRATION_CHUNK_SIZE = 500
+# Conexiones de solo lectura que se conservan abiertas entre peticiones y pragmas con que se abren.
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', '8'))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '16384'))
+# Procesos que puntúan las búsquedas difusas fuera del proceso del servidor (ver ScoringPool; solo SQLite); 0 puntúa
+# en el hilo de la petición. Como mucho SEARCH_QUEUE_SIZE búsquedas más esperan proceso; la que no consigue sitio en
+# SEARCH_QUEUE_TIMEOUT segundos se rechaza con 503 y Retry-After.
+SEARCH_PROCESSES = int(os.environ.get('SEARCH_PROCESSES', '0'))
+SEARCH_QUEUE_SIZE = int(os.environ.get('SEARCH_QUEUE_SIZE', '32'))
+SEARCH_QUEUE_TIMEOUT = float(os.environ.get('SEARCH_QUEUE_TIMEOUT', '0.5'))
+SEARCH_RETRY_AFTER = 1
+# Índice de nombres compartido entre procesos: cada generación se escribe una sola vez en NAME_CORPUS_DIR (en Linux,
+# /dev/shm, en memoria) y los procesos lo abren con mmap (ver mapped_corpus). Los de ScoringPool lo usan siempre;
+# con SHARED_NAME_CORPUS=1 también el del servidor, p. ej. para varios workers de uvicorn.
+SHARED_NAME_CORPUS = os.environ.get('SHARED_NAME_CORPUS', '0') == '1'
+NAME_CORPUS_DIR = os.environ.get('NAME_CORPUS_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+# Índice de nombres que ofac_parser.py deja junto a cada generación (sanctions_lists.g000042.corpus): si corresponde a
+# la generación, se usa en lugar de los dos anteriores, sin cargar ni escribir nada al arrancar ('0' para ignorarlo).
+PREBUILT_NAME_CORPUS = os.environ.get('PREBUILT_NAME_CORPUS', '1') != '0'
+NAME_CORPUS_SUFFIX = ".corpus"
+
+# Motor de búsqueda: 'sqlite' (el archivo que publica ofac_parser.py, con el índice de nombres en memoria) o
+# 'postgres' (la base de datos que carga ofac_parser.py con USE_DATABASE_TYPE=postgres, con las mismas
+# variables DB_*). Con PostgreSQL el servidor no guarda nada entre peticiones, así que varios procesos o
+# máquinas pueden atender la misma base de datos.
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'sqlite').strip().lower()
+POSTGRES_POOL_SIZE = int(os.environ.get('POSTGRES_POOL_SIZE', '8'))
+# Segundos durante los que se reutiliza la firma de los datos de PostgreSQL (ver get_postgres_signature).
+POSTGRES_SIGNATURE_TTL = float(os.environ.get('POSTGRES_SIGNATURE_TTL', '5'))
+# Similitud de trigramas (pg_trgm) mínima de un candidato, por cada punto de umbral de la búsqueda difusa:
+# con umbral 80 se puntúan los nombres con similarity() >= 0.24. Ver benchmarks/bench_postgres_search.py.
+POSTGRES_TRGM_SIMILARITY_FACTOR = float(os.environ.get('POSTGRES_TRGM_SIMILARITY_FACTOR', '0.003'))
+
+# ofac_parser.py publica cada carga como un archivo nuevo y deja junto a DB_FILE un marcador JSON
+# (DB_FILE + GENERATION_MARKER_SUFFIX) con el número de generación y el archivo vigente.
+GENERATION_MARKER_SUFFIX = ".generation"
 
-def conectar_db():
-    """Conecta a la base de datos SQLite."""
+def conectar_db(path=None, immutable=False):
+    """Abre una conexión de solo lectura a la base de datos SQLite con los pragmas de lectura del servidor.
+
+    Sin ``path`` abre la base de datos vigente (ver resolve_db). ``immutable`` indica a SQLite que el
+    archivo no va a cambiar, lo que evita los bloqueos de lectura; solo es válido para generaciones publicadas.
+    """
     try:
+        path = path or resolve_db()[0]
+        uri = f"{pathlib.Path(path).resolve().as_uri()}?mode=ro" + ("&immutable=1" if immutable else "")
         # check_same_thread=False es necesario porque Flask puede manejar peticiones en diferentes hilos.
-        conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
         return conn
     except sqlite3.Error as e:
         logging.error(f"Error al conectar a la base de datos SQLite: {e}")
         return None
 
-def normalize_string(s):
-    """Normaliza un string para la comparación difusa."""
-    if not s: return ""
-    s = s.lower()
-    s = re.sub(r'[^\w\s]', '', s)
-    s = re.sub(r'\s+', ' ', s).strip()
-    return s
+_marker_cache = (None, None)
+
+def read_generation_marker():
+    """Devuelve el marcador de generación ({"generacion", "archivo", ...}) publicado junto a DB_FILE, o None.
+
+    El archivo solo se vuelve a leer cuando cambia, así que se puede consultar en cada petición.
+    """
+    global _marker_cache
+    path = DB_FILE + GENERATION_MARKER_SUFFIX
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+    cached_key, marker = _marker_cache
+    if cached_key == key:
+        return marker
+    try:
+        with open(path, encoding='utf-8') as f:
+            marker = json.load(f)
+        int(marker['generacion']), str(marker['archivo'])
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        logging.warning(f"Marcador de generación ilegible en {path}: {e}")
+        return None
+    _marker_cache = (key, marker)
+    return marker
+
+def resolve_db():
+    """Devuelve (ruta, firma) de la base de datos vigente en disco: la generación del marcador o, si no hay
+    marcador, DB_FILE. La firma (generación, inodo, tamaño, mtime) cambia con cada generación publicada y,
+    sin marcador, cada vez que se modifica o reemplaza DB_FILE; es None si el archivo no existe."""
+    marker = read_generation_marker()
+    path = os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), marker['archivo']) if marker else DB_FILE
+    try:
+        st = os.stat(path)
+    except OSError:
+        return path, None
+    return path, (marker['generacion'] if marker else None, st.st_ino, st.st_size, st.st_mtime_ns)
+
+def get_db_signature():
+    """Firma de la base de datos vigente en disco (ver resolve_db)."""
+    return resolve_db()[1]
+
+class DatabaseGeneration:
+    """Versión de la base de datos con la que trabajan las peticiones: archivo, firma e índice de nombres.
+
+    El índice (``name_index``, None hasta entonces) se carga la primera vez que se pide y se comparte
+    entre todas las peticiones que usan esta generación. Es un MappedNameIndex si ofac_parser.py dejó un índice
+    válido en ``prebuilt_corpus_path`` o, con SHARED_NAME_CORPUS, abierto desde ``corpus_path`` (ver
+    publish_name_corpus); si no, se carga de la base de datos.
+    """
+
+    def __init__(self, path, signature):
+        self.path = path
+        self.signature = signature
+        # Las generaciones publicadas no se modifican nunca; DB_FILE sin marcador sí puede cambiar.
+        self.immutable = signature[0] is not None
+        self.name_index = None
+        self.corpus_published = False
+        # None hasta que se comprueba prebuilt_corpus_path (ver _open_prebuilt_corpus).
+        self.prebuilt_valid = None
+        self._lock = threading.Lock()
+
+    @property
+    def number(self):
+        return self.signature[0]
+
+    def connect(self):
+        return conectar_db(self.path, self.immutable)
+
+    @property
+    def corpus_path(self):
+        """Archivo del índice de nombres compartido; depende solo de la generación, así que todos los procesos
+        que sirven la misma base de datos usan el mismo."""
+        key = hashlib.sha1(repr((os.path.abspath(self.path), self.signature)).encode()).hexdigest()[:16]
+        return os.path.join(NAME_CORPUS_DIR, f"sanctions_corpus_{key}.bin")
+
+    @property
+    def prebuilt_corpus_path(self):
+        return os.path.splitext(self.path)[0] + NAME_CORPUS_SUFFIX
+
+    @property
+    def name_corpus_file(self):
+        """Archivo del índice de nombres mapeado que usa esta generación, o None si no usa ninguno."""
+        if self.prebuilt_valid:
+            return self.prebuilt_corpus_path
+        return self.corpus_path if self.corpus_published else None
+
+    def get_name_index(self):
+        index = self.name_index
+        if index is not None:
+            return index
+        with self._lock:
+            if self.name_index is None:
+                self.name_index = (self._open_prebuilt_corpus()
+                                   or (self._open_name_corpus() if SHARED_NAME_CORPUS else self.load_name_index()))
+            return self.name_index
+
+    def _open_prebuilt_corpus(self):
+        """MappedNameIndex de prebuilt_corpus_path, o None si no existe o no es de esta generación: de una versión
+        anterior del formato, dañado (suma de comprobación) o escrito para otra base de datos."""
+        # Se llama con self._lock adquirido. Solo se comprueba una vez por generación.
+        index = None
+        if self.prebuilt_valid is not False and PREBUILT_NAME_CORPUS and self.immutable and os.path.exists(self.prebuilt_corpus_path):
+            try:
+                index = MappedNameIndex.open(self.prebuilt_corpus_path, self.signature)
+                expected = {"generacion": self.number, "base_datos": os.path.basename(self.path),
+                            "tamano": self.signature[2], "mtime_ns": self.signature[3]}
+                found = {key: index.meta.get(key) for key in expected}
+                if found != expected:
+                    raise ValueError(f"es de otra base de datos ({found}; se esperaba {expected})")
+                logging.info(f"Índice de nombres precompilado abierto: {self.prebuilt_corpus_path} ({len(index.full.uids)} entidades, {len(index.full)} nombres).")
+            except (OSError, ValueError) as e:
+                logging.warning(f"Se descarta el índice de nombres precompilado {self.prebuilt_corpus_path}: {e}")
+                index = None
+        self.prebuilt_valid = index is not None
+        return index
+
+    def load_name_index(self):
+        """Carga el índice de nombres de la base de datos en este proceso (ver NameIndex.load)."""
+        conn = self.connect()
+        if not conn:
+            raise ConnectionError("No se pudo conectar a la base de datos")
+        try:
+            return NameIndex.load(conn, self.signature)
+        finally:
+            conn.close()
+
+    def publish_name_corpus(self):
+        """Devuelve el archivo del índice de nombres para abrirlo con mmap: prebuilt_corpus_path si es válido o, si
+        no, corpus_path, que se escribe si otro proceso no lo ha hecho ya.
+
+        Lo carga y lo escribe un proceso aparte que termina al acabar, de modo que este proceso no llega a
+        tener el índice en memoria.
+        """
+        with self._lock:
+            return self._publish_name_corpus()
+
+    def _publish_name_corpus(self, rebuild=False):
+        # Se llama con self._lock adquirido.
+        if self.prebuilt_valid is None:
+            self._open_prebuilt_corpus()
+        if self.prebuilt_valid:
+            return self.prebuilt_corpus_path
+        if rebuild or not (self.corpus_published or os.path.exists(self.corpus_path)):
+            start = time.perf_counter()
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                executor.submit(_write_name_corpus, self.path, self.signature, self.corpus_path).result()
+            logging.info(f"Índice de nombres compartido escrito en {self.corpus_path} en {time.perf_counter() - start:.1f} s.")
+        self.corpus_published = True
+        return self.corpus_path
+
+    def _open_name_corpus(self):
+        # Se llama con self._lock adquirido. Un archivo ilegible (p. ej. de otra versión del formato) se vuelve a escribir.
+        self._publish_name_corpus()
+        try:
+            return MappedNameIndex.open(self.corpus_path, self.signature)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Índice de nombres compartido inválido ({e}); se vuelve a escribir.")
+            self._publish_name_corpus(rebuild=True)
+            return MappedNameIndex.open(self.corpus_path, self.signature)
+
+    def discard_name_corpus(self):
+        """Borra corpus_path al dejar de usar la generación; los procesos que lo tienen abierto lo siguen leyendo."""
+        if self.corpus_published:
+            try: os.remove(self.corpus_path)
+            except OSError: pass
+
+def _write_name_corpus(path, signature, corpus_path):
+    """Se ejecuta en el proceso aparte de DatabaseGeneration.publish_name_corpus."""
+    write_name_index(corpus_path, DatabaseGeneration(path, signature).load_name_index())
+
+_active_generation = None
+_pending_signature = None
+_generation_lock = threading.Lock()
+
+def get_active_generation():
+    """Devuelve la generación con la que debe trabajar la petición, o None si no hay base de datos.
+
+    Cuando aparece una generación nueva (o DB_FILE cambia), se prepara en un hilo aparte, cargando su
+    índice de nombres, mientras las peticiones siguen con la anterior; al terminar se activa de golpe.
+    Así una recarga no se nota en la latencia: solo la primera petición del proceso espera a la carga.
+    """
+    global _active_generation, _pending_signature
+    path, signature = resolve_db()
+    active = _active_generation
+    if active is not None and (signature is None or active.signature == signature):
+        return active
+    if signature is None:
+        return None
+    if active is None:
+        with _generation_lock:
+            if _active_generation is None:
+                _active_generation = DatabaseGeneration(path, signature)
+            return _active_generation
+    with _generation_lock:
+        if _pending_signature == signature:
+            return active
+        _pending_signature = signature
+    threading.Thread(target=_switch_generation, args=(path, signature), name="db-generation-switch", daemon=True).start()
+    return active
+
+def _switch_generation(path, signature):
+    """Prepara la generación nueva (abre el archivo y carga su índice, o el de los procesos de _scoring_pool) y la activa."""
+    global _active_generation, _pending_signature
+    generation = DatabaseGeneration(path, signature)
+    try:
+        if _scoring_pool is not None:
+            _scoring_pool.warm(generation)
+        else:
+            generation.get_name_index()
+    except Exception as e:
+        logging.error(f"No se pudo preparar la base de datos {path}: {e}", exc_info=True)
+        with _generation_lock:
+            _pending_signature = None
+        return
+    with _generation_lock:
+        previous, _active_generation, _pending_signature = _active_generation, generation, None
+    logging.info(f"Base de datos activa: {path} (generación {generation.number}); la anterior era {previous.path if previous else None}.")
+    if previous is not None:
+        previous.discard_name_corpus()
+
+class ConnectionPool:
+    """Conexiones de solo lectura a la generación activa de la base de datos, reutilizadas entre peticiones.
+
+    Cada conexión recuerda la generación con que se abrió (ver get_active_generation): si al pedirla
+    o al devolverla ya hay otra activa, se cierra y se abre otra. Se guardan como mucho ``max_idle``
+    conexiones libres; las que sobran se cierran al devolverlas.
+    """
+
+    def __init__(self, max_idle):
+        self.max_idle = max_idle
+        self._idle = []
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._opened = self._reused = self._discarded = 0
+
+    def acquire(self):
+        """Devuelve una conexión libre y vigente, o una nueva; None si no se puede abrir."""
+        generation = get_active_generation()
+        if generation is None:
+            logging.error(f"Error al conectar a la base de datos SQLite: no existe {DB_FILE}")
+            return None
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if self._generations[conn] is generation:
+                    self._reused += 1
+                    return conn
+                self._close(conn)
+        conn = generation.connect()
+        if conn:
+            with self._lock:
+                self._generations[conn] = generation
+                self._opened += 1
+        return conn
+
+    def release(self, conn):
+        """Devuelve ``conn`` al pool, o la cierra si sobra o si ya hay otra generación activa."""
+        if conn.in_transaction:
+            conn.rollback()
+        generation = get_active_generation()
+        with self._lock:
+            if len(self._idle) < self.max_idle and self._generations.get(conn) is generation:
+                self._idle.append(conn)
+            else:
+                self._close(conn)
+
+    def generation_of(self, conn):
+        """Generación con la que se abrió una conexión del pool (None si no es del pool)."""
+        with self._lock:
+            return self._generations.get(conn)
+
+    def _close(self, conn):
+        # Se llama con self._lock adquirido.
+        self._generations.pop(conn, None)
+        self._discarded += 1
+        conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_idle': self.max_idle,
+                'idle': len(self._idle),
+                'in_use': len(self._generations) - len(self._idle),
+                'opened': self._opened,
+                'reused': self._reused,
+                'discarded': self._discarded,
+            }
+
+def conectar_db_postgres():
+    """Abre con ofac_parser.conectar_db_postgres (variables DB_*) una conexión de solo lectura a PostgreSQL
+    cuyas filas se leen por nombre de columna, igual que sqlite3.Row. None si no se puede abrir."""
+    # Se importa aquí: ofac_parser necesita psycopg2 y requests, que el servidor con SQLite no usa.
+    from ofac_parser import conectar_db_postgres as conectar_db_postgres_parser
+    conn = conectar_db_postgres_parser(cursor_factory=psycopg2.extras.RealDictCursor)
+    if conn:
+        try:
+            conn.set_session(readonly=True)
+        except psycopg2.Error as e:
+            logging.error(f"Error al conectar a PostgreSQL: {e}")
+            conn.close()
+            return None
+    return conn
+
+class PostgresPool:
+    """Conexiones de solo lectura a PostgreSQL reutilizadas entre peticiones, con la interfaz de ConnectionPool.
+
+    No hay generaciones: todos los servidores leen la misma base de datos, que ofac_parser.py actualiza
+    fuente a fuente en transacciones. Se guardan como mucho ``max_idle`` conexiones libres.
+    """
+
+    def __init__(self, max_idle):
+        self.max_idle = max_idle
+        self._idle = []
+        self._in_use = set()
+        self._lock = threading.Lock()
+        self._opened = self._reused = self._discarded = 0
+
+    def acquire(self):
+        """Devuelve una conexión libre o una nueva; None si no se puede abrir."""
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if not conn.closed:
+                    self._in_use.add(conn)
+                    self._reused += 1
+                    return conn
+                self._discarded += 1
+        conn = conectar_db_postgres()
+        if conn:
+            with self._lock:
+                self._in_use.add(conn)
+                self._opened += 1
+        return conn
+
+    def release(self, conn):
+        """Devuelve ``conn`` al pool (terminando su transacción de lectura), o la cierra si sobra o se ha roto."""
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._in_use.discard(conn)
+            if not conn.closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._discarded += 1
+        conn.close()
+
+    def generation_of(self, conn):
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_idle': self.max_idle,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'opened': self._opened,
+                'reused': self._reused,
+                'discarded': self._discarded,
+            }
+
+_postgres_signature = (0.0, None)
+
+def get_postgres_signature():
+    """Firma de los datos de PostgreSQL: el hash de EstadoFuentes (SHA-256 y fecha de carga de cada fuente),
+    que cambia con cada fuente que ofac_parser.py guarda. Es la misma en todos los servidores; se consulta
+    como mucho una vez cada POSTGRES_SIGNATURE_TTL segundos. None si no se puede leer."""
+    global _postgres_signature
+    checked_at, signature = _postgres_signature
+    now = time.monotonic()
+    if signature is not None and now - checked_at < POSTGRES_SIGNATURE_TTL:
+        return signature
+    conn = _db_pool.acquire()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT md5(COALESCE(string_agg(fuente_lista || ':' || COALESCE(sha256, '') || ':' || fecha_carga, ',' ORDER BY fuente_lista), '')) AS firma FROM EstadoFuentes")
+        signature = cursor.fetchone()['firma']
+    except psycopg2.Error as e:
+        logging.error(f"No se pudo leer EstadoFuentes de PostgreSQL: {e}")
+        return None
+    finally:
+        _db_pool.release(conn)
+    _postgres_signature = (now, signature)
+    return signature
+
+def get_data_signature():
+    """Identifica la versión de los datos con que se responde: la firma de la generación activa de SQLite o,
+    con SEARCH_BACKEND=postgres, la de get_postgres_signature. None si no hay base de datos."""
+    if SEARCH_BACKEND == 'postgres':
+        return get_postgres_signature()
+    generation = get_active_generation()
+    return generation.signature if generation else None
+
+if SEARCH_BACKEND == 'postgres':
+    if psycopg2 is None:
+        raise RuntimeError("SEARCH_BACKEND=postgres requiere psycopg2 (pip install psycopg2-binary)")
+    _db_pool = PostgresPool(POSTGRES_POOL_SIZE)
+elif SEARCH_BACKEND == 'sqlite':
+    _db_pool = ConnectionPool(SQLITE_POOL_SIZE)
+else:
+    raise RuntimeError(f"SEARCH_BACKEND desconocido: {SEARCH_BACKEND!r} (usa 'sqlite' o 'postgres')")
+
+def get_name_index(conn=None):
+    """Devuelve el índice de nombres de la generación de ``conn`` (una conexión del pool) o, sin ella,
+    de la generación activa, de modo que una búsqueda nunca mezcla dos versiones de la base de datos.
+    Con SEARCH_BACKEND=postgres no hay índice en memoria y devuelve None."""
+    if SEARCH_BACKEND == 'postgres':
+        return None
+    generation = (_db_pool.generation_of(conn) if conn is not None else None) or get_active_generation()
+    if generation is None:
+        raise ConnectionError("No se pudo conectar a la base de datos")
+    return generation.get_name_index()
+
+# --- Métricas (/metrics, en el formato de texto de Prometheus) y cabecera Server-Timing ---
+# Las etapas de la búsqueda (search_stage) se miden en todas las búsquedas, se hagan desde una petición o no;
+# dentro de una petición se acumulan además en su RequestTimings para la cabecera Server-Timing.
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _sample_value(value):
+    if value == math.inf: return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Contador de Prometheus, con una serie por combinación de valores de ``labels``."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Fija el valor de la serie; para reflejar contadores que ya lleva otro objeto (SearchCache, los pools)."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        """[(nombre, valores de las etiquetas, etiquetas adicionales, valor)]."""
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in sorted(self._values.items())]
+
+class Gauge(Counter):
+    """Valor instantáneo de Prometheus; se fija con ``set`` al leer /metrics."""
+    kind = 'gauge'
+
+class Histogram(Counter):
+    """Histograma de Prometheus con los límites ``buckets`` (el de +Inf se añade solo)."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Cada observación cuenta solo en su intervalo; samples() los acumula, como espera Prometheus (le="...").
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state)) for key, state in sorted(self._values.items())]
+        samples = []
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, (('le', _sample_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), state[-1]))
+            samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+def render_metrics(metrics):
+    """Texto de /metrics (formato de exposición 0.0.4 de Prometheus) para ``metrics``."""
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, extra, value in metric.samples():
+            pairs = list(zip(metric.labels, key)) + list(extra)
+            labels = "{" + ",".join(f'{label}="{_label_value(v)}"' for label, v in pairs) + "}" if pairs else ""
+            lines.append(f"{name}{labels} {_sample_value(value)}")
+    return "\n".join(lines) + "\n"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+SEARCH_STAGE_SECONDS = Histogram('sanctions_search_stage_seconds', 'Duración de cada etapa de la búsqueda: name_index (obtener el índice '
+                                 'de nombres), name_select (consulta de nombres), normalize, blocking (candidatos por trigramas y claves '
+                                 'fonéticas), scoring, filters (fecha de nacimiento, nacionalidad e identificador) y hydration.',
+                                 LATENCY_BUCKETS, labels=('stage',))
+SEARCH_CANDIDATES = Histogram('sanctions_search_candidates_scored', 'Nombres puntuados por cada búsqueda difusa.', COUNT_BUCKETS)
+SEARCH_RESULTS = Histogram('sanctions_search_results', 'Entidades encontradas por cada búsqueda, antes de paginar.', COUNT_BUCKETS)
+HTTP_REQUESTS = Counter('sanctions_http_requests_total', 'Peticiones atendidas, por ruta y código de estado.', labels=('endpoint', 'status'))
+HTTP_REQUEST_SECONDS = Histogram('sanctions_http_request_duration_seconds', 'Tiempo hasta enviar las cabeceras de la respuesta, por ruta '
+                                 '(en /export y /screen/batch el cuerpo se genera después).', LATENCY_BUCKETS, labels=('endpoint',))
+ERRORS = Counter('sanctions_errors_total', 'Errores por ruta: client (respuesta 4xx), server (5xx), stream (error tras enviar las '
+                 'cabeceras) y record (registro de /screen/batch con error).', labels=('endpoint', 'kind'))
+SEARCH_CACHE_EVENTS = Counter('sanctions_search_cache_events_total', 'Aciertos, fallos, desalojos, caducidades e invalidaciones de la caché de búsquedas.', labels=('event',))
+SEARCH_CACHE_ENTRIES = Gauge('sanctions_search_cache_entries', 'Búsquedas guardadas en la caché.')
+DB_POOL_CONNECTIONS = Gauge('sanctions_db_pool_connections', 'Conexiones del pool, libres o en uso.', labels=('state',))
+NAME_INDEX_NAMES = Gauge('sanctions_name_index_names', 'Nombres del índice de nombres de la generación activa (solo SQLite).')
+SCORING_POOL_PENDING = Gauge('sanctions_scoring_pool_pending', 'Búsquedas difusas en los procesos de puntuación o esperando uno (SEARCH_PROCESSES).')
+SCORING_POOL_REJECTED = Counter('sanctions_scoring_pool_rejected_total', 'Búsquedas rechazadas con 503 por tener llena la cola de los procesos de puntuación.')
+METRICS = [SEARCH_STAGE_SECONDS, SEARCH_CANDIDATES, SEARCH_RESULTS, HTTP_REQUESTS, HTTP_REQUEST_SECONDS, ERRORS,
+           SEARCH_CACHE_EVENTS, SEARCH_CACHE_ENTRIES, DB_POOL_CONNECTIONS, NAME_INDEX_NAMES, SCORING_POOL_PENDING, SCORING_POOL_REJECTED]
+
+class RequestTimings:
+    """Tiempo acumulado por etapa, candidatos puntuados y uso de la caché de la petición en curso."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.candidates = None
+        self.cache = None
+
+    def header(self, total):
+        """Valor de la cabecera Server-Timing (duraciones en milisegundos)."""
+        parts = []
+        for stage, seconds in self.stages.items():
+            part = f"{stage};dur={seconds * 1000:.2f}"
+            if stage == 'scoring' and self.candidates is not None:
+                part += f';desc="{self.candidates} candidatos"'
+            parts.append(part)
+        if self.cache:
+            parts.append(f'cache;desc="{self.cache}"')
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+@contextmanager
+def search_stage(stage):
+    """Mide el bloque como la etapa ``stage`` de la búsqueda (ver SEARCH_STAGE_SECONDS)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def record_stage(stage, elapsed):
+    SEARCH_STAGE_SECONDS.observe(elapsed, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.stages[stage] = timings.stages.get(stage, 0.0) + elapsed
+
+def record_candidates(count):
+    SEARCH_CANDIDATES.observe(count)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.candidates = (timings.candidates or 0) + count
+
+def record_search_error(kind):
+    """Cuenta un error que no llega a la respuesta HTTP (ver ERRORS)."""
+    ERRORS.inc(endpoint=request_endpoint() if has_request_context() else 'unmatched', kind=kind)
+
+def request_endpoint():
+    """Etiqueta de la ruta de la petición en curso; las que no existen comparten una para no multiplicar las series."""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def score_name_query(corpus, query_name, threshold):
+    """Devuelve [(posición, puntuación)], ordenado por posición, de los nombres de ``corpus`` que alcanzan ``threshold``.
+
+    La puntuación es token_sort_ratio sobre los nombres normalizados (fuzz.ratio sobre ``token_sorted``),
+    restringida a los candidatos del índice de trigramas. Con PHONETIC_SEARCH, los nombres que comparten
+    claves fonéticas con la consulta se puntúan además sobre su forma transliterada (o sobre el esqueleto
+    consonántico, con SKELETON_SCORE_PENALTY puntos menos, si alguno de los dos está en una escritura sin
+    vocales) y cada nombre se queda con la mayor de sus puntuaciones.
+    """
+    with search_stage('normalize'):
+        sorted_query = token_sort(prepare_for_scoring(normalize_string(query_name)))
+        transliterated_query = transliterate(query_name) if PHONETIC_SEARCH else None
+    with search_stage('blocking'):
+        candidates = corpus.ngram_index.candidates(sorted_query, threshold)
+        phonetic_candidates = corpus.phonetic_index.candidates(transliterated_query) if PHONETIC_SEARCH else None
+    scored = len(corpus.token_sorted) if candidates is None else len(candidates)
+    record_candidates(scored + len(phonetic_candidates or ()))
+
+    with search_stage('scoring'):
+        if candidates is None:
+            hits = score_corpus(sorted_query, corpus.token_sorted, threshold, presorted=True)
+        else:
+            hits = score_corpus(sorted_query, take(corpus.token_sorted, candidates), threshold, presorted=True)
+            hits = [(candidates[pos], score) for pos, score in hits]
+        if not phonetic_candidates:
+            return hits
+        if is_abjad(query_name):
+            by_skeleton, by_transliteration = phonetic_candidates, []
+        else:
+            by_skeleton = [pos for pos in phonetic_candidates if corpus.abjad[pos]]
+            by_transliteration = [pos for pos in phonetic_candidates if not corpus.abjad[pos]]
+
+        best = dict(hits)
+        for positions, query_form, forms, penalty in ((by_transliteration, transliterated_query, corpus.transliterated, 0),
+                                                      (by_skeleton, skeleton(transliterated_query), corpus.skeletons, SKELETON_SCORE_PENALTY)):
+            # Con la penalización ningún nombre puede llegar al umbral (p. ej. umbral 90 con 15 puntos menos).
+            if not positions or threshold + penalty > 100: continue
+            for pos, score in score_corpus(prepare_for_scoring(query_form), [prepare_for_scoring(form) for form in take(forms, positions)], threshold + penalty):
+                score -= penalty
+                if score > best.get(positions[pos], 0):
+                    best[positions[pos]] = score
+        return sorted(best.items())
+
+# Tablas hijas de Entidades que se adjuntan a cada documento: (tabla, clave en el documento, transformación de la fila).
+ENTITY_CHILD_TABLES = (
+    ('Alias', 'aliases', dict),
+    ('Direcciones', 'direcciones', dict),
+    ('Programas', 'programas', lambda row: row['programa']),
+    ('Identificadores', 'identificadores', dict),
+    ('CaracteristicasAdicionales', 'caracteristicas', dict),
+)
+
+def get_entities_details(cursor, uids):
+    """Obtiene todos los detalles de varias entidades con una consulta por tabla, en el orden de ``uids``.
+
+    Los UIDs que no existen se omiten. ``uids`` no debe superar el límite de parámetros de
+    SQLite; iter_entity_details se encarga de trocear listas largas. En PostgreSQL la lista
+    se pasa como un único array.
+    """
+    if not uids: return []
+    if _is_postgres(cursor):
+        # Sin ORDER BY, PostgreSQL no garantiza el orden de inserción de las filas hijas.
+        condition, params, order = "= ANY(%s)", [list(uids)], " ORDER BY id"
+    else:
+        condition, params, order = f"IN ({','.join('?' for _ in uids)})", list(uids), ""
+
+    cursor.execute(f"SELECT * FROM Entidades WHERE uid {condition}", params)
+    documentos = {}
+    for row in cursor.fetchall():
+        documentos[row['uid']] = dict(row)
+        # PostgreSQL devuelve datetime; SQLite, el texto 'AAAA-MM-DD HH:MM:SS'. Se deja igual en ambos.
+        fecha = documentos[row['uid']].get('fecha_actualizacion_registro')
+        if isinstance(fecha, datetime):
+            documentos[row['uid']]['fecha_actualizacion_registro'] = fecha.isoformat(sep=' ', timespec='seconds')
+        for _, key, _ in ENTITY_CHILD_TABLES:
+            documentos[row['uid']][key] = []
+
+    for table, key, transform in ENTITY_CHILD_TABLES:
+        cursor.execute(f"SELECT * FROM {table} WHERE entidad_uid {condition}{order}", params)
+        for row in cursor.fetchall():
+            if row['entidad_uid'] in documentos:
+                documentos[row['entidad_uid']][key].append(transform(row))
+
+    return [documentos[uid] for uid in uids if uid in documentos]
 
 def get_full_entity_details(cursor, uid):
     """Obtiene todos los detalles de una entidad a partir de su UID."""
-    cursor.execute("SELECT * FROM Entidades WHERE uid = ?", (uid,))
-    entidad_data = cursor.fetchone()
-    if not entidad_data: return None
+    entidades = get_entities_details(cursor, [uid])
+    return entidades[0] if entidades else None
 
-    entidad_completa = dict(entidad_data)
-    
-    cursor.execute("SELECT * FROM Alias WHERE entidad_uid = ?", (uid,))
-    entidad_completa['aliases'] = [dict(row) for row in cursor.fetchall()]
-    cursor.execute("SELECT * FROM Direcciones WHERE entidad_uid = ?", (uid,))
-    entidad_completa['direcciones'] = [dict(row) for row in cursor.fetchall()]
-    cursor.execute("SELECT * FROM Programas WHERE entidad_uid = ?", (uid,))
-    entidad_completa['programas'] = [row['programa'] for row in cursor.fetchall()]
-    cursor.execute("SELECT * FROM Identificadores WHERE entidad_uid = ?", (uid,))
-    entidad_completa['identificadores'] = [dict(row) for row in cursor.fetchall()]
-    cursor.execute("SELECT * FROM CaracteristicasAdicionales WHERE entidad_uid = ?", (uid,))
-    entidad_completa['caracteristicas'] = [dict(row) for row in cursor.fetchall()]
+def _is_postgres(cursor):
+    return not isinstance(cursor, sqlite3.Cursor)
+
+def best_matches(corpus, hits):
+    """Reduce los aciertos [(posición, puntuación)] de score_name_query a uno por entidad, ordenados por
+    puntuación: [{'uid', 'score', 'matched_on'}]."""
+    # Por entidad se queda el primer nombre con la puntuación máxima, como en el recorrido nombre a nombre; con
+    # umbral <= 0 también entran las entidades que puntúan 0, sin nombre coincidente (matched_on vacío).
+    best_by_owner = {}
+    for pos, score in hits:
+        owner = corpus.owners[pos]
+        if score > best_by_owner.get(owner, (0, None))[0] or owner not in best_by_owner:
+            best_by_owner[owner] = (score, pos)
+    matches = []
+    for owner in sorted(best_by_owner):
+        score, pos = best_by_owner[owner]
+        matches.append({'uid': corpus.uids[owner], 'score': score, 'matched_on': corpus.names[pos] if score > 0 else ''})
+    matches.sort(key=lambda x: x['score'], reverse=True)
+    return matches
+
+# --- Puntuación difusa en procesos (SEARCH_PROCESSES) ---
+# score_corpus retiene el GIL durante casi toda la puntuación, así que las búsquedas difusas de varios hilos se
+# ejecutan de una en una. Con SEARCH_PROCESSES, rank_search_results las envía a un pool de procesos, cada uno
+# con su propio índice de nombres, y el proceso del servidor solo hace E/S (SQLite, red) y filtros.
+
+class SearchOverloaded(Exception):
+    """La cola de los procesos de puntuación está llena: la petición se rechaza con 503."""
+
+class ScoringPool:
+    """Procesos que puntúan búsquedas difusas sobre el índice de nombres de una generación (ver _score_in_worker).
+
+    Admite como mucho ``processes + queue_size`` búsquedas a la vez; la siguiente espera ``timeout``
+    segundos a que alguna termine y, si no, lanza SearchOverloaded. Los procesos se crean con 'spawn' (no
+    heredan los hilos ni las conexiones del servidor) la primera vez que se usan y cada uno puntúa con un
+    solo hilo: el paralelismo lo dan los procesos. Todos abren con mmap el mismo índice de nombres de la
+    generación (ver DatabaseGeneration.publish_name_corpus), así que añadir procesos apenas añade memoria.
+    """
+
+    # Segundos que cada proceso espera en warm a que los demás abran el índice.
+    WARM_TIMEOUT = 120
+
+    def __init__(self, processes, queue_size, timeout):
+        self.processes = processes
+        self.capacity = processes + queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._executor = None
+        self._barrier = None
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._pending = self._submitted = self._rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context('spawn')
+                # La barrera de warm llega a los procesos al crearlos: no se puede enviar con cada tarea.
+                self._barrier = context.Barrier(self.processes)
+                self._executor = ProcessPoolExecutor(self.processes, mp_context=context, initializer=_init_scoring_worker, initargs=(self._barrier,))
+            return self._executor
+
+    def _run(self, fn, *args):
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        except BrokenProcessPool:
+            # Un proceso ha muerto (p. ej. por falta de memoria): la próxima búsqueda crea un pool nuevo.
+            with self._lock:
+                self._executor = None
+            raise
+
+    def score(self, generation, query_name, threshold, exclude_aliases):
+        """Devuelve best_matches para la consulta sobre el índice de ``generation``, calculado en un proceso del pool."""
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._rejected += 1
+            raise SearchOverloaded(f"hay {self.capacity} búsquedas difusas en curso o en cola")
+        with self._lock:
+            self._pending += 1
+            self._submitted += 1
+        try:
+            corpus_path = generation.publish_name_corpus()
+            matches, stages, candidates = self._run(_score_in_worker, generation.path, generation.signature, corpus_path, query_name, threshold, exclude_aliases)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+        for stage, elapsed in stages.items():
+            record_stage(stage, elapsed)
+        if candidates is not None:
+            record_candidates(candidates)
+        return matches
+
+    def warm(self, generation):
+        """Publica el índice de ``generation`` y lo abre en todos los procesos del pool antes de activarla.
+
+        Se envía una tarea por proceso y cada una, tras abrir el índice, espera en una barrera a las demás: un
+        proceso ocupado en la barrera no puede tomar otra tarea, así que cada una se ejecuta en un proceso
+        distinto. Si la barrera no se completa en WARM_TIMEOUT segundos (p. ej. por búsquedas largas en curso),
+        los procesos que falten abrirán el índice con su primera búsqueda.
+        """
+        corpus_path = generation.publish_name_corpus()
+        with self._warm_lock:
+            executor = self._get_executor()
+            barrier = self._barrier
+            futures = [executor.submit(_load_in_worker, generation.path, generation.signature, corpus_path, self.WARM_TIMEOUT) for _ in range(self.processes)]
+            warmed = 0
+            for future in futures:
+                try:
+                    future.result()
+                    warmed += 1
+                except threading.BrokenBarrierError:
+                    pass
+            if warmed < self.processes:
+                logging.warning(f"Solo {warmed} de {self.processes} procesos de puntuación han abierto el índice de la generación nueva; los demás lo abrirán con su primera búsqueda.")
+                barrier.reset()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'processes': self.processes,
+                'capacity': self.capacity,
+                'pending': self._pending,
+                'submitted': self._submitted,
+                'rejected': self._rejected,
+            }
+
+# Índices de nombres que tiene abiertos un proceso del pool, por firma: el de la generación activa y, durante un
+# cambio, el de la anterior.
+_worker_indexes = OrderedDict()
+WORKER_GENERATIONS = 2
+
+# Barrera de ScoringPool.warm, que el proceso recibe al crearse.
+_warm_barrier = None
+
+def _init_scoring_worker(barrier):
+    global _warm_barrier
+    name_matching.FUZZY_WORKERS = 1
+    _warm_barrier = barrier
+
+def _worker_name_index(path, signature, corpus_path):
+    """Índice de nombres de la generación en un proceso de ScoringPool: abre ``corpus_path`` si aún no lo
+    tiene abierto (o, si no se puede, lo carga de la base de datos)."""
+    index = _worker_indexes.get(signature)
+    if index is None:
+        while len(_worker_indexes) >= WORKER_GENERATIONS:
+            _worker_indexes.popitem(last=False)
+        try:
+            index = MappedNameIndex.open(corpus_path, signature)
+        except (OSError, ValueError) as e:
+            logging.warning(f"No se pudo abrir el índice de nombres compartido ({e}); se carga de la base de datos.")
+            index = DatabaseGeneration(path, signature).load_name_index()
+        _worker_indexes[signature] = index
+    _worker_indexes.move_to_end(signature)
+    return index
+
+def _load_in_worker(path, signature, corpus_path, timeout):
+    """Se ejecuta en un proceso de ScoringPool: abre el índice y espera a que los demás procesos lo hayan abierto
+    (ver ScoringPool.warm)."""
+    _worker_name_index(path, signature, corpus_path)
+    _warm_barrier.wait(timeout)
+
+def _score_in_worker(path, signature, corpus_path, query_name, threshold, exclude_aliases):
+    """Se ejecuta en un proceso de ScoringPool: puntúa la consulta como rank_search_results y devuelve sus
+    best_matches junto con el tiempo de cada etapa y los candidatos, que el servidor registra como suyos."""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    with search_stage('name_index'):
+        name_index = _worker_name_index(path, signature, corpus_path)
+    corpus = name_index.primary if exclude_aliases else name_index.full
+    return best_matches(corpus, score_name_query(corpus, query_name, threshold)), timings.stages, timings.candidates
+
+_scoring_pool = ScoringPool(SEARCH_PROCESSES, SEARCH_QUEUE_SIZE, SEARCH_QUEUE_TIMEOUT) if SEARCH_PROCESSES > 0 and SEARCH_BACKEND == 'sqlite' else None
+
+def rank_search_results(cursor, search_params, name_index=None):
+    """Devuelve los UIDs que cumplen los criterios, ordenados por relevancia, y su puntuación difusa.
+
+    No hidrata ninguna entidad: el resultado es una lista de UIDs y un diccionario
+    {uid: {'score', 'matched_on'}} (vacío salvo en búsquedas difusas). Con _scoring_pool, y si no se pasa
+    ``name_index``, la puntuación difusa se hace en uno de sus procesos y puede lanzar SearchOverloaded.
+    """
+    if _is_postgres(cursor):
+        return rank_search_results_postgres(cursor, search_params)
+    uids_from_name_search = None
+    scores_map = {}
+
+    query_name = search_params.get('name')
+    exclude_aliases = search_params.get('exclude_aliases', False)
+
+    if query_name:
+        if search_params.get('is_exact_search'):
+            sql = "SELECT DISTINCT uid FROM Entidades WHERE nombre_principal = ?"
+            sql_params = [query_name]
+            if not exclude_aliases:
+                # UNION en vez de un OR sobre el LEFT JOIN para que ambas ramas usen sus índices de nombre.
+                sql = "SELECT uid FROM Entidades WHERE nombre_principal = ? UNION SELECT entidad_uid FROM Alias WHERE nombre_alias = ? ORDER BY 1"
+                sql_params = [query_name, query_name]
+            with search_stage('name_select'):
+                cursor.execute(sql, sql_params)
+                uids_from_name_search = [row['uid'] for row in cursor.fetchall()]
+        else: # Fuzzy Search
+            threshold = search_params.get('threshold', 80)
+            if _scoring_pool is not None and name_index is None:
+                generation = _db_pool.generation_of(cursor.connection) or get_active_generation()
+                if generation is None:
+                    raise ConnectionError("No se pudo conectar a la base de datos")
+                matches = _scoring_pool.score(generation, query_name, threshold, exclude_aliases)
+            else:
+                with search_stage('name_index'):
+                    name_index = name_index or get_name_index(cursor.connection)
+                corpus = name_index.primary if exclude_aliases else name_index.full
+                matches = best_matches(corpus, score_name_query(corpus, query_name, threshold))
+            uids_from_name_search = [match['uid'] for match in matches]
+            scores_map = {m['uid']: {'score': m['score'], 'matched_on': m['matched_on']} for m in matches}
+
+    if uids_from_name_search is not None and not uids_from_name_search:
+        return [], scores_map
+
+    with search_stage('filters'):
+        return _filter_search_results(cursor, search_params, uids_from_name_search, scores_map)
+
+def _filter_search_results(cursor, search_params, uids_from_name_search, scores_map):
+    """Aplica a los UIDs de la búsqueda por nombre (None si no hay nombre) los filtros de fecha de nacimiento,
+    nacionalidad e identificador; ver rank_search_results."""
+    search_tables = _search_tables(cursor)
+    structured = structured_filters(search_params) if {'FechasNacimiento', 'Nacionalidades'} <= search_tables else {}
+    conditions, params = [], []
+
+    # Cada filtro es un IN (subconsulta) que devuelve entidad_uid. La fecha de nacimiento y la nacionalidad
+    # se buscan en FechasNacimiento y Nacionalidades si la consulta se puede interpretar; si no, por texto: con
+    # las tablas FTS5 de ofac_parser.py el LIKE '%...%' se resuelve con su índice de trigramas y, sin ellas,
+    # con LIKE sobre la tabla original.
+    for key, tipo in (('dob', 'Date of Birth'), ('nationality', 'Nationality')):
+        if key in structured:
+            conditions.append(f"e.uid IN ({structured[key][0]})")
+            params.extend(structured[key][1])
+        elif search_params.get(key):
+            table = 'BusquedaCaracteristicas' if 'BusquedaCaracteristicas' in search_tables else 'CaracteristicasAdicionales'
+            conditions.append(f"e.uid IN (SELECT entidad_uid FROM {table} WHERE tipo_caracteristica LIKE ? AND valor_caracteristica LIKE ?)")
+            params.extend([f"%{tipo}%", f"%{search_params.get(key)}%"])
+
+    if search_params.get('gov_id'):
+        table = 'BusquedaIdentificadores' if 'BusquedaIdentificadores' in search_tables else 'Identificadores'
+        conditions.append(f"e.uid IN (SELECT entidad_uid FROM {table} WHERE numero_identificador LIKE ?)")
+        params.append(f"%{search_params.get('gov_id')}%")
+
+    # Sin más filtros que el nombre no hace falta volver a la base de datos; con filtros, la
+    # intersección se hace aquí en vez de con un IN (...) que superaría el límite de parámetros
+    # de SQLite en búsquedas con decenas de miles de coincidencias.
+    if uids_from_name_search is not None and not conditions:
+        return uids_from_name_search, scores_map
+
+    final_query = "SELECT e.uid FROM Entidades e"
+    if conditions: final_query += " WHERE " + " AND ".join(conditions)
+    final_query += " ORDER BY e.uid"
     
-    return entidad_completa
+    cursor.execute(final_query, params)
+    final_uids = [row['uid'] for row in cursor.fetchall()]
+
+    if uids_from_name_search is not None:
+        final_uid_set = set(final_uids)
+        return [uid for uid in uids_from_name_search if uid in final_uid_set], scores_map
+    return final_uids, scores_map
+
+_postgres_features = (None, None)
+
+def _postgres_search_features(cursor):
+    """Devuelve (hay texto_busqueda(), hay pg_trgm, hay ClavesFoneticas, hay FechasNacimiento y Nacionalidades)
+    en la base de datos; ver crear_indices_busqueda_postgres en ofac_parser.py. Sin ellos la búsqueda funciona
+    igual, con lower(), recorriendo todos los nombres y filtrando fechas y nacionalidades por texto.
+
+    Se consulta una vez por firma de los datos (ver get_postgres_signature): ofac_parser.py los crea al
+    preparar la base de datos, antes de guardar las fuentes que cambian la firma."""
+    global _postgres_features
+    signature = get_postgres_signature()
+    checked_signature, features = _postgres_features
+    if features is not None and signature is not None and signature == checked_signature:
+        return features
+    cursor.execute("""SELECT to_regprocedure('texto_busqueda(text)') IS NOT NULL AS normalizar,
+                             EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS trigramas,
+                             to_regclass('clavesfoneticas') IS NOT NULL AS foneticas,
+                             to_regclass('fechasnacimiento') IS NOT NULL AND to_regclass('nacionalidades') IS NOT NULL AS atributos""")
+    row = cursor.fetchone()
+    features = row['normalizar'], row['trigramas'], row['foneticas'], row['atributos']
+    _postgres_features = (signature, features)
+    return features
+
+def rank_search_results_postgres(cursor, search_params):
+    """rank_search_results sobre PostgreSQL, con las mismas puntuaciones que con SQLite.
+
+    Los filtros se resuelven en la misma consulta que los nombres. En la búsqueda difusa, los candidatos
+    son los nombres con similarity() >= umbral * POSTGRES_TRGM_SIMILARITY_FACTOR sobre texto_busqueda(nombre)
+    (índice GIN de pg_trgm) y, con PHONETIC_SEARCH, los que comparten claves fonéticas con la consulta, como
+    en PhoneticIndex; por debajo de NGRAM_BLOCKING_MIN_THRESHOLD se traen todos. Se puntúan aquí con
+    score_name_query.
+    """
+    normalizar, trigramas, foneticas, atributos = _postgres_search_features(cursor)
+    fold = "texto_busqueda" if normalizar else "lower"
+    structured = structured_filters(search_params, '%s') if atributos else {}
+    conditions, params = [], []
+    # La fecha de nacimiento y la nacionalidad se buscan en FechasNacimiento y Nacionalidades, como con SQLite; si
+    # no se pueden interpretar, por texto sin distinguir mayúsculas ni acentos (con pg_trgm, el LIKE '%...%' usa
+    # el índice de trigramas de la columna).
+    for key, tipo in (('dob', 'Date of Birth'), ('nationality', 'Nationality')):
+        if key in structured:
+            conditions.append(f"n.uid IN ({structured[key][0]})")
+            params.extend(structured[key][1])
+        elif search_params.get(key):
+            conditions.append(f"n.uid IN (SELECT entidad_uid FROM CaracteristicasAdicionales WHERE tipo_caracteristica ILIKE %s AND {fold}(valor_caracteristica) LIKE '%%' || {fold}(%s) || '%%')")
+            params.extend([f"%{tipo}%", search_params.get(key)])
+    if search_params.get('gov_id'):
+        conditions.append(f"n.uid IN (SELECT entidad_uid FROM Identificadores WHERE {fold}(numero_identificador) LIKE '%%' || {fold}(%s) || '%%')")
+        params.append(search_params.get('gov_id'))
+    where = " AND ".join(conditions) or "TRUE"
+
+    query_name = search_params.get('name')
+    exclude_aliases = search_params.get('exclude_aliases', False)
+    if not query_name:
+        with search_stage('filters'):
+            cursor.execute(f"SELECT n.uid FROM Entidades n WHERE {where} ORDER BY n.uid", params)
+            return [row['uid'] for row in cursor.fetchall()], {}
+
+    if search_params.get('is_exact_search'):
+        names = "SELECT uid FROM Entidades WHERE nombre_principal = %s"
+        name_params = [query_name]
+        if not exclude_aliases:
+            names += " UNION SELECT entidad_uid FROM Alias WHERE nombre_alias = %s"
+            name_params.append(query_name)
+        with search_stage('name_select'):
+            cursor.execute(f"SELECT n.uid FROM ({names}) n WHERE {where} ORDER BY n.uid", name_params + params)
+            return [row['uid'] for row in cursor.fetchall()], {}
+
+    # Cada rama devuelve (uid, nombre, es_alias, fonético). Los nombres de cada entidad se ordenan como en
+    # NombresIndexados (el principal y después los alias por orden binario), que decide cuál cuenta si dos empatan.
+    # Los filtros van en la misma consulta, así que su tiempo cuenta como name_select.
+    threshold = search_params.get('threshold', 80)
+    branches = []
+    if trigramas and threshold >= NGRAM_BLOCKING_MIN_THRESHOLD:
+        # set_config(..., true) solo dura hasta el final de la transacción, que el pool termina al devolver la conexión.
+        cursor.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)", (str(min(threshold * POSTGRES_TRGM_SIMILARITY_FACTOR, 1.0)),))
+        branches.append((f"SELECT uid, nombre_principal AS nombre, 0 AS es_alias, FALSE AS fonetico FROM Entidades WHERE {fold}(nombre_principal) %% {fold}(%s)", [query_name]))
+        if not exclude_aliases:
+            branches.append((f"SELECT entidad_uid, nombre_alias, 1, FALSE FROM Alias WHERE {fold}(nombre_alias) %% {fold}(%s)", [query_name]))
+    else:
+        branches.append(("SELECT uid, nombre_principal AS nombre, 0 AS es_alias, FALSE AS fonetico FROM Entidades", []))
+        if not exclude_aliases:
+            branches.append(("SELECT entidad_uid, nombre_alias, 1, FALSE FROM Alias", []))
+    keys = sorted(phonetic_keys(transliterate(query_name))) if PHONETIC_SEARCH and foneticas else []
+    if keys:
+        phonetic = "SELECT entidad_uid, nombre FROM ClavesFoneticas WHERE clave = ANY(%s) GROUP BY entidad_uid, nombre HAVING COUNT(*) >= %s"
+        phonetic_params = [keys, max(1, math.ceil(len(keys) / 2))]
+        branches.append((f"SELECT e.uid, e.nombre_principal, 0, TRUE FROM Entidades e JOIN ({phonetic}) f ON f.entidad_uid = e.uid AND f.nombre = e.nombre_principal", phonetic_params))
+        if not exclude_aliases:
+            branches.append((f"SELECT a.entidad_uid, a.nombre_alias, 1, TRUE FROM Alias a JOIN ({phonetic}) f ON f.entidad_uid = a.entidad_uid AND f.nombre = a.nombre_alias", phonetic_params))
+    names = " UNION ALL ".join(sql for sql, _ in branches)
+    name_params = [param for _, branch_params in branches for param in branch_params]
+    with search_stage('name_select'):
+        cursor.execute(f"""SELECT n.uid, n.nombre, bool_or(n.fonetico) AS fonetico FROM ({names}) n
+                           WHERE n.nombre IS NOT NULL AND {where} GROUP BY n.uid, n.nombre, n.es_alias ORDER BY n.uid, n.es_alias, n.nombre COLLATE "C" """, name_params + params)
+        rows = cursor.fetchall()
+    with search_stage('normalize'):
+        corpus = NameCorpus.from_candidates((row['uid'], row['nombre'], row['fonetico']) for row in rows)
+    matches = best_matches(corpus, score_name_query(corpus, query_name, threshold))
+    return [match['uid'] for match in matches], {m['uid']: {'score': m['score'], 'matched_on': m['matched_on']} for m in matches}
+
+def _search_tables(cursor):
+    """Nombres de las tablas FTS5 y de atributos presentes en la base de datos (ver ofac_parser.py)."""
+    cursor.execute("SELECT name FROM sqlite_master WHERE name IN ('BusquedaIdentificadores', 'BusquedaCaracteristicas', 'FechasNacimiento', 'Nacionalidades')")
+    return {row['name'] for row in cursor.fetchall()}
+
+def structured_filters(search_params, placeholder='?'):
+    """Subconsultas sobre FechasNacimiento y Nacionalidades para los filtros dob y nationality que se pueden
+    interpretar (ver structured_attributes.py): {'dob' | 'nationality': (sql que devuelve entidad_uid, params)}.
+
+    Una fecha encuentra las que caen en su intervalo de años, ampliado en dob_tolerance años por cada lado.
+    Sin tolerancia, el mes y el día de la consulta descartan las fechas que tienen otro, pero no las que no lo
+    indican. Los filtros que no se reconocen no aparecen y se siguen buscando por texto.
+    """
+    filters = {}
+    dob = parse_birth_date_query(search_params.get('dob'))
+    if dob:
+        desde, hasta, mes, dia = dob
+        tolerance = search_params.get('dob_tolerance', 0)
+        sql = f"SELECT entidad_uid FROM FechasNacimiento WHERE anio BETWEEN {placeholder} AND {placeholder}"
+        params = [desde - tolerance, hasta + tolerance]
+        if not tolerance and mes:
+            sql += f" AND mes IN (0, {placeholder})"
+            params.append(mes)
+            if dia:
+                sql += f" AND dia IN (0, {placeholder})"
+                params.append(dia)
+        filters['dob'] = (sql, params)
+    codes = country_codes(search_params.get('nationality'))
+    if codes:
+        filters['nationality'] = (f"SELECT entidad_uid FROM Nacionalidades WHERE codigo_pais IN ({', '.join(placeholder for _ in codes)})", codes)
+    return filters
+
+class SearchCache:
+    """Caché LRU, con caducidad, de los resultados de rank_search_results (UIDs ordenados y puntuaciones).
+
+    La clave son los parámetros de búsqueda normalizados (ver ``key``) y cada entrada vale para la firma de
+    los datos con que se calculó: cuando aparece una firma nueva (otra generación, o EstadoFuentes en
+    PostgreSQL), la caché se vacía entera y pasa a ella. Solo se avanza: las búsquedas con una firma ya
+    superada (una conexión de la generación anterior durante un cambio) ni leen ni guardan resultados.
+    Los resultados se comparten entre peticiones y no deben modificarse.
+    """
+
+    # Firmas superadas que se recuerdan para no volver a ellas.
+    RETIRED_SIGNATURES = 16
+
+    def __init__(self, max_entries, ttl, max_results):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_results = max_results
+        self._entries = OrderedDict()
+        self._signature = None
+        self._retired = deque(maxlen=self.RETIRED_SIGNATURES)
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = self._expirations = self._invalidations = 0
+
+    @staticmethod
+    def key(search_params):
+        """Parámetros que deciden el resultado, sin los que no influyen (el umbral en una búsqueda exacta o sin
+        nombre, la tolerancia sin fecha), para que dos peticiones equivalentes compartan la entrada. En la
+        búsqueda difusa el nombre entra como lo ve score_name_query (normalize_string, transliterate e is_abjad), así
+        que "Ivan  Petrov" e "ivan petrov" comparten entrada; la exacta compara el nombre tal cual."""
+        name = search_params.get('name') or ''
+        dob = search_params.get('dob') or ''
+        exact = bool(name and search_params.get('is_exact_search'))
+        if name and not exact:
+            name = (normalize_string(name), (transliterate(name), is_abjad(name)) if PHONETIC_SEARCH else None)
+        return (name, exact, search_params.get('threshold', 80) if name and not exact else None,
+                bool(name and search_params.get('exclude_aliases')), dob, search_params.get('dob_tolerance', 0) if dob else 0,
+                search_params.get('nationality') or '', search_params.get('gov_id') or '')
+
+    def get(self, signature, key):
+        """Devuelve el resultado guardado para ``key`` con los datos ``signature``, o None."""
+        with self._lock:
+            if not self._check_signature(signature):
+                self._misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def put(self, signature, key, result):
+        """Guarda ``result``, salvo que sea demasiado grande o que los datos hayan cambiado mientras se calculaba."""
+        if self.max_entries <= 0 or len(result[0]) > self.max_results:
+            return
+        with self._lock:
+            if not self._check_signature(signature):
+                return
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _check_signature(self, signature):
+        """Indica si ``signature`` es la vigente, pasando a ella si es nueva. Se llama con self._lock adquirido."""
+        if signature == self._signature:
+            return True
+        if signature in self._retired or self._older_generation(signature, self._signature):
+            return False
+        if self._entries:
+            self._invalidations += 1
+        self._entries.clear()
+        if self._signature is not None:
+            self._retired.append(self._signature)
+        self._signature = signature
+        return True
+
+    @staticmethod
+    def _older_generation(signature, current):
+        # Las firmas de SQLite empiezan por el número de generación (None sin marcador); las de PostgreSQL son un hash.
+        if isinstance(signature, tuple) and isinstance(current, tuple) and signature[0] is not None and current[0] is not None:
+            return signature[0] < current[0]
+        return False
 
-def perform_database_search(search_params):
-    """Función central que ejecuta la lógica de búsqueda y devuelve los resultados."""
-    conn = conectar_db()
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'entries': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else None,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
+
+_search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_MAX_RESULTS)
+
+def cached_rank_search_results(conn, search_params, name_index=None):
+    """rank_search_results sobre ``conn`` (una conexión del pool) a través de _search_cache.
+
+    La firma es la de la generación con que se abrió la conexión, no la activa, para no guardar
+    resultados de la generación anterior como si fueran de la nueva durante un cambio.
+    """
+    generation = _db_pool.generation_of(conn)
+    signature = generation.signature if generation else get_data_signature()
+    key = SearchCache.key(search_params)
+    timings = _request_timings.get()
+    if signature is not None and SEARCH_CACHE_SIZE > 0:
+        result = _search_cache.get(signature, key)
+        if timings is not None: timings.cache = 'miss' if result is None else 'hit'
+        if result is not None:
+            SEARCH_RESULTS.observe(len(result[0]))
+            return result
+    result = rank_search_results(conn.cursor(), search_params, name_index)
+    SEARCH_RESULTS.observe(len(result[0]))
+    if signature is not None:
+        _search_cache.put(signature, key, result)
+    return result
+
+def iter_entity_details(cursor, uids, scores_map):
+    """Hidrata las entidades de ``uids`` en bloques de HYDRATION_CHUNK_SIZE y las devuelve de una en una,
+    en orden, añadiendo su puntuación si la tienen."""
+    for start in range(0, len(uids), HYDRATION_CHUNK_SIZE):
+        with search_stage('hydration'):
+            entidades = get_entities_details(cursor, uids[start:start + HYDRATION_CHUNK_SIZE])
+        for entidad_completa in entidades:
+            if entidad_completa['uid'] in scores_map:
+                entidad_completa.update(scores_map[entidad_completa['uid']])
+            yield entidad_completa
+
+def perform_database_search(search_params, conn=None, name_index=None, offset=0, limit=SEARCH_DEFAULT_LIMIT):
+    """Función central que ejecuta la lógica de búsqueda y devuelve los resultados.
+
+    Devuelve la página ``[offset:offset + limit]`` de las entidades encontradas (``limit=None``
+    para todas). ``conn`` y ``name_index`` permiten reutilizar una conexión y un índice de nombres
+    entre varias búsquedas (p. ej. en /screen/batch); si no se pasan, se abre y se cierra una
+    conexión propia.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = _db_pool.acquire()
     if not conn:
         raise ConnectionError("No se pudo conectar a la base de datos")
 
     try:
         cursor = conn.cursor()
-        uids_from_name_search = None
-        scores_map = {}
-
-        query_name = search_params.get('name')
-        exclude_aliases = search_params.get('exclude_aliases', False)
-
-        if query_name:
-            if search_params.get('is_exact_search'):
-                sql = "SELECT DISTINCT uid FROM Entidades WHERE nombre_principal = ?"
-                sql_params = [query_name]
-                if not exclude_aliases:
-                    sql = "SELECT DISTINCT e.uid FROM Entidades e LEFT JOIN Alias a ON e.uid = a.entidad_uid WHERE e.nombre_principal = ? OR a.nombre_alias = ?"
-                    sql_params = [query_name, query_name]
-                cursor.execute(sql, sql_params)
-                uids_from_name_search = [row['uid'] for row in cursor.fetchall()]
-            else: # Fuzzy Search
-                if exclude_aliases:
-                    cursor.execute("SELECT uid, nombre_principal FROM Entidades")
-                else:
-                    cursor.execute("SELECT e.uid, e.nombre_principal, a.nombre_alias FROM Entidades e LEFT JOIN Alias a ON e.uid = a.entidad_uid")
-                
-                all_names_from_db = cursor.fetchall()
-                names_by_uid = {}
-                for row in all_names_from_db:
-                    uid = row['uid']
-                    if uid not in names_by_uid: names_by_uid[uid] = []
-                    if row['nombre_principal'] and row['nombre_principal'] not in names_by_uid[uid]: names_by_uid[uid].append(row['nombre_principal'])
-                    if not exclude_aliases and 'nombre_alias' in row.keys() and row['nombre_alias'] and row['nombre_alias'] not in names_by_uid[uid]:
-                        names_by_uid[uid].append(row['nombre_alias'])
-
-                normalized_query = normalize_string(query_name)
-                matches = []
-                for uid, names in names_by_uid.items():
-                    best_match_in_entity = {'score': 0, 'name': ''}
-                    for name in names:
-                        score = fuzz.token_sort_ratio(normalized_query, normalize_string(name))
-                        if score > best_match_in_entity['score']:
-                            best_match_in_entity['score'] = score
-                            best_match_in_entity['name'] = name
-                    
-                    if best_match_in_entity['score'] >= search_params.get('threshold', 80):
-                        matches.append({'uid': uid, 'score': best_match_in_entity['score'], 'matched_on': best_match_in_entity['name']})
-                
-                matches.sort(key=lambda x: x['score'], reverse=True)
-                uids_from_name_search = [match['uid'] for match in matches]
-                scores_map = {m['uid']: {'score': m['score'], 'matched_on': m['matched_on']} for m in matches}
-
-        base_query = "SELECT DISTINCT e.uid FROM Entidades e"
-        joins, conditions, params = set(), [], []
-
-        if uids_from_name_search is not None:
-            if not uids_from_name_search: return []
-            placeholders = ','.join('?' for _ in uids_from_name_search)
-            conditions.append(f"e.uid IN ({placeholders})")
-            params.extend(uids_from_name_search)
-
-        if search_params.get('dob'):
-            joins.add("LEFT JOIN CaracteristicasAdicionales ca_dob ON e.uid = ca_dob.entidad_uid")
-            conditions.append("(ca_dob.tipo_caracteristica LIKE '%Date of Birth%' AND ca_dob.valor_caracteristica LIKE ?)")
-            params.append(f"%{search_params.get('dob')}%")
-        
-        if search_params.get('nationality'):
-            joins.add("LEFT JOIN CaracteristicasAdicionales ca_nat ON e.uid = ca_nat.entidad_uid")
-            conditions.append("(ca_nat.tipo_caracteristica LIKE '%Nationality%' AND ca_nat.valor_caracteristica LIKE ?)")
-            params.append(f"%{search_params.get('nationality')}%")
-
-        if search_params.get('gov_id'):
-            joins.add("LEFT JOIN Identificadores i ON e.uid = i.entidad_uid")
-            conditions.append("i.numero_identificador LIKE ?")
-            params.append(f"%{search_params.get('gov_id')}%")
-
-        final_query = base_query
-        if joins: final_query += " " + " ".join(list(joins))
-        if conditions: final_query += " WHERE " + " AND ".join(conditions)
-        
-        cursor.execute(final_query, params)
-        final_uids = [row['uid'] for row in cursor.fetchall()]
-
-        if uids_from_name_search is not None:
-            final_uids_ordered = [uid for uid in uids_from_name_search if uid in final_uids]
-        else:
-            final_uids_ordered = final_uids
-
-        entidades_encontradas = []
-        for uid in final_uids_ordered[:50]:
-            entidad_completa = get_full_entity_details(cursor, uid)
-            if entidad_completa:
-                if uid in scores_map:
-                    entidad_completa.update(scores_map[uid])
-                entidades_encontradas.append(entidad_completa)
-        
-        return entidades_encontradas
+        uids, scores_map = cached_rank_search_results(conn, search_params, name_index)
+        page = uids[offset:] if limit is None else uids[offset:offset + limit]
+        return list(iter_entity_details(cursor, page, scores_map))
 
     finally:
-        if conn: conn.close()
+        if own_conn and conn: _db_pool.release(conn)
+
+def parse_search_params(source):
+    """Construye search_params a partir de request.args o de un registro de /screen/batch."""
+    def text(key): return str(source.get(key) or '').strip()
+    def flag(key): return str(source.get(key) or 'false').strip().lower() == 'true'
+    threshold = source.get('threshold')
+    dob_tolerance = int(source.get('dob_tolerance') or 0)
+    if not 0 <= dob_tolerance <= DOB_MAX_YEAR_TOLERANCE:
+        raise ValueError(f"dob_tolerance debe estar entre 0 y {DOB_MAX_YEAR_TOLERANCE}")
+    return {
+        'name': text('name'),
+        'dob': text('dob'),
+        'dob_tolerance': dob_tolerance,
+        'nationality': text('nationality'),
+        'gov_id': text('gov_id'),
+        'threshold': int(threshold) if threshold not in (None, '') else 80,
+        'is_exact_search': flag('exact'),
+        'exclude_aliases': flag('exclude_aliases')
+    }
+
+def has_search_criteria(search_params):
+    return any([search_params['name'], search_params['dob'], search_params['nationality'], search_params['gov_id']])
+
+def _cursor_version():
+    """Identifica la versión de la base de datos para la que se emitió un cursor."""
+    return hashlib.sha1(repr(get_data_signature()).encode()).hexdigest()[:12]
+
+def encode_page_cursor(offset):
+    """Cursor opaco para pedir la página que empieza en ``offset``."""
+    payload = json.dumps({'o': offset, 'v': _cursor_version()}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_page_cursor(token):
+    """Devuelve el offset de un cursor; ValueError si es inválido o la base de datos ha cambiado desde que se emitió."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        offset, version = int(payload['o']), payload['v']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise ValueError("cursor inválido")
+    if offset < 0:
+        raise ValueError("cursor inválido")
+    if version != _cursor_version():
+        raise ValueError("la base de datos ha cambiado desde que se emitió el cursor; repite la búsqueda")
+    return offset
+
+def parse_pagination(source, default_limit, max_limit):
+    """Lee ``cursor`` u ``offset`` y ``limit`` de la petición; devuelve (offset, limit) o lanza ValueError."""
+    cursor_token = str(source.get('cursor') or '').strip()
+    offset = str(source.get('offset') or '').strip()
+    limit = str(source.get('limit') or '').strip()
+    if cursor_token:
+        offset = decode_page_cursor(cursor_token)
+    else:
+        offset = int(offset) if offset else 0
+    limit = int(limit) if limit else default_limit
+    if offset < 0 or limit < 1:
+        raise ValueError("offset debe ser >= 0 y limit >= 1")
+    return offset, min(limit, max_limit)
+
+def _export_row(entidad):
+    """Fila del CSV de exportación para una entidad hidratada."""
+    # Se asegura de que todos los elementos sean strings antes de unirlos.
+    programas_str = " | ".join(filter(None, entidad.get('programas', [])))
+    aliases_str = " | ".join([f"{a.get('nombre_alias') or ''} ({a.get('tipo_alias') or 'Alias'})" for a in entidad.get('aliases', [])])
+    direcciones_str = " | ".join([d.get('direccion_completa') or '' for d in entidad.get('direcciones', [])])
+    ids_str = " | ".join([f"{i.get('tipo_identificador') or ''}: {i.get('numero_identificador') or ''}" for i in entidad.get('identificadores', [])])
+    caracteristicas_str = " | ".join([f"{c.get('tipo_caracteristica') or ''}: {c.get('valor_caracteristica') or ''}" for c in entidad.get('caracteristicas', [])])
+    return [
+        entidad.get('uid'), entidad.get('nombre_principal'), entidad.get('tipo'), entidad.get('fuente_lista'),
+        programas_str, aliases_str, direcciones_str, ids_str, caracteristicas_str
+    ]
+
+class _LineBuffer:
+    """Destino para csv.writer que devuelve cada línea en lugar de acumularla."""
+    def write(self, line):
+        return line
+
+def overloaded_response(error):
+    """Respuesta 503 de una búsqueda rechazada por SearchOverloaded."""
+    logging.warning(f"Búsqueda rechazada: {error}")
+    response = jsonify({"error": "El servidor está atendiendo demasiadas búsquedas; inténtalo de nuevo en unos segundos."})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(SEARCH_RETRY_AFTER)
+    return response
+
+@app.before_request
+def start_request_timings():
+    g.request_timings = RequestTimings()
+    _request_timings.set(g.request_timings)
+
+@app.after_request
+def record_request_metrics(response):
+    """Cuenta la respuesta en /metrics y, con SERVER_TIMING, añade la cabecera Server-Timing con las etapas de la búsqueda."""
+    endpoint = request_endpoint()
+    timings = g.get('request_timings')
+    elapsed = time.perf_counter() - timings.start if timings else None
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if elapsed is not None:
+        HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = timings.header(elapsed)
+    if response.status_code >= 400:
+        ERRORS.inc(endpoint=endpoint, kind='client' if response.status_code < 500 else 'server')
+    return response
 
 @app.route('/')
 def index():
     """Sirve el archivo frontend principal."""
     return render_template('verificador_final.html')
 
+@app.route('/status')
+def status():
+    """Estado del servidor: generación de la base de datos activa, índice de nombres cargado, pool de conexiones,
+    procesos de puntuación y caché de búsquedas."""
+    generation = get_active_generation() if SEARCH_BACKEND == 'sqlite' else None
+    name_index = generation.name_index if generation else None
+    return jsonify({
+        "search_backend": SEARCH_BACKEND,
+        "data_signature": get_data_signature(),
+        "db_file": generation.path if generation else None,
+        "db_generation": generation.number if generation else None,
+        "db_signature": generation.signature if generation else None,
+        "switching_to": _pending_signature,
+        "name_index": {"entidades": len(name_index.full.uids), "nombres": len(name_index.full)} if name_index else None,
+        "name_corpus_file": generation.name_corpus_file if generation else None,
+        "pool": _db_pool.stats(),
+        "scoring_pool": _scoring_pool.stats() if _scoring_pool else None,
+        "search_cache": _search_cache.stats()
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en el formato de texto de Prometheus: duración de cada etapa de la búsqueda, candidatos puntuados,
+    resultados por búsqueda, peticiones y errores por ruta, caché de búsquedas, pool de conexiones e índice de nombres."""
+    cache = _search_cache.stats()
+    for event in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+        SEARCH_CACHE_EVENTS.set(cache[event], event=event)
+    SEARCH_CACHE_ENTRIES.set(cache['entries'])
+    pool = _db_pool.stats()
+    DB_POOL_CONNECTIONS.set(pool['idle'], state='idle')
+    DB_POOL_CONNECTIONS.set(pool['in_use'], state='in_use')
+    generation = _active_generation if SEARCH_BACKEND == 'sqlite' else None
+    if generation is not None and generation.name_index is not None:
+        NAME_INDEX_NAMES.set(len(generation.name_index.full))
+    if _scoring_pool is not None:
+        scoring = _scoring_pool.stats()
+        SCORING_POOL_PENDING.set(scoring['pending'])
+        SCORING_POOL_REJECTED.set(scoring['rejected'])
+    return Response(render_metrics(METRICS), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/search')
 def search_sanctions():
-    """Endpoint que maneja las búsquedas para la UI."""
-    search_params = {
-        'name': request.args.get('name', '').strip(),
-        'dob': request.args.get('dob', '').strip(),
-        'nationality': request.args.get('nationality', '').strip(),
-        'gov_id': request.args.get('gov_id', '').strip(),
-        'threshold': int(request.args.get('threshold', 80)),
-        'is_exact_search': request.args.get('exact', 'false').lower() == 'true',
-        'exclude_aliases': request.args.get('exclude_aliases', 'false').lower() == 'true'
-    }
+    """Endpoint que maneja las búsquedas para la UI.
 
-    if not any([search_params['name'], search_params['dob'], search_params['nationality'], search_params['gov_id']]):
+    Devuelve una página de resultados (``limit``, por defecto SEARCH_DEFAULT_LIMIT) a partir de
+    ``offset`` o de ``cursor``, junto con el total y el cursor de la página siguiente.
+    """
+    try:
+        search_params = parse_search_params(request.args)
+        offset, limit = parse_pagination(request.args, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({"error": f"Parámetro inválido: {e}"}), 400
+
+    if not has_search_criteria(search_params):
         return jsonify({"error": "Se requiere al menos un parámetro de búsqueda"}), 400
 
+    conn = _db_pool.acquire()
+    if not conn:
+        return jsonify({"error": "Error interno al realizar la búsqueda"}), 500
     try:
-        resultados = perform_database_search(search_params)
-        logging.info(f"Se encontraron {len(resultados)} resultados para la búsqueda UI.")
-        return jsonify({"resultados": resultados})
+        cursor = conn.cursor()
+        uids, scores_map = cached_rank_search_results(conn, search_params)
+        resultados = list(iter_entity_details(cursor, uids[offset:offset + limit], scores_map))
+        next_offset = offset + limit if offset + limit < len(uids) else None
+        logging.info(f"Se encontraron {len(uids)} resultados para la búsqueda UI; se devuelven {len(resultados)}.")
+        return jsonify({
+            "resultados": resultados,
+            "total": len(uids),
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset,
+            "next_cursor": encode_page_cursor(next_offset) if next_offset is not None else None
+        })
+    except SearchOverloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         logging.error(f"Error inesperado durante la búsqueda: {e}", exc_info=True)
         return jsonify({"error": "Error interno al realizar la búsqueda"}), 500
+    finally:
+        _db_pool.release(conn)
 
 @app.route('/export')
 def export_results():
-    """Endpoint que maneja la exportación a CSV."""
-    search_params = {
-        'name': request.args.get('name', '').strip(),
-        'dob': request.args.get('dob', '').strip(),
-        'nationality': request.args.get('nationality', '').strip(),
-        'gov_id': request.args.get('gov_id', '').strip(),
-        'threshold': int(request.args.get('threshold', 80)),
-        'is_exact_search': request.args.get('exact', 'false').lower() == 'true',
-        'exclude_aliases': request.args.get('exclude_aliases', 'false').lower() == 'true'
-    }
+    """Endpoint que maneja la exportación a CSV.
 
-    if not any([search_params['name'], search_params['dob'], search_params['nationality'], search_params['gov_id']]):
+    Las filas se envían a medida que se hidratan las entidades, por lo que la memoria no depende
+    del número de resultados. Admite ``offset``/``cursor`` y ``limit`` (por defecto y como máximo
+    EXPORT_MAX_LIMIT).
+    """
+    try:
+        search_params = parse_search_params(request.args)
+        offset, limit = parse_pagination(request.args, EXPORT_MAX_LIMIT, EXPORT_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({"error": f"Parámetro inválido: {e}"}), 400
+
+    if not has_search_criteria(search_params):
         return jsonify({"error": "Se requiere al menos un criterio de búsqueda para exportar."}), 400
 
+    conn = _db_pool.acquire()
+    if not conn:
+        return jsonify({"error": "Error interno al generar el archivo CSV."}), 500
     try:
-        entidades_encontradas = perform_database_search(search_params)
-        logging.info(f"Exportando {len(entidades_encontradas)} resultados a CSV.")
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        headers = ["UID", "Nombre Principal", "Tipo", "Fuente", "Programas", "Alias", "Direcciones", "IDs", "Info Adicional"]
-        writer.writerow(headers)
-        
-        for entidad in entidades_encontradas:
-            # --- CORRECCIÓN AQUÍ ---
-            # Se asegura de que todos los elementos sean strings antes de unirlos.
-            programas_str = " | ".join(filter(None, entidad.get('programas', [])))
-            aliases_str = " | ".join([f"{a.get('nombre_alias') or ''} ({a.get('tipo_alias') or 'Alias'})" for a in entidad.get('aliases', [])])
-            direcciones_str = " | ".join([d.get('direccion_completa') or '' for d in entidad.get('direcciones', [])])
-            ids_str = " | ".join([f"{i.get('tipo_identificador') or ''}: {i.get('numero_identificador') or ''}" for i in entidad.get('identificadores', [])])
-            caracteristicas_str = " | ".join([f"{c.get('tipo_caracteristica') or ''}: {c.get('valor_caracteristica') or ''}" for c in entidad.get('caracteristicas', [])])
-            
-            row = [
-                entidad.get('uid'), entidad.get('nombre_principal'), entidad.get('tipo'), entidad.get('fuente_lista'),
-                programas_str, aliases_str, direcciones_str, ids_str, caracteristicas_str
-            ]
-            writer.writerow(row)
-            
-        output.seek(0)
-        
-        return Response(output, mimetype="text/csv", headers={"Content-Disposition":"attachment;filename=resultados_sanciones.csv"})
-
+        cursor = conn.cursor()
+        uids, scores_map = cached_rank_search_results(conn, search_params)
+    except SearchOverloaded as e:
+        _db_pool.release(conn)
+        return overloaded_response(e)
     except Exception as e:
+        _db_pool.release(conn)
         logging.error(f"Error inesperado durante la exportación: {e}", exc_info=True)
         return jsonify({"error": "Error interno al generar el archivo CSV."}), 500
 
+    page = uids[offset:offset + limit]
+    logging.info(f"Exportando {len(page)} de {len(uids)} resultados a CSV.")
+
+    def generate():
+        # A partir de aquí las cabeceras ya se han enviado: un error solo puede cortar la descarga.
+        exportadas = 0
+        try:
+            writer = csv.writer(_LineBuffer())
+            yield writer.writerow(["UID", "Nombre Principal", "Tipo", "Fuente", "Programas", "Alias", "Direcciones", "IDs", "Info Adicional"])
+            for entidad in iter_entity_details(cursor, page, scores_map):
+                yield writer.writerow(_export_row(entidad))
+                exportadas += 1
+        except Exception as e:
+            record_search_error('stream')
+            logging.error(f"Error inesperado durante la exportación tras {exportadas} filas: {e}", exc_info=True)
+        finally:
+            _db_pool.release(conn)
+
+    headers = {"Content-Disposition": "attachment;filename=resultados_sanciones.csv", "X-Total-Count": str(len(uids))}
+    if offset + limit < len(uids):
+        headers["X-Next-Cursor"] = encode_page_cursor(offset + limit)
+    return Response(stream_with_context(generate()), mimetype="text/csv", headers=headers)
+
+BATCH_CSV_MIMETYPES = ('text/csv', 'application/csv')
+BATCH_JSONL_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines', 'application/json')
+
+def read_batch_records(stream, batch_format):
+    """Lee los registros de /screen/batch de uno en uno, sin cargar el cuerpo completo en memoria.
+
+    Devuelve tuplas (número de registro, registro o None, error o None). Un registro CSV mal formado (p. ej. un
+    campo entrecomillado sin cerrar) da un error y se sigue con el siguiente; un cuerpo que no es UTF-8 da un
+    error y termina el lote, porque a partir de ahí no se sabe dónde empieza cada registro.
+    """
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if batch_format == 'csv' else None)
+    row_number = 0
+    try:
+        if batch_format == 'csv':
+            reader = csv.DictReader(text_stream)
+            while True:
+                try:
+                    record = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    row_number += 1
+                    yield row_number, None, f"CSV inválido: {e}"
+                    continue
+                row_number += 1
+                yield row_number, {(key or '').strip().lower(): value for key, value in record.items()}, None
+        for line in text_stream:
+            if not line.strip(): continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"JSON inválido: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, "Cada línea debe ser un objeto JSON"
+                continue
+            yield row_number, record, None
+    except UnicodeDecodeError as e:
+        yield row_number + 1, None, f"El cuerpo no es UTF-8 válido: {e}"
+
+@app.route('/screen/batch', methods=['POST'])
+def screen_batch():
+    """Endpoint de cribado masivo: recibe CSV o JSONL y devuelve un resultado NDJSON por registro.
+
+    Cada registro admite los mismos campos que /search (name, dob, dob_tolerance, nationality, gov_id,
+    threshold, exact, exclude_aliases) y un ``id`` opcional que se devuelve tal cual. La conexión y el índice de
+    nombres se abren una sola vez para todo el lote y cada resultado se envía en cuanto está listo.
+    """
+    batch_format = request.args.get('format', '').lower()
+    if not batch_format:
+        if request.mimetype in BATCH_CSV_MIMETYPES: batch_format = 'csv'
+        elif request.mimetype in BATCH_JSONL_MIMETYPES: batch_format = 'jsonl'
+    if batch_format not in ('csv', 'jsonl'):
+        return jsonify({"error": "Formato no soportado: envía text/csv o application/x-ndjson (o usa ?format=csv|jsonl)."}), 415
+
+    conn = _db_pool.acquire()
+    if not conn:
+        return jsonify({"error": "Error interno al realizar la búsqueda"}), 500
+    try:
+        # Con _scoring_pool el índice está en sus procesos y cada registro se puntúa en uno de ellos.
+        name_index = get_name_index(conn) if _scoring_pool is None else None
+    except Exception as e:
+        _db_pool.release(conn)
+        logging.error(f"Error inesperado al cargar el índice de nombres: {e}", exc_info=True)
+        return jsonify({"error": "Error interno al realizar la búsqueda"}), 500
+
+    def generate():
+        procesados = errores = 0
+        try:
+            for row_number, record, error in read_batch_records(request.stream, batch_format):
+                resultado = {'row': row_number}
+                if record is not None and record.get('id') not in (None, ''):
+                    resultado['id'] = record.get('id')
+                if error is None:
+                    try:
+                        search_params = parse_search_params(record)
+                        if has_search_criteria(search_params):
+                            resultado['resultados'] = perform_database_search(search_params, conn, name_index)
+                        else:
+                            error = "Se requiere al menos un parámetro de búsqueda"
+                    except (TypeError, ValueError) as e:
+                        # p. ej. un threshold o un dob_tolerance que en JSONL es una lista o un objeto.
+                        error = f"Parámetro inválido: {e}"
+                    except SearchOverloaded:
+                        error = "Servidor saturado: vuelve a enviar este registro más tarde"
+                    except Exception as e:
+                        logging.error(f"Error inesperado en el registro {row_number} del lote: {e}", exc_info=True)
+                        error = "Error interno al realizar la búsqueda"
+                if error is not None:
+                    record_search_error('record')
+                    resultado['error'] = error
+                    errores += 1
+                procesados += 1
+                yield json.dumps(resultado) + "\n"
+        finally:
+            _db_pool.release(conn)
+            logging.info(f"Lote procesado: {procesados} registros, {errores} con error.")
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""Interpretación de fechas de nacimiento y nacionalidades compartida por server.py y ofac_parser.py.
+
+Las cuatro listas escriben estos datos como texto libre y cada una a su manera ("1962", "12 Jan 1962",
+"23/04/1966", "1960 to 1965", "Korea, North", "IRAN (ISLAMIC REPUBLIC OF)", "Iraqi"). Aquí se convierten
+en valores con tipo: años, meses y días (0 si no se conocen) y códigos ISO 3166-1 alfa-2, que el parser
+guarda en las tablas FechasNacimiento y Nacionalidades y el servidor usa para filtrar con índices.
+"""
+import re
+import unicodedata
+
+# Rango de años que se acepta como fecha de nacimiento y amplitud máxima de un intervalo ("1940 to 1990" es
+# demasiado vago para filtrar y se descarta).
+BIRTH_YEAR_MIN = 1800
+BIRTH_YEAR_MAX = 2100
+BIRTH_RANGE_MAX_YEARS = 30
+
+_MONTHS = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
+# Las alternativas se prueban en este orden en cada posición: intervalo, ISO (AAAA-MM-DD), numérica con el año
+# al final (DD/MM/AAAA; UK escribe 00/00 o --/-- si no conoce el día o el mes), con el mes en letras y año suelto.
+_BIRTH_DATE_RE = re.compile(r"""
+    (?<![\d/.-])(?P<desde>\d{4})\s*(?:-|–|/|to|until|and)\s*(?P<hasta>\d{4})(?![\d/.-])
+  | (?<![\d/.-])(?P<iso_anio>\d{4})[-/.](?P<iso_mes>\d{1,2})(?:[-/.](?P<iso_dia>\d{1,2}))?(?!\d)
+  | (?<!\d)(?P<num_dia>\d{1,2}|[-x]{1,2}|dd)[-/.](?P<num_mes>\d{1,2}|[-x]{1,2}|mm)[-/.](?P<num_anio>\d{4})(?!\d)
+  | (?:(?<!\d)(?P<txt_dia>\d{1,2})(?:st|nd|rd|th)?\s+)?(?P<txt_mes>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?
+        (?:\s+(?P<txt_dia2>\d{1,2})(?:st|nd|rd|th)?)?,?\s+(?P<txt_anio>\d{4})(?!\d)
+  | (?<!\d)(?P<anio>\d{4})(?!\d)
+""", re.VERBOSE)
+
+def _number(text):
+    return int(text) if text and text.isdigit() else 0
+
+def _date(year, month=0, day=0):
+    """(año, año, mes, día) con el mes y el día a 0 si no son válidos, o None si el año no es plausible."""
+    if not BIRTH_YEAR_MIN <= year <= BIRTH_YEAR_MAX:
+        return None
+    if not 1 <= month <= 12:
+        month = day = 0
+    if not 1 <= day <= 31:
+        day = 0
+    return (year, year, month, day)
+
+def parse_birth_dates(text):
+    """Devuelve las fechas de nacimiento que aparecen en ``text`` como [(año_desde, año_hasta, mes, día)],
+    con 0 en el mes y el día si no se conocen; [] si no se reconoce ninguna."""
+    fechas = []
+    for match in _BIRTH_DATE_RE.finditer((text or '').lower()):
+        grupos = match.groupdict()
+        if grupos['desde']:
+            desde, hasta = sorted((int(grupos['desde']), int(grupos['hasta'])))
+            fecha = (desde, hasta, 0, 0) if BIRTH_YEAR_MIN <= desde and hasta <= BIRTH_YEAR_MAX and hasta - desde <= BIRTH_RANGE_MAX_YEARS else None
+        elif grupos['iso_anio']:
+            fecha = _date(int(grupos['iso_anio']), _number(grupos['iso_mes']), _number(grupos['iso_dia']))
+        elif grupos['num_anio']:
+            dia, mes = _number(grupos['num_dia']), _number(grupos['num_mes'])
+            # DD/MM es lo habitual en las listas; si el mes no es válido pero el día sí, la fecha viene como MM/DD.
+            if mes > 12 and 1 <= dia <= 12:
+                dia, mes = mes, dia
+            fecha = _date(int(grupos['num_anio']), mes, dia)
+        elif grupos['txt_anio']:
+            fecha = _date(int(grupos['txt_anio']), _MONTHS[grupos['txt_mes']], _number(grupos['txt_dia'] or grupos['txt_dia2']))
+        else:
+            fecha = _date(int(grupos['anio']))
+        if fecha and fecha not in fechas:
+            fechas.append(fecha)
+    return fechas
+
+def birth_date_rows(text):
+    """Filas (año, mes, día) de FechasNacimiento para ``text``: un intervalo de años se guarda como una fila por
+    año (con mes y día 0), de modo que el filtro es siempre un BETWEEN sobre el año indexado."""
+    filas = []
+    for desde, hasta, mes, dia in parse_birth_dates(text):
+        for anio in range(desde, hasta + 1):
+            if (anio, mes, dia) not in filas:
+                filas.append((anio, mes, dia))
+    return filas
+
+def parse_birth_date_query(text):
+    """Interpreta el parámetro ``dob`` de una búsqueda: (año_desde, año_hasta, mes, día), o None si no contiene
+    ninguna fecha reconocible. Si hay varias, se busca en el intervalo que las cubre, sin mes ni día."""
+    fechas = parse_birth_dates(text)
+    if not fechas:
+        return None
+    if len(fechas) == 1:
+        return fechas[0]
+    return (min(f[0] for f in fechas), max(f[1] for f in fechas), 0, 0)
+
+def is_birth_date_type(tipo):
+    """Indica si un tipo de característica es una fecha de nacimiento ('Date of Birth', 'Date of Birth (EXACT)',
+    'Birthdate'...), no un lugar de nacimiento."""
+    tipo = (tipo or '').lower()
+    return 'birthdate' in tipo or ('birth' in tipo and 'date' in tipo)
+
+def is_nationality_type(tipo):
+    """Indica si un tipo de característica es una nacionalidad o ciudadanía ('Nationality', 'Nationality Country',
+    'Nationality/Citizenship', 'Citizenship Country'...)."""
+    tipo = (tipo or '').lower()
+    return 'nationality' in tipo or 'citizenship' in tipo
+
+# ISO 3166-1: alfa-2, alfa-3 y los nombres con los que aparece cada país en las listas, separados por '|'
+# (nombre corto, nombre oficial de la ONU, variantes habituales y gentilicio). Los gentilicios ambiguos
+# ("Korean", "Congolese") no se incluyen. XK (Kosovo) es un código provisional de uso común.
+_COUNTRIES = """
+AF AFG Afghanistan|Afghan
+AX ALA Aland Islands
+AL ALB Albania|Albanian
+DZ DZA Algeria|Algerian
+AS ASM American Samoa
+AD AND Andorra|Andorran
+AO AGO Angola|Angolan
+AI AIA Anguilla
+AQ ATA Antarctica
+AG ATG Antigua and Barbuda|Antigua|Antiguan
+AR ARG Argentina|Argentine|Argentinian
+AM ARM Armenia|Armenian
+AW ABW Aruba
+AU AUS Australia|Australian
+AT AUT Austria|Austrian
+AZ AZE Azerbaijan|Azerbaijani|Azeri
+BS BHS Bahamas|Bahamian
+BH BHR Bahrain|Bahraini
+BD BGD Bangladesh|Bangladeshi
+BB BRB Barbados|Barbadian
+BY BLR Belarus|Belarusian|Byelorussian
+BE BEL Belgium|Belgian
+BZ BLZ Belize|Belizean
+BJ BEN Benin|Beninese
+BM BMU Bermuda
+BT BTN Bhutan|Bhutanese
+BO BOL Bolivia|Bolivia Plurinational State of|Bolivian
+BQ BES Bonaire Sint Eustatius and Saba|Caribbean Netherlands
+BA BIH Bosnia and Herzegovina|Bosnia Herzegovina|Bosnia|Bosnian
+BW BWA Botswana|Motswana
+BV BVT Bouvet Island
+BR BRA Brazil|Brazilian
+IO IOT British Indian Ocean Territory
+BN BRN Brunei|Brunei Darussalam|Bruneian
+BG BGR Bulgaria|Bulgarian
+BF BFA Burkina Faso|Burkinabe
+BI BDI Burundi|Burundian
+CV CPV Cabo Verde|Cape Verde|Cape Verdean
+KH KHM Cambodia|Cambodian
+CM CMR Cameroon|Cameroonian
+CA CAN Canada|Canadian
+KY CYM Cayman Islands
+CF CAF Central African Republic|Central African
+TD TCD Chad|Chadian
+CL CHL Chile|Chilean
+CN CHN China|People's Republic of China|China People's Republic of|Chinese
+CX CXR Christmas Island
+CC CCK Cocos Keeling Islands|Cocos Islands
+CO COL Colombia|Colombian
+KM COM Comoros|Comorian
+CG COG Congo|Republic of the Congo|Congo Republic of|Congo Republic|Congo Brazzaville
+CD COD Democratic Republic of the Congo|Congo Democratic Republic of the|Congo Democratic Republic|Congo DRC|DR Congo|DRC|Congo Kinshasa|Zaire
+CK COK Cook Islands
+CR CRI Costa Rica|Costa Rican
+CI CIV Cote d'Ivoire|Ivory Coast|Ivorian
+HR HRV Croatia|Croatian
+CU CUB Cuba|Cuban
+CW CUW Curacao
+CY CYP Cyprus|Cypriot
+CZ CZE Czechia|Czech Republic|Czech
+DK DNK Denmark|Danish
+DJ DJI Djibouti|Djiboutian
+DM DMA Dominica
+DO DOM Dominican Republic
+EC ECU Ecuador|Ecuadorian
+EG EGY Egypt|Egyptian
+SV SLV El Salvador|Salvadoran
+GQ GNQ Equatorial Guinea|Equatoguinean
+ER ERI Eritrea|Eritrean
+EE EST Estonia|Estonian
+SZ SWZ Eswatini|Swaziland|Swazi
+ET ETH Ethiopia|Ethiopian
+FK FLK Falkland Islands|Falkland Islands Malvinas
+FO FRO Faroe Islands
+FJ FJI Fiji|Fijian
+FI FIN Finland|Finnish
+FR FRA France|French
+GF GUF French Guiana
+PF PYF French Polynesia
+TF ATF French Southern Territories
+GA GAB Gabon|Gabonese
+GM GMB Gambia|Gambian
+GE GEO Georgia|Georgian
+DE DEU Germany|German
+GH GHA Ghana|Ghanaian
+GI GIB Gibraltar
+GR GRC Greece|Greek
+GL GRL Greenland
+GD GRD Grenada|Grenadian
+GP GLP Guadeloupe
+GU GUM Guam
+GT GTM Guatemala|Guatemalan
+GG GGY Guernsey
+GN GIN Guinea|Guinean
+GW GNB Guinea-Bissau|Guinea Bissau|Bissau-Guinean
+GY GUY Guyana|Guyanese
+HT HTI Haiti|Haitian
+HM HMD Heard Island and McDonald Islands
+VA VAT Holy See|Vatican|Vatican City
+HN HND Honduras|Honduran
+HK HKG Hong Kong|Hong Kong SAR
+HU HUN Hungary|Hungarian
+IS ISL Iceland|Icelandic
+IN IND India|Indian
+ID IDN Indonesia|Indonesian
+IR IRN Iran|Iran Islamic Republic of|Islamic Republic of Iran|Iranian
+IQ IRQ Iraq|Iraqi
+IE IRL Ireland|Irish
+IM IMN Isle of Man
+IL ISR Israel|Israeli
+IT ITA Italy|Italian
+JM JAM Jamaica|Jamaican
+JP JPN Japan|Japanese
+JE JEY Jersey
+JO JOR Jordan|Jordanian
+KZ KAZ Kazakhstan|Kazakh|Kazakhstani
+KE KEN Kenya|Kenyan
+KI KIR Kiribati
+KP PRK North Korea|Korea North|Korea Democratic People's Republic of|Democratic People's Republic of Korea|DPRK|North Korean
+KR KOR South Korea|Korea South|Korea Republic of|Republic of Korea|South Korean
+XK XKX Kosovo|Kosovar
+KW KWT Kuwait|Kuwaiti
+KG KGZ Kyrgyzstan|Kyrgyz Republic|Kyrgyz
+LA LAO Laos|Lao People's Democratic Republic|Lao
+LV LVA Latvia|Latvian
+LB LBN Lebanon|Lebanese
+LS LSO Lesotho|Basotho
+LR LBR Liberia|Liberian
+LY LBY Libya|Libyan Arab Jamahiriya|Libyan
+LI LIE Liechtenstein
+LT LTU Lithuania|Lithuanian
+LU LUX Luxembourg|Luxembourgish
+MO MAC Macao|Macau
+MG MDG Madagascar|Malagasy
+MW MWI Malawi|Malawian
+MY MYS Malaysia|Malaysian
+MV MDV Maldives|Maldivian
+ML MLI Mali|Malian
+MT MLT Malta|Maltese
+MH MHL Marshall Islands|Marshallese
+MQ MTQ Martinique
+MR MRT Mauritania|Mauritanian
+MU MUS Mauritius|Mauritian
+YT MYT Mayotte
+MX MEX Mexico|Mexican
+FM FSM Micronesia|Micronesia Federated States of|Micronesian
+MD MDA Moldova|Moldova Republic of|Republic of Moldova|Moldovan
+MC MCO Monaco|Monegasque
+MN MNG Mongolia|Mongolian
+ME MNE Montenegro|Montenegrin
+MS MSR Montserrat
+MA MAR Morocco|Moroccan
+MZ MOZ Mozambique|Mozambican
+MM MMR Myanmar|Burma|Burmese
+NA NAM Namibia|Namibian
+NR NRU Nauru|Nauruan
+NP NPL Nepal|Nepalese|Nepali
+NL NLD Netherlands|Holland|Dutch
+NC NCL New Caledonia
+NZ NZL New Zealand
+NI NIC Nicaragua|Nicaraguan
+NE NER Niger|Nigerien
+NG NGA Nigeria|Nigerian
+NU NIU Niue
+NF NFK Norfolk Island
+MK MKD North Macedonia|Macedonia|Republic of North Macedonia|Former Yugoslav Republic of Macedonia|Macedonian
+MP MNP Northern Mariana Islands
+NO NOR Norway|Norwegian
+OM OMN Oman|Omani
+PK PAK Pakistan|Pakistani
+PW PLW Palau|Palauan
+PS PSE Palestine|State of Palestine|Palestinian Territory|Occupied Palestinian Territory|West Bank|Gaza|Gaza Strip|Palestinian
+PA PAN Panama|Panamanian
+PG PNG Papua New Guinea|Papua New Guinean
+PY PRY Paraguay|Paraguayan
+PE PER Peru|Peruvian
+PH PHL Philippines|Filipino|Philippine
+PN PCN Pitcairn
+PL POL Poland|Polish
+PT PRT Portugal|Portuguese
+PR PRI Puerto Rico|Puerto Rican
+QA QAT Qatar|Qatari
+RE REU Reunion
+RO ROU Romania|Romanian
+RU RUS Russia|Russian Federation|Russian
+RW RWA Rwanda|Rwandan
+BL BLM Saint Barthelemy
+SH SHN Saint Helena|Saint Helena Ascension and Tristan da Cunha
+KN KNA Saint Kitts and Nevis|St Kitts and Nevis
+LC LCA Saint Lucia|St Lucia
+MF MAF Saint Martin
+PM SPM Saint Pierre and Miquelon
+VC VCT Saint Vincent and the Grenadines|St Vincent and the Grenadines
+WS WSM Samoa|Samoan
+SM SMR San Marino
+ST STP Sao Tome and Principe
+SA SAU Saudi Arabia|Saudi|Saudi Arabian
+SN SEN Senegal|Senegalese
+RS SRB Serbia|Serbian
+SC SYC Seychelles|Seychellois
+SL SLE Sierra Leone|Sierra Leonean
+SG SGP Singapore|Singaporean
+SX SXM Sint Maarten
+SK SVK Slovakia|Slovak Republic|Slovak
+SI SVN Slovenia|Slovenian|Slovene
+SB SLB Solomon Islands
+SO SOM Somalia|Somali
+ZA ZAF South Africa|South African
+GS SGS South Georgia and the South Sandwich Islands
+SS SSD South Sudan|South Sudanese
+ES ESP Spain|Spanish
+LK LKA Sri Lanka|Sri Lankan
+SD SDN Sudan|Sudanese
+SR SUR Suriname|Surinamese
+SJ SJM Svalbard and Jan Mayen
+SE SWE Sweden|Swedish
+CH CHE Switzerland|Swiss
+SY SYR Syria|Syrian Arab Republic|Syrian
+TW TWN Taiwan|Taiwan Province of China|Taiwanese
+TJ TJK Tajikistan|Tajik
+TZ TZA Tanzania|Tanzania United Republic of|United Republic of Tanzania|Tanzanian
+TH THA Thailand|Thai
+TL TLS Timor-Leste|East Timor|Timorese
+TG TGO Togo|Togolese
+TK TKL Tokelau
+TO TON Tonga|Tongan
+TT TTO Trinidad and Tobago|Trinidadian
+TN TUN Tunisia|Tunisian
+TR TUR Turkey|Turkiye|Turkish
+TM TKM Turkmenistan|Turkmen
+TC TCA Turks and Caicos Islands
+TV TUV Tuvalu
+UG UGA Uganda|Ugandan
+UA UKR Ukraine|Ukrainian
+AE ARE United Arab Emirates|UAE|Emirati
+GB GBR United Kingdom|United Kingdom of Great Britain and Northern Ireland|Great Britain|UK|British
+US USA United States|United States of America|USA|American
+UM UMI United States Minor Outlying Islands
+UY URY Uruguay|Uruguayan
+UZ UZB Uzbekistan|Uzbek
+VU VUT Vanuatu
+VE VEN Venezuela|Venezuela Bolivarian Republic of|Bolivarian Republic of Venezuela|Venezuelan
+VN VNM Vietnam|Viet Nam|Vietnamese
+VG VGB British Virgin Islands|Virgin Islands British
+VI VIR US Virgin Islands|Virgin Islands U.S.|Virgin Islands US
+WF WLF Wallis and Futuna
+EH ESH Western Sahara|Sahrawi
+YE YEM Yemen|Yemeni
+ZM ZMB Zambia|Zambian
+ZW ZWE Zimbabwe|Zimbabwean
+"""
+
+def _country_tokens(text):
+    """Minúsculas, sin acentos ni apóstrofos, y sin el artículo 'the': 'Korea, Democratic People's Republic of'
+    -> ('korea', 'democratic', 'peoples', 'republic', 'of')."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    text = re.sub(r"['’`]", '', text.replace('&', ' and '))
+    return tuple(token for token in re.split(r'[^a-z0-9]+', text) if token and token != 'the')
+
+_COUNTRY_PHRASES = {}
+_COUNTRY_CODES = {}
+for _line in _COUNTRIES.strip().splitlines():
+    _alpha2, _alpha3, _names = _line.split(' ', 2)
+    _COUNTRY_CODES[_alpha2.lower()] = _COUNTRY_CODES[_alpha3.lower()] = _alpha2
+    for _name in _names.split('|'):
+        _COUNTRY_PHRASES[_country_tokens(_name)] = _alpha2
+_COUNTRY_PHRASE_MAX_TOKENS = max(len(phrase) for phrase in _COUNTRY_PHRASES)
+del _line, _alpha2, _alpha3, _names, _name
+
+def country_codes(text):
+    """Códigos ISO 3166-1 alfa-2 de los países que nombra ``text``, en orden de aparición.
+
+    Reconoce nombres, variantes y gentilicios de _COUNTRIES (el más largo en cada posición, para que
+    "Congo, Democratic Republic of the" no quede en "Congo"), y un código alfa-2 o alfa-3 si es todo el texto.
+    """
+    tokens = _country_tokens(text)
+    if len(tokens) == 1 and tokens[0] in _COUNTRY_CODES and tokens not in _COUNTRY_PHRASES:
+        return [_COUNTRY_CODES[tokens[0]]]
+    codigos, i = [], 0
+    while i < len(tokens):
+        for longitud in range(min(_COUNTRY_PHRASE_MAX_TOKENS, len(tokens) - i), 0, -1):
+            codigo = _COUNTRY_PHRASES.get(tokens[i:i + longitud])
+            if codigo:
+                if codigo not in codigos:
+                    codigos.append(codigo)
+                i += longitud
+                break
+        else:
+            i += 1
+    return codigos
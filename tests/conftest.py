@@ -0,0 +1,45 @@
+"""Fixtures comunes: una base de datos SQLite pequeña construida con las funciones de ofac_parser.py."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ofac_parser
+import server
+
+# Nombres latinos, cirílicos y árabes: los árabes pasan por el esqueleto consonántico de score_name_query.
+ENTIDADES = [
+    {"uid": "1", "nombre_principal": "Muhammad Ali", "tipo": "Individual",
+     "aliases": [{"nombre_alias": "محمد علي", "tipo_alias": "a.k.a."}, {"nombre_alias": "Mohammed Ali", "tipo_alias": "a.k.a."}],
+     "caracteristicas": [{"tipo_caracteristica": "Date of Birth", "valor_caracteristica": "1970-01-15"}]},
+    {"uid": "2", "nombre_principal": "Ali Hassan", "tipo": "Individual", "aliases": [{"nombre_alias": "علي حسن", "tipo_alias": "a.k.a."}]},
+    {"uid": "3", "nombre_principal": "Ivan Petrov", "tipo": "Individual", "aliases": [{"nombre_alias": "Иван Петров", "tipo_alias": "a.k.a."}]},
+    {"uid": "4", "nombre_principal": "Mahmoud Abbas Trading Co", "tipo": "Entity"},
+    {"uid": "5", "nombre_principal": "Андрей Иванов", "tipo": "Individual"},
+    {"uid": "6", "nombre_principal": "إبراهيم", "tipo": "Individual"},
+]
+
+def construir_base_datos(ruta, entidades=ENTIDADES, fuente="OFAC"):
+    """Crea en ``ruta`` una base de datos con ``entidades`` y sus índices, como la deja ofac_parser.py."""
+    conn = ofac_parser.conectar_db_sqlite(str(ruta))
+    ofac_parser.crear_tablas_sqlite(conn)
+    assert ofac_parser.guardar_datos_en_db_sqlite(conn, iter(entidades), fuente) == len(entidades)
+    ofac_parser.construir_indice_nombres_sqlite(conn)
+    ofac_parser.construir_indices_busqueda_sqlite(conn)
+    ofac_parser.construir_atributos_sqlite(conn)
+    conn.close()
+    return ruta
+
+@pytest.fixture(scope="session")
+def base_datos(tmp_path_factory):
+    return construir_base_datos(tmp_path_factory.mktemp("db") / "sanctions_lists.db")
+
+@pytest.fixture
+def cliente(base_datos, monkeypatch):
+    """Cliente de prueba de Flask sobre ``base_datos``, sin caché de búsquedas ni generación previa."""
+    monkeypatch.setattr(server, "DB_FILE", str(base_datos))
+    monkeypatch.setattr(server, "_active_generation", None)
+    monkeypatch.setattr(server, "SEARCH_CACHE_SIZE", 0)
+    return server.app.test_client()
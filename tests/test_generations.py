@@ -0,0 +1,66 @@
+"""Publicación de generaciones SQLite: permisos, enlace db_file y borrado de las antiguas."""
+import os
+import stat
+
+import pytest
+
+import ofac_parser
+import server
+from conftest import ENTIDADES, construir_base_datos
+
+def publicar(db_file, generacion):
+    ruta = construir_base_datos(ofac_parser.ruta_generacion(str(db_file), generacion))
+    assert ofac_parser.escribir_indice_nombres(ruta, generacion)
+    assert ofac_parser.publicar_generacion_sqlite(str(db_file), generacion, {"OFAC": len(ENTIDADES)})
+    return ruta
+
+def modo(ruta):
+    return stat.S_IMODE(os.stat(ruta).st_mode)
+
+def test_published_generation_and_index_are_world_readable_and_read_only(tmp_path):
+    db_file = tmp_path / "sanctions_lists.db"
+    ruta = publicar(db_file, 1)
+    assert modo(ruta) == 0o444
+    assert modo(ofac_parser.ruta_indice_nombres(ruta)) == 0o444
+
+def test_db_file_is_a_relative_link_to_the_published_generation(tmp_path):
+    db_file = tmp_path / "sanctions_lists.db"
+    publicar(db_file, 1)
+    ruta = publicar(db_file, 2)
+    assert os.path.samefile(db_file, ruta)
+    if os.path.islink(db_file):
+        assert os.readlink(db_file) == os.path.basename(ruta)
+    assert ofac_parser.leer_marcador_generacion(str(db_file))["generacion"] == 2
+
+def test_server_opens_the_published_precompiled_index(tmp_path, monkeypatch):
+    db_file = tmp_path / "sanctions_lists.db"
+    publicar(db_file, 1)
+    monkeypatch.setattr(server, "DB_FILE", str(db_file))
+    monkeypatch.setattr(server, "_active_generation", None)
+    assert type(server.get_active_generation().get_name_index()).__name__ == "MappedNameIndex"
+
+@pytest.mark.parametrize("plazo, conservada", [(3600, True), (0, False)])
+def test_old_generations_are_deleted_after_the_grace_period(tmp_path, monkeypatch, plazo, conservada):
+    monkeypatch.setattr(ofac_parser, "GENERACIONES_CONSERVADAS", 1)
+    monkeypatch.setattr(ofac_parser, "PLAZO_BORRADO_GENERACIONES", plazo)
+    db_file = tmp_path / "sanctions_lists.db"
+    primera = publicar(db_file, 1)
+    publicar(db_file, 2)
+    assert os.path.exists(primera) == conservada
+
+def test_next_generation_is_copied_only_when_opened(tmp_path, monkeypatch):
+    monkeypatch.setattr(ofac_parser, "FORZAR_ACTUALIZACION", False)
+    db_file = tmp_path / "sanctions_lists.db"
+    publicar(db_file, 1)
+    generacion = ofac_parser.preparar_generacion_sqlite(str(db_file))
+    assert generacion["generacion"] == 2 and not generacion["vacia"]
+    assert not os.path.exists(generacion["ruta"])
+    origen = ofac_parser.conectar_origen_sqlite(generacion)
+    assert origen.execute("SELECT COUNT(*) FROM Entidades").fetchone()[0] == len(ENTIDADES)
+    with pytest.raises(ofac_parser.sqlite3.OperationalError):
+        origen.execute("DELETE FROM Entidades")
+    origen.close()
+    conn = ofac_parser.abrir_generacion_sqlite(generacion)
+    assert conn.execute("SELECT COUNT(*) FROM Entidades").fetchone()[0] == len(ENTIDADES)
+    conn.close()
+    assert modo(generacion["ruta"]) & stat.S_IWUSR
@@ -0,0 +1,61 @@
+"""Guardado de las fuentes en SQLite: análisis interrumpido y cargas incrementales."""
+import pytest
+
+import ofac_parser
+
+XML_ONU = """<?xml version="1.0" encoding="UTF-8"?>
+<CONSOLIDATED_LIST><INDIVIDUALS>{}</INDIVIDUALS><ENTITIES/></CONSOLIDATED_LIST>"""
+INDIVIDUO_ONU = "<INDIVIDUAL><DATAID>{0}</DATAID><FIRST_NAME>Persona</FIRST_NAME><SECOND_NAME>{0}</SECOND_NAME><UN_LIST_TYPE>Al-Qaida</UN_LIST_TYPE></INDIVIDUAL>"
+
+def xml_onu(tmp_path, dataids):
+    ruta = tmp_path / "onu.xml"
+    ruta.write_text(XML_ONU.format("".join(INDIVIDUO_ONU.format(dataid) for dataid in dataids)), encoding="utf-8")
+    return str(ruta)
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = ofac_parser.conectar_db_sqlite(str(tmp_path / "ingest.db"))
+    ofac_parser.crear_tablas_sqlite(conn)
+    yield conn
+    conn.close()
+
+def contar(conn, fuente="ONU"):
+    return conn.execute("SELECT COUNT(*) FROM Entidades WHERE fuente_lista = ?", (fuente,)).fetchone()[0]
+
+@pytest.fixture
+def iteracion_rota(monkeypatch):
+    """Hace que el análisis falle con un error inesperado después de ``n`` elementos."""
+    original = ofac_parser.iterar_elementos_xml
+    def romper(n):
+        def iterar(*args, **kwargs):
+            for i, nodo in enumerate(original(*args, **kwargs)):
+                if i == n: raise RuntimeError("fallo a mitad del archivo")
+                yield nodo
+        monkeypatch.setattr(ofac_parser, "iterar_elementos_xml", iterar)
+    return romper
+
+def test_unexpected_parser_error_propagates(tmp_path, iteracion_rota):
+    iteracion_rota(2)
+    with pytest.raises(RuntimeError):
+        list(ofac_parser.analizar_onu_xml(xml_onu(tmp_path, range(1, 6))))
+
+@pytest.mark.parametrize("guardar", [ofac_parser.guardar_datos_en_db_sqlite, ofac_parser.guardar_delta_sqlite])
+def test_interrupted_parse_keeps_previous_rows(tmp_path, conn, iteracion_rota, guardar):
+    ruta = xml_onu(tmp_path, range(1, 6))
+    assert guardar(conn, ofac_parser.con_huellas(ofac_parser.analizar_onu_xml(ruta)), "ONU") is not None
+    iteracion_rota(4)
+    assert guardar(conn, ofac_parser.con_huellas(ofac_parser.analizar_onu_xml(ruta)), "ONU") is None
+    assert contar(conn) == 5
+
+def test_change_report_is_kept_when_nothing_changed(tmp_path, conn):
+    ruta_informe = tmp_path / "informe_cambios.json"
+    ofac_parser.guardar_delta_sqlite(conn, ofac_parser.con_huellas(ofac_parser.analizar_onu_xml(xml_onu(tmp_path, range(1, 6)))), "ONU")
+    ruta = xml_onu(tmp_path, range(1, 7))
+    informe = ofac_parser.guardar_delta_sqlite(conn, ofac_parser.con_huellas(ofac_parser.analizar_onu_xml(ruta)), "ONU")
+    assert ofac_parser.hay_cambios(informe)
+    ofac_parser.guardar_informe_cambios({"ONU": informe}, str(ruta_informe))
+    escrito = ruta_informe.read_text(encoding="utf-8")
+    informe = ofac_parser.guardar_delta_sqlite(conn, ofac_parser.con_huellas(ofac_parser.analizar_onu_xml(ruta)), "ONU")
+    assert not ofac_parser.hay_cambios(informe)
+    ofac_parser.guardar_informe_cambios({"ONU": informe}, str(ruta_informe))
+    assert ruta_informe.read_text(encoding="utf-8") == escrito
@@ -0,0 +1,33 @@
+"""Paginación de /search con offset y con cursores opacos."""
+import pytest
+
+import server
+
+def buscar(cliente, **parametros):
+    return cliente.get("/search", query_string={"name": "Muhammad", "threshold": 0, **parametros})
+
+def test_cursor_pages_cover_every_result_once(cliente):
+    pagina = buscar(cliente, limit=4).get_json()
+    uids = [entidad["uid"] for entidad in pagina["resultados"]]
+    while pagina["next_cursor"]:
+        pagina = buscar(cliente, limit=4, cursor=pagina["next_cursor"]).get_json()
+        uids += [entidad["uid"] for entidad in pagina["resultados"]]
+    todos = [entidad["uid"] for entidad in buscar(cliente, limit=100).get_json()["resultados"]]
+    assert uids == todos and len(todos) == pagina["total"] == 6
+    assert pagina["next_offset"] is None
+
+def test_offset_and_cursor_return_the_same_page(cliente):
+    primera = buscar(cliente, limit=2).get_json()
+    assert primera["next_offset"] == 2
+    assert buscar(cliente, limit=2, cursor=primera["next_cursor"]).get_json() == buscar(cliente, limit=2, offset=2).get_json()
+
+@pytest.mark.parametrize("parametros", [{"cursor": "no-es-un-cursor"}, {"offset": -1}, {"limit": 0}, {"limit": "x"}])
+def test_invalid_pagination_is_rejected(cliente, parametros):
+    assert buscar(cliente, **parametros).status_code == 400
+
+def test_cursor_from_another_database_version_is_rejected(cliente, monkeypatch):
+    cursor = buscar(cliente, limit=2).get_json()["next_cursor"]
+    monkeypatch.setattr(server, "get_data_signature", lambda: ("otra",))
+    respuesta = buscar(cliente, limit=2, cursor=cursor)
+    assert respuesta.status_code == 400
+    assert "ha cambiado" in respuesta.get_json()["error"]
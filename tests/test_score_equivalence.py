@@ -0,0 +1,67 @@
+"""Las puntuaciones de la búsqueda difusa son las de fuzz.token_sort_ratio sobre los nombres normalizados."""
+import pytest
+from thefuzz import fuzz
+
+import name_matching
+import server
+from name_matching import NameCorpus, normalize_string, prepare_for_scoring, score_corpus, token_sort, transliterate
+
+# Nombres y alias con orden de tokens, acentos, puntuación, errores y escrituras distintos.
+NOMBRES = [
+    "Muhammad Ali", "ALI, Muhammad", "Mohammed Ali", "Mohamed Aly", "Muhammad Ali Khan", "Ali Muhammad Hassan",
+    "Ali Hassan", "Hassan Ali", "Alí Hassán", "Ivan Petrov", "Petrov, Ivan Ivanovich", "Iwan Petrow",
+    "José María García", "Jose Maria Garcia", "García-López, José", "Mahmoud Abbas Trading Co.",
+    "Abbas Trading Company", "O'Brien Shipping Ltd", "Андрей Иванов", "Иван Петров", "محمد علي", "X", "",
+]
+CONSULTAS = ["Muhammad Ali", "ali muhammad", "Ivan Petrov", "jose garcia", "Abbas Trading", "O Brien", "Mohamed", "Иван Петров"]
+UMBRALES = [0, 1, 50, 70, 80, 85, 86, 90, 95, 99, 100]
+
+def esperado(consulta, umbral, nombres=NOMBRES):
+    puntuaciones = [(pos, fuzz.token_sort_ratio(normalize_string(consulta), normalize_string(nombre))) for pos, nombre in enumerate(nombres)]
+    return [(pos, puntuacion) for pos, puntuacion in puntuaciones if puntuacion >= umbral]
+
+@pytest.fixture(params=["numpy", "sin_numpy"])
+def motor(request, monkeypatch):
+    """score_corpus con rapidfuzz.process.cdist por bloques y con process.extract, cuando numpy no está."""
+    if request.param == "numpy":
+        monkeypatch.setattr(name_matching, "FUZZY_CHUNK_SIZE", 5) # Varios bloques también con pocos nombres.
+    else:
+        monkeypatch.setattr(name_matching, "np", None)
+
+@pytest.mark.parametrize("umbral", UMBRALES)
+@pytest.mark.parametrize("consulta", CONSULTAS)
+def test_score_corpus_matches_token_sort_ratio(motor, consulta, umbral):
+    elegidos = [prepare_for_scoring(normalize_string(nombre)) for nombre in NOMBRES]
+    assert score_corpus(prepare_for_scoring(normalize_string(consulta)), elegidos, umbral) == esperado(consulta, umbral)
+
+@pytest.mark.parametrize("umbral", UMBRALES)
+@pytest.mark.parametrize("consulta", CONSULTAS)
+def test_presorted_scoring_matches_token_sort_ratio(motor, consulta, umbral):
+    elegidos = [token_sort(prepare_for_scoring(normalize_string(nombre))) for nombre in NOMBRES]
+    consulta_ordenada = token_sort(prepare_for_scoring(normalize_string(consulta)))
+    assert score_corpus(consulta_ordenada, elegidos, umbral, presorted=True) == esperado(consulta, umbral)
+
+@pytest.fixture
+def corpus():
+    return NameCorpus((str(pos), nombre, normalize_string(nombre), transliterate(nombre)) for pos, nombre in enumerate(NOMBRES))
+
+@pytest.mark.parametrize("umbral", UMBRALES)
+@pytest.mark.parametrize("consulta", CONSULTAS)
+def test_trigram_blocking_loses_no_match(monkeypatch, corpus, consulta, umbral):
+    monkeypatch.setattr(server, "PHONETIC_SEARCH", False)
+    assert server.score_name_query(corpus, consulta, umbral) == esperado(consulta, umbral)
+
+@pytest.mark.parametrize("umbral", UMBRALES)
+@pytest.mark.parametrize("consulta", CONSULTAS)
+def test_phonetic_search_only_adds_matches(monkeypatch, corpus, consulta, umbral):
+    """La búsqueda fonética no quita ni rebaja ninguna coincidencia de token_sort_ratio, y no pasa de 100."""
+    monkeypatch.setattr(server, "PHONETIC_SEARCH", True)
+    resultado = dict(server.score_name_query(corpus, consulta, umbral))
+    for pos, puntuacion in esperado(consulta, umbral):
+        assert resultado[pos] >= puntuacion
+    assert all(umbral <= puntuacion <= 100 for puntuacion in resultado.values())
+
+def test_transliterated_alias_is_found_phonetically(monkeypatch, corpus):
+    monkeypatch.setattr(server, "PHONETIC_SEARCH", True)
+    assert NOMBRES.index("Иван Петров") in dict(server.score_name_query(corpus, "Ivan Petrov", 90))
+    assert NOMBRES.index("Ivan Petrov") in dict(server.score_name_query(corpus, "Иван Петров", 90))
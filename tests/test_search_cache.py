@@ -0,0 +1,53 @@
+"""SearchCache: claves equivalentes, firma de los datos, tamaño y caducidad."""
+import pytest
+
+import server
+from server import SearchCache
+
+RESULTADO = (["1", "2"], {"1": 100, "2": 90})
+
+def clave(**parametros):
+    return SearchCache.key({"threshold": 80, **parametros})
+
+def test_equivalent_searches_share_the_key():
+    assert clave(name="Ivan  Petrov") == clave(name="ivan petrov")
+    assert clave(name="Ivan Petrov", is_exact_search=True) != clave(name="ivan petrov", is_exact_search=True)
+    # El umbral no cuenta en la búsqueda exacta ni sin nombre, ni la tolerancia sin fecha.
+    assert clave(name="Ivan Petrov", is_exact_search=True, threshold=50) == clave(name="Ivan Petrov", is_exact_search=True)
+    assert clave(nationality="RU", threshold=50, dob_tolerance=3) == clave(nationality="RU")
+    assert clave(name="Ivan Petrov", threshold=90) != clave(name="Ivan Petrov")
+
+def test_signature_only_moves_forward():
+    cache = SearchCache(10, 60, 100)
+    cache.put((1, "a"), "k", RESULTADO)
+    assert cache.get((1, "a"), "k") is RESULTADO
+    cache.put((2, "b"), "k2", RESULTADO)
+    assert cache.get((2, "b"), "k") is None # La firma nueva vacía la caché.
+    # Una conexión de la generación anterior no vuelve a ella ni guarda nada.
+    cache.put((1, "a"), "k", RESULTADO)
+    assert cache.get((1, "a"), "k") is None
+    assert cache.get((2, "b"), "k2") is RESULTADO
+    assert cache.stats()["invalidations"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SearchCache(2, 60, 100)
+    for k in ("a", "b"): cache.put(1, k, RESULTADO)
+    cache.get(1, "a")
+    cache.put(1, "c", RESULTADO)
+    assert cache.get(1, "b") is None and cache.get(1, "a") is RESULTADO
+    assert cache.stats()["evictions"] == 1
+
+@pytest.mark.parametrize("max_entries, max_results", [(0, 100), (10, 1)])
+def test_disabled_cache_and_large_results_are_not_stored(max_entries, max_results):
+    cache = SearchCache(max_entries, 60, max_results)
+    cache.put(1, "k", RESULTADO)
+    assert cache.get(1, "k") is None
+
+def test_entries_expire(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: ahora[0])
+    cache = SearchCache(10, 60, 100)
+    cache.put(1, "k", RESULTADO)
+    ahora[0] += 61
+    assert cache.get(1, "k") is None
+    assert cache.stats()["expirations"] == 1
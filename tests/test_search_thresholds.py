@@ -0,0 +1,30 @@
+"""Umbrales de la búsqueda difusa: todo el rango del frontend (50-100) y los extremos."""
+import pytest
+
+import server
+
+CONSULTAS = ["Muhammad", "Muhammad Ali", "محمد", "محمد علي", "Ali Hassan", "Mahmoud", "Ivan Petrov", "Андрей"]
+
+@pytest.mark.parametrize("threshold", range(50, 101))
+@pytest.mark.parametrize("name", CONSULTAS)
+def test_search_accepts_every_threshold(cliente, name, threshold):
+    response = cliente.get("/search", query_string={"name": name, "threshold": threshold})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+@pytest.mark.parametrize("threshold", range(86, 101))
+def test_skeleton_scores_never_exceed_threshold_range(base_datos, threshold, monkeypatch):
+    monkeypatch.setattr(server, "DB_FILE", str(base_datos))
+    monkeypatch.setattr(server, "_active_generation", None)
+    corpus = server.get_active_generation().get_name_index().full
+    for name in CONSULTAS:
+        hits = server.score_name_query(corpus, name, threshold)
+        assert all(threshold <= score <= 100 for _, score in hits)
+
+def test_exact_name_scores_100_at_threshold_100(cliente):
+    results = cliente.get("/search", query_string={"name": "Ali Hassan", "threshold": 100}).get_json()["resultados"]
+    assert [entity["uid"] for entity in results] == ["2"]
+
+@pytest.mark.parametrize("threshold", [0, -5])
+def test_threshold_zero_or_below_returns_every_entity(cliente, threshold):
+    results = cliente.get("/search", query_string={"name": "Muhammad", "threshold": threshold, "limit": 100}).get_json()["resultados"]
+    assert len(results) == 6